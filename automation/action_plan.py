@@ -0,0 +1,176 @@
+"""
+Session Action Plans
+=====================
+Per-account "next session plan" — the account row, its settings and the
+action list BotEngine._plan_session() decides on — built ahead of the
+session and reused until one of its inputs changes:
+
+    plan = get_plan(device_serial, account_id)     # BotEngine._load_account
+    plan.account, plan.settings, plan.warmup, plan.warmup_expired, plan.entries
+
+    refresher = start_refresher(device_serial, lambda: [a['id'] for a in accounts])
+    ...
+    refresher.stop()
+
+A plan is current while
+    - the row_versions counters of PLAN_TABLES are what they were when it
+      was built (triggers bump them on every write, from any process: a
+      settings edit, a new job order or assignment, a schedule item, an
+      account update, a new follower snapshot), and
+    - its expires_at hasn't passed — the time-driven inputs: the follower
+      snapshot ageing past check_profile_interval_hours, the daily account
+      status check falling due, the next scheduled post's time, the end of
+      warmup.
+Checking that is one SELECT on row_versions, instead of the account,
+settings, job-order JOIN and content_schedule queries the engine used to
+run before touching the device.
+
+The device runner keeps a refresher thread that rebuilds stale plans of
+its accounts every REFRESH_INTERVAL seconds, so the session start normally
+finds a current plan. Building a plan only reads: an expired warmup is
+flagged (warmup_expired) and cleared in the DB by the session that runs the
+plan (BotEngine._determine_actions), not by whoever built it. Without row_versions (pre-migration DB) nothing is
+cached and every get_plan() builds.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from automation.actions.helpers import get_db
+
+log = logging.getLogger(__name__)
+
+# Tables whose writes can change a plan (row_versions triggers: migration
+# steps 7 and 14)
+PLAN_TABLES = ('accounts', 'account_settings', 'follower_snapshots',
+               'job_orders', 'job_assignments', 'content_schedule')
+REFRESH_INTERVAL = 5.0
+
+# cached: True when get_plan() served it from the cache
+SessionPlan = namedtuple('SessionPlan',
+                         'account_id account settings warmup warmup_expired entries versions '
+                         'built_at expires_at cached')
+
+_plans = {}             # account_id -> SessionPlan
+_plans_lock = threading.Lock()
+
+
+def plan_versions(conn=None):
+    """Tuple of the PLAN_TABLES counters, or None without row_versions."""
+    own = conn is None
+    conn = conn or get_db()
+    try:
+        rows = dict(conn.execute(
+            "SELECT name, version FROM row_versions WHERE name IN (%s)"
+            % ','.join('?' * len(PLAN_TABLES)), PLAN_TABLES).fetchall())
+    except sqlite3.Error:
+        return None
+    finally:
+        if own:
+            conn.close()
+    if len(rows) < len(PLAN_TABLES):
+        return None
+    return tuple(rows[t] for t in PLAN_TABLES)
+
+
+def is_current(plan, versions, now=None):
+    return (plan is not None and versions is not None and plan.versions == versions
+            and (plan.expires_at is None or (now or time.time()) < plan.expires_at))
+
+
+def build_plan(engine, versions=None):
+    """SessionPlan for a BotEngine whose account is loaded."""
+    warmup, warmup_expired, entries, expires_at = engine._plan_session()
+    return SessionPlan(engine.account_id, dict(engine.account), engine.settings, warmup,
+                       warmup_expired, entries, versions, time.time(), expires_at, False)
+
+
+def _build(device_serial, account_id, versions):
+    from automation.bot_engine import BotEngine
+    engine = BotEngine(device_serial, account_id)
+    if not engine._read_account():
+        return None
+    return build_plan(engine, versions)
+
+
+def get_plan(device_serial, account_id):
+    """Current plan of the account (built now if the cached one is stale);
+    None if the account doesn't exist."""
+    from automation.metrics import get_registry
+    versions = plan_versions()
+    with _plans_lock:
+        plan = _plans.get(account_id)
+    if is_current(plan, versions):
+        get_registry().inc('action_plans_total', result='cached')
+        return plan._replace(cached=True)
+    plan = _build(device_serial, account_id, versions)
+    get_registry().inc('action_plans_total', result='built')
+    if plan is not None and versions is not None:
+        with _plans_lock:
+            _plans[account_id] = plan
+    return plan
+
+
+def invalidate(account_id=None):
+    """Drop the cached plan of one account (or all)."""
+    with _plans_lock:
+        if account_id is None:
+            _plans.clear()
+        else:
+            _plans.pop(account_id, None)
+
+
+class PlanRefresher:
+    """Keeps the plans of a runner's accounts current in the background."""
+
+    def __init__(self, device_serial, account_ids_fn, interval=REFRESH_INTERVAL):
+        self.device_serial = device_serial
+        self.account_ids_fn = account_ids_fn
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True,
+                                        name=f"plans-{device_serial}")
+
+    def refresh(self):
+        """Rebuild every stale plan once; returns how many were rebuilt."""
+        versions = plan_versions()
+        if versions is None:
+            return 0
+        rebuilt = 0
+        for account_id in self.account_ids_fn():
+            with _plans_lock:
+                plan = _plans.get(account_id)
+            if is_current(plan, versions):
+                continue
+            plan = _build(self.device_serial, account_id, versions)
+            with _plans_lock:
+                if plan is None:
+                    _plans.pop(account_id, None)
+                else:
+                    _plans[account_id] = plan
+                    rebuilt += 1
+        return rebuilt
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                log.debug("[%s] plan refresh failed: %s", self.device_serial, e)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+
+
+def start_refresher(device_serial, account_ids_fn, interval=REFRESH_INTERVAL):
+    return PlanRefresher(device_serial, account_ids_fn, interval).start()
@@ -12,6 +12,11 @@ import time
 import datetime
 import json
 
+from automation import relationship_ledger
+from db.connection import connect
+from db.migrations import require_schema
+from automation.cooldown import note_pacing
+
 log = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
@@ -25,6 +30,10 @@ def _get_db_path():
         os.path.abspath(__file__)))), "db", "phone_farm.db")
 
 
+# Versioned migrations (db/migrations.py) — one integer compare per process
+require_schema(_get_db_path())
+
+
 # ---------------------------------------------------------------------------
 # Random Delays (human-like)
 # ---------------------------------------------------------------------------
@@ -35,6 +44,7 @@ def random_sleep(min_sec=2.0, max_sec=5.0, label=""):
     if label:
         log.debug("[delay] %s: %.1fs", label, duration)
     time.sleep(duration)
+    note_pacing(duration)       # session pacing report (automation/cooldown.py)
     return duration
 
 
@@ -57,30 +67,9 @@ def action_delay(action_type="default"):
 # DB Helpers
 # ---------------------------------------------------------------------------
 
-_db_migrated = False
-
 def get_db():
-    """Get a thread-safe DB connection."""
-    import sqlite3
-    global _db_migrated
-    path = _get_db_path()
-    conn = sqlite3.connect(path, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-
-    # Auto-migrate missing columns (runs once per process)
-    if not _db_migrated:
-        _db_migrated = True
-        try:
-            cols = {c[1] for c in conn.execute("PRAGMA table_info(action_history)").fetchall()}
-            if 'source_username' not in cols:
-                conn.execute("ALTER TABLE action_history ADD COLUMN source_username TEXT")
-                conn.commit()
-                log.info("Auto-migrated: added source_username to action_history")
-        except Exception as e:
-            log.debug("DB migration check: %s", e)
-
-    return conn
+    """Get a thread-safe pooled DB connection (db.connection)."""
+    return connect(_get_db_path())
 
 
 def log_action(session_id, device_serial, username, action_type,
@@ -99,6 +88,15 @@ def log_action(session_id, device_serial, username, action_type,
         """, (session_id, device_serial, username, action_type,
               target_username, target_post_id, 1 if success else 0,
               now, error_message, source_username))
+        # Keep the relationship ledger (unfollow queue) in the same transaction
+        if success and target_username and action_type in ('follow', 'unfollow'):
+            if action_type == 'follow':
+                relationship_ledger.record_follow(
+                    username, target_username, device_serial,
+                    source_username=source_username, at=now, conn=conn)
+            else:
+                relationship_ledger.record_unfollow(
+                    username, target_username, device_serial, at=now, conn=conn)
         conn.commit()
         conn.close()
     except Exception as e:
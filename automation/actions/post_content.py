@@ -29,7 +29,7 @@ class PostContentAction:
     """Post scheduled content (post/reel/story) to Instagram."""
 
     def __init__(self, device, device_serial, account_info, session_id,
-                 schedule_item, package='com.instagram.androie'):
+                 schedule_item, package='com.instagram.androie', staged_media=None):
         """
         Args:
             device: uiautomator2 device object
@@ -37,6 +37,8 @@ class PostContentAction:
             account_info: dict with account data (id, username, package, etc.)
             session_id: current bot session id
             schedule_item: dict from content_schedule row
+            staged_media: remote path the media was already pushed to (by
+                push_media_to_device during a cooldown), or None to push now
         """
         self.device = device
         self.device_serial = device_serial
@@ -72,6 +74,7 @@ class PostContentAction:
 
         # Remote path for pushed media
         self._remote_media_path = None
+        self._staged_media = staged_media
 
     def execute(self):
         """
@@ -98,13 +101,19 @@ class PostContentAction:
                 raise FileNotFoundError(
                     f"Media file not found: {self.media_path}")
 
-            # Push media to device FIRST (before opening IG)
-            self._remote_media_path = self._push_media_to_device(self.media_path)
-            if not self._remote_media_path:
-                raise RuntimeError("Failed to push media to device")
+            # Push media to device FIRST (before opening IG) — unless it was
+            # pre-staged during the previous cooldown
+            if self._staged_media:
+                self._remote_media_path = self._staged_media
+                log.info("[%s] CONTENT: Using pre-staged media %s",
+                         self.device_serial, self._remote_media_path)
+            else:
+                self._remote_media_path = self._push_media_to_device(self.media_path)
+                if not self._remote_media_path:
+                    raise RuntimeError("Failed to push media to device")
 
-            log.info("[%s] CONTENT: Pushed media to %s",
-                     self.device_serial, self._remote_media_path)
+                log.info("[%s] CONTENT: Pushed media to %s",
+                         self.device_serial, self._remote_media_path)
 
             # NOW open IG and start the flow.
             # ensure_app() can FAIL — IG clones sometimes refuse to launch on
@@ -237,85 +246,12 @@ class PostContentAction:
 
     def _push_media_to_device(self, local_path, remote_dir="/sdcard/Pictures"):
         """Push media file to device via ADB and register in MediaStore."""
-        adb_serial = self.device_serial.replace('_', ':')
-        filename = os.path.basename(local_path)
-        remote_path = f"{remote_dir}/{filename}"
-        # MediaStore needs the real /storage/emulated/0 path, not /sdcard
-        real_remote_path = remote_path.replace('/sdcard/', '/storage/emulated/0/')
-
-        # Determine mime type
-        ext = os.path.splitext(filename)[1].lower()
-        mime_map = {
-            '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png',
-            '.gif': 'image/gif', '.webp': 'image/webp', '.bmp': 'image/bmp',
-            '.mp4': 'video/mp4', '.mov': 'video/quicktime', '.avi': 'video/x-msvideo',
-        }
-        mime_type = mime_map.get(ext, 'image/jpeg')
-        is_video = mime_type.startswith('video/')
-        media_uri = 'content://media/external/video/media' if is_video else 'content://media/external/images/media'
-
-        # Create remote directory
-        subprocess.run(
-            ['adb', '-s', adb_serial, 'shell', 'mkdir', '-p', remote_dir],
-            capture_output=True, timeout=10)
-
-        # Push the file
-        result = subprocess.run(
-            ['adb', '-s', adb_serial, 'push', local_path, remote_path],
-            capture_output=True, text=True, timeout=120)
-
-        if result.returncode != 0:
-            log.error("[%s] CONTENT: ADB push failed: %s",
-                      self.device_serial, result.stderr[:200])
-            return None
-
-        # Use MediaProvider's scan_file method — the proper API on Android 10+.
-        # This triggers MediaScannerConnection.scanFile() internally and extracts
-        # all metadata (duration, resolution, etc.) from the actual file.
-        # No manual content insert or deprecated broadcasts needed.
-        scan_result = subprocess.run(
-            ['adb', '-s', adb_serial, 'shell',
-             'content', 'call', '--uri', 'content://media',
-             '--method', 'scan_file',
-             '--arg', real_remote_path],
-            capture_output=True, text=True, timeout=20)
-
-        if scan_result.returncode == 0 and 'content://' in scan_result.stdout:
-            log.info("[%s] CONTENT: Scanned %s → %s",
-                     self.device_serial, filename,
-                     scan_result.stdout.strip()[:100])
-        else:
-            log.warning("[%s] CONTENT: scan_file returned: %s",
-                        self.device_serial,
-                        (scan_result.stdout + scan_result.stderr)[:200])
-            # Fallback: deprecated broadcast (better than nothing)
-            subprocess.run(
-                ['adb', '-s', adb_serial, 'shell',
-                 'am', 'broadcast', '-a',
-                 'android.intent.action.MEDIA_SCANNER_SCAN_FILE',
-                 '-d', f'file://{remote_path}'],
-                capture_output=True, timeout=10)
-
-        # Brief pause for gallery to refresh
-        time.sleep(2)
-
-        return remote_path
+        return push_media_to_device(self.device_serial, local_path, remote_dir)
 
     def _cleanup_device_media(self):
         """Remove pushed media file from device."""
-        if not self._remote_media_path:
-            return
-        try:
-            adb_serial = self.device_serial.replace('_', ':')
-            subprocess.run(
-                ['adb', '-s', adb_serial, 'shell', 'rm', '-f',
-                 self._remote_media_path],
-                capture_output=True, timeout=10)
-            log.debug("[%s] CONTENT: Cleaned up %s from device",
-                      self.device_serial, self._remote_media_path)
-        except Exception as e:
-            log.debug("[%s] CONTENT: Cleanup failed (non-critical): %s",
-                      self.device_serial, e)
+        if self._remote_media_path:
+            remove_device_media(self.device_serial, self._remote_media_path)
 
     # ------------------------------------------------------------------
     # Feed Post Flow
@@ -2233,6 +2169,87 @@ class PostContentAction:
             pass
 
 
+def push_media_to_device(device_serial, local_path, remote_dir="/sdcard/Pictures"):
+    """Push media file to device via ADB and register in MediaStore."""
+    adb_serial = device_serial.replace('_', ':')
+    filename = os.path.basename(local_path)
+    remote_path = f"{remote_dir}/{filename}"
+    # MediaStore needs the real /storage/emulated/0 path, not /sdcard
+    real_remote_path = remote_path.replace('/sdcard/', '/storage/emulated/0/')
+
+    # Determine mime type
+    ext = os.path.splitext(filename)[1].lower()
+    mime_map = {
+        '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png',
+        '.gif': 'image/gif', '.webp': 'image/webp', '.bmp': 'image/bmp',
+        '.mp4': 'video/mp4', '.mov': 'video/quicktime', '.avi': 'video/x-msvideo',
+    }
+    mime_type = mime_map.get(ext, 'image/jpeg')
+    is_video = mime_type.startswith('video/')
+    media_uri = 'content://media/external/video/media' if is_video else 'content://media/external/images/media'
+
+    # Create remote directory
+    subprocess.run(
+        ['adb', '-s', adb_serial, 'shell', 'mkdir', '-p', remote_dir],
+        capture_output=True, timeout=10)
+
+    # Push the file
+    result = subprocess.run(
+        ['adb', '-s', adb_serial, 'push', local_path, remote_path],
+        capture_output=True, text=True, timeout=120)
+
+    if result.returncode != 0:
+        log.error("[%s] CONTENT: ADB push failed: %s",
+                  device_serial, result.stderr[:200])
+        return None
+
+    # Use MediaProvider's scan_file method — the proper API on Android 10+.
+    # This triggers MediaScannerConnection.scanFile() internally and extracts
+    # all metadata (duration, resolution, etc.) from the actual file.
+    # No manual content insert or deprecated broadcasts needed.
+    scan_result = subprocess.run(
+        ['adb', '-s', adb_serial, 'shell',
+         'content', 'call', '--uri', 'content://media',
+         '--method', 'scan_file',
+         '--arg', real_remote_path],
+        capture_output=True, text=True, timeout=20)
+
+    if scan_result.returncode == 0 and 'content://' in scan_result.stdout:
+        log.info("[%s] CONTENT: Scanned %s → %s",
+                 device_serial, filename,
+                 scan_result.stdout.strip()[:100])
+    else:
+        log.warning("[%s] CONTENT: scan_file returned: %s",
+                    device_serial,
+                    (scan_result.stdout + scan_result.stderr)[:200])
+        # Fallback: deprecated broadcast (better than nothing)
+        subprocess.run(
+            ['adb', '-s', adb_serial, 'shell',
+             'am', 'broadcast', '-a',
+             'android.intent.action.MEDIA_SCANNER_SCAN_FILE',
+             '-d', f'file://{remote_path}'],
+            capture_output=True, timeout=10)
+
+    # Brief pause for gallery to refresh
+    time.sleep(2)
+
+    return remote_path
+
+
+def remove_device_media(device_serial, remote_path):
+    """Remove a pushed media file from the device."""
+    try:
+        adb_serial = device_serial.replace('_', ':')
+        subprocess.run(
+            ['adb', '-s', adb_serial, 'shell', 'rm', '-f', remote_path],
+            capture_output=True, timeout=10)
+        log.debug("[%s] CONTENT: Cleaned up %s from device",
+                  device_serial, remote_path)
+    except Exception as e:
+        log.debug("[%s] CONTENT: Cleanup failed (non-critical): %s",
+                  device_serial, e)
+
+
 def execute_post_content(device, device_serial, account_info, session_id,
                          schedule_item):
     """Convenience function to post scheduled content."""
@@ -3,8 +3,8 @@ Scrape Action Module
 =====================
 Scrape follower lists from target accounts for follow targeting.
 
-Saves scraped usernames to a local DB table (scraped_users)
-so the follow action can use them as targets.
+Saves scraped usernames to a local DB table (scraped_users, created by
+db/migrations.py) so the follow action can use them as targets.
 """
 
 import logging
@@ -19,32 +19,6 @@ from automation.actions.helpers import (
 
 log = logging.getLogger(__name__)
 
-# Ensure scraped_users table exists
-SCRAPED_TABLE_SQL = """
-CREATE TABLE IF NOT EXISTS scraped_users (
-    id              INTEGER PRIMARY KEY AUTOINCREMENT,
-    account_id      INTEGER NOT NULL,
-    source_username TEXT NOT NULL,
-    scraped_username TEXT NOT NULL,
-    scraped_at      TEXT DEFAULT (datetime('now')),
-    used            INTEGER DEFAULT 0,
-    UNIQUE(account_id, scraped_username)
-);
-CREATE INDEX IF NOT EXISTS idx_scraped_account ON scraped_users(account_id, used);
-"""
-
-
-def ensure_scraped_table():
-    """Create scraped_users table if it doesn't exist."""
-    try:
-        conn = get_db()
-        conn.executescript(SCRAPED_TABLE_SQL)
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        log.error("Failed to create scraped_users table: %s", e)
-
-
 class ScrapeAction:
     """
     Scrape follower lists from target/source accounts.
@@ -59,8 +33,6 @@ class ScrapeAction:
         self.username = account_info['username']
         self.account_id = account_info['id']
 
-        ensure_scraped_table()
-
     def execute(self, max_per_source=100):
         """
         Scrape followers from source accounts.
@@ -868,7 +868,7 @@ def save_insights_to_db(data, account_id, device_serial=None, db_path=None):
     Returns:
         inserted row ID, or None on failure
     """
-    import sqlite3
+    from db.connection import connect
     import os
     
     if db_path is None:
@@ -883,8 +883,7 @@ def save_insights_to_db(data, account_id, device_serial=None, db_path=None):
         return None
     
     try:
-        conn = sqlite3.connect(db_path, check_same_thread=False)
-        conn.execute("PRAGMA journal_mode=WAL")
+        conn = connect(db_path, row_factory=None)
         
         overview = data.get('overview', {})
         views = data.get('views_detail', {})
@@ -968,7 +967,7 @@ def get_latest_insights(account_id, db_path=None):
     Returns:
         dict with insights data, or None
     """
-    import sqlite3
+    from db.connection import connect
     import os
     
     if db_path is None:
@@ -979,8 +978,7 @@ def get_latest_insights(account_id, db_path=None):
         )
     
     try:
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
+        conn = connect(db_path)
         
         row = conn.execute("""
             SELECT * FROM account_insights_v2
@@ -1011,7 +1009,7 @@ def get_insights_history(account_id, days=30, db_path=None):
     Returns:
         list of dicts with insights data
     """
-    import sqlite3
+    from db.connection import connect
     import os
     
     if db_path is None:
@@ -1022,8 +1020,7 @@ def get_insights_history(account_id, days=30, db_path=None):
         )
     
     try:
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
+        conn = connect(db_path)
         
         since = (datetime.datetime.now() - datetime.timedelta(days=days)).isoformat()
         rows = conn.execute("""
@@ -4,23 +4,23 @@ Unfollow Action Module
 Unfollow users who were followed X days ago, using IGController.
 
 Flow:
-1. Navigate to bot account's profile
-2. Open Following list
-3. Scroll through and unfollow users
-4. Respect whitelist and unfollow delay (days since follow)
-5. Log each action
+1. Build an oldest-first queue from the relationship ledger
+   (automation/relationship_ledger.py), respecting whitelist + unfollow delay
+2. Open Following list, unfollow queued users on the first few screens
+3. Search the remaining queued users directly and unfollow from their profile
+4. Log each action (log_action keeps the ledger in sync)
 """
 
 import logging
 import random
 import time
-import datetime
 
 from automation.actions.helpers import (
     action_delay, random_sleep, log_action,
     get_account_settings, get_account_sources,
-    get_today_action_count, get_db
+    get_today_action_count
 )
+from automation import relationship_ledger
 from automation.ig_controller import IGController, Screen
 
 log = logging.getLogger(__name__)
@@ -32,6 +32,9 @@ class UnfollowAction:
     Uses IGController for reliable screen-state-verified navigation.
     """
 
+    LIST_PAGES = 3            # Following-list screens to check before searching
+    LEGACY_LIST_PAGES = 20    # accounts without ledger history (list-only mode)
+
     def __init__(self, device, device_serial, account_info, session_id,
                  package='com.instagram.androie'):
         self.device = device
@@ -102,45 +105,30 @@ class UnfollowAction:
         self.whitelist.update(u.lower() for u in sources)
         log.info("[%s] Whitelist: %d users", self.device_serial, len(self.whitelist))
 
-    def _get_users_eligible_for_unfollow(self):
+    def _build_queue(self, limit):
         """
-        Get users followed long enough ago to be eligible for unfollow.
-        Returns set of usernames.
+        Oldest-first unfollow queue from the relationship ledger: targets
+        followed at least unfollow_delay_days ago, not yet unfollowed, not
+        whitelisted. Returns list of target usernames.
         """
-        eligible = set()
-        try:
-            conn = get_db()
-            cutoff = (datetime.datetime.now() -
-                     datetime.timedelta(days=self.unfollow_delay_days)).isoformat()
-            rows = conn.execute("""
-                SELECT DISTINCT target_username FROM action_history
-                WHERE device_serial=? AND username=? AND action_type='follow'
-                  AND success=1 AND timestamp <= ?
-                  AND target_username IS NOT NULL
-            """, (self.device_serial, self.username, cutoff)).fetchall()
-            conn.close()
-            eligible = {r['target_username'] for r in rows}
-
-            eligible -= self.whitelist
-
-            conn = get_db()
-            already_unfollowed = conn.execute("""
-                SELECT DISTINCT target_username FROM action_history
-                WHERE device_serial=? AND username=? AND action_type='unfollow'
-                  AND success=1 AND target_username IS NOT NULL
-            """, (self.device_serial, self.username)).fetchall()
-            conn.close()
-            eligible -= {r['target_username'] for r in already_unfollowed}
-
-        except Exception as e:
-            log.error("[%s] Error getting eligible unfollow list: %s",
-                     self.device_serial, e)
-
-        return eligible
+        rows = relationship_ledger.unfollow_queue(
+            self.username, self.unfollow_delay_days, limit, exclude=self.whitelist)
+        return [r['target_username'] for r in rows]
 
     def execute(self):
         """
         Execute the unfollow action.
+
+        1. Build the oldest-first queue from the relationship ledger.
+        2. List pass: open the Following list and unfollow queued targets
+           visible on the first LIST_PAGES screens.
+        3. Direct pass: search each remaining queued target and unfollow it
+           from the profile — no blind scrolling for old follows.
+
+        Accounts the ledger knows nothing about (never followed via the bot)
+        keep the legacy behaviour: unfollow non-whitelisted users from the
+        list.
+
         Returns dict: {success, unfollows_done, errors, skipped}
         """
         result = {
@@ -168,15 +156,34 @@ class UnfollowAction:
         log.info("[%s] %s: Will unfollow up to %d users (done today: %d)",
                  self.device_serial, self.username, target, done_today)
 
-        # Get users eligible for unfollow
-        eligible = self._get_users_eligible_for_unfollow()
-        log.info("[%s] Users eligible for unfollow: %d", self.device_serial, len(eligible))
+        # Queue a few extra in case some targets are gone / renamed
+        queue = self._build_queue(target * 2)
+        legacy = not queue and not relationship_ledger.has_history(self.username)
+        log.info("[%s] Unfollow queue: %d targets%s", self.device_serial, len(queue),
+                 " (no ledger history — list mode)" if legacy else "")
+        if not queue and not legacy:
+            result['success'] = True
+            return result
+
+        pending = list(queue)
+        self._list_pass(result, target, pending, legacy)
+
+        if not legacy and pending and result['unfollows_done'] < target:
+            self._direct_pass(result, target, pending)
 
+        result['success'] = True
+        log.info("[%s] %s: Unfollow complete. Unfollowed: %d, Skipped: %d, Errors: %d",
+                 self.device_serial, self.username,
+                 result['unfollows_done'], result['skipped'], result['errors'])
+        return result
+
+    def _list_pass(self, result, target, pending, legacy):
+        """Unfollow queued targets visible near the top of the Following list."""
         # Navigate to own profile using IGController
         if not self.ctrl.navigate_to(Screen.PROFILE):
             log.warning("[%s] Could not navigate to profile", self.device_serial)
             result['errors'] += 1
-            return result
+            return
 
         random_sleep(2, 4)
 
@@ -185,29 +192,31 @@ class UnfollowAction:
             log.warning("[%s] Could not open following list", self.device_serial)
             self.ctrl.press_back()
             result['errors'] += 1
-            return result
+            return
 
         random_sleep(2, 4, label="following_list_loaded")
 
-        # Process the following list
-        scroll_attempts = 0
-        max_scroll_attempts = 20
+        wanted = {u.lower(): u for u in pending}
+        max_pages = self.LEGACY_LIST_PAGES if legacy else self.LIST_PAGES
+        pages = 0
+        empty_scrolls = 0
         seen_usernames = set()
 
-        while result['unfollows_done'] < target and scroll_attempts < max_scroll_attempts:
-            # Get visible users using IGController
+        while (result['unfollows_done'] < target and pages < max_pages
+               and (legacy or wanted)):
             users = self.ctrl.get_visible_usernames_in_list()
             new_users = [u for u in users if u not in seen_usernames]
 
             if not new_users:
-                scroll_attempts += 1
-                if scroll_attempts >= max_scroll_attempts:
+                empty_scrolls += 1
+                if empty_scrolls >= 3:
                     break
                 self.ctrl.scroll_list("down")
                 random_sleep(1, 2)
                 continue
 
-            scroll_attempts = 0
+            empty_scrolls = 0
+            pages += 1
 
             for user in new_users:
                 if result['unfollows_done'] >= target:
@@ -221,35 +230,19 @@ class UnfollowAction:
                     result['skipped'] += 1
                     continue
 
-                # Check eligibility
-                if eligible and user not in eligible:
+                # Only queued targets (unless the ledger is empty)
+                if not legacy and user.lower() not in wanted:
                     result['skipped'] += 1
                     continue
 
                 # Dismiss any popups before each unfollow attempt
                 self.ctrl.dismiss_popups()
 
-                try:
-                    unfollowed = self._unfollow_user_from_list(user)
-                    if unfollowed:
-                        result['unfollows_done'] += 1
-                        log_action(
-                            self.session_id, self.device_serial, self.username,
-                            'unfollow', target_username=user, success=True)
-                        log.info("[%s] Unfollowed @%s (%d/%d)",
-                                self.device_serial, user,
-                                result['unfollows_done'], target)
-                        action_delay("unfollow")
-                    else:
-                        result['skipped'] += 1
-                except Exception as e:
-                    log.error("[%s] Error unfollowing @%s: %s",
-                             self.device_serial, user, e)
-                    result['errors'] += 1
-                    log_action(
-                        self.session_id, self.device_serial, self.username,
-                        'unfollow', target_username=user, success=False,
-                        error_message=str(e)[:200])
+                queued = wanted.pop(user.lower(), None)
+                if queued is not None:
+                    pending.remove(queued)
+                self._attempt(result, target, user,
+                              lambda u=user: self._unfollow_user_from_list(u))
 
             self.ctrl.scroll_list("down")
             random_sleep(1.5, 3, label="scroll_following")
@@ -258,11 +251,89 @@ class UnfollowAction:
         self.ctrl.press_back()
         time.sleep(1)
 
-        result['success'] = True
-        log.info("[%s] %s: Unfollow complete. Unfollowed: %d, Skipped: %d, Errors: %d",
-                 self.device_serial, self.username,
-                 result['unfollows_done'], result['skipped'], result['errors'])
-        return result
+    def _direct_pass(self, result, target, pending):
+        """Search each remaining queued target and unfollow from its profile."""
+        log.info("[%s] Direct unfollow for %d queued targets",
+                 self.device_serial, len(pending))
+        for user in list(pending):
+            if result['unfollows_done'] >= target:
+                break
+            pending.remove(user)
+            self.ctrl.dismiss_popups()
+            self._attempt(result, target, user,
+                          lambda u=user: self._unfollow_user_via_search(u))
+
+    def _attempt(self, result, target, user, unfollow_fn):
+        """Run one unfollow and record the outcome (action_history + ledger)."""
+        try:
+            unfollowed = unfollow_fn()
+            if unfollowed:
+                result['unfollows_done'] += 1
+                log_action(
+                    self.session_id, self.device_serial, self.username,
+                    'unfollow', target_username=user, success=True)
+                log.info("[%s] Unfollowed @%s (%d/%d)",
+                        self.device_serial, user,
+                        result['unfollows_done'], target)
+                action_delay("unfollow")
+            elif unfollowed is None:
+                # Not following any more (unfollowed elsewhere) — close it out
+                relationship_ledger.record_unfollow(
+                    self.username, user, self.device_serial)
+                result['skipped'] += 1
+            else:
+                relationship_ledger.record_unfollow_failure(self.username, user)
+                result['skipped'] += 1
+        except Exception as e:
+            log.error("[%s] Error unfollowing @%s: %s",
+                     self.device_serial, user, e)
+            result['errors'] += 1
+            relationship_ledger.record_unfollow_failure(self.username, user)
+            log_action(
+                self.session_id, self.device_serial, self.username,
+                'unfollow', target_username=user, success=False,
+                error_message=str(e)[:200])
+
+    def _follow_button_text(self):
+        """Text of the profile header follow button ('' if not found)."""
+        btn = self.ctrl.device(resourceIdMatches=self.ctrl._rid_match('profile_header_follow_button'))
+        if btn.exists(timeout=2):
+            return (btn.get_text() or "").strip()
+        return ""
+
+    def _unfollow_user_via_search(self, target_username):
+        """
+        Open the target's profile through search and unfollow from there.
+
+        Returns True if unfollowed, None if the profile shows we no longer
+        follow them, False otherwise (not found / UI failure).
+        """
+        try:
+            if not self.ctrl.search_user(target_username):
+                log.debug("[%s] @%s not found via search",
+                         self.device_serial, target_username)
+                return False
+            random_sleep(1.5, 3, label="profile_loaded")
+
+            if self.ctrl.detect_screen() == Screen.POPUP:
+                self.ctrl.dismiss_popups()
+                time.sleep(1)
+
+            unfollowed = self.ctrl.unfollow_user()
+            if not unfollowed and self._follow_button_text() in ("Follow", "Follow Back"):
+                return None
+            if not unfollowed:
+                self.ctrl.dump_xml(f"unfollow_fail_{target_username}")
+            return unfollowed
+        except Exception as e:
+            log.error("[%s] _unfollow_user_via_search error: %s", self.device_serial, e)
+            return False
+        finally:
+            try:
+                self.ctrl.press_back()
+                time.sleep(1)
+            except Exception:
+                pass
 
     def _unfollow_user_from_list(self, target_username):
         """
@@ -18,7 +18,8 @@ import base64
 import json
 import os
 import re
-import urllib.request
+
+from automation.http_pool import get_pool
 
 
 # DeepSeek moved to V4 (flash = fast/cheap, pro = stronger reasoning). The old
@@ -185,10 +186,9 @@ Rules:
 
 
 def _http_post(url, headers, payload, timeout=90):
-    data = json.dumps(payload).encode('utf-8')
-    req = urllib.request.Request(url, data=data, headers=headers, method='POST')
-    with urllib.request.urlopen(req, timeout=timeout) as r:
-        return json.loads(r.read().decode('utf-8'))
+    # Pooled keep-alive: the executor calls the model once per step, so
+    # reusing the connection saves a TLS handshake on every action.
+    return get_pool().post_json(url, headers, payload, timeout=timeout)
 
 
 def _extract_json(text):
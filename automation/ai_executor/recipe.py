@@ -20,9 +20,10 @@ Key design choices:
 import hashlib
 import json
 import os
-import sqlite3
 import time
 
+from db.connection import connect
+
 
 def _db_path():
     base = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -139,7 +140,7 @@ class Recipe:
 
 def ensure_tables(db_path=None):
     db = db_path or _db_path()
-    c = sqlite3.connect(db)
+    c = connect(db, row_factory=None)
     c.execute("""CREATE TABLE IF NOT EXISTS ai_recipes (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         name TEXT NOT NULL,
@@ -175,7 +176,7 @@ def save_recipe(name, goal, app_package, steps, db_path=None, now=None):
     db = db_path or _db_path()
     ensure_tables(db)
     ts = int(now if now is not None else time.time())
-    c = sqlite3.connect(db)
+    c = connect(db, row_factory=None)
     cur = c.execute(
         "INSERT INTO ai_recipes (name, goal, app_package, steps_json, "
         "run_count, success_count, created_at, updated_at) "
@@ -191,7 +192,7 @@ def update_recipe_steps(rid, steps, db_path=None, now=None):
     """Persist a (possibly self-healed/extended) step set back to a recipe."""
     db = db_path or _db_path()
     ts = int(now if now is not None else time.time())
-    c = sqlite3.connect(db)
+    c = connect(db, row_factory=None)
     c.execute("UPDATE ai_recipes SET steps_json=?, updated_at=? WHERE id=?",
               (json.dumps({'steps': steps}), ts, rid))
     c.commit()
@@ -200,7 +201,7 @@ def update_recipe_steps(rid, steps, db_path=None, now=None):
 
 def bump_recipe_stats(rid, success, db_path=None):
     db = db_path or _db_path()
-    c = sqlite3.connect(db)
+    c = connect(db, row_factory=None)
     if success:
         c.execute("UPDATE ai_recipes SET run_count=run_count+1, "
                   "success_count=success_count+1 WHERE id=?", (rid,))
@@ -213,8 +214,7 @@ def bump_recipe_stats(rid, success, db_path=None):
 def load_recipe(rid, db_path=None):
     db = db_path or _db_path()
     ensure_tables(db)
-    c = sqlite3.connect(db)
-    c.row_factory = sqlite3.Row
+    c = connect(db)
     r = c.execute("SELECT * FROM ai_recipes WHERE id=?", (rid,)).fetchone()
     c.close()
     if not r:
@@ -228,8 +228,7 @@ def load_recipe(rid, db_path=None):
 def list_recipes(db_path=None):
     db = db_path or _db_path()
     ensure_tables(db)
-    c = sqlite3.connect(db)
-    c.row_factory = sqlite3.Row
+    c = connect(db)
     rows = c.execute("SELECT id, name, goal, app_package, steps_json, run_count, "
                      "success_count, updated_at FROM ai_recipes "
                      "ORDER BY updated_at DESC").fetchall()
@@ -247,7 +246,7 @@ def list_recipes(db_path=None):
 
 def delete_recipe(rid, db_path=None):
     db = db_path or _db_path()
-    c = sqlite3.connect(db)
+    c = connect(db, row_factory=None)
     c.execute("DELETE FROM ai_recipes WHERE id=?", (rid,))
     c.execute("DELETE FROM ai_schedules WHERE recipe_id=?", (rid,))
     c.commit()
@@ -738,67 +738,82 @@ def api_bot_single_action(account_id, action_name):
 # Orchestrator endpoints moved to bottom of file (expanded versions)
 
 
-@automation_bp.route('/api/automation/action-history')
-def api_action_history():
-    """Get recent action history."""
-    from db.models import get_connection as db_conn, row_to_dict
-
-    device_serial = request.args.get('device_serial')
-    username = request.args.get('username')
-    action_type = request.args.get('action_type')
-    limit = int(request.args.get('limit', 100))
+def _history_filters():
+    """Filters shared by the history pages and exports (db/keyset.py)."""
+    return {
+        'device_serial': request.args.get('device_serial'),
+        'username': request.args.get('username'),
+        'action_type': request.args.get('action_type'),
+        'success': request.args.get('success'),
+        'status': request.args.get('status'),
+        'level': request.args.get('level'),
+    }
+
+
+def _history_page(dataset, key, default_limit):
+    """Keyset page of `dataset` as {'success', key, 'count', 'next_cursor'}.
+    Query params: device_serial, username, action_type, ..., since, until,
+    limit, cursor (next_cursor of the previous page)."""
+    from db.models import get_connection as db_conn
+    from db.keyset import fetch_page
 
     conn = db_conn()
-    q = "SELECT * FROM action_history WHERE 1=1"
-    params = []
-
-    if device_serial:
-        q += " AND device_serial=?"
-        params.append(device_serial)
-    if username:
-        q += " AND username=?"
-        params.append(username)
-    if action_type:
-        q += " AND action_type=?"
-        params.append(action_type)
-
-    q += " ORDER BY timestamp DESC LIMIT ?"
-    params.append(limit)
-
-    rows = conn.execute(q, params).fetchall()
-    conn.close()
+    try:
+        rows, next_cursor = fetch_page(
+            conn, dataset, filters=_history_filters(),
+            since=request.args.get('since'), until=request.args.get('until'),
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', default_limit))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    finally:
+        conn.close()
 
     return jsonify({
         'success': True,
-        'history': [row_to_dict(r) for r in rows],
+        key: rows,
         'count': len(rows),
+        'next_cursor': next_cursor,
     })
 
 
+@automation_bp.route('/api/automation/action-history')
+def api_action_history():
+    """Get action history, newest first (keyset-paged)."""
+    return _history_page('action_history', 'history', 100)
+
+
 @automation_bp.route('/api/automation/sessions')
 def api_sessions():
-    """Get recent bot sessions."""
-    from db.models import get_connection as db_conn, row_to_dict
+    """Get bot sessions, newest first (keyset-paged)."""
+    return _history_page('sessions', 'sessions', 50)
 
-    device_serial = request.args.get('device_serial')
-    limit = int(request.args.get('limit', 50))
 
-    conn = db_conn()
-    q = "SELECT * FROM account_sessions WHERE 1=1"
-    params = []
-    if device_serial:
-        q += " AND device_serial=?"
-        params.append(device_serial)
-    q += " ORDER BY session_start DESC LIMIT ?"
-    params.append(limit)
+@automation_bp.route('/api/automation/export/<dataset>')
+def api_history_export(dataset):
+    """
+    Stream a history table as NDJSON or CSV, newest first.
+    dataset: action_history | sessions | bot_logs
+    Query params: format=ndjson|csv, since=, until= and the same filters as
+    the history pages. Rows are written as they are read, so a multi-week
+    export never sits in memory.
+    """
+    from db.keyset import FORMATS, export, get_dataset
 
-    rows = conn.execute(q, params).fetchall()
-    conn.close()
+    fmt = request.args.get('format', 'ndjson')
+    try:
+        get_dataset(dataset)
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown format {fmt!r} (expected ndjson or csv)")
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
 
-    return jsonify({
-        'success': True,
-        'sessions': [row_to_dict(r) for r in rows],
-        'count': len(rows),
+    chunks = export(dataset, fmt, filters=_history_filters(),
+                    since=request.args.get('since'), until=request.args.get('until'))
+    stamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    ext = 'ndjson' if fmt == 'ndjson' else 'csv'
+    return Response(chunks, mimetype=FORMATS[fmt], headers={
+        'Content-Disposition': f'attachment; filename="{dataset}_{stamp}.{ext}"',
     })
 
 
@@ -1380,21 +1395,56 @@ def api_automation_log_stats():
 @automation_bp.route('/api/automation/logs/history')
 def api_automation_logs_history():
     """
-    Get historical logs from DB (supports pagination).
+    Get historical logs from DB, newest first (keyset-paged).
     Query params:
-        limit=200, offset=0, device_serial=, level=, username=, since=
+        limit=200, cursor=, device_serial=, level=, username=, action_type=,
+        since=, until=
     """
     from automation.bot_logger import get_logs_from_db
 
-    logs = get_logs_from_db(
-        limit=int(request.args.get('limit', 200)),
-        offset=int(request.args.get('offset', 0)),
-        device_serial=request.args.get('device_serial'),
-        level=request.args.get('level'),
-        username=request.args.get('username'),
-        since=request.args.get('since'),
-    )
-    return jsonify({'success': True, 'logs': logs, 'count': len(logs)})
+    try:
+        logs, next_cursor = get_logs_from_db(
+            limit=request.args.get('limit', 200),
+            device_serial=request.args.get('device_serial'),
+            level=request.args.get('level'),
+            username=request.args.get('username'),
+            action_type=request.args.get('action_type'),
+            since=request.args.get('since'),
+            until=request.args.get('until'),
+            cursor=request.args.get('cursor'),
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, 'logs': logs, 'count': len(logs),
+                    'next_cursor': next_cursor})
+
+
+@automation_bp.route('/api/automation/logs/search')
+def api_automation_logs_search():
+    """
+    Full-text search over bot log messages and error details.
+    Query params:
+        q=              - Words to find (all must match; word* = prefix)
+        raw=1           - Treat q as FTS5 query syntax (phrases, OR, NEAR)
+        device_serial=, username=, level=, since=, until=
+        limit=50        - Max matches returned (counts cover all matches)
+    """
+    from automation.bot_logger import search_logs
+
+    try:
+        result = search_logs(
+            request.args.get('q', ''),
+            device_serial=request.args.get('device_serial'),
+            username=request.args.get('username'),
+            level=request.args.get('level'),
+            since=request.args.get('since'),
+            until=request.args.get('until'),
+            limit=int(request.args.get('limit', 50)),
+            raw=request.args.get('raw') in ('1', 'true'),
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, **result})
 
 
 # ===================================================================
@@ -1437,7 +1487,9 @@ def api_active_accounts():
         next_rotation = None
         next_account = None
 
-        acct_list = [dict(a) for a in accounts]
+        # 'off': no hours at all (runtime planner, 0 hours/day) — never active
+        acct_list = [dict(a) for a in accounts
+                     if str(a['start_time']).strip().lower() != 'off']
 
         for acct in acct_list:
             st = int(acct['start_time']) if str(acct.get('start_time', '0')).isdigit() else 0
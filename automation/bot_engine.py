@@ -12,6 +12,7 @@ For a given device + account:
 6. Handle errors gracefully (reconnect on UIAutomator disconnect)
 """
 
+import copy
 import logging
 import os
 import random
@@ -20,6 +21,9 @@ import datetime
 import json
 import traceback
 
+from automation.metrics import get_registry
+from automation.rpc_instrument import rpc_action
+
 log = logging.getLogger(__name__)
 
 
@@ -41,14 +45,24 @@ class BotEngine:
         engine.run()
     """
 
-    def __init__(self, device_serial, account_id):
+    def __init__(self, device_serial, account_id, only_actions=None, cooldown=None):
         """
         Args:
             device_serial: DB format serial (e.g. "10.1.11.4_5555")
             account_id: accounts.id
+            only_actions: run just these actions this session (the runner's
+                control channel "run" command), see action_names()
+            cooldown: the runner's automation.cooldown.CooldownScheduler
+                (one is created if not given)
         """
+        from automation.cooldown import CooldownScheduler
         self.device_serial = device_serial
         self.account_id = account_id
+        self.only_actions = list(only_actions) if only_actions else None
+        self.cooldown = cooldown or CooldownScheduler(device_serial)
+        self._content_item = None   # this session's post_content schedule row
+        self._staged_media = {}     # content_schedule.id -> remote path pushed in a cooldown
+        self._plan = None           # automation.action_plan.SessionPlan
         self.account = None
         self.settings = None
         self.session_id = None
@@ -141,6 +155,8 @@ class BotEngine:
             'errors': [],
             'duration_sec': 0,
         }
+        self.cooldown.begin_session()
+        action_seconds = 0.0
 
         try:
             self._running = True
@@ -192,24 +208,15 @@ class BotEngine:
             if not self._connect_device():
                 result['errors'].append("Failed to connect to device")
                 return result
+            self._device_conn.rpc.reset()   # per-session RPC report
 
             # Process any pending login tasks for this device
             self._check_pending_login_tasks()
 
             # Check proxy status (SuperProxy VPN must be running)
-            skip_proxy = os.environ.get('HYDRA_SKIP_PROXY', '').lower() in ('1', 'true', 'yes')
-            # Also check global_settings.json toggle
-            if not skip_proxy:
-                try:
-                    _gs_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-                                            'dashboard', 'global_settings.json')
-                    if os.path.exists(_gs_path):
-                        import json as _json
-                        with open(_gs_path, 'r') as _f:
-                            _gs = _json.load(_f)
-                        skip_proxy = bool(_gs.get('skip_proxy_check', False))
-                except Exception:
-                    pass
+            # — HYDRA_SKIP_PROXY env or the global skip_proxy_check setting
+            from automation import proxy_health
+            skip_proxy = proxy_health.skip_check()
             proxy_ok = True if skip_proxy else self._check_proxy_status()
             if skip_proxy:
                 log.info("[%s] Proxy check SKIPPED (setting or env)", self.device_serial)
@@ -219,6 +226,7 @@ class BotEngine:
                             self.device_serial, username)
                 reconnected = self._reconnect_surfshark()
                 if reconnected:
+                    proxy_health.record(self.device_serial, True, 'ui', ['Surfshark reconnected'])
                     log.info("[%s] %s: Surfshark reconnected successfully!",
                              self.device_serial, username)
                     _blog("VPN reconnected automatically via Surfshark", device=self.device_serial,
@@ -232,11 +240,15 @@ class BotEngine:
                     return result
 
             # Open Instagram
-            if not self._open_instagram():
+            with rpc_action('open_instagram'):
+                opened = self._open_instagram()
+            if not opened:
                 result['errors'].append("Failed to open Instagram")
                 return result
             # Check login state
-            if not self._ensure_logged_in():
+            with rpc_action('ensure_logged_in'):
+                logged_in = self._ensure_logged_in()
+            if not logged_in:
                 result['errors'].append("Not logged in and login failed")
                 return result
 
@@ -248,10 +260,12 @@ class BotEngine:
             self._update_bot_status('running')
             # Run enabled actions
             actions = self._determine_actions()
+            if self.only_actions:
+                actions = self._requested_actions(actions)
             action_names = [a[0] for a in actions]
             log.info("[%s] %s: Actions to run: %s",
                      self.device_serial, username, action_names)
-            for action_name, action_func in actions:
+            for i, (action_name, action_func) in enumerate(actions):
                 if not self._running:
                     log.info("[%s] Bot engine stopped", self.device_serial)
                     break
@@ -260,26 +274,37 @@ class BotEngine:
                     log.info("[%s] Running action: %s",
                              self.device_serial, action_name)
                     self._lock_portrait()   # re-assert portrait before each action
-                    action_result = action_func()
+                    action_start = time.monotonic()
+                    try:
+                        with get_registry().timer('action_seconds', action=action_name), \
+                                rpc_action(action_name):
+                            action_result = action_func()
+                    finally:
+                        action_seconds += time.monotonic() - action_start
                     result['actions_completed'].append({
                         'action': action_name,
                         'result': action_result,
                     })
                     self._broadcast_action(action_name, action_result)
-                    # Cool down between actions
+                    # Cool down between actions — prep for the next one
+                    # runs inside the wait (automation/cooldown.py)
                     if self._running:
                         cooldown = random.randint(30, 90)
                         log.info("[%s] Cooling down for %ds before next action",
                                 self.device_serial, cooldown)
-                        time.sleep(cooldown)
+                        self._queue_prep(actions[i + 1:])
+                        self.cooldown.wait(cooldown, running=lambda: self._running)
 
                 except Exception as e:
                     error_msg = "%s error: %s" % (action_name, str(e)[:200])
+                    get_registry().inc('action_errors_total', action=action_name)
                     log.error("[%s] %s\n%s", self.device_serial, error_msg,
                              traceback.format_exc())
                     result['errors'].append(error_msg)
                     # Try to recover
-                    if not self._recover():
+                    with rpc_action('recover'):
+                        recovered = self._recover()
+                    if not recovered:
                         log.error("[%s] Recovery failed, stopping", self.device_serial)
                         break
 
@@ -293,6 +318,8 @@ class BotEngine:
         finally:
             self._running = False
             result['duration_sec'] = time.time() - start_time
+            self._drop_prep()
+            result['timing'] = self.cooldown.session_report(action_seconds)
 
             # End session
             if self.session_id:
@@ -309,9 +336,29 @@ class BotEngine:
             self._update_bot_status('idle')
 
             _username = self.account.get('username', '?') if self.account else '?'
+
+            # Per-session RPC latency report (logs/rpc/<serial>/)
+            if self._device_conn is not None:
+                try:
+                    report_path = self._device_conn.rpc.dump(
+                        session_id=self.session_id,
+                        extra={'username': _username, 'account_id': self.account_id,
+                               'timing': result['timing']})
+                    if report_path:
+                        log.info("[%s] RPC report: %s", self.device_serial, report_path)
+                    self._device_conn.rpc.reset()
+                except Exception as e:
+                    log.debug("[%s] RPC report failed: %s", self.device_serial, e)
+
             log.info("[%s] Bot engine finished. Duration: %.0fs, Actions: %d, Errors: %d",
                      self.device_serial, result['duration_sec'],
                      len(result['actions_completed']), len(result['errors']))
+            timing = result['timing']
+            log.info("[%s] Session time: actions %.0fs, pacing %.0fs (prep %.0fs inside), "
+                     "mechanical %.0fs (prep overrun %.0fs)",
+                     self.device_serial, timing['action_seconds'], timing['pacing_seconds'],
+                     timing['prep_seconds'], timing['mechanical_seconds'],
+                     timing['overrun_seconds'])
         return result
 
     def stop(self):
@@ -319,11 +366,66 @@ class BotEngine:
         self._running = False
         log.info("[%s] Bot engine stop requested", self.device_serial)
 
+    # Action names whose method isn't simply _action_<name>
+    ACTION_ALIASES = {'account_status': '_action_scrape_account_status'}
+    # _action_* methods that need arguments (scheduled item / job order)
+    _NOT_REQUESTABLE = ('post_content', 'job_order')
+
+    @classmethod
+    def action_names(cls):
+        """Names accepted in only_actions."""
+        names = {m[len('_action_'):] for m in dir(cls) if m.startswith('_action_')}
+        names.difference_update(cls._NOT_REQUESTABLE)
+        names.difference_update(m[len('_action_'):] for m in cls.ACTION_ALIASES.values())
+        names.update(cls.ACTION_ALIASES)
+        return sorted(names)
+
     # ------------------------------------------------------------------
     # Internal Methods
     # ------------------------------------------------------------------
+    def _requested_actions(self, planned):
+        """only_actions as (name, callable): the planned entry when the
+        account has the action enabled, the plain method otherwise."""
+        planned = dict(planned)
+        actions = []
+        for name in self.only_actions:
+            func = planned.get(name)
+            if func is None and name in self.action_names():
+                func = getattr(self, self.ACTION_ALIASES.get(name, '_action_' + name))
+            if func is None:
+                log.warning("[%s] Requested action %r unknown — skipped",
+                            self.device_serial, name)
+                continue
+            actions.append((name, func))
+        return actions
+
 
     def _load_account(self):
+        """Load account, settings and this session's action plan — from the
+        per-account plan cache (automation/action_plan.py) when it is still
+        current, which is one row_versions read instead of the account,
+        settings, job order and content schedule queries."""
+        from automation import action_plan
+        try:
+            plan = action_plan.get_plan(self.device_serial, self.account_id)
+        except Exception as e:
+            log.warning("[%s] Action plan unavailable (%s) — reading account directly",
+                        self.device_serial, e)
+            return self._read_account()
+        if plan is None:
+            log.error("[%s] Account %d not found in DB",
+                      self.device_serial, self.account_id)
+            return False
+        self._plan = plan
+        self.account = dict(plan.account)
+        self.settings = copy.deepcopy(plan.settings)
+        log.info("[%s] Loaded account: %s (pkg: %s, plan %s)",
+                 self.device_serial, self.account['username'],
+                 self.account.get('instagram_package'),
+                 'cached' if plan.cached else 'built')
+        return True
+
+    def _read_account(self):
         """Load account and settings from DB."""
         try:
             from automation.actions.helpers import get_db, get_account_settings
@@ -340,9 +442,9 @@ class BotEngine:
 
             self.account = dict(row)
             self.settings = get_account_settings(self.account_id)
-            log.info("[%s] Loaded account: %s (pkg: %s)",
-                     self.device_serial, self.account['username'],
-                     self.account.get('instagram_package'))
+            log.debug("[%s] Read account: %s (pkg: %s)",
+                      self.device_serial, self.account['username'],
+                      self.account.get('instagram_package'))
             return True
 
         except Exception as e:
@@ -456,50 +558,68 @@ class BotEngine:
     def _check_proxy_status(self):
         """
         Check if SuperProxy VPN is active on the device.
-        Uses the notification bar content-desc to detect 'Proxy service is running'
-        and system status icon 'VPN on.' — no need to open the app.
+        Uses the shared per-device proxy health cache (automation/proxy_health.py):
+        a recent "active" result, else one adb shell probe for a VPN
+        interface / connection, and only then the status-bar UI check.
 
         Returns True if proxy appears active, False otherwise.
         """
-        try:
-            xml_dump = self._device.dump_hierarchy()
+        from automation import proxy_health
+        health = proxy_health.check(self.device_serial, ui_fallback=self._proxy_ui_check)
 
-            # Check for VPN indicator in status bar
-            vpn_active = 'VPN on' in xml_dump
-            # Check for SuperProxy notification
-            proxy_running = 'Proxy service is running' in xml_dump
+        if health['active'] is None:
+            log.warning("[%s] Proxy check error (allowing anyway): could not probe device",
+                        self.device_serial)
+            # If we can't check, allow to proceed rather than blocking
+            return True
 
-            if vpn_active or proxy_running:
-                log.info("[%s] Proxy check: OK (VPN=%s, SuperProxy=%s)",
-                         self.device_serial, vpn_active, proxy_running)
-                return True
+        if health['active']:
+            log.info("[%s] Proxy check: OK (%s%s: %s)",
+                     self.device_serial, health['method'],
+                     ', cached %.0fs' % health['age'] if health.get('cached') else '',
+                     '; '.join(health['indicators']) or '-')
+            return True
 
-            # Neither indicator found — proxy is likely down
-            log.warning("[%s] Proxy check: FAILED — no VPN or SuperProxy indicators found",
-                        self.device_serial)
+        # Neither indicator found — proxy is likely down
+        log.warning("[%s] Proxy check: FAILED — no VPN or SuperProxy indicators found",
+                    self.device_serial)
 
-            # Record health event for this device
-            try:
-                from automation.actions.helpers import get_db
-                conn = get_db()
-                now = datetime.datetime.now().isoformat()
-                conn.execute("""
-                    INSERT INTO device_proxy_history
-                    (device_serial, proxy_id, proxy_host, proxy_port, action, timestamp)
-                    VALUES (?, NULL, NULL, NULL, 'proxy_down_detected', ?)
-                """, (self.device_serial, now))
-                conn.commit()
-                conn.close()
-            except Exception as db_err:
-                log.debug("[%s] Could not log proxy event: %s", self.device_serial, db_err)
+        # Record health event for this device
+        try:
+            from automation.actions.helpers import get_db
+            conn = get_db()
+            now = datetime.datetime.now().isoformat()
+            conn.execute("""
+                INSERT INTO device_proxy_history
+                (device_serial, proxy_id, proxy_host, proxy_port, action, timestamp)
+                VALUES (?, NULL, NULL, NULL, 'proxy_down_detected', ?)
+            """, (self.device_serial, now))
+            conn.commit()
+            conn.close()
+        except Exception as db_err:
+            log.debug("[%s] Could not log proxy event: %s", self.device_serial, db_err)
 
-            return False
+        return False
 
-        except Exception as e:
-            log.warning("[%s] Proxy check error (allowing anyway): %s",
-                        self.device_serial, e)
-            # If we can't check, allow to proceed rather than blocking
-            return True
+    def _proxy_ui_check(self):
+        """
+        UI fallback of _check_proxy_status: the notification bar
+        content-desc 'Proxy service is running' and the system status icon
+        'VPN on.' — no need to open the app.
+        """
+        xml_dump = self._device.dump_hierarchy()
+
+        # Check for VPN indicator in status bar
+        vpn_active = 'VPN on' in xml_dump
+        # Check for SuperProxy notification
+        proxy_running = 'Proxy service is running' in xml_dump
+
+        indicators = []
+        if vpn_active:
+            indicators.append('status bar: VPN on')
+        if proxy_running:
+            indicators.append('notification: Proxy service is running')
+        return {'active': bool(indicators), 'indicators': indicators}
 
     def _reconnect_surfshark(self, max_wait: int = 30) -> bool:
         """
@@ -831,13 +951,9 @@ class BotEngine:
             log.error("[%s] Failed to record health event: %s",
                       self.device_serial, e)
 
-    def _check_job_orders(self):
-        """
-        Check for active job order assignments for this account.
-        Job orders take priority over regular settings-based actions.
-
-        Returns list of (name, callable) tuples — one per active job.
-        """
+    def _pending_job_orders(self):
+        """Active job order assignments for this account, highest priority
+        first, as [(action label, job, assignment)]."""
         actions = []
         try:
             from automation.actions.helpers import get_db
@@ -873,8 +989,6 @@ class BotEngine:
 
                 job_id = job['id']
                 job_type = job['job_type']
-                job_name = job.get('job_name', 'unnamed')
-                target = job.get('target', '?')
 
                 # Skip if total target already reached
                 if job['target_count'] and job['target_count'] > 0:
@@ -884,16 +998,7 @@ class BotEngine:
                         continue
 
                 action_label = 'job_%d_%s' % (job_id, job_type)
-                log.info("[%s] JOB #%d '%s' (%s → @%s): Queuing for execution",
-                         self.device_serial, job_id, job_name, job_type, target)
-
-                # Capture job/assignment in closure
-                def make_job_action(j, a):
-                    def _run():
-                        return self._action_job_order(j, a)
-                    return _run
-
-                actions.append((action_label, make_job_action(job, assignment)))
+                actions.append((action_label, job, assignment))
 
         except Exception as e:
             log.error("[%s] Error checking job orders: %s", self.device_serial, e)
@@ -930,6 +1035,69 @@ class BotEngine:
                       self.device_serial, e)
             return []
 
+    # ------------------------------------------------------------------
+    # Cooldown prep (non-interactive work done inside pacing waits)
+    # ------------------------------------------------------------------
+
+    # action name -> action_history action_type its limits are counted by
+    _LOOKUP_ACTION_TYPES = {
+        'follow': 'follow', 'follow_from_list': 'follow', 'unfollow': 'unfollow',
+        'like': 'like', 'comment': 'comment', 'dm': 'dm',
+    }
+
+    def _queue_prep(self, upcoming):
+        """Queue cooldown prep for the next action in `upcoming`."""
+        if not upcoming:
+            return
+        name = upcoming[0][0]
+        item = self._content_item
+        if (name == 'post_content' and item is not None
+                and item.get('id') not in self._staged_media):
+            self.cooldown.add('stage_media', lambda: self._stage_media(item), estimate=5)
+        self.cooldown.add('warm_lookups', lambda: self._warm_lookups(name))
+
+    def _drop_prep(self):
+        """End of session: unqueue session prep, remove media staged for a
+        post that didn't run."""
+        self.cooldown.discard('stage_media')
+        self.cooldown.discard('warm_lookups')
+        if self._staged_media:
+            from automation.actions.post_content import remove_device_media
+            for remote_path in self._staged_media.values():
+                remove_device_media(self.device_serial, remote_path)
+            self._staged_media.clear()
+
+    def _stage_media(self, item):
+        """adb-push the next post's media (and register it in MediaStore)
+        so _action_post_content starts at the IG flow."""
+        media_path = item.get('media_path')
+        if not media_path or not os.path.exists(media_path):
+            return
+        from automation.actions.post_content import push_media_to_device
+        remote_path = push_media_to_device(self.device_serial, media_path)
+        if remote_path:
+            self._staged_media[item['id']] = remote_path
+            log.info("[%s] CONTENT: Pre-staged media for schedule #%s at %s",
+                     self.device_serial, item['id'], remote_path)
+
+    def _warm_lookups(self, name):
+        """Run the DB reads the next action starts with, so the pages they
+        touch are in cache when it runs (results discarded)."""
+        from automation.actions import helpers
+        username = self.account['username']
+        helpers.get_account_settings(self.account_id)
+        action_type = self._LOOKUP_ACTION_TYPES.get(name)
+        if action_type is None:
+            return
+        helpers.get_today_action_count(self.device_serial, username, action_type)
+        helpers.get_recently_interacted(self.device_serial, username, action_type)
+        if name in ('follow', 'like', 'unfollow'):
+            helpers.get_account_sources(self.account_id)
+        if name in ('follow', 'follow_from_list'):
+            from automation.tag_dedup import is_tag_dedup_enabled, get_same_tag_followed_set
+            if is_tag_dedup_enabled(self.account_id):
+                get_same_tag_followed_set(self.account_id)
+
     def _action_post_content(self, schedule_item):
         """
         Post scheduled content (feed post, reel, or story).
@@ -961,7 +1129,8 @@ class BotEngine:
         action = PostContentAction(
             self._device, self.device_serial,
             self.account, self.session_id,
-            schedule_item)
+            schedule_item,
+            staged_media=self._staged_media.pop(schedule_id, None))
         result = action.execute()
 
         # Update status based on result
@@ -1019,45 +1188,46 @@ class BotEngine:
 
         return result
 
-    def _is_warmup_mode(self):
+    def _warmup_state(self):
         """
-        Check if this account is in warmup mode.
-        Also auto-expires warmup if the warmup_until date has passed.
-        Returns True if currently warming up.
+        (in_warmup, expired, ends_at) from the account row, no side effects.
+        expired: warmup is set but warmup_until has passed. ends_at: epoch
+        seconds when warmup_until passes (None if open-ended / not warming).
         """
         warmup = self.account.get('warmup', 0)
         warmup_until = self.account.get('warmup_until')
 
         if not warmup:
-            return False
+            return False, False, None
 
         # Check if warmup period has expired
         if warmup_until:
             try:
                 expiry = datetime.datetime.strptime(warmup_until, '%Y-%m-%d').date()
                 if datetime.datetime.now().date() >= expiry:
-                    log.info("[%s] %s: Warmup period expired (%s), switching to normal mode",
-                             self.device_serial, self.account.get('username', '?'), warmup_until)
-                    # Auto-clear warmup in DB
-                    try:
-                        from automation.actions.helpers import get_db
-                        conn = get_db()
-                        now = datetime.datetime.now().isoformat()
-                        conn.execute(
-                            "UPDATE accounts SET warmup = 0, warmup_until = NULL, updated_at = ? WHERE id = ?",
-                            (now, self.account_id))
-                        conn.commit()
-                        conn.close()
-                    except Exception as e:
-                        log.warning("[%s] Failed to auto-clear warmup: %s", self.device_serial, e)
-                    return False
+                    return False, True, None
+                ends_at = datetime.datetime.combine(expiry, datetime.time()).timestamp()
+                return True, False, ends_at
             except (ValueError, TypeError):
                 pass
+        return True, False, None
 
-        log.info("[%s] %s: Account is in WARMUP mode (until %s)",
+    def _clear_warmup(self):
+        """Auto-clear an expired warmup in DB."""
+        log.info("[%s] %s: Warmup period expired (%s), switching to normal mode",
                  self.device_serial, self.account.get('username', '?'),
-                 warmup_until or 'indefinite')
-        return True
+                 self.account.get('warmup_until'))
+        try:
+            from automation.actions.helpers import get_db
+            conn = get_db()
+            now = datetime.datetime.now().isoformat()
+            conn.execute(
+                "UPDATE accounts SET warmup = 0, warmup_until = NULL, updated_at = ? WHERE id = ?",
+                (now, self.account_id))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            log.warning("[%s] Failed to auto-clear warmup: %s", self.device_serial, e)
 
     def _warmup_actions(self):
         """
@@ -1088,13 +1258,30 @@ class BotEngine:
 
         return actions
 
+    # Default freshness of the follower snapshot that lets a session skip
+    # check_profile (settings key check_profile_interval_hours; 0 = always).
+    PROFILE_CHECK_INTERVAL_HOURS = 4
+
     def _determine_actions(self):
         """
         Determine which actions to run based on account settings.
         Returns list of (name, callable) tuples.
+
+        The decision itself (_plan_session) was made ahead of the session
+        by automation/action_plan.py; this binds it to the session and
+        orders it.
         """
+        if self._plan is None:
+            from automation import action_plan
+            self._plan = action_plan.build_plan(self)
+        if self._plan.warmup_expired:
+            self._clear_warmup()
+
         # ── WARMUP MODE: restricted action set ──
-        if self._is_warmup_mode():
+        if self._plan.warmup:
+            log.info("[%s] %s: Account is in WARMUP mode (until %s)",
+                     self.device_serial, self.account.get('username', '?'),
+                     self.account.get('warmup_until') or 'indefinite')
             _blog(
                 "Warmup mode active for %s — reels + explore only" % self.account.get('username', '?'),
                 device=self.device_serial,
@@ -1104,10 +1291,122 @@ class BotEngine:
             )
             return self._warmup_actions()
 
-        actions = []
+        actions = [(name, self._bind_action(name, kind, arg))
+                   for name, kind, arg in copy.deepcopy(self._plan.entries)]
+        if not any(name == 'check_profile' for name, _ in actions):
+            log.info("[%s] %s: follower snapshot is fresh — skipping check_profile",
+                     self.device_serial, self.account.get('username', '?'))
 
-        # Always check profile first for follower tracking
-        actions.append(('check_profile', self._action_check_profile))
+        # Order: check_profile -> job orders (by priority) -> regular actions (shuffled) -> engage/HBE last
+        if len(actions) > 1:
+            profile_actions = [a for a in actions if a[0] == 'check_profile']
+            job_actions_list = [a for a in actions if a[0].startswith('job_')]
+            engage_actions = [a for a in actions if a[0] in ('engage', 'browse_profiles')]
+            other_actions = [a for a in actions if a[0] not in
+                            ('check_profile', 'engage', 'browse_profiles')
+                            and not a[0].startswith('job_')]
+            random.shuffle(other_actions)
+            random.shuffle(engage_actions)
+            # job_actions_list already sorted by priority from _pending_job_orders
+            actions = profile_actions + job_actions_list + other_actions + engage_actions
+
+        return actions
+
+    def _bind_action(self, name, kind, arg):
+        """Callable for a plan entry (see _plan_session)."""
+        if kind == 'post_content':
+            self._content_item = arg
+            log.info("[%s] CONTENT: Found scheduled %s for @%s "
+                     "(scheduled %s, caption: \"%s...\")",
+                     self.device_serial, arg.get('content_type', '?'),
+                     self.account.get('username', '?'),
+                     arg.get('scheduled_time', '?'), (arg.get('caption', '') or '')[:40])
+            return lambda: self._action_post_content(arg)
+        if kind == 'job_order':
+            job, assignment = arg
+            log.info("[%s] JOB #%d '%s' (%s → @%s): Queuing for execution",
+                     self.device_serial, job['id'], job.get('job_name', 'unnamed'),
+                     job['job_type'], job.get('target', '?'))
+            return lambda: self._action_job_order(job, assignment)
+        return getattr(self, kind)
+
+    def _profile_snapshot_due(self):
+        """(due, next_due_at): whether check_profile should run this session
+        and, if not, when the latest follower snapshot goes stale."""
+        try:
+            hours = float(self.settings.get('check_profile_interval_hours',
+                                            self.PROFILE_CHECK_INTERVAL_HOURS))
+        except (TypeError, ValueError):
+            hours = self.PROFILE_CHECK_INTERVAL_HOURS
+        if hours <= 0:
+            return True, None
+        try:
+            from automation.actions.helpers import get_db
+            conn = get_db()
+            row = conn.execute(
+                "SELECT MAX(captured_at) FROM follower_snapshots WHERE account_id = ?",
+                (self.account_id,)).fetchone()
+            conn.close()
+            last = row[0] if row else None
+            if not last:
+                return True, None
+            last_dt = datetime.datetime.strptime(last[:16], '%Y-%m-%d %H:%M')
+        except Exception:
+            return True, None
+        next_due = last_dt + datetime.timedelta(hours=hours)
+        if datetime.datetime.now() >= next_due:
+            return True, None
+        return False, next_due.timestamp()
+
+    def _next_scheduled_content_at(self):
+        """Epoch seconds of this account's next pending (not yet due)
+        content_schedule item, or None."""
+        try:
+            from automation.actions.helpers import get_db
+            conn = get_db()
+            row = conn.execute("""
+                SELECT MIN(scheduled_time) FROM content_schedule
+                WHERE username = ? AND device_serial = ?
+                AND status = 'pending' AND scheduled_time > ?
+            """, (self.account['username'], self.device_serial,
+                  datetime.datetime.now().isoformat())).fetchone()
+            conn.close()
+            if row and row[0]:
+                return datetime.datetime.fromisoformat(row[0]).timestamp()
+        except Exception as e:
+            log.debug("[%s] next scheduled content lookup failed: %s", self.device_serial, e)
+        return None
+
+    def _plan_session(self):
+        """
+        Decide the next session's actions from the loaded account/settings,
+        scheduled content and job orders, without touching the device or
+        writing to the DB (plans are also built on the refresher thread).
+
+        Returns (warmup, warmup_expired, entries, expires_at): warmup_expired
+        asks the session to clear the account's warmup (_determine_actions);
+        entries are (name, kind, arg)
+        with kind 'post_content' (arg: content_schedule row), 'job_order'
+        (arg: (job, assignment)) or an _action_* method name. expires_at is
+        when the decision goes stale without any DB write (snapshot ageing,
+        account status check due, content falling due, warmup ending).
+        """
+        deadlines = []
+
+        # ── WARMUP MODE: restricted action set ──
+        in_warmup, expired, warmup_ends = self._warmup_state()
+        if in_warmup:
+            return True, False, [], warmup_ends
+
+        entries = []
+
+        # Check profile first for follower tracking — unless the latest
+        # snapshot is fresh (saves the profile-tab navigation each session)
+        due, next_due = self._profile_snapshot_due()
+        if due:
+            entries.append(('check_profile', '_action_check_profile', None))
+        else:
+            deadlines.append(next_due)
 
         # Scrape Account Status once per day (Settings → Account Status)
         # — cheap navigation, good early-warning signal for IG restrictions
@@ -1117,81 +1416,73 @@ class BotEngine:
             if last:
                 last_dt = datetime.datetime.strptime(last[:19], '%Y-%m-%d %H:%M:%S')
                 stale = (datetime.datetime.now() - last_dt).total_seconds() > 86400  # >24h
+                if not stale:
+                    deadlines.append(last_dt.timestamp() + 86400)
             if stale:
-                actions.append(('account_status', self._action_scrape_account_status))
+                entries.append(('account_status', '_action_scrape_account_status', None))
         except Exception:
             pass
 
         # Switch to Business Profile (one-time action, if enabled)
         if (self.settings.get('auto_switch_business', False)
                 and not self.account.get('is_business_profile')):
-            actions.append(('switch_to_business', self._action_switch_to_business))
+            entries.append(('switch_to_business', '_action_switch_to_business', None))
 
         # Switch to Private Profile (one-time action, if enabled)
         if (self.settings.get('auto_switch_private', False)
                 and not self.account.get('is_private')):
-            actions.append(('switch_to_private', self._action_switch_to_private))
+            entries.append(('switch_to_private', '_action_switch_to_private', None))
 
         # Check scheduled content FIRST (time-sensitive, highest priority)
         scheduled = self._check_scheduled_content()
         if scheduled:
-            item = scheduled[0]
-            sched_time = item.get('scheduled_time', '?')
-            caption_preview = (item.get('caption', '') or '')[:40]
-            log.info("[%s] CONTENT: Found scheduled %s for @%s "
-                     "(scheduled %s, caption: \"%s...\")",
-                     self.device_serial, item.get('content_type', '?'),
-                     self.account.get('username', '?'),
-                     sched_time, caption_preview)
-            # Use default-arg capture to bind 'item' in the lambda
-            actions.append(('post_content',
-                            lambda _item=item: self._action_post_content(_item)))
+            entries.append(('post_content', 'post_content', scheduled[0]))
+        deadlines.append(self._next_scheduled_content_at())
 
         # Check job orders (they take priority over regular actions)
-        job_actions = self._check_job_orders()
-        if job_actions:
-            actions.extend(job_actions)
+        for label, job, assignment in self._pending_job_orders():
+            entries.append((label, 'job_order', (job, assignment)))
 
         # Engagement/warmup first (more natural behavior)
         if (self.settings.get('enable_human_behaviour_emulation', False) or
                 self.settings.get('enable_viewhomefeedstory', False) or
                 self.settings.get('enable_scrollhomefeed', False)):
-            actions.append(('engage', self._action_engage))
+            entries.append(('engage', '_action_engage', None))
 
         # Follow (from source accounts)
         if self.account.get('follow_enabled') == 'True':
-            actions.append(('follow', self._action_follow))
+            entries.append(('follow', '_action_follow', None))
 
         # Follow from list (if setting enabled or list assigned)
         if (self.settings.get('enable_follow_from_list', False) or
                 self.settings.get('follow_list_id')):
-            actions.append(('follow_from_list', self._action_follow_from_list))
+            entries.append(('follow_from_list', '_action_follow_from_list', None))
 
         # Unfollow
         if self.account.get('unfollow_enabled') == 'True':
-            actions.append(('unfollow', self._action_unfollow))
+            entries.append(('unfollow', '_action_unfollow', None))
 
         # Like
         if self.settings.get('enable_likepost', False):
-            actions.append(('like', self._action_like))
+            entries.append(('like', '_action_like', None))
 
         # Comment
         if (self.account.get('comment_enabled') == 'True' or
                 self.settings.get('enable_comment', False)):
-            actions.append(('comment', self._action_comment))
+            entries.append(('comment', '_action_comment', None))
 
         # DM
         if self.settings.get('enable_directmessage', False):
-            actions.append(('dm', self._action_dm))
+            entries.append(('dm', '_action_dm', None))
 
         # Story viewing (dedicated, not just warmup)
         if (self.account.get('story_enabled') == 'True' or
                 self.settings.get('enable_story_viewer', False)):
-            actions.append(('story_view', self._action_story_view))
+            entries.append(('story_view', '_action_story_view', None))
 
         # Reels watching
         if self.settings.get('enable_watch_reels', False):
-            actions.append(('reels', self._action_reels))
+            entries.append(('reels', '_action_reels', None))
 
         # Share to story.
         #
@@ -1208,35 +1499,23 @@ class BotEngine:
         # toggle on (i.e. nobody silently stops doing this action after the
         # change — every account that was sharing has the master ON too).
         if self.settings.get('enable_share_post_to_story', False):
-            actions.append(('share_to_story', self._action_share_to_story))
+            entries.append(('share_to_story', '_action_share_to_story', None))
 
         # Save post (bookmark)
         if self.settings.get('enable_save_post', False):
-            actions.append(('save_post', self._action_save_post))
+            entries.append(('save_post', '_action_save_post', None))
 
         # Browse profiles (organic profile visiting)
         if self.settings.get('enable_browse_profiles', False):
-            actions.append(('browse_profiles', self._action_browse_profiles))
+            entries.append(('browse_profiles', '_action_browse_profiles', None))
 
         # If no specific actions enabled, at least do engagement as fallback
-        real_actions = [a for a in actions if a[0] not in ('check_profile',)]
+        real_actions = [e for e in entries if e[0] not in ('check_profile',)]
         if not real_actions:
-            actions.append(('engage', self._action_engage))
-
-        # Order: check_profile -> job orders (by priority) -> regular actions (shuffled) -> engage/HBE last
-        if len(actions) > 1:
-            profile_actions = [a for a in actions if a[0] == 'check_profile']
-            job_actions_list = [a for a in actions if a[0].startswith('job_')]
-            engage_actions = [a for a in actions if a[0] in ('engage', 'browse_profiles')]
-            other_actions = [a for a in actions if a[0] not in
-                            ('check_profile', 'engage', 'browse_profiles')
-                            and not a[0].startswith('job_')]
-            random.shuffle(other_actions)
-            random.shuffle(engage_actions)
-            # job_actions_list already sorted by priority from _check_job_orders
-            actions = profile_actions + job_actions_list + other_actions + engage_actions
+            entries.append(('engage', '_action_engage', None))
 
-        return actions
+        deadlines = [d for d in deadlines if d]
+        return False, expired, entries, min(deadlines) if deadlines else None
 
     def _action_check_profile(self):
         """Run profile check for follower tracking."""
@@ -1273,7 +1552,7 @@ class BotEngine:
             # Disable auto_switch so it doesn't run again
             self.settings['auto_switch_business'] = False
             # Reload account data to pick up is_business_profile=1
-            self._load_account()
+            self._read_account()
         else:
             # Mark attempted so we don't retry every session
             # (set a flag in settings_json)
@@ -1309,7 +1588,7 @@ class BotEngine:
         result = action.execute()
         if result.get('success'):
             self.settings['auto_switch_private'] = False
-            self._load_account()
+            self._read_account()
         else:
             self.settings['auto_switch_private'] = False
             try:
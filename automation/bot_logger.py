@@ -20,6 +20,9 @@ import datetime
 import json
 from collections import deque
 
+from db.connection import connect
+from db.migrations import require_schema
+
 log = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
@@ -38,46 +41,9 @@ _log_lock = threading.Lock()
 _log_id_counter = 0
 
 # ---------------------------------------------------------------------------
-# DB Schema
+# DB Schema — bot_logs + indexes are created by db/migrations.py
 # ---------------------------------------------------------------------------
-CREATE_TABLE_SQL = """
-CREATE TABLE IF NOT EXISTS bot_logs (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    timestamp TEXT NOT NULL DEFAULT (datetime('now','localtime')),
-    level TEXT NOT NULL DEFAULT 'INFO',
-    device_serial TEXT,
-    username TEXT,
-    action_type TEXT,
-    message TEXT NOT NULL,
-    success INTEGER,
-    error_detail TEXT,
-    module TEXT,
-    created_at TEXT NOT NULL DEFAULT (datetime('now','localtime'))
-);
-"""
-
-CREATE_INDEX_SQL = """
-CREATE INDEX IF NOT EXISTS idx_bot_logs_timestamp ON bot_logs(timestamp DESC);
-CREATE INDEX IF NOT EXISTS idx_bot_logs_device ON bot_logs(device_serial);
-CREATE INDEX IF NOT EXISTS idx_bot_logs_level ON bot_logs(level);
-"""
-
-
-def init_log_table():
-    """Create the bot_logs table if it doesn't exist."""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.execute("PRAGMA journal_mode=WAL")
-        conn.executescript(CREATE_TABLE_SQL + CREATE_INDEX_SQL)
-        conn.commit()
-        conn.close()
-        log.info("bot_logs table initialized")
-    except Exception as e:
-        log.error("Failed to init bot_logs table: %s", e)
-
-
-# Initialize on import
-init_log_table()
+require_schema(DB_PATH)
 
 
 # ---------------------------------------------------------------------------
@@ -124,7 +90,7 @@ def log_bot_event(message, level="INFO", device_serial=None, username=None,
     # Write to DB (async via thread to avoid blocking)
     def _write_db():
         try:
-            conn = sqlite3.connect(DB_PATH, timeout=5)
+            conn = connect(DB_PATH, timeout=5)
             conn.execute(
                 """INSERT INTO bot_logs
                    (timestamp, level, device_serial, username, action_type,
@@ -184,48 +150,36 @@ def get_recent_logs(limit=100, since_id=None, device_serial=None,
         return entries[:limit]
 
 
-def get_logs_from_db(limit=200, offset=0, device_serial=None,
-                     level=None, username=None, since=None):
+def get_logs_from_db(limit=200, device_serial=None, level=None, username=None,
+                     since=None, until=None, action_type=None, cursor=None):
     """
-    Get logs from DB (for historical queries).
+    Get logs from DB (for historical queries), newest first.
+    Returns (logs, next_cursor) — pass next_cursor back for the following
+    page (db/keyset.py); it is None on the last page. Raises ValueError for
+    a malformed cursor.
     """
-    try:
-        conn = sqlite3.connect(DB_PATH, timeout=5)
-        conn.row_factory = sqlite3.Row
-
-        query = "SELECT * FROM bot_logs WHERE 1=1"
-        params = []
-
-        if device_serial:
-            query += " AND device_serial=?"
-            params.append(device_serial)
-        if level:
-            query += " AND level=?"
-            params.append(level)
-        if username:
-            query += " AND username=?"
-            params.append(username)
-        if since:
-            query += " AND timestamp >= ?"
-            params.append(since)
-
-        query += " ORDER BY id DESC LIMIT ? OFFSET ?"
-        params.extend([limit, offset])
+    from db.keyset import fetch_page
 
-        rows = conn.execute(query, params).fetchall()
-        conn.close()
-
-        return [dict(r) for r in rows]
+    filters = {'device_serial': device_serial, 'level': level,
+               'username': username, 'action_type': action_type}
+    try:
+        conn = connect(DB_PATH, timeout=5)
+        try:
+            return fetch_page(conn, 'bot_logs', filters=filters, since=since,
+                              until=until, cursor=cursor, limit=limit)
+        finally:
+            conn.close()
+    except ValueError:
+        raise
     except Exception as e:
         log.error("get_logs_from_db error: %s", e)
-        return []
+        return [], None
 
 
 def get_log_stats():
     """Get log statistics for the dashboard."""
     try:
-        conn = sqlite3.connect(DB_PATH, timeout=5)
-        conn.row_factory = sqlite3.Row
+        conn = connect(DB_PATH, timeout=5)
 
         today = datetime.date.today().isoformat()
 
@@ -254,6 +208,140 @@ def get_log_stats():
         return {"total_today": 0, "errors_today": 0, "warnings_today": 0}
 
 
+# ---------------------------------------------------------------------------
+# Full-text search (bot_logs_fts, db/migrations.py step 12)
+# ---------------------------------------------------------------------------
+SEARCH_HIGHLIGHT = ("**", "**")
+_SEARCH_COLUMNS = ("l.id, l.timestamp, l.level, l.device_serial, l.username, "
+                   "l.action_type, l.module")
+_fts_available = None
+
+
+def _has_fts(conn):
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name='bot_logs_fts'").fetchone() is not None
+    return _fts_available
+
+
+def fts_query(text):
+    """
+    Plain search text -> FTS5 MATCH expression: every word must appear,
+    each quoted so serials, paths and punctuation need no escaping; a word
+    ending in '*' stays a prefix search ("UiAutomation*").
+    """
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def _search_filters(device_serial, username, level, since, until):
+    where, params = [], []
+    for column, value in (("device_serial", device_serial), ("username", username),
+                          ("level", level)):
+        if value:
+            where.append(f"l.{column} = ?")
+            params.append(value)
+    if since:
+        where.append("l.timestamp >= ?")
+        params.append(since)
+    if until:
+        where.append("l.timestamp < ?")
+        params.append(until)
+    return where, params
+
+
+def search_logs(text, device_serial=None, username=None, level=None, since=None,
+                until=None, limit=50, raw=False):
+    """
+    Full-text search over bot_logs message / error_detail.
+
+    Args:
+        text: words to find (all of them); raw=True passes FTS5 query
+              syntax through (phrases, OR, NEAR, column filters)
+        device_serial / username / level: exact filters
+        since / until: timestamp range, since inclusive, until exclusive
+
+    Returns dict:
+        results    newest `limit` matches, with message_snippet /
+                   error_snippet highlighted by SEARCH_HIGHLIGHT
+        total      number of matching rows
+        by_device  [{device_serial, count, first_seen, last_seen}], most first
+        engine     'fts5', or 'like' when the index is missing (slow path)
+    Raises ValueError for a query FTS5 cannot parse.
+    """
+    match = text if raw else fts_query(text)
+    if not match:
+        raise ValueError("empty search")
+    limit = max(1, min(int(limit), 500))
+    where, params = _search_filters(device_serial, username, level, since, until)
+    started = time.perf_counter()
+
+    conn = connect(DB_PATH, timeout=5)
+    try:
+        if _has_fts(conn):
+            engine = "fts5"
+            source = "bot_logs_fts JOIN bot_logs l ON l.id = bot_logs_fts.rowid"
+            where = ["bot_logs_fts MATCH ?"] + where
+            params = [match] + params
+            if since:
+                # ids grow with time: hand FTS5 a rowid floor so a common
+                # word over a short window doesn't visit every older match
+                first_id = conn.execute(
+                    "SELECT MIN(id) FROM bot_logs WHERE timestamp >= ?", (since,)
+                ).fetchone()[0]
+                where.append("bot_logs_fts.rowid >= ?")
+                params.append(first_id if first_id is not None else 1 << 62)
+            a, b = SEARCH_HIGHLIGHT
+            columns = (f"{_SEARCH_COLUMNS}, "
+                       f"snippet(bot_logs_fts, 0, '{a}', '{b}', '…', 16) AS message_snippet, "
+                       f"snippet(bot_logs_fts, 1, '{a}', '{b}', '…', 16) AS error_snippet")
+            order = "bot_logs_fts.rowid DESC"
+        else:
+            engine = "like"
+            source = "bot_logs l"
+            words = match.split() if raw else [w.strip('"*').replace('""', '"')
+                                               for w in match.split()]
+            for word in words:
+                where.append("(l.message LIKE ? OR l.error_detail LIKE ?)")
+                params.extend([f"%{word}%"] * 2)
+            columns = (f"{_SEARCH_COLUMNS}, substr(l.message, 1, 200) AS message_snippet, "
+                       "substr(l.error_detail, 1, 200) AS error_snippet")
+            order = "l.id DESC"
+
+        clause = " AND ".join(where)
+        try:
+            rows = conn.execute(
+                f"SELECT {columns} FROM {source} WHERE {clause} ORDER BY {order} LIMIT ?",
+                params + [limit]).fetchall()
+            by_device = conn.execute(
+                f"SELECT l.device_serial, COUNT(*) AS count, MIN(l.timestamp) AS first_seen, "
+                f"MAX(l.timestamp) AS last_seen FROM {source} WHERE {clause} "
+                f"GROUP BY l.device_serial ORDER BY count DESC",
+                params).fetchall()
+        except sqlite3.OperationalError as e:
+            if engine == "fts5" and "fts5" in str(e).lower():
+                raise ValueError(f"bad search query: {e}")
+            raise
+    finally:
+        conn.close()
+
+    by_device = [dict(r) for r in by_device]
+    return {
+        "query": match,
+        "engine": engine,
+        "results": [dict(r) for r in rows],
+        "total": sum(d["count"] for d in by_device),
+        "by_device": by_device,
+        "took_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
 # ---------------------------------------------------------------------------
 # Custom logging handler — intercepts Python logging calls
 # ---------------------------------------------------------------------------
@@ -0,0 +1,250 @@
+"""
+Runner Control Channel
+=======================
+A loopback socket per device runner for commands that must land now,
+instead of files the runner polls or a taskkill:
+
+    from automation import control
+    control.send('10.1.11.4_5555', 'wake')              # skip the cooldown
+    control.send('10.1.11.4_5555', 'run', action='follow')
+    control.send('10.1.11.4_5555', 'pause')
+    control.send('10.1.11.4_5555', 'status')
+    control.send('10.1.11.4_5555', 'stop', now=True)
+
+Runner side (run_device.DeviceRunner), one server per runner — also per
+device inside the in-process farm:
+
+    server = control.ControlServer('10.1.11.4_5555', handler).start()
+    ...
+    server.close()
+
+handler(command, args) returns a dict (sent back with ok=True) or raises
+ControlError (sent back as ok=False + error).
+
+The server listens on 127.0.0.1, on a port the OS picks, and registers
+itself in runtime/control/<name>.json: {pid, port, token, started_at}.
+The token is random per server and must accompany every request, so only
+processes that can read runtime/ can drive a runner. The registry file is
+removed on close(); an entry left behind by a killed runner is dropped
+when a send() to it is refused.
+
+Wire format: one JSON line each way per connection,
+    -> {"token": ..., "command": "wake", "args": {...}}
+    <- {"ok": true, ...}
+"""
+
+import hmac
+import json
+import logging
+import os
+import secrets
+import socket
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+FARM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONTROL_DIR = os.path.join(FARM_DIR, 'runtime', 'control')
+
+HOST = '127.0.0.1'
+SEND_TIMEOUT = 3.0
+MAX_REQUEST = 64 * 1024
+
+COMMANDS = ('status', 'wake', 'pause', 'resume', 'run', 'stop')
+
+
+class ControlError(Exception):
+    """A command the runner refuses (bad arguments, wrong state)."""
+
+
+def _safe_name(name):
+    return ''.join(c if c.isalnum() or c in '._-' else '_' for c in str(name))
+
+
+def registry_path(name):
+    return os.path.join(CONTROL_DIR, _safe_name(name) + '.json')
+
+
+def _read_line(sock):
+    buf = b''
+    while b'\n' not in buf:
+        chunk = sock.recv(4096)
+        if not chunk:
+            break
+        buf += chunk
+        if len(buf) > MAX_REQUEST:
+            raise ValueError('request too large')
+    return buf.split(b'\n', 1)[0]
+
+
+# ---------------------------------------------------------------------------
+# Server (runner side)
+# ---------------------------------------------------------------------------
+
+class ControlServer:
+    """Accepts control commands for one runner on a background thread."""
+
+    def __init__(self, name, handler):
+        self.name = name
+        self.handler = handler
+        self.path = registry_path(name)
+        self.token = secrets.token_hex(16)
+        self.port = None
+        self._sock = None
+        self._thread = None
+        self._closed = threading.Event()
+
+    def start(self):
+        self._sock = socket.create_server((HOST, 0))
+        self._sock.settimeout(0.5)
+        self.port = self._sock.getsockname()[1]
+        os.makedirs(CONTROL_DIR, exist_ok=True)
+        entry = {'name': self.name, 'pid': os.getpid(), 'port': self.port,
+                 'token': self.token, 'started_at': time.time()}
+        tmp = self.path + '.tmp.%d' % os.getpid()
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp, self.path)
+        self._thread = threading.Thread(target=self._serve, daemon=True,
+                                        name=f"control-{self.name}")
+        self._thread.start()
+        return self
+
+    def _serve(self):
+        while not self._closed.is_set():
+            try:
+                conn, _ = self._sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            with conn:
+                try:
+                    conn.settimeout(SEND_TIMEOUT)
+                    reply = self._handle(_read_line(conn))
+                    conn.sendall(json.dumps(reply, default=str).encode('utf-8') + b'\n')
+                except Exception as e:
+                    log.debug("[control] %s: connection error: %s", self.name, e)
+
+    def _handle(self, raw):
+        try:
+            req = json.loads(raw.decode('utf-8'))
+        except ValueError:
+            return {'ok': False, 'error': 'malformed request'}
+        if not isinstance(req, dict) or not hmac.compare_digest(
+                str(req.get('token', '')), self.token):
+            return {'ok': False, 'error': 'bad token'}
+        command = req.get('command')
+        if command not in COMMANDS:
+            return {'ok': False, 'error': f"unknown command {command!r}"}
+        try:
+            result = self.handler(command, req.get('args') or {}) or {}
+        except ControlError as e:
+            return {'ok': False, 'error': str(e)}
+        except Exception as e:
+            log.warning("[control] %s: %s failed: %s", self.name, command, e)
+            return {'ok': False, 'error': f"{command} failed: {e}"}
+        return dict(result, ok=True)
+
+    def close(self):
+        self._closed.set()
+        try:
+            self._sock.close()
+        except Exception:
+            pass
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                mine = json.load(f).get('token') == self.token
+            if mine:                      # a restarted runner may own it now
+                os.remove(self.path)
+        except (OSError, ValueError):
+            pass
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+
+
+# ---------------------------------------------------------------------------
+# Client (dashboard / scripts)
+# ---------------------------------------------------------------------------
+
+def runner_info(name):
+    """Registry entry of the runner `name` (DB serial format), or None."""
+    try:
+        with open(registry_path(name), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def list_runners():
+    """Registry entries of every runner that registered a channel."""
+    out = []
+    if not os.path.isdir(CONTROL_DIR):
+        return out
+    for fname in sorted(os.listdir(CONTROL_DIR)):
+        if fname.endswith('.json'):
+            info = runner_info(fname[:-5])
+            if info:
+                out.append(info)
+    return out
+
+
+def send(name, command, timeout=SEND_TIMEOUT, **args):
+    """Send `command` to the runner `name`. Returns its reply dict
+    ({'ok': True, ...} or {'ok': False, 'error': ...}), or None when no
+    runner is listening for that name."""
+    info = runner_info(name)
+    if info is None:
+        return None
+    request = {'token': info.get('token'), 'command': command, 'args': args}
+    try:
+        with socket.create_connection((HOST, info['port']), timeout=timeout) as sock:
+            sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            raw = _read_line(sock)
+    except ConnectionRefusedError:
+        # Runner died without close(): forget it (unless it was replaced meanwhile)
+        if runner_info(name) == info:
+            try:
+                os.remove(registry_path(name))
+            except OSError:
+                pass
+        return None
+    except (OSError, KeyError, ValueError) as e:
+        log.debug("[control] %s %s: %s", name, command, e)
+        return None
+    try:
+        return json.loads(raw.decode('utf-8'))
+    except ValueError:
+        return None
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Send a control command to a device runner')
+    parser.add_argument('serial', nargs='?', help='device serial (omit to list runners)')
+    parser.add_argument('command', nargs='?', default='status', choices=COMMANDS)
+    parser.add_argument('--action', help='action for "run"')
+    parser.add_argument('--now', action='store_true', help='"stop": abort the running session')
+    args = parser.parse_args(argv)
+
+    if not args.serial:
+        for info in list_runners():
+            print(f"{info['name']:<24} pid={info['pid']:<7} port={info['port']}")
+        return 0
+    extra = {}
+    if args.action:
+        extra['action'] = args.action
+    if args.now:
+        extra['now'] = True
+    reply = send(args.serial.replace(':', '_'), args.command, **extra)
+    if reply is None:
+        print('no runner listening for', args.serial)
+        return 1
+    print(json.dumps(reply, indent=2))
+    return 0 if reply.get('ok') else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
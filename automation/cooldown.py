@@ -0,0 +1,231 @@
+"""
+Cooldown Scheduler
+===================
+Pacing waits — between actions (BotEngine.run, 30-90s) and between cycles
+(run_device, 120s) — that spend their first seconds on non-interactive
+prep for what comes next, then sleep out the rest:
+
+    cooldown = CooldownScheduler('10.1.11.4_5555')
+    cooldown.every('rotate_artifacts', rotate_debug_artifacts_fn, 3600)
+    cooldown.add('stage_media', lambda: ..., estimate=8)    # next wait only
+    cooldown.wait(random.randint(30, 90), running=lambda: engine._running)
+
+wait(seconds) always ends `seconds` after it started, so the cadence an
+observer sees (time between two actions) keeps the same distribution;
+only what the runner does inside it changes. Prep never touches the UI:
+adb pushes, DB reads, file housekeeping.
+
+A task is only started when its estimate (the last run's duration, or
+the given one) fits in what is left of the wait; otherwise it stays
+queued for the next one. A task that runs longer than the wait had left
+pushes the wait's end back — that "overrun" is reported, not hidden.
+
+Per-session accounting (begin_session() / session_report()); the parts
+add up to session_seconds:
+
+    action_seconds      time inside actions, less their random_sleeps
+    pacing_seconds      deliberate human-like waiting: cooldowns plus the
+                        random_sleep/action_delay calls (note_pacing)
+    prep_seconds        prep work done inside cooldowns (wall clock the
+                        pacing absorbed)
+    overrun_seconds     prep that outlasted its cooldown
+    mechanical_seconds  everything outside actions and cooldowns: connect,
+                        proxy check, opening IG, login, session bookkeeping
+                        (less any random_sleeps there)
+"""
+
+import glob
+import logging
+import os
+import threading
+import time
+
+from automation.metrics import get_registry
+
+log = logging.getLogger(__name__)
+
+FARM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Don't start prep with less than this left in the wait.
+MIN_PREP_WINDOW = 2.0
+
+RPC_REPORTS_KEEP = 200                  # logs/rpc/<serial>/ files kept
+DEBUG_DUMP_MAX_AGE = 3 * 86400          # test_results/ screenshots & XML
+
+_pacing = threading.local()
+
+
+def note_pacing(seconds):
+    """Count a deliberate in-action delay towards this thread's session
+    pacing (called by helpers.random_sleep)."""
+    _pacing.seconds = getattr(_pacing, 'seconds', 0.0) + seconds
+
+
+def _taken_pacing():
+    seconds = getattr(_pacing, 'seconds', 0.0)
+    _pacing.seconds = 0.0
+    return seconds
+
+
+class _Task:
+    __slots__ = ('name', 'fn', 'interval', 'estimate', 'last_run')
+
+    def __init__(self, name, fn, interval=None, estimate=0.0):
+        self.name = name
+        self.fn = fn
+        self.interval = interval        # None: one-shot
+        self.estimate = estimate
+        self.last_run = 0.0
+
+
+class CooldownScheduler:
+    """Runs queued prep tasks inside pacing waits of one device."""
+
+    def __init__(self, device_serial, registry=None):
+        self.device_serial = device_serial
+        self.metrics = registry or get_registry()
+        self._lock = threading.Lock()
+        self._once = []             # [_Task], FIFO
+        self._recurring = {}        # name -> _Task
+        self.begin_session()
+
+    # -- tasks ------------------------------------------------------------
+
+    def add(self, name, fn, estimate=0.0):
+        """Queue fn() for the next wait with room for it (replaces a queued
+        task of the same name)."""
+        with self._lock:
+            self._once = [t for t in self._once if t.name != name]
+            self._once.append(_Task(name, fn, estimate=estimate))
+
+    def every(self, name, fn, interval, estimate=0.0):
+        """Run fn() in a wait at most once per `interval` seconds."""
+        with self._lock:
+            self._recurring[name] = _Task(name, fn, interval, estimate)
+
+    def discard(self, name):
+        with self._lock:
+            self._once = [t for t in self._once if t.name != name]
+
+    def pending(self):
+        with self._lock:
+            now = time.time()
+            return [t.name for t in self._once] + [
+                t.name for t in self._recurring.values()
+                if now - t.last_run >= t.interval]
+
+    def _next_task(self, remaining):
+        with self._lock:
+            for i, t in enumerate(self._once):
+                if t.estimate <= remaining:
+                    return self._once.pop(i)
+            now = time.time()
+            for t in self._recurring.values():
+                if now - t.last_run >= t.interval and t.estimate <= remaining:
+                    t.last_run = now
+                    return t
+        return None
+
+    # -- waiting ----------------------------------------------------------
+
+    def prep(self, budget, running=None):
+        """Run prep tasks that fit in `budget` seconds; returns the seconds
+        spent (may exceed budget by the last task's overrun)."""
+        start = time.monotonic()
+        while running is None or running():
+            remaining = budget - (time.monotonic() - start)
+            if remaining < MIN_PREP_WINDOW:
+                break
+            task = self._next_task(remaining)
+            if task is None:
+                break
+            t0 = time.monotonic()
+            result = 'ok'
+            try:
+                task.fn()
+            except Exception as e:
+                result = 'error'
+                log.debug("[%s] prep %s failed: %s", self.device_serial, task.name, e)
+            took = time.monotonic() - t0
+            task.estimate = took
+            self.metrics.inc('cooldown_prep_total', task=task.name, result=result)
+            self.metrics.observe('cooldown_prep_seconds', took, task=task.name)
+            self._tasks_run[task.name] = self._tasks_run.get(task.name, 0) + 1
+        spent = time.monotonic() - start
+        self._prep += min(spent, budget)
+        self._overrun += max(0.0, spent - budget)
+        return spent
+
+    def wait(self, seconds, running=None):
+        """Pacing wait of `seconds`: prep first, sleep the remainder. Ends
+        early once running() returns False. Returns seconds waited."""
+        start = time.monotonic()
+        spent = self.prep(seconds, running)
+        deadline = start + max(seconds, spent)
+        while running is None or running():
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            time.sleep(min(1.0, left))
+        waited = time.monotonic() - start
+        self._cooldown += waited
+        self.metrics.observe('cooldown_seconds', waited)
+        return waited
+
+    # -- reporting --------------------------------------------------------
+
+    def begin_session(self):
+        self._started = time.monotonic()
+        self._cooldown = 0.0
+        self._prep = 0.0
+        self._overrun = 0.0
+        self._tasks_run = {}
+        _taken_pacing()
+
+    def session_report(self, action_seconds=0.0):
+        """Where this session's wall clock went (see module docstring).
+        `action_seconds` is the actions' wall time, their random_sleeps
+        included; those move to pacing so the parts add up to the total."""
+        total = time.monotonic() - self._started
+        noted = _taken_pacing()
+        in_actions = min(noted, action_seconds)
+        outside = noted - in_actions            # e.g. sleeps during login
+        mechanical = total - action_seconds - self._cooldown
+        return {
+            'session_seconds': round(total, 1),
+            'action_seconds': round(action_seconds - in_actions, 1),
+            'pacing_seconds': round(max(0.0, self._cooldown - self._prep - self._overrun)
+                                    + noted, 1),
+            'prep_seconds': round(self._prep, 1),
+            'overrun_seconds': round(self._overrun, 1),
+            'mechanical_seconds': round(max(0.0, mechanical - outside), 1),
+            'prep_tasks': dict(self._tasks_run),
+        }
+
+
+# ---------------------------------------------------------------------------
+# Prep tasks shared by every runner
+# ---------------------------------------------------------------------------
+
+def rotate_debug_artifacts(device_serial, keep=RPC_REPORTS_KEEP,
+                           max_age=DEBUG_DUMP_MAX_AGE):
+    """Keep the newest `keep` RPC reports of the device (logs/rpc/<serial>/)
+    and drop test_results/ dumps older than `max_age`. Returns files removed."""
+    removed = 0
+    reports = sorted(glob.glob(os.path.join(FARM_DIR, 'logs', 'rpc',
+                                            glob.escape(device_serial), '*.json')))
+    for path in reports[:-keep] if keep else reports:
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+    cutoff = time.time() - max_age
+    for path in glob.glob(os.path.join(FARM_DIR, 'test_results', '*')):
+        try:
+            if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass            # another runner got it first
+    return removed
@@ -11,6 +11,10 @@ Uses the proven pattern from login_automation.py:
 5. Reconnect on UiAutomationNotConnectedError
 
 Thread-safe: each device gets its own connection tracked in a global registry.
+
+Simulated serials ("sim-..." or every serial with HYDRA_DEVICE_SIM=1) skip
+adb and u2 entirely and get an instrumented SimDevice; automation/device_sim.py
+is only imported when one of them connects.
 """
 
 import subprocess
@@ -19,6 +23,10 @@ import time
 import logging
 import io
 import base64
+import os
+
+from automation.metrics import get_registry
+from automation.rpc_instrument import RpcRecorder, instrument
 
 log = logging.getLogger(__name__)
 
@@ -26,6 +34,15 @@ log = logging.getLogger(__name__)
 _connections = {}
 _lock = threading.Lock()
 
+SIM_PREFIX = 'sim-'
+
+
+def is_simulated(device_serial):
+    """True for serials served by the simulator (automation/device_sim.py)."""
+    if not device_serial:
+        return False
+    return device_serial.startswith(SIM_PREFIX) or os.environ.get('HYDRA_DEVICE_SIM') == '1'
+
 
 class DeviceConnection:
     """Manages a single device's uiautomator2 connection."""
@@ -48,13 +65,19 @@ class DeviceConnection:
         self.error_message = None
         self.last_connected = None
         self.last_activity = None
+        self.rpc = RpcRecorder(device_serial)   # survives reconnects
         self._lock = threading.Lock()
 
-    def connect(self, timeout=45, max_attempts=2):
+    def connect(self, timeout=45, max_attempts=2, cancel=None):
         """
         Connect to device using the proven UIAutomator pattern.
         Retries once if the first attempt fails (handles stale UIAutomator).
 
+        Args:
+            cancel: optional threading.Event — once set, the connect stops at
+                    its next step (before a kill, during the wait, between
+                    polls) without touching the device again
+
         Returns:
             device object or None on failure
         """
@@ -62,14 +85,26 @@ class DeviceConnection:
             self.status = self.CONNECTING
             self.error_message = None
 
+        metrics = get_registry()
+        connect_started = time.time()
+        if is_simulated(self.device_serial):
+            return self._connect_simulated(metrics, connect_started)
         for attempt in range(1, max_attempts + 1):
+            if attempt > 1:
+                metrics.inc('connect_retries_total', device=self.device_serial)
+            if cancel is not None and cancel.is_set():
+                return self._cancel_connect(metrics)
             try:
                 # STEP 1: Kill all existing UIAutomator processes
                 log.info("[%s] Attempt %d/%d: Cleaning UIAutomator processes...",
                          self.device_serial, attempt, max_attempts)
                 self._kill_uiautomator()
                 wait_time = 5 if attempt == 1 else 8  # Wait longer on retry
-                time.sleep(wait_time)
+                if cancel is not None:
+                    if cancel.wait(wait_time):
+                        return self._cancel_connect(metrics)
+                else:
+                    time.sleep(wait_time)
 
                 # STEP 2: Connect via uiautomator2
                 log.info("[%s] Connecting via u2.connect(%s)...",
@@ -85,6 +120,8 @@ class DeviceConnection:
                 start = time.time()
 
                 while (time.time() - start) < timeout:
+                    if cancel is not None and cancel.is_set():
+                        return self._cancel_connect(metrics)
                     try:
                         _ = device.info
                         _ = device.window_size()
@@ -92,12 +129,16 @@ class DeviceConnection:
                         log.info("[%s] UIAutomator responsive (took %ds)",
                                  self.device_serial, elapsed)
 
+                        device = instrument(device, self.device_serial, self.rpc)
                         with self._lock:
                             self.device = device
                             self.status = self.CONNECTED
                             self.last_connected = time.time()
                             self.last_activity = time.time()
 
+                        metrics.observe('connect_seconds', time.time() - connect_started,
+                                        device=self.device_serial)
+                        metrics.inc('connects_total', device=self.device_serial, result='ok')
                         return device
                     except Exception as poll_err:
                         elapsed = int(time.time() - start)
@@ -118,6 +159,7 @@ class DeviceConnection:
                 with self._lock:
                     self.status = self.ERROR
                     self.error_message = msg
+                metrics.inc('connects_total', device=self.device_serial, result='failed')
                 return None
 
             except Exception as e:
@@ -132,10 +174,86 @@ class DeviceConnection:
                 with self._lock:
                     self.status = self.ERROR
                     self.error_message = msg
+                metrics.inc('connects_total', device=self.device_serial, result='failed')
                 return None
 
         return None
 
+    def _cancel_connect(self, metrics):
+        log.info("[%s] Connect cancelled", self.device_serial)
+        with self._lock:
+            self.status = self.DISCONNECTED
+            self.error_message = 'connect cancelled'
+        metrics.inc('connects_total', device=self.device_serial, result='cancelled')
+        return None
+
+    def attach(self, timeout=10):
+        """
+        Attach to a UIAutomator server that is already running — started
+        moments ago by the farm start warm-up (automation/farm_start.py) —
+        without connect()'s kill-and-restart. Short timeout, no retries.
+
+        Returns:
+            device object or None (the caller falls back to connect())
+        """
+        with self._lock:
+            self.status = self.CONNECTING
+            self.error_message = None
+
+        metrics = get_registry()
+        connect_started = time.time()
+        if is_simulated(self.device_serial):
+            return self._connect_simulated(metrics, connect_started)
+        try:
+            import uiautomator2 as u2
+            device = u2.connect(self.adb_serial)
+            while True:
+                try:
+                    _ = device.info
+                    _ = device.window_size()
+                    break
+                except Exception:
+                    if time.time() - connect_started >= timeout:
+                        raise
+                    time.sleep(1)
+        except Exception as e:
+            log.info("[%s] Attach failed (%s) — full connect needed",
+                     self.device_serial, str(e)[:80])
+            with self._lock:
+                self.status = self.DISCONNECTED
+                self.error_message = str(e)[:200]
+            metrics.inc('connects_total', device=self.device_serial, result='attach_failed')
+            return None
+
+        device = instrument(device, self.device_serial, self.rpc)
+        log.info("[%s] Attached to running UIAutomator (took %.1fs)",
+                 self.device_serial, time.time() - connect_started)
+        with self._lock:
+            self.device = device
+            self.status = self.CONNECTED
+            self.last_connected = time.time()
+            self.last_activity = time.time()
+        metrics.observe('connect_seconds', time.time() - connect_started,
+                        device=self.device_serial)
+        metrics.inc('connects_total', device=self.device_serial, result='attached')
+        return device
+
+    def _connect_simulated(self, metrics, connect_started):
+        """Synthetic device for offline runs — same bookkeeping as connect()."""
+        from automation import device_sim
+        device = instrument(device_sim.connect(self.device_serial),
+                            self.device_serial, self.rpc)
+        log.info("[%s] Connected to simulated device", self.device_serial)
+        with self._lock:
+            self.device = device
+            self.status = self.CONNECTED
+            self.last_connected = time.time()
+            self.last_activity = time.time()
+        metrics.observe('connect_seconds', time.time() - connect_started,
+                        device=self.device_serial)
+        metrics.inc('connects_total', device=self.device_serial, result='ok')
+        return device
+
     def disconnect(self):
         """Disconnect from device, cleanup resources."""
         import gc
@@ -168,6 +286,9 @@ class DeviceConnection:
                     pass
 
             # Clean ADB forwards
+            if is_simulated(self.device_serial):
+                log.info("[%s] Disconnected (simulated)", self.device_serial)
+                return
             try:
                 subprocess.run(
                     ['adb', '-s', self.adb_serial, 'forward', '--remove-all'],
@@ -199,6 +320,7 @@ class DeviceConnection:
 
     def reconnect(self, timeout=45):
         """Disconnect then reconnect."""
+        get_registry().inc('reconnects_total', device=self.device_serial)
         self.disconnect()
         time.sleep(2)
         return self.connect(timeout=timeout)
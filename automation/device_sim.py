@@ -0,0 +1,1180 @@
+"""
+Synthetic Device Simulator
+===========================
+A fake uiautomator2 device for offline end-to-end runs and throughput
+benchmarks (automation/sim_bench.py). It serves dump_hierarchy XML from
+fixtures through a small screen-state machine and answers click / swipe /
+press / selector calls with configurable latency and jitter, so
+IGController and the action modules run unchanged against it.
+
+Serials starting with "sim-" (e.g. "sim-07_5555") are simulated, as is
+every serial when HYDRA_DEVICE_SIM=1. DeviceConnection.connect() hands
+those back as an instrumented SimDevice instead of calling u2.connect().
+
+`adb -s <sim serial> ...` subprocess.run() calls (typing, force-stop, deep
+links) reach the simulator only while the adb router is installed: inside
+`with adb_router():` (sim_bench does this for its run), or for the whole
+process when HYDRA_DEVICE_SIM=1 (an offline run_device / orchestrator).
+
+Fixtures live in automation/sim_fixtures/:
+    screens.json      screen graph: fixture per screen, tap rules, list rows
+    <screen>.xml      compact dump; missing node attributes get u2 defaults
+    <row>.xml         row template repeated into ${rows}
+Placeholders use string.Template syntax (${package}, ${query}, ...).
+Recorded dumps (IGController.dump_xml writes them to test_results/) become
+fixtures with
+
+    python -m automation.device_sim import test_results/012_verify_profile.xml profile
+    python -m automation.device_sim check     # each screen detects as its "expect"
+
+Tap rules (per-screen "taps" over the global ones; keys are
+id:<resource-id suffix>, text:<text> or desc:<content-desc>):
+    "<screen>"        push screen           "@back"      pop
+    "@tab:<screen>"   reset stack to a tab  "@focus"     focus the EditText
+    "@follow"         Follow -> Following for the row / profile user
+    "@open_profile"   open the row user's profile
+
+Latency is device time: every RPC sleeps its DEFAULT_LATENCY entry times
+latency_scale, with gaussian jitter. A selector that does not match waits
+out its timeout exactly like u2's waitForExists does.
+"""
+
+import base64
+import json
+import logging
+import os
+import random
+import re
+import shlex
+import string
+import struct
+import subprocess
+import threading
+import time
+import xml.etree.ElementTree as ET
+import zlib
+from collections import namedtuple
+from contextlib import contextmanager
+from xml.sax.saxutils import escape
+
+from automation.device_connection import SIM_PREFIX, is_simulated  # noqa: F401
+
+log = logging.getLogger(__name__)
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sim_fixtures')
+LAUNCHER_PACKAGE = 'com.sec.android.app.launcher'
+WAIT_TIMEOUT = 20.0            # u2 settings['wait_timeout']
+
+# Seconds per RPC on a real phone over wifi (device time, before jitter).
+DEFAULT_LATENCY = {
+    'dump_hierarchy': 0.45,
+    'screenshot': 0.35,
+    'click': 0.12,
+    'press': 0.10,
+    'swipe': 0.15,
+    'input': 0.25,
+    'shell': 0.20,
+    'selector': 0.15,
+    'app_current': 0.08,
+    'app_start': 1.50,
+    'app_stop': 0.30,
+    'window_size': 0.05,
+    'info': 0.06,
+    'connect': 2.00,
+}
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+# Options for devices created from now on (configure() / env).
+_options = {
+    'latency_scale': _env_float('HYDRA_SIM_LATENCY_SCALE', 1.0),
+    'jitter': _env_float('HYDRA_SIM_JITTER', 0.25),
+    'popup_rate': _env_float('HYDRA_SIM_POPUP_RATE', 0.02),
+    'fixtures': os.environ.get('HYDRA_SIM_FIXTURES') or FIXTURE_DIR,
+}
+_devices = {}           # device_serial -> SimDevice
+_specs = {}             # fixtures dir -> _Spec
+_lock = threading.RLock()
+
+ShellResponse = namedtuple('ShellResponse', 'output exit_code')
+
+
+class UiObjectNotFoundError(Exception):
+    """Same role as uiautomator2.exceptions.UiObjectNotFoundError."""
+
+
+def configure(**options):
+    """Change latency_scale / jitter / popup_rate / fixtures for new devices."""
+    unknown = set(options) - set(_options)
+    if unknown:
+        raise ValueError("Unknown simulator option(s): %s" % ', '.join(sorted(unknown)))
+    _options.update(options)
+
+
+def get_device(device_serial):
+    """The simulated phone behind `device_serial` (state survives reconnects)."""
+    with _lock:
+        device = _devices.get(device_serial)
+        if device is None:
+            device = _devices[device_serial] = SimDevice(device_serial, **_options)
+        return device
+
+
+def connect(device_serial):
+    """u2.connect() stand-in used by DeviceConnection."""
+    if os.environ.get('HYDRA_DEVICE_SIM') == '1':
+        install_adb_router()
+    device = get_device(device_serial)
+    device._wait('connect')
+    return device
+
+
+def reset():
+    """Forget all simulated devices and cached fixtures."""
+    with _lock:
+        _devices.clear()
+        _specs.clear()
+
+
+# ---------------------------------------------------------------------------
+# Fixtures
+# ---------------------------------------------------------------------------
+
+# uiautomator dump attribute order; fixtures only spell out what matters.
+_NODE_DEFAULTS = (
+    ('index', '0'), ('text', ''), ('resource-id', ''), ('class', 'android.view.View'),
+    ('package', ''), ('content-desc', ''), ('checkable', 'false'), ('checked', 'false'),
+    ('clickable', 'false'), ('enabled', 'true'), ('focusable', 'false'),
+    ('focused', 'false'), ('scrollable', 'false'), ('long-clickable', 'false'),
+    ('password', 'false'), ('selected', 'false'), ('visible-to-user', 'true'),
+    ('bounds', '[0,0][0,0]'),
+)
+_BOUNDS_RE = re.compile(r'\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]')
+
+
+class _Spec:
+    """screens.json plus the raw fixture templates it names."""
+
+    def __init__(self, fixtures_dir):
+        self.dir = fixtures_dir
+        with open(os.path.join(fixtures_dir, 'screens.json'), encoding='utf-8') as f:
+            spec = json.load(f)
+        self.window = tuple(spec.get('window', (1080, 2400)))
+        self.start = spec['start']
+        self.launcher = spec.get('launcher')
+        self.taps = spec.get('taps', {})
+        self.screens = spec['screens']
+        self._templates = {}
+        self.tab_bar = self.template(spec['tab_bar']) if spec.get('tab_bar') else None
+        self.tab_ids = sorted(key.split(':', 1)[1] for key, rule in self.taps.items()
+                              if rule.startswith('@tab:') and key.startswith('id:'))
+        for name, screen in self.screens.items():
+            self.template(screen['fixture'])
+            if screen.get('rows'):
+                self.template(screen['rows']['template'])
+
+    def template(self, fname):
+        tpl = self._templates.get(fname)
+        if tpl is None:
+            with open(os.path.join(self.dir, fname), encoding='utf-8') as f:
+                tpl = self._templates[fname] = string.Template(f.read())
+        return tpl
+
+
+def _load_spec(fixtures_dir):
+    with _lock:
+        spec = _specs.get(fixtures_dir)
+        if spec is None:
+            spec = _specs[fixtures_dir] = _Spec(fixtures_dir)
+        return spec
+
+
+class _Node:
+    __slots__ = ('attrs', 'bounds', 'parent', 'end', 'children')
+
+    def __init__(self, attrs, parent):
+        self.attrs = attrs
+        m = _BOUNDS_RE.match(attrs.get('bounds', ''))
+        self.bounds = tuple(int(v) for v in m.groups()) if m else (0, 0, 0, 0)
+        self.parent = parent
+        self.end = None
+        self.children = []
+
+    @property
+    def short_id(self):
+        rid = self.attrs.get('resource-id', '')
+        return rid.split(':id/', 1)[1] if ':id/' in rid else rid
+
+    def contains(self, x, y):
+        l, t, r, b = self.bounds
+        return l <= x < r and t <= y < b
+
+    def area(self):
+        l, t, r, b = self.bounds
+        return max(0, r - l) * max(0, b - t)
+
+    def info(self):
+        a = self.attrs
+        l, t, r, b = self.bounds
+        flag = lambda k: a.get(k) == 'true'  # noqa: E731
+        bounds = {'left': l, 'top': t, 'right': r, 'bottom': b}
+        return {
+            'bounds': bounds,
+            'visibleBounds': dict(bounds),
+            'childCount': len(self.children),
+            'className': a.get('class'),
+            'contentDescription': a.get('content-desc') or None,
+            'packageName': a.get('package'),
+            'resourceName': a.get('resource-id') or None,
+            'text': a.get('text', ''),
+            'checkable': flag('checkable'),
+            'checked': flag('checked'),
+            'clickable': flag('clickable'),
+            'enabled': flag('enabled'),
+            'focusable': flag('focusable'),
+            'focused': flag('focused'),
+            'longClickable': flag('long-clickable'),
+            'scrollable': flag('scrollable'),
+            'selected': flag('selected'),
+        }
+
+
+def _render(raw_xml, package):
+    """Fill u2 defaults into a compact fixture; returns (xml, [_Node])."""
+    root = ET.fromstring(raw_xml)
+    nodes = []
+
+    def walk(elem, parent, index):
+        attrs = dict(_NODE_DEFAULTS)
+        attrs['index'] = str(index)
+        attrs['package'] = package
+        attrs.update(elem.attrib)
+        elem.attrib.clear()
+        elem.attrib.update(attrs)
+        node = _Node(attrs, parent)
+        idx = len(nodes)
+        nodes.append(node)
+        if parent is not None:
+            nodes[parent].children.append(idx)
+        for i, child in enumerate(elem.findall('node')):
+            walk(child, idx, i)
+        node.end = len(nodes)
+
+    for i, elem in enumerate(root.findall('node')):
+        walk(elem, None, i)
+    xml = ("<?xml version='1.0' encoding='UTF-8' standalone='yes' ?>\n"
+           + ET.tostring(root, encoding='unicode'))
+    return xml, nodes
+
+
+def _h(*parts):
+    return zlib.crc32('|'.join(str(p) for p in parts).encode('utf-8'))
+
+
+def _profile_stats(username):
+    h = _h('stats', username)
+    return {'followers': 150 + h % 40000, 'following': 50 + (h >> 8) % 2000,
+            'posts': (h >> 16) % 900}
+
+
+def _follower_name(owner, n):
+    return 'u%08d' % (_h(owner, n) % 100000000)
+
+
+def _full_name(username):
+    return username.replace('_', ' ').replace('.', ' ').strip().title()
+
+
+# ---------------------------------------------------------------------------
+# Screen-state machine
+# ---------------------------------------------------------------------------
+
+class ScreenMachine:
+    """What the phone is showing and how taps / keys / swipes change it."""
+
+    def __init__(self, spec, account='sim_account', popup_rate=0.0, seed=None):
+        self.spec = spec
+        self.account = account
+        self.popup_rate = popup_rate
+        self.rng = random.Random(seed)
+        self.package = None          # installed app we launched
+        self.running = False
+        self.foreground = LAUNCHER_PACKAGE
+        self.stack = []
+        self.query = ''
+        self.focused = False
+        self.followed = set()
+        self.version = 0
+        self._cache = (None, None)   # (key, (xml, nodes))
+
+    # -- state -----------------------------------------------------------
+    def _changed(self):
+        self.version += 1
+
+    @property
+    def frame(self):
+        if self.foreground != self.package or not self.stack:
+            return {'screen': self.spec.launcher}
+        return self.stack[-1]
+
+    def _push(self, screen, profile=None, popup_ok=True):
+        if profile is None and self.stack:
+            profile = self.stack[-1].get('profile')
+        self.stack.append({'screen': screen, 'profile': profile, 'offset': 0})
+        self._maybe_popup(screen, popup_ok)
+        self._changed()
+
+    def _maybe_popup(self, screen, popup_ok=True):
+        if (popup_ok and self.popup_rate and self.spec.screens[screen].get('popups')
+                and 'popup' in self.spec.screens and self.rng.random() < self.popup_rate):
+            self.stack.append({'screen': 'popup', 'profile': None, 'offset': 0})
+
+    def follow_text(self, username):
+        if username in self.followed or _h('following', self.account, username) % 10 == 0:
+            return 'Following'
+        return 'Follow'
+
+    # -- rendering ---------------------------------------------------------
+    def render(self):
+        """(xml, nodes) for the current screen, cached until state changes."""
+        frame = self.frame
+        key = (self.version, self.foreground, frame['screen'])
+        if self._cache[0] == key:
+            return self._cache[1]
+        spec = self.spec
+        screen = spec.screens[frame['screen']]
+        values = self._values(frame, screen)
+        raw = spec.template(screen['fixture']).safe_substitute(values)
+        result = _render(raw, self.foreground)
+        self._cache = (key, result)
+        return result
+
+    def _values(self, frame, screen):
+        profile = frame.get('profile') or self.account
+        stats = _profile_stats(profile)
+        v = {
+            'package': self.package or '',
+            'account': self.account,
+            'profile': profile,
+            'full_name': _full_name(profile),
+            'bio': 'Simulated profile',
+            'followers': '{:,}'.format(stats['followers']),
+            'following': '{:,}'.format(stats['following']),
+            'posts': '{:,}'.format(stats['posts']),
+            'follow_text': self.follow_text(profile),
+            'query': self.query,
+            'focused': 'true' if self.focused else 'false',
+            'likes': '{:,}'.format(_h('likes', self.version) % 5000),
+        }
+        v = {k: escape(str(val), {'"': '&quot;'}) for k, val in v.items()}
+        if self.spec.tab_bar is not None:
+            tabs = {t: 'true' if screen.get('tab') == t else 'false' for t in self.spec.tab_ids}
+            tabs['package'] = v['package']
+            v['tabs'] = self.spec.tab_bar.safe_substitute(tabs)
+        else:
+            v['tabs'] = ''
+        rows = screen.get('rows')
+        v['rows'] = self._rows(rows, frame, v['package']) if rows else ''
+        return v
+
+    def _row_users(self, rows, frame):
+        count = rows.get('count', 8)
+        if rows.get('source') == 'search':
+            q = self.query.strip()
+            if not q:
+                return []
+            return [q] + ['%s%s' % (q, s) for s in ('_', '.official', '_fan', 'x', '_2',
+                                                    '.daily', '_tv')][:count - 1]
+        if rows.get('source') == 'followers':
+            owner = frame.get('profile') or self.account
+            total = _profile_stats(owner)['followers']
+            start = frame.get('offset', 0)
+            return [_follower_name(owner, n) for n in range(start, min(start + count, total))]
+        return []
+
+    def _rows(self, rows, frame, package):
+        tpl = self.spec.template(rows['template'])
+        top, height = rows.get('top', 300), rows.get('height', 150)
+        out = []
+        for i, username in enumerate(self._row_users(rows, frame)):
+            t = top + i * height
+            b = t + height
+            out.append(tpl.safe_substitute({
+                'package': package,
+                'username': escape(username, {'"': '&quot;'}),
+                'full_name': escape(_full_name(username), {'"': '&quot;'}),
+                'follow_text': self.follow_text(username),
+                'index': i, 'top': t, 'bottom': b, 'mid': (t + b) // 2,
+                'inner_top': t + 15, 'inner_bottom': b - 15,
+            }))
+        return '\n'.join(out)
+
+    # -- input -------------------------------------------------------------
+    def tap(self, x, y):
+        if self.foreground != self.package:
+            return
+        _, nodes = self.render()
+        hit = None
+        for i, node in enumerate(nodes):
+            if node.contains(x, y) and (hit is None or node.area() <= nodes[hit].area()):
+                hit = i
+        if hit is None:
+            return
+        rules = dict(self.spec.taps)
+        rules.update(self.spec.screens[self.frame['screen']].get('taps', {}))
+        idx = hit
+        while idx is not None:
+            a = nodes[idx].attrs
+            for key in ('id:' + nodes[idx].short_id, 'text:' + a.get('text', ''),
+                        'desc:' + a.get('content-desc', '')):
+                rule = rules.get(key)
+                if rule and key.split(':', 1)[1]:
+                    self._apply(rule, nodes, idx)
+                    return
+            idx = nodes[idx].parent
+
+    def _row_user(self, nodes, idx):
+        """Username of the list row containing nodes[idx]."""
+        for _ in range(3):
+            if idx is None:
+                break
+            for node in nodes[idx:nodes[idx].end]:
+                if (node.short_id.endswith('username') and node.attrs.get('text')
+                        and 'EditText' not in node.attrs.get('class', '')):
+                    return node.attrs['text']
+            idx = nodes[idx].parent
+        return None
+
+    def _apply(self, rule, nodes, idx):
+        if rule == '@back':
+            self.back()
+        elif rule.startswith('@tab:'):
+            self.stack = [{'screen': rule[len('@tab:'):], 'profile': None, 'offset': 0}]
+            self.query, self.focused = '', False
+            self._maybe_popup(self.stack[0]['screen'])
+            self._changed()
+        elif rule == '@focus':
+            if not self.focused:
+                self.focused = True
+                self._changed()
+        elif rule == '@follow':
+            user = self._row_user(nodes, idx) or self.frame.get('profile')
+            if user and self.follow_text(user) == 'Follow':
+                self.followed.add(user)
+                self._changed()
+        elif rule == '@open_profile':
+            user = self._row_user(nodes, idx)
+            if user:
+                self.focused = False
+                self._push('profile', profile=user)
+        elif rule in self.spec.screens:
+            self._push(rule)
+        else:
+            log.warning("Simulator: unknown tap rule %r", rule)
+
+    def back(self):
+        if self.foreground != self.package:
+            return
+        if len(self.stack) > 1:
+            self.stack.pop()
+        elif self.stack and self.stack[0]['screen'] != self.spec.start:
+            self.stack = [{'screen': self.spec.start, 'profile': None, 'offset': 0}]
+        else:
+            return
+        self.focused = False
+        self._changed()
+
+    def press(self, key):
+        key = str(key).lower()
+        if key in ('back', '4', 'keycode_back'):
+            self.back()
+        elif key in ('home', '3', 'keycode_home'):
+            self.foreground = LAUNCHER_PACKAGE
+            self._changed()
+        elif key in ('enter', 'search', '66', 'keycode_enter'):
+            if self.focused:
+                self.focused = False
+                self._changed()
+        elif key in ('del', '67', 'keycode_del'):
+            if self.query:
+                self.query = self.query[:-1]
+                self._changed()
+
+    def type_text(self, text, replace=False):
+        if self.foreground != self.package:
+            return
+        if self.frame['screen'] != 'search' and not self.focused:
+            return
+        self.query = text if replace else self.query + text
+        self.focused = True
+        self._changed()
+
+    def scroll(self, dy):
+        """dy > 0: finger moved up, list scrolls down."""
+        frame = self.frame
+        rows = self.spec.screens[frame['screen']].get('rows')
+        if not rows or rows.get('source') != 'followers' or abs(dy) < 100:
+            return
+        count = rows.get('count', 8)
+        total = _profile_stats(frame.get('profile') or self.account)['followers']
+        step = max(1, count - 2) * (1 if dy > 0 else -1)
+        offset = max(0, min(frame['offset'] + step, max(0, total - count)))
+        if offset != frame['offset']:
+            frame['offset'] = offset
+            self._changed()
+
+    # -- app lifecycle -------------------------------------------------------
+    def app_start(self, package):
+        if self.running and self.package == package:
+            if self.foreground != package:
+                self.foreground = package
+                self._changed()
+            return
+        self.package = package
+        self.running = True
+        self.foreground = package
+        self.stack = [{'screen': self.spec.start, 'profile': None, 'offset': 0}]
+        self.query, self.focused = '', False
+        self._maybe_popup(self.spec.start)
+        self._changed()
+
+    def app_stop(self, package):
+        if self.package == package and self.running:
+            self.running = False
+            self.foreground = LAUNCHER_PACKAGE
+            self.stack = []
+            self._changed()
+
+    def open_link(self, uri):
+        m = re.search(r'username=([\w.]+)|instagram\.com/([\w.]+)', uri or '')
+        if not m or not self.package:
+            return
+        if not self.running or self.foreground != self.package:
+            self.app_start(self.package)
+        self._push('profile', profile=m.group(1) or m.group(2))
+
+
+# ---------------------------------------------------------------------------
+# Screenshot stand-in (PIL.Image-like: .size / .save())
+# ---------------------------------------------------------------------------
+
+_png_cache = {}
+
+
+def _solid_png(width, height):
+    data = _png_cache.get((width, height))
+    if data is None:
+        def chunk(kind, body):
+            return (struct.pack('>I', len(body)) + kind + body
+                    + struct.pack('>I', zlib.crc32(kind + body) & 0xffffffff))
+        row = b'\x00' + b'\xfa\xfa\xfa' * width
+        data = (b'\x89PNG\r\n\x1a\n'
+                + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+                + chunk(b'IDAT', zlib.compress(row * height, 9))
+                + chunk(b'IEND', b''))
+        _png_cache[(width, height)] = data
+    return data
+
+
+class SimImage:
+    mode = 'RGB'
+
+    def __init__(self, size):
+        self.size = tuple(size)
+        self.width, self.height = self.size
+
+    def save(self, fp, format=None, **params):
+        data = _solid_png(*self.size)
+        if hasattr(fp, 'write'):
+            fp.write(data)
+        else:
+            with open(fp, 'wb') as f:
+                f.write(data)
+
+    def convert(self, mode=None):
+        return self
+
+
+# ---------------------------------------------------------------------------
+# Selectors
+# ---------------------------------------------------------------------------
+
+_STR_KEYS = {
+    'text': ('text', 'eq'), 'textContains': ('text', 'contains'),
+    'textMatches': ('text', 'match'), 'textStartsWith': ('text', 'startswith'),
+    'description': ('content-desc', 'eq'),
+    'descriptionContains': ('content-desc', 'contains'),
+    'descriptionMatches': ('content-desc', 'match'),
+    'descriptionStartsWith': ('content-desc', 'startswith'),
+    'className': ('class', 'eq'), 'classNameMatches': ('class', 'match'),
+    'resourceId': ('resource-id', 'eq'), 'resourceIdMatches': ('resource-id', 'match'),
+    'packageName': ('package', 'eq'), 'packageNameMatches': ('package', 'match'),
+}
+_BOOL_KEYS = {
+    'clickable': 'clickable', 'enabled': 'enabled', 'selected': 'selected',
+    'checked': 'checked', 'checkable': 'checkable', 'focused': 'focused',
+    'focusable': 'focusable', 'scrollable': 'scrollable',
+    'longClickable': 'long-clickable',
+}
+
+
+def _node_matches(node, criteria):
+    a = node.attrs
+    for key, want in criteria.items():
+        if key in _STR_KEYS:
+            attr, op = _STR_KEYS[key]
+            value = a.get(attr, '')
+            if op == 'eq':
+                ok = value == want
+            elif op == 'contains':
+                ok = want in value
+            elif op == 'startswith':
+                ok = value.startswith(want)
+            else:
+                ok = re.fullmatch(want, value) is not None
+        elif key in _BOOL_KEYS:
+            ok = (a.get(_BOOL_KEYS[key]) == 'true') == bool(want)
+        elif key == 'index':
+            ok = a.get('index') == str(want)
+        else:
+            ok = True
+        if not ok:
+            return False
+    return True
+
+
+class _Exists:
+    """u2's Exists: truthy (no wait) and callable with a timeout."""
+
+    __slots__ = ('_sel',)
+
+    def __init__(self, sel):
+        self._sel = sel
+
+    def __bool__(self):
+        return self._sel._exists(0)
+
+    def __call__(self, timeout=0):
+        return self._sel._exists(timeout)
+
+
+class SimSelector:
+    """UiObject stand-in: re-resolved against the current screen per call."""
+
+    def __init__(self, device, criteria, instance=0, parent=None, relation='child'):
+        for key in criteria:
+            if key not in _STR_KEYS and key not in _BOOL_KEYS and key not in ('index', 'instance'):
+                raise ReferenceError("%s is not allowed." % key)
+        criteria = dict(criteria)
+        self._instance = criteria.pop('instance', instance)
+        self._criteria = criteria
+        self._device = device
+        self._parent = parent
+        self._relation = relation
+
+    def _all(self):
+        _, nodes = self._device._machine.render()
+        if self._parent is None:
+            scope = range(len(nodes))
+        else:
+            anchors = self._parent._all()
+            if not anchors:
+                return []
+            p = anchors[min(self._parent._instance, len(anchors) - 1)]
+            if self._relation == 'sibling':
+                parent = nodes[p].parent
+                scope = [i for i in (nodes[parent].children if parent is not None else [])
+                         if i != p]
+            else:
+                scope = range(p + 1, nodes[p].end)
+        return [i for i in scope if _node_matches(nodes[i], self._criteria)]
+
+    def _node(self):
+        found = self._all()
+        if self._instance < len(found):
+            return self._device._machine.render()[1][found[self._instance]]
+        return None
+
+    def _exists(self, timeout=0):
+        self._device._wait('selector')
+        with self._device._state:
+            found = self._node() is not None
+        if not found and timeout:
+            time.sleep(timeout)
+            with self._device._state:
+                found = self._node() is not None
+        return found
+
+    def _must(self, timeout=None):
+        """Node or UiObjectNotFoundError after waiting like must_wait()."""
+        self._device._wait('selector')
+        with self._device._state:
+            node = self._node()
+        if node is None:
+            time.sleep(WAIT_TIMEOUT if timeout is None else timeout)
+            with self._device._state:
+                node = self._node()
+            if node is None:
+                raise UiObjectNotFoundError(
+                    {'code': -32002, 'message': 'UiObjectNotFoundException',
+                     'selector': dict(self._criteria, instance=self._instance)})
+        return node
+
+    @property
+    def exists(self):
+        return _Exists(self)
+
+    def wait(self, exists=True, timeout=None):
+        timeout = WAIT_TIMEOUT if timeout is None else timeout
+        return self._exists(timeout) if exists else self.wait_gone(timeout)
+
+    def wait_gone(self, timeout=None):
+        self._device._wait('selector')
+        with self._device._state:
+            gone = self._node() is None
+        if not gone:
+            time.sleep(WAIT_TIMEOUT if timeout is None else timeout)
+            with self._device._state:
+                gone = self._node() is None
+        return gone
+
+    @property
+    def count(self):
+        self._device._wait('selector')
+        with self._device._state:
+            return len(self._all())
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            raise IndexError("negative index not supported")
+        return SimSelector(self._device, self._criteria, index, self._parent, self._relation)
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    @property
+    def info(self):
+        self._device._wait('selector')
+        with self._device._state:
+            node = self._node()
+            if node is None:
+                raise UiObjectNotFoundError(
+                    {'code': -32002, 'message': 'UiObjectNotFoundException',
+                     'selector': dict(self._criteria, instance=self._instance)})
+            return node.info()
+
+    def get_text(self, timeout=None):
+        return self._must(timeout).attrs.get('text', '')
+
+    def bounds(self):
+        return self._must().bounds
+
+    def center(self, offset=(0.5, 0.5)):
+        l, t, r, b = self._must().bounds
+        return int(l + (r - l) * offset[0]), int(t + (b - t) * offset[1])
+
+    def click(self, timeout=None, offset=None):
+        l, t, r, b = self._must(timeout).bounds
+        self._device._tap((l + r) // 2, (t + b) // 2)
+
+    def long_click(self, duration=0.5, timeout=None):
+        self.click(timeout)
+
+    def click_exists(self, timeout=0):
+        if not self._exists(timeout):
+            return False
+        self.click(0)
+        return True
+
+    def set_text(self, text, timeout=None):
+        node = self._must(timeout)
+        self._device._wait('input')
+        with self._device._state:
+            m = self._device._machine
+            if 'EditText' in node.attrs.get('class', ''):
+                m.focused = True
+                m.type_text(text or '', replace=True)
+
+    def clear_text(self, timeout=None):
+        self.set_text('', timeout)
+
+    def child(self, **criteria):
+        return SimSelector(self._device, criteria, parent=self)
+
+    def sibling(self, **criteria):
+        return SimSelector(self._device, criteria, parent=self, relation='sibling')
+
+    def __repr__(self):
+        return "<SimSelector %r instance=%d>" % (self._criteria, self._instance)
+
+
+# ---------------------------------------------------------------------------
+# Device
+# ---------------------------------------------------------------------------
+
+class SimDevice:
+    """The u2.Device surface Hydra uses, backed by a ScreenMachine."""
+
+    def __init__(self, device_serial, latency_scale=1.0, jitter=0.25, popup_rate=0.02,
+                 fixtures=FIXTURE_DIR, account=None, latency=None, seed=None):
+        self.device_serial = device_serial
+        self.serial = device_serial.replace('_', ':')
+        self.latency = dict(DEFAULT_LATENCY, **(latency or {}))
+        self.latency_scale = latency_scale
+        self.jitter = jitter
+        self._rng = random.Random(seed if seed is not None else _h('rng', device_serial))
+        spec = _load_spec(fixtures)
+        self._machine = ScreenMachine(spec, account or 'sim_account', popup_rate,
+                                      seed=_h('machine', device_serial))
+        self._state = threading.RLock()
+        self.settings = {'wait_timeout': WAIT_TIMEOUT}
+
+    @property
+    def account(self):
+        return self._machine.account
+
+    @account.setter
+    def account(self, username):
+        with self._state:
+            self._machine.account = username
+            self._machine._changed()
+
+    def _wait(self, kind, extra=0.0):
+        seconds = self.latency.get(kind, 0.1) * self.latency_scale
+        if self.jitter:
+            seconds *= max(0.2, self._rng.gauss(1.0, self.jitter))
+        time.sleep(seconds + extra)
+
+    def _tap(self, x, y):
+        self._wait('click')
+        with self._state:
+            self._machine.tap(x, y)
+
+    # -- hierarchy / screen --------------------------------------------------
+    def dump_hierarchy(self, compressed=False, pretty=False, max_depth=None):
+        self._wait('dump_hierarchy')
+        with self._state:
+            return self._machine.render()[0]
+
+    def screenshot(self, filename=None, format='pillow'):
+        self._wait('screenshot')
+        img = SimImage(self._machine.spec.window)
+        if filename:
+            img.save(filename)
+            return filename
+        return img
+
+    def window_size(self):
+        self._wait('window_size')
+        return self._machine.spec.window
+
+    @property
+    def info(self):
+        self._wait('info')
+        w, h = self._machine.spec.window
+        return {'currentPackageName': self._machine.foreground, 'displayWidth': w,
+                'displayHeight': h, 'displayRotation': 0, 'naturalOrientation': True,
+                'productName': 'hydra-sim', 'screenOn': True, 'sdkInt': 30}
+
+    @property
+    def orientation(self):
+        self._wait('info')
+        return 'natural'
+
+    def __call__(self, **criteria):
+        return SimSelector(self, criteria)
+
+    # -- input ---------------------------------------------------------------
+    def click(self, x, y):
+        self._tap(int(x), int(y))
+
+    def double_click(self, x, y, duration=0.1):
+        self._tap(int(x), int(y))
+        self._tap(int(x), int(y))
+
+    def long_click(self, x, y, duration=0.5):
+        self._wait('click', duration)
+        with self._state:
+            self._machine.tap(int(x), int(y))
+
+    def swipe(self, fx, fy, tx, ty, duration=None, steps=None):
+        self._wait('swipe', duration or 0.0)
+        w, h = self._machine.spec.window
+        # u2 accepts 0-1 fractions as screen-relative coordinates
+        fy = fy * h if isinstance(fy, float) and fy <= 1 else fy
+        ty = ty * h if isinstance(ty, float) and ty <= 1 else ty
+        with self._state:
+            self._machine.scroll(fy - ty)
+
+    def swipe_ext(self, direction, scale=0.9, box=None, **kwargs):
+        h = self._machine.spec.window[1]
+        dy = {'up': 1, 'down': -1}.get(direction, 0) * int(h * scale * 0.5)
+        self._wait('swipe')
+        with self._state:
+            self._machine.scroll(dy)
+
+    def drag(self, sx, sy, ex, ey, duration=0.5):
+        self.swipe(sx, sy, ex, ey, duration)
+
+    def press(self, key, meta=None):
+        self._wait('press')
+        with self._state:
+            self._machine.press(key)
+
+    def send_keys(self, text, clear=False):
+        self._wait('input')
+        with self._state:
+            self._machine.type_text(text, replace=clear)
+
+    def clear_text(self):
+        self._wait('input')
+        with self._state:
+            self._machine.type_text('', replace=True)
+
+    def set_input_ime(self, enable=True):
+        self._wait('shell')
+
+    def set_orientation(self, value):
+        self._wait('shell')
+
+    def freeze_rotation(self, freezed=True):
+        self._wait('shell')
+
+    def screen_on(self):
+        self._wait('shell')
+
+    def screen_off(self):
+        self._wait('shell')
+
+    def unlock(self):
+        self._wait('shell')
+
+    # -- apps ----------------------------------------------------------------
+    def app_current(self):
+        self._wait('app_current')
+        pkg = self._machine.foreground
+        return {'package': pkg,
+                'activity': ('com.android.launcher3.Launcher' if pkg == LAUNCHER_PACKAGE
+                             else 'com.instagram.mainactivity.MainActivity'),
+                'pid': _h('pid', pkg) % 30000 + 1000}
+
+    def app_start(self, package_name, activity=None, wait=False, stop=False,
+                  use_monkey=False):
+        self._wait('app_start')
+        with self._state:
+            if stop:
+                self._machine.app_stop(package_name)
+            self._machine.app_start(package_name)
+
+    def app_stop(self, package_name):
+        self._wait('app_stop')
+        with self._state:
+            self._machine.app_stop(package_name)
+
+    def app_wait(self, package_name, timeout=20.0, front=False):
+        self._wait('app_current')
+        m = self._machine
+        if m.package == package_name and m.running and (not front or m.foreground == package_name):
+            return _h('pid', package_name) % 30000 + 1000
+        time.sleep(timeout)
+        return 0
+
+    # -- shell ---------------------------------------------------------------
+    def shell(self, cmdargs, timeout=60):
+        self._wait('shell')
+        with self._state:
+            return ShellResponse(self._shell(cmdargs), 0)
+
+    def _shell(self, cmdargs):
+        if isinstance(cmdargs, str):
+            if '|' in cmdargs:
+                # text_input's base64 fallback: echo <b64> | base64 -d | xargs -0 input text
+                m = re.search(r'echo\s+(\S+)\s*\|\s*base64 -d.*input text', cmdargs)
+                if m:
+                    self._machine.type_text(base64.b64decode(m.group(1)).decode('utf-8'))
+                return ''
+            args = shlex.split(cmdargs)
+        else:
+            args = [str(a) for a in cmdargs]
+        m = self._machine
+        if args[:2] == ['input', 'text'] and len(args) > 2:
+            m.type_text(_adb_unescape(' '.join(args[2:])))
+        elif args[:2] == ['input', 'keyevent']:
+            for key in args[2:]:
+                if not key.startswith('--'):
+                    m.press(key)
+        elif args[:2] == ['input', 'tap'] and len(args) >= 4:
+            m.tap(int(float(args[2])), int(float(args[3])))
+        elif args[:2] == ['input', 'swipe'] and len(args) >= 6:
+            m.scroll(int(float(args[3])) - int(float(args[5])))
+        elif args[:2] == ['am', 'force-stop'] and len(args) > 2:
+            m.app_stop(args[2])
+        elif args[:2] == ['am', 'start'] and '-d' in args:
+            m.open_link(args[args.index('-d') + 1])
+        elif args[:1] == ['monkey'] and '-p' in args:
+            m.app_start(args[args.index('-p') + 1])
+        elif args[:1] == ['wm'] and args[1:2] == ['size']:
+            return 'Physical size: %dx%d\n' % m.spec.window
+        return ''
+
+    def __repr__(self):
+        return "<SimDevice %s>" % self.device_serial
+
+
+def _adb_unescape(text):
+    """Undo text_input._escape_for_adb() / plain `input text` quoting."""
+    return re.sub(r'\\(.)', r'\1', text.replace('%s', ' '))
+
+
+# ---------------------------------------------------------------------------
+# adb routing
+# ---------------------------------------------------------------------------
+
+_real_run = None
+
+
+def _routed_run(args, *popenargs, **kwargs):
+    """subprocess.run() that answers `adb -s <simulated serial> ...` itself."""
+    if (isinstance(args, (list, tuple)) and len(args) >= 4 and args[1] == '-s'
+            and os.path.basename(str(args[0])).lower() in ('adb', 'adb.exe')
+            and is_simulated(str(args[2]).replace(':', '_'))):
+        device = get_device(str(args[2]).replace(':', '_'))
+        rest = [str(a) for a in args[3:]]
+        out = ''
+        if rest[0] == 'shell':
+            cmd = rest[1] if len(rest) == 2 else rest[1:]
+            out = device.shell(cmd).output
+        text = kwargs.get('text') or kwargs.get('universal_newlines') or kwargs.get('encoding')
+        captured = kwargs.get('capture_output') or kwargs.get('stdout') == subprocess.PIPE
+        stdout = (out if text else out.encode('utf-8')) if captured else None
+        stderr = ('' if text else b'') if captured else None
+        return subprocess.CompletedProcess(list(args), 0, stdout, stderr)
+    return _real_run(args, *popenargs, **kwargs)
+
+
+def install_adb_router():
+    """Route adb subprocess.run() calls for simulated serials (idempotent)."""
+    global _real_run
+    with _lock:
+        if _real_run is None:
+            _real_run = subprocess.run
+            subprocess.run = _routed_run
+
+
+def uninstall_adb_router():
+    global _real_run
+    with _lock:
+        if _real_run is not None:
+            subprocess.run = _real_run
+            _real_run = None
+
+
+@contextmanager
+def adb_router():
+    """Route simulated adb calls inside the block only (unless the router
+    was already installed, which is then left in place)."""
+    with _lock:
+        installed = _real_run is None
+        install_adb_router()
+    try:
+        yield
+    finally:
+        if installed:
+            uninstall_adb_router()
+
+
+# ---------------------------------------------------------------------------
+# Fixture tooling
+# ---------------------------------------------------------------------------
+
+def import_dump(path, name, fixtures_dir=FIXTURE_DIR):
+    """Turn a recorded dump_hierarchy XML into fixture <name>.xml: the app's
+    package becomes ${package} and literal '$' is escaped. Returns the path."""
+    with open(path, encoding='utf-8') as f:
+        xml = f.read()
+    ET.fromstring(xml)  # refuse anything that is not a parseable dump
+    pkgs = re.findall(r'resource-id="([\w.]+):id/', xml)
+    pkgs = [p for p in pkgs if p not in ('android', 'com.android.systemui')]
+    xml = xml.replace('$', '$$')
+    if pkgs:
+        package = max(set(pkgs), key=pkgs.count)
+        xml = xml.replace('"%s:id/' % package, '"${package}:id/')
+        xml = xml.replace('package="%s"' % package, 'package="${package}"')
+    out = os.path.join(fixtures_dir, name + '.xml')
+    with open(out, 'w', encoding='utf-8') as f:
+        f.write(xml)
+    return out
+
+
+def check_fixtures(fixtures_dir=FIXTURE_DIR, package='com.instagram.androie'):
+    """Render every screen with an "expect" and compare IGController.detect_screen.
+    Returns [(screen, expected, detected)] for the mismatches."""
+    from automation.ig_controller import IGController
+
+    device = SimDevice('sim-check_0', latency_scale=0, jitter=0, popup_rate=0,
+                       fixtures=fixtures_dir, account='sim_check')
+    device.app_start(package)
+    ctrl = IGController(device, device.device_serial, package)
+    machine = device._machine
+    spec = machine.spec
+
+    bad = []
+    for name, screen in spec.screens.items():
+        if 'expect' not in screen:
+            continue
+        machine.stack = [{'screen': name, 'profile': 'sim_target', 'offset': 0}]
+        machine.query = 'sim_target' if screen.get('rows', {}).get('source') == 'search' else ''
+        machine._changed()
+        detected = ctrl.detect_screen(machine.render()[0]).value
+        if detected != screen['expect']:
+            bad.append((name, screen['expect'], detected))
+    return bad
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Hydra device simulator fixtures")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p = sub.add_parser('import', help="turn a recorded dump into a fixture")
+    p.add_argument('dump')
+    p.add_argument('name')
+    p.add_argument('--fixtures', default=FIXTURE_DIR)
+    p = sub.add_parser('check', help="detect_screen every fixture screen")
+    p.add_argument('--fixtures', default=FIXTURE_DIR)
+    p = sub.add_parser('render', help="print one screen's XML")
+    p.add_argument('screen')
+    p.add_argument('--fixtures', default=FIXTURE_DIR)
+    p.add_argument('--profile', default='sim_target')
+    args = parser.parse_args(argv)
+
+    if args.cmd == 'import':
+        print(import_dump(args.dump, args.name, args.fixtures))
+        return 0
+    if args.cmd == 'check':
+        bad = check_fixtures(args.fixtures)
+        for name, expected, detected in bad:
+            print("%-14s expected %-16s detected %s" % (name, expected, detected))
+        print("%d mismatch(es)" % len(bad))
+        return 1 if bad else 0
+    machine = ScreenMachine(_Spec(args.fixtures), account='sim_account')
+    machine.app_start('com.instagram.androie')
+    machine.stack = [{'screen': args.screen, 'profile': args.profile, 'offset': 0}]
+    machine.query = args.profile
+    machine._changed()
+    print(machine.render()[0])
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,284 @@
+"""
+Farm Start Coordinator
+=======================
+Cold-starting the farm used to launch every runner at once (2s apart);
+each then killed UIAutomator and ran u2.connect on its own, so 50 devices
+hit adb and the Wi-Fi at the same moment and many burned their retries.
+Now a start goes through three phases:
+
+    1. warm-up   — connect every device from here, at most `concurrency`
+                   at a time, each bounded by connect_timeout, the whole
+                   phase by `deadline`:
+                       adb connect (network serials) -> adb get-state
+                       -> DeviceConnection.connect(max_attempts=1)
+    2. launch    — start the runners, ready devices first (fastest
+                   first), with a jittered gap: delay + uniform(0, jitter)
+    3. handoff   — a runner finds its device already connected:
+                   in-process (farm_orchestrator) it is the same
+                   DeviceConnection; a runner process finds
+                   runtime/ready/<serial>.json and attaches to the
+                   running UIAutomator server (DeviceConnection.attach)
+                   instead of killing and restarting it
+
+    from automation import farm_start
+    report = farm_start.start_farm(serials, launch=_launch_device)
+    report = farm_start.warm_up(serials)          # phase 1 only
+
+Devices that fail the warm-up are still launched, last; their runner
+connects on its own as before. The readiness report (per device state,
+seconds, error; totals) is returned and kept in runtime/farm_start.json,
+rewritten as the start progresses, for the dashboard, which runs the start
+in the background and polls GET /api/bot/launch-report.
+"""
+
+import json
+import logging
+import os
+import random
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+log = logging.getLogger(__name__)
+
+FARM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+READY_DIR = os.path.join(FARM_DIR, 'runtime', 'ready')
+REPORT_PATH = os.path.join(FARM_DIR, 'runtime', 'farm_start.json')
+
+WARM_CONCURRENCY = 6
+CONNECT_TIMEOUT = 30
+WARM_DEADLINE = 300
+LAUNCH_DELAY = 2.0
+LAUNCH_JITTER = 1.0
+# A handoff record older than this is ignored (the runner connects itself)
+READY_MAX_AGE = 300
+
+_NETWORK_SERIAL = re.compile(r'^\d{1,3}(\.\d{1,3}){3}:\d+$')
+
+
+def _db_serial(serial):
+    return str(serial).replace(':', '_')
+
+
+def _ready_path(serial):
+    safe = ''.join(c if c.isalnum() or c in '._-' else '_' for c in _db_serial(serial))
+    return os.path.join(READY_DIR, safe + '.json')
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp.%d' % os.getpid()
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def stagger_delay(delay=LAUNCH_DELAY, jitter=LAUNCH_JITTER):
+    """Gap before the next launch."""
+    return max(0.0, delay) + (random.uniform(0, jitter) if jitter > 0 else 0.0)
+
+
+# ---------------------------------------------------------------------------
+# Handoff
+# ---------------------------------------------------------------------------
+
+def mark_ready(serial, connect_seconds=None):
+    _write_json(_ready_path(serial), {'device_serial': _db_serial(serial),
+                                      'ready_at': time.time(), 'pid': os.getpid(),
+                                      'connect_seconds': connect_seconds})
+
+
+def take_ready(serial, max_age=READY_MAX_AGE):
+    """Consume the warm-up handoff record of `serial`; True if it was
+    fresh (its UIAutomator server was up moments ago)."""
+    path = _ready_path(serial)
+    try:
+        with open(path, encoding='utf-8') as f:
+            info = json.load(f)
+        os.remove(path)
+    except (OSError, ValueError):
+        return False
+    return time.time() - info.get('ready_at', 0) < max_age
+
+
+# ---------------------------------------------------------------------------
+# Phase 1: warm-up
+# ---------------------------------------------------------------------------
+
+def _adb(args, timeout=10):
+    r = subprocess.run(['adb'] + args, capture_output=True, text=True, timeout=timeout)
+    return (r.stdout + r.stderr).strip()
+
+
+def warm_device(serial, connect_timeout=CONNECT_TIMEOUT, handoff=True, cancel=None):
+    """Connect one device; returns its report entry. Once `cancel` (a
+    threading.Event) is set the device is left alone from the next step on
+    and no handoff record is written — its runner connects by itself."""
+    from automation.device_connection import get_connection, is_simulated
+    db_serial = _db_serial(serial)
+    adb_serial = db_serial.replace('_', ':')
+    started = time.time()
+    entry = {'serial': db_serial, 'state': 'failed', 'seconds': None, 'error': None}
+
+    def cancelled():
+        if cancel is not None and cancel.is_set():
+            entry.update(state='timeout', error='warm-up cancelled')
+            return True
+        return False
+
+    try:
+        if cancelled():
+            return entry
+        if not is_simulated(db_serial):
+            if _NETWORK_SERIAL.match(adb_serial):
+                _adb(['connect', adb_serial])
+            state = _adb(['-s', adb_serial, 'get-state'], timeout=5)
+            if state != 'device':
+                entry.update(state='offline', error=state[:200] or 'no adb state')
+                return entry
+        if cancelled():
+            return entry
+        conn = get_connection(db_serial)
+        if conn.status == conn.CONNECTED and conn.device is not None:
+            entry['state'] = 'ready'
+            entry['reused'] = True
+        elif conn.connect(timeout=connect_timeout, max_attempts=1, cancel=cancel):
+            entry['state'] = 'ready'
+        elif not cancelled():
+            entry['error'] = conn.error_message or 'connect failed'
+    except Exception as e:
+        entry['error'] = str(e)[:200]
+    finally:
+        entry['seconds'] = round(time.time() - started, 1)
+    if entry['state'] == 'ready' and handoff and not (cancel is not None and cancel.is_set()):
+        mark_ready(db_serial, entry['seconds'])
+    return entry
+
+
+def warm_up(serials, concurrency=WARM_CONCURRENCY, connect_timeout=CONNECT_TIMEOUT,
+            deadline=WARM_DEADLINE, handoff=True, save=True):
+    """Connect `serials`, at most `concurrency` at once, within `deadline`
+    seconds overall. Devices not done by then are reported as 'timeout'; the
+    warm-up of those still in flight is cancelled (they stop at their next
+    step and write no handoff record)."""
+    started = time.time()
+    serials = [_db_serial(s) for s in serials]
+    done_order = []
+    order_lock = threading.Lock()
+    cancel = threading.Event()
+
+    def run(serial):
+        entry = warm_device(serial, connect_timeout, handoff, cancel)
+        with order_lock:
+            done_order.append(serial)
+        return entry
+
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency),
+                              thread_name_prefix='farm-warmup')
+    futures = {s: pool.submit(run, s) for s in serials}
+    wait(futures.values(), timeout=deadline)
+    cancel.set()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    entries = {}
+    for s, fut in futures.items():
+        if fut.done() and not fut.cancelled():
+            entries[s] = fut.result()
+        else:
+            entries[s] = {'serial': s, 'state': 'timeout', 'seconds': None,
+                          'error': f'not connected within {deadline}s'}
+    rank = {s: i for i, s in enumerate(done_order)}
+    devices = sorted(entries.values(),
+                     key=lambda e: (e['state'] != 'ready', rank.get(e['serial'], len(rank))))
+    report = {
+        'phase': 'done',
+        'started_at': started,
+        'warmup_seconds': round(time.time() - started, 1),
+        'concurrency': concurrency,
+        'total': len(devices),
+        'ready': sum(1 for e in devices if e['state'] == 'ready'),
+        'devices': devices,
+    }
+    report['not_ready'] = report['total'] - report['ready']
+    if save:
+        save_report(report)
+    return report
+
+
+# ---------------------------------------------------------------------------
+# Phase 2: staggered launch
+# ---------------------------------------------------------------------------
+
+def start_farm(serials, launch, warmup=True, concurrency=WARM_CONCURRENCY,
+               connect_timeout=CONNECT_TIMEOUT, deadline=WARM_DEADLINE,
+               delay=LAUNCH_DELAY, jitter=LAUNCH_JITTER, on_warm=None):
+    """Warm up `serials`, then launch(serial) each — ready devices first —
+    with stagger_delay() between launches. launch returns truthy or a
+    (success, info) tuple, info a dict with 'error' or a message;
+    on_warm(report) is called between the phases.
+    Returns the report with per-device 'launched'.
+
+    The saved report follows the start while it runs — its 'phase' is
+    'warmup', then 'launching' (rewritten after each launch), then 'done' —
+    so a caller that runs this in the background can poll last_report()."""
+    save_report({'phase': 'warmup', 'started_at': time.time(), 'total': len(serials),
+                 'devices': [{'serial': _db_serial(s), 'state': 'pending', 'seconds': None,
+                              'error': None} for s in serials]})
+    if warmup:
+        report = warm_up(serials, concurrency, connect_timeout, deadline, save=False)
+    else:
+        report = {'started_at': time.time(), 'warmup_seconds': 0.0, 'concurrency': 0,
+                  'total': len(serials), 'ready': 0, 'not_ready': len(serials),
+                  'devices': [{'serial': _db_serial(s), 'state': 'skipped',
+                               'seconds': None, 'error': None} for s in serials]}
+    report['phase'] = 'launching'
+    save_report(report)
+    if on_warm is not None:
+        on_warm(report)
+    launch_started = time.time()
+    for i, entry in enumerate(report['devices']):
+        try:
+            result = launch(entry['serial'])
+            ok, info = result if isinstance(result, tuple) else (bool(result), None)
+        except Exception as e:
+            ok, info = False, {'error': str(e)}
+        entry['launched'] = ok
+        if not ok and info:
+            entry['launch_error'] = (info.get('error', 'unknown') if isinstance(info, dict)
+                                     else str(info))
+        save_report(report)
+        if i < len(report['devices']) - 1:
+            time.sleep(stagger_delay(delay, jitter))
+    report['launch_seconds'] = round(time.time() - launch_started, 1)
+    report['launched'] = sum(1 for e in report['devices'] if e.get('launched'))
+    report['phase'] = 'done'
+    save_report(report)
+    return report
+
+
+def save_report(report):
+    try:
+        _write_json(REPORT_PATH, report)
+    except OSError as e:
+        log.debug("farm start report not saved: %s", e)
+
+
+def last_report():
+    try:
+        with open(REPORT_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def format_report(report):
+    """Text table of a readiness report (launch_farm.py prints it)."""
+    lines = [f"Warm-up: {report['ready']}/{report['total']} ready in "
+             f"{report['warmup_seconds']:.0f}s (concurrency {report['concurrency']})"]
+    for e in report['devices']:
+        secs = '' if e['seconds'] is None else f"{e['seconds']:.1f}s"
+        err = f"  {e['error']}" if e.get('error') else ''
+        lines.append(f"  {e['serial']:<24} {e['state']:<8} {secs:>7}{err}")
+    return '\n'.join(lines)
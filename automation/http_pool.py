@@ -0,0 +1,460 @@
+"""
+Pooled HTTP Transport
+======================
+Keep-alive, connection-pooled HTTP client shared by the dashboard chat
+(`dashboard/llm_provider.py`) and the AI executor (`automation/ai_executor/llm.py`).
+
+urllib.request opens a fresh TCP + TLS connection for every call. A multi-round
+tool conversation makes 3-6 calls per chat turn, so most of the wall-clock was
+handshakes. This module keeps idle `http.client` connections per host and
+reuses them.
+
+Features:
+    - Keep-alive pool per (scheme, host, port), idle connections reused LIFO
+    - Per-host concurrency limit (semaphore) so one slow provider can't
+      starve the others
+    - Connect/read timeouts
+    - A request whose reused keep-alive socket turns out stale (the server
+      closed it while idle) is re-sent on a fresh connection; 429/502/
+      503/504 are retried with exponential backoff. Nothing else is retried:
+      a timeout or reset on a fresh connection may come after the server
+      started a non-idempotent POST (a billed LLM generation)
+    - Latency metrics per host: time-to-headers and total response time
+
+Usage:
+    from automation.http_pool import get_pool
+    data = get_pool().post_json(url, headers, body, timeout=60)
+    for line in get_pool().post_stream(url, headers, body, timeout=180):
+        ...
+
+Stub server (local testing without a real provider):
+    python -m automation.http_pool --stub 8799
+    # then point a provider's base_url at http://127.0.0.1:8799/v1
+"""
+
+import http.client
+import json
+import logging
+import random
+import ssl
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_PER_HOST = 4       # concurrent requests per host
+DEFAULT_MAX_IDLE = 4           # idle keep-alive connections kept per host
+DEFAULT_IDLE_TTL = 60          # seconds before an idle connection is dropped
+DEFAULT_RETRIES = 2
+RETRY_STATUSES = {429, 502, 503, 504}
+
+# How a keep-alive socket the server closed while it sat idle fails on its
+# next use, before any response byte arrives. Only on a *reused* connection
+# does that mean the server never saw the request; timeouts are not here.
+_STALE_SOCKET_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    ConnectionAbortedError,
+    BrokenPipeError,
+)
+
+
+class HTTPStatusError(RuntimeError):
+    """Non-2xx response. Message matches the old `HTTP <code>: <body>` format."""
+
+    def __init__(self, code, body='', reason=''):
+        self.code = code
+        self.body = body
+        self.reason = reason
+        super().__init__(f"HTTP {code}: {body or reason}")
+
+
+class _HostStats:
+    """Latency/volume counters for one host."""
+
+    __slots__ = ('requests', 'errors', 'retries', 'reused', 'opened',
+                 'ttfb', 'total')
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.reused = 0
+        self.opened = 0
+        self.ttfb = deque(maxlen=200)    # seconds until response headers
+        self.total = deque(maxlen=200)   # seconds until body fully read
+
+    def to_dict(self):
+        def _summary(samples):
+            if not samples:
+                return {'count': 0, 'avg_ms': None, 'p50_ms': None, 'p95_ms': None}
+            s = sorted(samples)
+            return {
+                'count': len(s),
+                'avg_ms': round(sum(s) / len(s) * 1000, 1),
+                'p50_ms': round(s[len(s) // 2] * 1000, 1),
+                'p95_ms': round(s[min(len(s) - 1, int(len(s) * 0.95))] * 1000, 1),
+            }
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'retries': self.retries,
+            'connections_opened': self.opened,
+            'connections_reused': self.reused,
+            'request_latency': _summary(self.ttfb),
+            'response_latency': _summary(self.total),
+        }
+
+
+class HTTPPool:
+    """Thread-safe keep-alive connection pool keyed by (scheme, host, port)."""
+
+    def __init__(self, max_per_host=DEFAULT_MAX_PER_HOST,
+                 max_idle=DEFAULT_MAX_IDLE, idle_ttl=DEFAULT_IDLE_TTL,
+                 retries=DEFAULT_RETRIES, backoff=0.5):
+        self.max_per_host = max_per_host
+        self.max_idle = max_idle
+        self.idle_ttl = idle_ttl
+        self.retries = retries
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._idle = {}        # key -> [(conn, released_at), ...]
+        self._sems = {}        # key -> BoundedSemaphore
+        self._stats = {}       # key -> _HostStats
+        self._ssl_ctx = ssl.create_default_context()
+
+    # ------------------------------------------------------------------
+    #  Connection management
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _key(parts):
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        return (parts.scheme, parts.hostname, port)
+
+    def _host_state(self, key):
+        with self._lock:
+            sem = self._sems.get(key)
+            if sem is None:
+                sem = self._sems[key] = threading.BoundedSemaphore(self.max_per_host)
+                self._stats[key] = _HostStats()
+            return sem, self._stats[key]
+
+    def _acquire_conn(self, key, timeout, stats):
+        """Pop a live idle connection or open a new one."""
+        now = time.time()
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                conn, released_at = idle.pop()
+                if now - released_at <= self.idle_ttl:
+                    conn.timeout = timeout
+                    if conn.sock is not None:
+                        conn.sock.settimeout(timeout)
+                    stats.reused += 1
+                    return conn, True
+                conn.close()
+        scheme, host, port = key
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(host, port, timeout=timeout,
+                                               context=self._ssl_ctx)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        stats.opened += 1
+        return conn, False
+
+    def _release_conn(self, key, conn, reusable):
+        if not reusable:
+            conn.close()
+            return
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) >= self.max_idle:
+                conn.close()
+                return
+            idle.append((conn, time.time()))
+
+    def close(self):
+        """Close every idle connection."""
+        with self._lock:
+            for conns in self._idle.values():
+                for conn, _ in conns:
+                    conn.close()
+            self._idle.clear()
+
+    # ------------------------------------------------------------------
+    #  Requests
+    # ------------------------------------------------------------------
+
+    def _open(self, method, url, headers, body, timeout, stats, key):
+        """Send the request with retries. Returns (conn, response, started_at)."""
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        hdrs = {'Connection': 'keep-alive'}
+        hdrs.update(headers or {})
+
+        attempt = 0
+        while True:
+            attempt += 1
+            conn, reused = self._acquire_conn(key, timeout, stats)
+            started = time.time()
+            try:
+                conn.request(method, path, body=body, headers=hdrs)
+                resp = conn.getresponse()
+            except _STALE_SOCKET_ERRORS:
+                conn.close()
+                # A reused socket the server already closed is not a real
+                # failure — retry at once without burning an attempt. Every
+                # pass pops an idle connection, so this ends on a fresh one.
+                if reused:
+                    attempt -= 1
+                    stats.retries += 1
+                    continue
+                stats.errors += 1
+                raise
+            except Exception:
+                conn.close()
+                stats.errors += 1
+                raise
+
+            stats.ttfb.append(time.time() - started)
+            if resp.status in RETRY_STATUSES and attempt <= self.retries:
+                retry_after = resp.getheader('Retry-After')
+                resp.read()
+                self._release_conn(key, conn, not resp.will_close)
+                stats.retries += 1
+                self._sleep_backoff(attempt, retry_after)
+                continue
+            if resp.status >= 400:
+                text = resp.read().decode('utf-8', errors='replace')
+                self._release_conn(key, conn, not resp.will_close)
+                stats.errors += 1
+                stats.total.append(time.time() - started)
+                raise HTTPStatusError(resp.status, text, resp.reason)
+            return conn, resp, started
+
+    def _sleep_backoff(self, attempt, retry_after=None):
+        delay = self.backoff * (2 ** (attempt - 1))
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        time.sleep(min(delay, 30) * random.uniform(0.8, 1.2))
+
+    def request(self, method, url, headers=None, body=None, timeout=60):
+        """Perform a request and return (status, headers, body_bytes)."""
+        parts = urlsplit(url)
+        key = self._key(parts)
+        sem, stats = self._host_state(key)
+        with sem:
+            stats.requests += 1
+            conn, resp, started = self._open(method, url, headers, body,
+                                             timeout, stats, key)
+            try:
+                data = resp.read()
+            except Exception:
+                conn.close()
+                stats.errors += 1
+                raise
+            stats.total.append(time.time() - started)
+            self._release_conn(key, conn, not resp.will_close)
+            return resp.status, dict(resp.getheaders()), data
+
+    def post_json(self, url, headers, body, timeout=60):
+        """POST JSON, return parsed JSON response."""
+        data = json.dumps(body).encode('utf-8')
+        _, _, raw = self.request('POST', url, headers, data, timeout)
+        return json.loads(raw.decode('utf-8', errors='replace'))
+
+    def post_stream(self, url, headers, body, timeout=120):
+        """POST JSON, yield each non-empty line of a streaming (SSE) response.
+
+        The connection is returned to the pool only when the stream is read
+        to the end; an abandoned generator closes its socket instead.
+        """
+        data = json.dumps(body).encode('utf-8')
+        parts = urlsplit(url)
+        key = self._key(parts)
+        sem, stats = self._host_state(key)
+        with sem:
+            stats.requests += 1
+            conn, resp, started = self._open('POST', url, headers, data,
+                                             timeout, stats, key)
+            finished = False
+            try:
+                while True:
+                    raw = resp.readline()
+                    if not raw:
+                        break
+                    line = raw.decode('utf-8', errors='replace').rstrip('\n\r')
+                    if line:
+                        yield line
+                # readline() at a Content-Length boundary leaves the response
+                # open; a final read() marks it complete so the socket can
+                # carry the next request.
+                resp.read()
+                finished = True
+            finally:
+                stats.total.append(time.time() - started)
+                if not finished:
+                    stats.errors += 1
+                self._release_conn(key, conn, finished and not resp.will_close)
+
+    # ------------------------------------------------------------------
+    #  Metrics
+    # ------------------------------------------------------------------
+
+    def stats(self):
+        """Per-host counters and latency summaries."""
+        with self._lock:
+            out = {}
+            for (scheme, host, port), st in self._stats.items():
+                entry = st.to_dict()
+                entry['idle_connections'] = len(self._idle.get((scheme, host, port), []))
+                out[f"{scheme}://{host}:{port}"] = entry
+            return out
+
+
+# ---------------------------------------------------------------------------
+#  Process-wide pool
+# ---------------------------------------------------------------------------
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the shared HTTPPool (created on first use)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HTTPPool()
+    return _pool
+
+
+def get_stats():
+    """Latency metrics of the shared pool (empty before first request)."""
+    return _pool.stats() if _pool is not None else {}
+
+
+# ---------------------------------------------------------------------------
+#  Local stub server
+# ---------------------------------------------------------------------------
+
+def serve_stub(port=8799, host='127.0.0.1', latency=0.0):
+    """
+    Minimal OpenAI/Anthropic-compatible stub with HTTP/1.1 keep-alive.
+
+    POST */chat/completions  -> echoes the last user message (JSON or SSE
+                                when body has "stream": true)
+    POST */messages          -> same, Anthropic wire format
+    Returns the ThreadingHTTPServer (call .shutdown() to stop); its
+    `requests_received` counts POSTs that reached a handler.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def log_message(self, fmt, *args):
+            log.debug("stub: " + fmt, *args)
+
+        def _send(self, status, payload, content_type='application/json'):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            with counter_lock:
+                server.requests_received += 1
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                req = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                return self._send(400, b'{"error":"bad json"}')
+            if latency:
+                time.sleep(latency)
+            last = ''
+            for m in reversed(req.get('messages') or []):
+                if m.get('role') == 'user' and isinstance(m.get('content'), str):
+                    last = m['content']
+                    break
+            reply = f"echo: {last}"
+            anthropic = self.path.endswith('/messages')
+
+            if not req.get('stream'):
+                if anthropic:
+                    obj = {'content': [{'type': 'text', 'text': reply}],
+                           'stop_reason': 'end_turn'}
+                else:
+                    obj = {'choices': [{'message': {'role': 'assistant',
+                                                    'content': reply},
+                                        'finish_reason': 'stop'}]}
+                return self._send(200, json.dumps(obj).encode('utf-8'))
+
+            if anthropic:
+                events = [
+                    {'type': 'content_block_start',
+                     'content_block': {'type': 'text', 'text': ''}},
+                    {'type': 'content_block_delta',
+                     'delta': {'type': 'text_delta', 'text': reply}},
+                    {'type': 'content_block_stop'},
+                    {'type': 'message_delta', 'delta': {'stop_reason': 'end_turn'}},
+                ]
+                lines = [f"data: {json.dumps(e)}" for e in events]
+            else:
+                lines = [f"data: {json.dumps({'choices': [{'delta': {'content': reply}}]})}",
+                         f"data: {json.dumps({'choices': [{'delta': {}, 'finish_reason': 'stop'}]})}",
+                         "data: [DONE]"]
+            self._send(200, ('\n\n'.join(lines) + '\n\n').encode('utf-8'),
+                       'text/event-stream')
+
+    counter_lock = threading.Lock()
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.requests_received = 0
+    threading.Thread(target=server.serve_forever, daemon=True,
+                     name=f"http-stub-{port}").start()
+    return server
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Pooled HTTP transport tools')
+    parser.add_argument('--stub', type=int, metavar='PORT',
+                        help='Run the local LLM stub server on PORT')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Artificial per-request latency for the stub (s)')
+    parser.add_argument('--bench', type=int, metavar='N', default=0,
+                        help='Fire N pooled requests at the stub and print stats')
+    args = parser.parse_args()
+
+    if args.stub:
+        srv = serve_stub(args.stub, latency=args.latency)
+        url = f"http://127.0.0.1:{args.stub}/v1/chat/completions"
+        print(f"Stub LLM server on http://127.0.0.1:{args.stub}/v1")
+        if args.bench:
+            body = {'model': 'stub', 'messages': [{'role': 'user', 'content': 'ping'}]}
+            t0 = time.time()
+            for _ in range(args.bench):
+                get_pool().post_json(url, {'Content-Type': 'application/json'}, body)
+            print(f"{args.bench} requests in {time.time() - t0:.2f}s")
+            print(json.dumps(get_stats(), indent=2))
+            srv.shutdown()
+        else:
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                srv.shutdown()
@@ -0,0 +1,342 @@
+"""
+Device Log Reader
+==================
+Seekable reader for the per-device runner logs (logs/<serial>_<date>.log,
+written by run_device.py / farm_orchestrator.py):
+
+    from automation import log_reader
+    path = log_reader.log_path('10.1.11.4_5555')              # today
+    lines, offset = log_reader.tail(path, 200, grep='error')
+    lines, offset, reset = log_reader.read_since(path, offset)  # only what's new
+    offset = log_reader.seek_time(path, '2026-10-19 14:30')    # jump to a time
+    lines, end = log_reader.read_from(path, offset, 200)
+
+tail() reads 64 KiB blocks backwards from EOF until it has N (matching)
+lines, so a poll costs the same on a 5 MB file as on a 5 KB one.
+Offsets are byte positions just past the last complete line returned; a
+client polls read_since(path, offset) and gets only appended lines. A
+line still being written is never returned half-finished. If the file
+shrank (replaced / truncated), read_since() falls back to a tail and says
+so with reset=True.
+
+seek_time() uses a sparse index: every INDEX_EVERY bytes, the first
+timestamped line's (time, offset). The index is built once per file and
+then only extended over appended bytes, so it stays in memory (per
+process, LRU of INDEX_CACHE files).
+
+Previous days may be gzip-compressed (<serial>_<date>.log.gz, see
+compress_old_logs / `python -m automation.log_reader compress`). log_path()
+finds either form, and every function reads both. Offsets into a .gz are
+positions in the decompressed text. Those files never change, so seeking
+in them reads forward from the start once.
+"""
+
+import bisect
+import datetime
+import glob
+import gzip
+import os
+import re
+import shutil
+import struct
+import sys
+import threading
+from collections import OrderedDict, deque
+
+FARM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOG_DIR = os.path.join(FARM_DIR, 'logs')
+
+BLOCK = 64 * 1024
+INDEX_EVERY = 64 * 1024
+INDEX_CACHE = 256
+MAX_READ_BYTES = 1024 * 1024
+
+_TS_LEN = 19                                  # "YYYY-MM-DD HH:MM:SS"
+_TS_RE = re.compile(rb'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}')
+_FILE_RE = re.compile(r'^(?P<serial>.+)_(?P<date>\d{4}-\d{2}-\d{2})\.log(?P<gz>\.gz)?$')
+
+
+# ---------------------------------------------------------------------------
+# Locating files
+# ---------------------------------------------------------------------------
+
+def log_path(serial, date=None, log_dir=LOG_DIR):
+    """Existing log file of `serial` (DB format) for `date` (YYYY-MM-DD,
+    default today) — plain or .gz — or None."""
+    date = date or datetime.date.today().strftime('%Y-%m-%d')
+    base = os.path.join(log_dir, f'{serial}_{date}.log')
+    for path in (base, base + '.gz'):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def available_logs(serial, log_dir=LOG_DIR):
+    """[{date, path, size, compressed}] for `serial`, newest day first."""
+    out = []
+    for path in glob.glob(os.path.join(glob.escape(log_dir), glob.escape(serial) + '_*.log*')):
+        m = _FILE_RE.match(os.path.basename(path))
+        if not m or m.group('serial') != serial:
+            continue
+        out.append({'date': m.group('date'), 'path': path,
+                    'size': os.path.getsize(path), 'compressed': bool(m.group('gz'))})
+    out.sort(key=lambda d: (d['date'], not d['compressed']), reverse=True)
+    return out
+
+
+def _is_gz(path):
+    return path.endswith('.gz')
+
+
+def _open(path):
+    return gzip.open(path, 'rb') if _is_gz(path) else open(path, 'rb')
+
+
+def text_size(path):
+    """Size of the log text: file size, or the decompressed size of a .gz
+    (from the gzip trailer — exact below 4 GiB)."""
+    if not _is_gz(path):
+        return os.path.getsize(path)
+    with open(path, 'rb') as f:
+        f.seek(-4, os.SEEK_END)
+        return struct.unpack('<I', f.read(4))[0]
+
+
+def _decode(raw):
+    return raw.rstrip(b'\r').decode('utf-8', errors='replace')
+
+
+def _matcher(grep):
+    if not grep:
+        return None
+    needle = grep.lower()
+    return lambda line: needle in line.lower()
+
+
+# ---------------------------------------------------------------------------
+# Tail / incremental reads
+# ---------------------------------------------------------------------------
+
+def tail(path, lines=100, grep=None):
+    """Last `lines` complete lines (containing `grep`, case-insensitive) and
+    the offset just past the last complete line."""
+    match = _matcher(grep)
+    if _is_gz(path):
+        return _tail_stream(path, lines, match)
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        pos, carry, out, end = size, b'', [], None
+        while pos > 0 and len(out) < lines:
+            step = min(BLOCK, pos)
+            pos -= step
+            f.seek(pos)
+            parts = (f.read(step) + carry).split(b'\n')
+            carry = parts.pop(0)            # may start before `pos`
+            if end is None:
+                if not parts:
+                    continue                # still inside the unterminated last line
+                end = size - len(parts.pop())
+            for raw in reversed(parts):
+                line = _decode(raw)
+                if match is None or match(line):
+                    out.append(line)
+                    if len(out) >= lines:
+                        break
+        if pos == 0 and end is not None and len(out) < lines:
+            line = _decode(carry)           # the file's first line
+            if match is None or match(line):
+                out.append(line)
+    out.reverse()
+    return out, end or 0
+
+
+def _tail_stream(path, lines, match):
+    out = deque(maxlen=lines)
+    end = 0
+    with _open(path) as f:
+        for raw in f:
+            if not raw.endswith(b'\n'):
+                break
+            end += len(raw)
+            line = _decode(raw[:-1])
+            if match is None or match(line):
+                out.append(line)
+    return list(out), end
+
+
+def read_from(path, offset, lines=200, grep=None, max_bytes=MAX_READ_BYTES):
+    """Up to `lines` complete lines starting at `offset` (read at most
+    `max_bytes`); returns (lines, offset after the last one read)."""
+    match = _matcher(grep)
+    out = []
+    with _open(path) as f:
+        f.seek(offset)
+        data = f.read(max_bytes)
+    pos = 0
+    while len(out) < lines:
+        nl = data.find(b'\n', pos)
+        if nl < 0:
+            break
+        line = _decode(data[pos:nl])
+        pos = nl + 1
+        if match is None or match(line):
+            out.append(line)
+    if pos == 0 and len(data) == max_bytes:
+        # one line longer than max_bytes: hand it over in pieces
+        out.append(_decode(data))
+        pos = len(data)
+    return out, offset + pos
+
+
+def read_since(path, offset, lines=1000, grep=None):
+    """Lines appended after `offset`: (lines, new offset, reset). reset=True
+    when the file is now shorter than `offset` — it was replaced, so the
+    result is a fresh tail instead."""
+    if offset > text_size(path):
+        out, end = tail(path, lines, grep)
+        return out, end, True
+    out, end = read_from(path, offset, lines, grep)
+    return out, end, False
+
+
+# ---------------------------------------------------------------------------
+# Sparse time index
+# ---------------------------------------------------------------------------
+
+class _TimeIndex:
+    """Sorted [(timestamp, offset)] sample, one per INDEX_EVERY bytes."""
+
+    def __init__(self, stamp):
+        self.stamp = stamp          # (size, mtime) when built/extended
+        self.times = []
+        self.offsets = []
+        self.upto = 0               # bytes indexed (always at a line start)
+        self.next_mark = 0
+
+    def extend(self, path):
+        with _open(path) as f:
+            f.seek(self.upto)
+            pos = self.upto
+            for raw in f:
+                if not raw.endswith(b'\n'):
+                    break
+                if pos >= self.next_mark and _TS_RE.match(raw):
+                    ts = raw[:_TS_LEN].decode('ascii')
+                    if not self.times or ts >= self.times[-1]:
+                        self.times.append(ts)
+                        self.offsets.append(pos)
+                        self.next_mark = pos + INDEX_EVERY
+                pos += len(raw)
+            self.upto = pos
+
+
+_indexes = OrderedDict()            # path -> _TimeIndex
+_index_lock = threading.Lock()
+
+
+def _time_index(path):
+    st = os.stat(path)
+    with _index_lock:
+        idx = _indexes.pop(path, None)
+        if idx is None or st.st_size < idx.stamp[0] or (
+                _is_gz(path) and st.st_mtime != idx.stamp[1]):
+            idx = _TimeIndex((st.st_size, st.st_mtime))
+        if (st.st_size, st.st_mtime) != idx.stamp or idx.upto == 0:
+            idx.extend(path)
+            idx.stamp = (st.st_size, st.st_mtime)
+        _indexes[path] = idx
+        while len(_indexes) > INDEX_CACHE:
+            _indexes.popitem(last=False)
+        return idx
+
+
+def _normalize_time(path, when):
+    """'HH:MM[:SS]' is taken on the file's date; full timestamps as given."""
+    when = str(when).strip().replace('T', ' ')
+    if len(when) <= 8 and ':' in when:
+        m = _FILE_RE.match(os.path.basename(path))
+        day = m.group('date') if m else datetime.date.today().strftime('%Y-%m-%d')
+        when = f'{day} {when}'
+    return when
+
+
+def seek_time(path, when):
+    """Offset of the first line stamped at or after `when` (end of the
+    complete lines if none is)."""
+    when = _normalize_time(path, when)
+    idx = _time_index(path)
+    i = bisect.bisect_left(idx.times, when)
+    start = idx.offsets[i - 1] if i > 0 else 0
+    with _open(path) as f:
+        f.seek(start)
+        pos = start
+        for raw in f:
+            if not raw.endswith(b'\n'):
+                break
+            if _TS_RE.match(raw) and raw[:_TS_LEN].decode('ascii') >= when:
+                return pos
+            pos += len(raw)
+    return pos
+
+
+# ---------------------------------------------------------------------------
+# Compressing previous days
+# ---------------------------------------------------------------------------
+
+def compress_old_logs(keep_days=2, log_dir=LOG_DIR, dry_run=False):
+    """gzip <serial>_<date>.log files older than `keep_days` days (today = 0).
+    Returns the paths compressed. A day still being appended to by a long
+    running runner is today's or yesterday's, hence the default of 2."""
+    cutoff = (datetime.date.today() - datetime.timedelta(days=keep_days)).strftime('%Y-%m-%d')
+    done = []
+    for path in sorted(glob.glob(os.path.join(glob.escape(log_dir), '*_*.log'))):
+        m = _FILE_RE.match(os.path.basename(path))
+        if not m or m.group('date') >= cutoff or os.path.exists(path + '.gz'):
+            continue
+        if not dry_run:
+            tmp = path + '.gz.tmp'
+            with open(path, 'rb') as src, gzip.open(tmp, 'wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, BLOCK)
+            os.replace(tmp, path + '.gz')
+            os.remove(path)
+        done.append(path)
+    return done
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Per-device log reader')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p = sub.add_parser('tail', help='last lines of a device log')
+    p.add_argument('serial')
+    p.add_argument('--date')
+    p.add_argument('-n', '--lines', type=int, default=50)
+    p.add_argument('--grep')
+    p.add_argument('--at', help='start at this time (HH:MM or full timestamp) instead')
+    p = sub.add_parser('compress', help='gzip log files of previous days')
+    p.add_argument('--keep-days', type=int, default=2)
+    p.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args(argv)
+
+    if args.cmd == 'compress':
+        for path in compress_old_logs(args.keep_days, dry_run=args.dry_run):
+            print(('would compress ' if args.dry_run else 'compressed ') + path)
+        return 0
+
+    path = log_path(args.serial.replace(':', '_'), args.date)
+    if path is None:
+        print('no log file', file=sys.stderr)
+        return 1
+    if args.at:
+        lines, _ = read_from(path, seek_time(path, args.at), args.lines, args.grep)
+    else:
+        lines, _ = tail(path, args.lines, args.grep)
+    for line in lines:
+        print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,384 @@
+"""
+Live Metrics Registry
+======================
+Lightweight counters, gauges and latency histograms for device runners, with
+a memory-mapped publication file the dashboard aggregates without touching
+SQLite.
+
+Each runner process (run_device.py) records into the process-wide registry:
+
+    from automation.metrics import get_registry
+    m = get_registry()
+    m.inc('actions_total', action='follow')
+    m.set_gauge('current_account', 1, username='bob')
+    with m.timer('rpc_seconds', method='dump_hierarchy'):
+        xml = device.dump_hierarchy()
+
+and publishes it every few seconds:
+
+    start_publisher('10.1.11.4_5555')
+
+Publication file: runtime/metrics/<name>.mmap (fixed size, seqlock header):
+    [0:8]   seq         uint64 — odd while a write is in progress
+    [8:12]  length      uint32 — payload bytes
+    [12:16] pid         uint32
+    [16:24] published   float64 (epoch seconds)
+    [24:]   payload     JSON snapshot
+
+Readers (dashboard/metrics_routes.py) call read_published() and
+render_prometheus() for a Prometheus text endpoint.
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+FARM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+METRICS_DIR = os.path.join(FARM_DIR, 'runtime', 'metrics')
+
+MMAP_SIZE = 1024 * 1024
+_HEADER = struct.Struct('<QIId')
+_HEADER_SIZE = 24
+
+# Seconds. Covers sub-100ms RPCs up to multi-minute actions.
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   30, 60, 120, 300, 600)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, le in enumerate(self.buckets):
+            if value <= le:
+                self.counts[i] += 1
+                break
+
+    def to_dict(self):
+        return {'buckets': list(zip(self.buckets, self.counts)),
+                'sum': self.sum, 'count': self.count}
+
+
+class MetricsRegistry:
+    """Thread-safe in-process metric store."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._lock = threading.Lock()
+        self._buckets = tuple(buckets)
+        self._counters = {}      # (name, labels) -> float
+        self._gauges = {}        # (name, labels) -> float
+        self._histograms = {}    # (name, labels) -> _Histogram
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._gauges[key] = value
+
+    def clear_gauge(self, name, **labels):
+        """Remove one gauge series (or every series of `name` if no labels)."""
+        with self._lock:
+            if labels:
+                self._gauges.pop((name, _label_key(labels)), None)
+            else:
+                for key in [k for k in self._gauges if k[0] == name]:
+                    del self._gauges[key]
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = _Histogram(self._buckets)
+            h.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the wall-clock duration of the block into histogram `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        """Plain-dict copy, JSON-serialisable."""
+        with self._lock:
+            return {
+                'counters': [{'name': n, 'labels': dict(l), 'value': v}
+                             for (n, l), v in self._counters.items()],
+                'gauges': [{'name': n, 'labels': dict(l), 'value': v}
+                           for (n, l), v in self._gauges.items()],
+                'histograms': [dict(name=n, labels=dict(l), **h.to_dict())
+                               for (n, l), h in self._histograms.items()],
+            }
+
+
+_registry = MetricsRegistry()
+
+
+def get_registry():
+    """The process-wide registry."""
+    return _registry
+
+
+# ---------------------------------------------------------------------------
+#  Memory-mapped publication
+# ---------------------------------------------------------------------------
+
+def _safe_name(name):
+    return ''.join(c if c.isalnum() or c in '._-' else '_' for c in str(name))
+
+
+class MmapPublisher:
+    """Writes registry snapshots into a fixed-size shared file."""
+
+    def __init__(self, name, registry=None, size=MMAP_SIZE):
+        self.name = name
+        self.registry = registry or _registry
+        self.size = size
+        self.path = os.path.join(METRICS_DIR, _safe_name(name) + '.mmap')
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        self._file = open(self.path, 'w+b')
+        self._file.truncate(size)
+        self._mm = mmap.mmap(self._file.fileno(), size)
+        self._seq = 0
+        self._warned = False
+
+    def publish(self, extra=None):
+        snap = self.registry.snapshot()
+        snap['runner'] = self.name
+        if extra:
+            snap.update(extra)
+        payload = json.dumps(snap, default=str).encode('utf-8')
+        if len(payload) > self.size - _HEADER_SIZE:
+            if not self._warned:
+                log.warning("[metrics] snapshot too large (%d bytes) for %s",
+                            len(payload), self.path)
+                self._warned = True
+            return False
+        self._seq += 1                         # odd: write in progress
+        self._mm[0:8] = struct.pack('<Q', self._seq)
+        self._mm[_HEADER_SIZE:_HEADER_SIZE + len(payload)] = payload
+        self._seq += 1                         # even: consistent
+        self._mm[0:_HEADER_SIZE] = _HEADER.pack(self._seq, len(payload),
+                                                os.getpid(), time.time())
+        return True
+
+    def close(self, remove=True):
+        try:
+            self._mm.close()
+            self._file.close()
+            if remove:
+                os.remove(self.path)
+        except Exception:
+            pass
+
+
+_publishers = {}        # name -> MmapPublisher
+_publishers_lock = threading.Lock()
+
+
+def start_publisher(name, interval=2.0, extra_fn=None, registry=None):
+    """Publish a registry every `interval` seconds from a daemon thread.
+
+    extra_fn: optional callable returning a dict merged into each snapshot
+    (e.g. runner state that isn't a metric).
+    registry: defaults to the process-wide one; the in-process farm
+    orchestrator gives each device runner its own, published under the
+    device serial, so one process can own several publication files.
+    """
+    with _publishers_lock:
+        pub = _publishers.get(name)
+        if pub is not None:
+            return pub
+        try:
+            pub = _publishers[name] = MmapPublisher(name, registry=registry)
+        except Exception as e:
+            log.warning("[metrics] publisher disabled: %s", e)
+            return None
+
+    def _loop():
+        while _publishers.get(name) is pub:
+            try:
+                pub.publish(extra_fn() if extra_fn else None)
+            except Exception as e:
+                log.debug("[metrics] publish error: %s", e)
+            time.sleep(interval)
+
+    threading.Thread(target=_loop, daemon=True, name=f"metrics-{name}").start()
+    return pub
+
+
+def stop_publisher(name=None):
+    """Publish a final snapshot and remove the publication file — of the
+    publisher `name`, or of every publisher in this process."""
+    with _publishers_lock:
+        if name is None:
+            pubs = list(_publishers.values())
+            _publishers.clear()
+        else:
+            pub = _publishers.pop(name, None)
+            pubs = [pub] if pub is not None else []
+    for pub in pubs:
+        try:
+            pub.publish()
+        except Exception:
+            pass
+        pub.close(remove=True)
+
+
+# ---------------------------------------------------------------------------
+#  Readers (dashboard side)
+# ---------------------------------------------------------------------------
+
+def _read_one(path, retries=5):
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for _ in range(retries):
+                seq1, length, pid, published = _HEADER.unpack(mm[0:_HEADER_SIZE])
+                if seq1 == 0 or seq1 % 2:
+                    time.sleep(0.001)
+                    continue
+                payload = mm[_HEADER_SIZE:_HEADER_SIZE + length]
+                seq2 = struct.unpack('<Q', mm[0:8])[0]
+                if seq1 == seq2:
+                    data = json.loads(payload.decode('utf-8'))
+                    data['pid'] = pid
+                    data['published_at'] = published
+                    return data
+            return None
+        finally:
+            mm.close()
+
+
+def read_published(max_age=30):
+    """Snapshots from every runner that published within `max_age` seconds."""
+    out = []
+    if not os.path.isdir(METRICS_DIR):
+        return out
+    now = time.time()
+    for fname in sorted(os.listdir(METRICS_DIR)):
+        if not fname.endswith('.mmap'):
+            continue
+        path = os.path.join(METRICS_DIR, fname)
+        try:
+            snap = _read_one(path)
+        except Exception as e:
+            log.debug("[metrics] unreadable %s: %s", fname, e)
+            continue
+        if not snap or now - snap['published_at'] > max_age:
+            continue
+        out.append(snap)
+    return out
+
+
+def _fmt_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for k, v in sorted(labels.items()):
+        v = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{k}="{v}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _fmt_value(v):
+    if v == float('inf'):
+        return '+Inf'
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def render_prometheus(snapshots, prefix='hydra_'):
+    """Prometheus text exposition (v0.0.4) for a list of runner snapshots."""
+    series = {}   # metric name -> (type, [lines])
+
+    def _add(name, mtype, line):
+        entry = series.setdefault(name, (mtype, []))
+        entry[1].append(line)
+
+    for snap in snapshots:
+        runner = {'runner': snap.get('runner', '?')}
+        for c in snap.get('counters', []):
+            name = prefix + c['name']
+            _add(name, 'counter',
+                 f"{name}{_fmt_labels({**runner, **c['labels']})} {_fmt_value(c['value'])}")
+        for g in snap.get('gauges', []):
+            name = prefix + g['name']
+            _add(name, 'gauge',
+                 f"{name}{_fmt_labels({**runner, **g['labels']})} {_fmt_value(g['value'])}")
+        for h in snap.get('histograms', []):
+            name = prefix + h['name']
+            labels = {**runner, **h['labels']}
+            cumulative = 0
+            for le, count in h['buckets']:
+                cumulative += count
+                _add(name, 'histogram',
+                     f"{name}_bucket{_fmt_labels({**labels, 'le': _fmt_value(le)})} {cumulative}")
+            _add(name, 'histogram',
+                 f"{name}_bucket{_fmt_labels({**labels, 'le': '+Inf'})} {h['count']}")
+            _add(name, 'histogram', f"{name}_sum{_fmt_labels(labels)} {_fmt_value(h['sum'])}")
+            _add(name, 'histogram', f"{name}_count{_fmt_labels(labels)} {h['count']}")
+        _add(prefix + 'runner_last_publish_seconds', 'gauge',
+             f"{prefix}runner_last_publish_seconds{_fmt_labels(runner)} "
+             f"{_fmt_value(float(snap.get('published_at', 0)))}")
+
+    lines = []
+    for name in sorted(series):
+        mtype, body = series[name]
+        lines.append(f"# TYPE {name} {mtype}")
+        lines.extend(body)
+    return '\n'.join(lines) + '\n'
+
+
+def summarize(snapshots):
+    """Farm-wide JSON view: per-runner totals plus summed counters."""
+    runners = []
+    totals = {}
+    for snap in snapshots:
+        counters = {}
+        for c in snap.get('counters', []):
+            counters[c['name']] = counters.get(c['name'], 0) + c['value']
+            totals[c['name']] = totals.get(c['name'], 0) + c['value']
+        latency = {}
+        for h in snap.get('histograms', []):
+            key = h['name'] + _fmt_labels(h['labels'])
+            latency[key] = {
+                'count': h['count'],
+                'avg_ms': round(h['sum'] / h['count'] * 1000, 1) if h['count'] else None,
+            }
+        runners.append({
+            'runner': snap.get('runner'),
+            'pid': snap.get('pid'),
+            'published_at': snap.get('published_at'),
+            'state': snap.get('state'),
+            'counters': counters,
+            'gauges': {g['name'] + _fmt_labels(g['labels']): g['value']
+                       for g in snap.get('gauges', [])},
+            'latency': latency,
+        })
+    return {'runners': runners, 'totals': totals, 'runner_count': len(runners)}
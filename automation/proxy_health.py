@@ -0,0 +1,211 @@
+"""
+Proxy Health Cache
+===================
+Per-device "is the proxy / VPN up" state, shared by every runner and the
+dashboard, so a session start doesn't drive the SuperProxy / VPN UI:
+
+    from automation import proxy_health
+    health = proxy_health.check('10.1.11.4_5555', ui_fallback=engine_ui_check)
+    health['active'], health['method'], health['age']
+
+    proxy_health.skip_check()          # HYDRA_SKIP_PROXY / skip_proxy_check
+    proxy_health.invalidate(serial)    # after a toggle / set / reconnect
+
+check() order:
+    1. A cached "active" result younger than TTL (300s) is returned as is.
+    2. One `adb shell` call: the device's network interfaces with their
+       operstate and flags (a VPN — SuperProxy, Surfshark — brings up
+       tun<N>/ppp<N>/wg<N>; tunl0, the IP-in-IP tunnel every Android kernel
+       has, doesn't count) plus the VPN lines of `dumpsys connectivity`.
+       Either shows an up VPN -> active.
+    3. Only when that finds nothing (or adb fails) does ui_fallback run —
+       the caller's UI check (status-bar dump in BotEngine,
+       SuperProxyController.is_proxy_active in the dashboard).
+
+Inactive results are not served from the cache: a down proxy is
+re-checked every time, so a reconnect shows up at once.
+
+State lives in runtime/proxy_health/<serial>.json (DB serial format),
+written atomically; readers in other processes see it immediately.
+"""
+
+import json
+import logging
+import os
+import re
+import subprocess
+import time
+
+log = logging.getLogger(__name__)
+
+FARM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEALTH_DIR = os.path.join(FARM_DIR, 'runtime', 'proxy_health')
+GLOBAL_SETTINGS = os.path.join(FARM_DIR, 'dashboard', 'global_settings.json')
+
+TTL = 300
+ADB_TIMEOUT = 10
+# tun0, ppp0, wg0, ipsec0 — not tunl0 / ip6tnl0 / ip_vti0 (kernel tunnels
+# present on a stock device)
+VPN_INTERFACE = re.compile(r'(tun|ppp|wg|ipsec)\d+')
+IFF_UP = 0x1
+
+# "<name> <operstate> <flags>" per interface, then the VPN connectivity lines
+_PROBE = ("for i in /sys/class/net/*; do echo \"${i##*/} $(cat $i/operstate) $(cat $i/flags)\"; "
+          "done 2>/dev/null; echo ---; dumpsys connectivity | grep -i vpn | head -5")
+
+_settings_cache = {'stamp': None, 'skip': False}
+
+
+def _safe_name(serial):
+    return ''.join(c if c.isalnum() or c in '._-' else '_'
+                   for c in str(serial).replace(':', '_'))
+
+
+def _path(serial):
+    return os.path.join(HEALTH_DIR, _safe_name(serial) + '.json')
+
+
+# ---------------------------------------------------------------------------
+# Settings
+# ---------------------------------------------------------------------------
+
+def skip_check():
+    """True when proxy checks are disabled (HYDRA_SKIP_PROXY env or the
+    dashboard's skip_proxy_check global setting). The settings file is
+    re-read only when its mtime changes."""
+    if os.environ.get('HYDRA_SKIP_PROXY', '').lower() in ('1', 'true', 'yes'):
+        return True
+    try:
+        st = os.stat(GLOBAL_SETTINGS)
+    except OSError:
+        return False
+    stamp = (st.st_mtime, st.st_size)
+    if _settings_cache['stamp'] != stamp:
+        try:
+            with open(GLOBAL_SETTINGS, 'r') as f:
+                skip = bool(json.load(f).get('skip_proxy_check', False))
+        except (OSError, ValueError):
+            skip = False
+        _settings_cache.update(stamp=stamp, skip=skip)
+    return _settings_cache['skip']
+
+
+# ---------------------------------------------------------------------------
+# Cached state
+# ---------------------------------------------------------------------------
+
+def get(serial):
+    """Last recorded health of `serial` with its age, or None."""
+    try:
+        with open(_path(serial), encoding='utf-8') as f:
+            health = json.load(f)
+    except (OSError, ValueError):
+        return None
+    health['age'] = round(time.time() - health.get('checked_at', 0), 1)
+    return health
+
+
+def record(serial, active, method, indicators=(), confidence=None):
+    """Store a check result; returns the stored dict."""
+    health = {
+        'device_serial': str(serial).replace(':', '_'),
+        'active': bool(active),
+        'method': method,
+        'confidence': confidence or ('high' if method == 'adb' else 'medium'),
+        'indicators': list(indicators),
+        'checked_at': time.time(),
+    }
+    os.makedirs(HEALTH_DIR, exist_ok=True)
+    path = _path(serial)
+    tmp = path + '.tmp.%d' % os.getpid()
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(health, f)
+    os.replace(tmp, path)
+    return dict(health, age=0.0)
+
+
+def invalidate(serial):
+    """Forget the cached state (the proxy was just toggled / changed)."""
+    try:
+        os.remove(_path(serial))
+    except OSError:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Checks
+# ---------------------------------------------------------------------------
+
+def probe(serial, timeout=ADB_TIMEOUT):
+    """Cheap check over one adb shell call: (active, indicators), active is
+    None when adb couldn't tell."""
+    adb_serial = str(serial).replace('_', ':')
+    try:
+        r = subprocess.run(['adb', '-s', adb_serial, 'shell', _PROBE],
+                           capture_output=True, text=True, timeout=timeout)
+    except (OSError, subprocess.SubprocessError) as e:
+        log.debug("[%s] proxy probe failed: %s", serial, e)
+        return None, []
+    if r.returncode != 0 or '---' not in r.stdout:
+        return None, []
+    return parse_probe(r.stdout)
+
+
+def _interface_up(operstate, flags):
+    # A tun device without carrier reports operstate "unknown" while up
+    if operstate == 'down':
+        return False
+    try:
+        return bool(int(flags, 16) & IFF_UP)
+    except ValueError:
+        return operstate == 'up'
+
+
+def parse_probe(output):
+    """(active, indicators) from the _PROBE output."""
+    interfaces, _, vpn_lines = output.partition('---')
+    indicators = []
+    for line in interfaces.splitlines():
+        parts = line.split()
+        if len(parts) != 3 or not VPN_INTERFACE.fullmatch(parts[0]):
+            continue
+        name, operstate, flags = parts
+        if _interface_up(operstate, flags):
+            indicators.append(f'VPN interface {name} ({operstate})')
+    if 'CONNECTED' in vpn_lines.upper() and 'DISCONNECTED' not in vpn_lines.upper():
+        indicators.append('VPN connectivity: CONNECTED')
+    return bool(indicators), indicators
+
+
+def check(serial, ui_fallback=None, force=False, ttl=TTL):
+    """Health of `serial`: cached when recently active, else probe(), else
+    ui_fallback() -> bool or {active, indicators, confidence}. Adds
+    cached=True/False. With no way to tell, active is None."""
+    if not force:
+        cached = get(serial)
+        if cached and cached.get('active') and cached['age'] < ttl:
+            return dict(cached, cached=True)
+
+    active, indicators = probe(serial)
+    if active:
+        return dict(record(serial, True, 'adb', indicators), cached=False)
+
+    if ui_fallback is not None:
+        try:
+            result = ui_fallback()
+        except Exception as e:
+            log.warning("[%s] proxy UI check failed: %s", serial, e)
+            result = None
+        if isinstance(result, dict):
+            return dict(record(serial, result.get('active'), 'ui',
+                               result.get('indicators') or [], result.get('confidence')),
+                        cached=False)
+        if result is not None:
+            return dict(record(serial, result, 'ui'), cached=False)
+
+    if active is None:
+        return {'device_serial': str(serial).replace(':', '_'), 'active': None,
+                'method': None, 'confidence': 'low', 'indicators': [],
+                'checked_at': time.time(), 'age': 0.0, 'cached': False}
+    return dict(record(serial, False, 'adb', ['no VPN interface or connection']),
+                cached=False)
@@ -0,0 +1,198 @@
+"""
+Relationship Ledger
+====================
+Per-account record of who the bot followed and when it unfollowed them.
+
+One row per (account username, target):
+  - followed_at / source_username set on every successful follow
+  - unfollowed_at set on a successful unfollow (cleared on re-follow)
+  - unfollow_attempts counts failed unfollows so dead/renamed targets
+    drop out of the queue instead of clogging it
+
+Kept up to date by helpers.log_action() — every successful 'follow' /
+'unfollow' that reaches action_history also lands here, in the same
+transaction. The unfollow queue is one indexed range read (oldest follow
+first) instead of DISTINCT scans over action_history.
+
+On first creation the ledger is backfilled from action_history (schema +
+backfill: db/migrations.py).
+"""
+
+import datetime
+import logging
+import os
+
+from db.connection import connect
+from db.migrations import require_schema
+
+log = logging.getLogger(__name__)
+
+MAX_UNFOLLOW_ATTEMPTS = 3
+
+
+# ---------------------------------------------------------------------------
+# DB
+# ---------------------------------------------------------------------------
+
+def _get_db_path():
+    return os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "db", "phone_farm.db",
+    )
+
+
+def _get_db():
+    return connect(_get_db_path())
+
+
+def _now():
+    return datetime.datetime.now().isoformat()
+
+
+# Table, queue index and the one-time backfill from action_history live in
+# db/migrations.py (step 'relationship_ledger').
+require_schema(_get_db_path())
+
+
+# ---------------------------------------------------------------------------
+# Writers (called from helpers.log_action)
+# ---------------------------------------------------------------------------
+
+def record_follow(username, target_username, device_serial=None,
+                  source_username=None, at=None, conn=None):
+    """Record a successful follow. A re-follow re-opens the relationship."""
+    own = conn is None
+    conn = conn or _get_db()
+    try:
+        conn.execute("""
+            INSERT INTO relationship_ledger
+                (username, target_username, device_serial, source_username, followed_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(username, target_username) DO UPDATE SET
+                device_serial = excluded.device_serial,
+                source_username = COALESCE(excluded.source_username,
+                                           relationship_ledger.source_username),
+                followed_at = excluded.followed_at,
+                unfollowed_at = NULL,
+                unfollow_attempts = 0,
+                last_attempt_at = NULL
+        """, (username, target_username, device_serial, source_username, at or _now()))
+        if own:
+            conn.commit()
+    except Exception as e:
+        log.error("record_follow(%s, %s): %s", username, target_username, e)
+    finally:
+        if own:
+            conn.close()
+
+
+def record_unfollow(username, target_username, device_serial=None, at=None, conn=None):
+    """Record a successful unfollow (or one observed on the profile)."""
+    own = conn is None
+    conn = conn or _get_db()
+    try:
+        at = at or _now()
+        cur = conn.execute("""
+            UPDATE relationship_ledger SET unfollowed_at = ?, last_attempt_at = ?
+            WHERE username = ? AND target_username = ?
+        """, (at, at, username, target_username))
+        if cur.rowcount == 0:
+            # followed outside the bot — keep the unfollow on record anyway
+            conn.execute("""
+                INSERT OR IGNORE INTO relationship_ledger
+                    (username, target_username, device_serial, unfollowed_at, last_attempt_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (username, target_username, device_serial, at, at))
+        if own:
+            conn.commit()
+    except Exception as e:
+        log.error("record_unfollow(%s, %s): %s", username, target_username, e)
+    finally:
+        if own:
+            conn.close()
+
+
+def record_unfollow_failure(username, target_username):
+    """Count a failed unfollow; after MAX_UNFOLLOW_ATTEMPTS it leaves the queue."""
+    conn = _get_db()
+    try:
+        conn.execute("""
+            UPDATE relationship_ledger
+            SET unfollow_attempts = unfollow_attempts + 1, last_attempt_at = ?
+            WHERE username = ? AND target_username = ?
+        """, (_now(), username, target_username))
+        conn.commit()
+    except Exception as e:
+        log.error("record_unfollow_failure(%s, %s): %s", username, target_username, e)
+    finally:
+        conn.close()
+
+
+# ---------------------------------------------------------------------------
+# Readers
+# ---------------------------------------------------------------------------
+
+def unfollow_queue(username, delay_days, limit, exclude=None):
+    """Targets followed at least `delay_days` ago and not yet unfollowed,
+    oldest follow first. `exclude` (lowercase usernames) is skipped.
+
+    Returns list of dicts: target_username, followed_at, source_username.
+    """
+    exclude = exclude or set()
+    cutoff = (datetime.datetime.now() - datetime.timedelta(days=delay_days)).isoformat()
+    conn = _get_db()
+    try:
+        cur = conn.execute("""
+            SELECT target_username, followed_at, source_username
+            FROM relationship_ledger
+            WHERE username = ? AND unfollowed_at IS NULL
+              AND followed_at IS NOT NULL AND followed_at <= ?
+              AND unfollow_attempts < ?
+            ORDER BY followed_at ASC
+        """, (username, cutoff, MAX_UNFOLLOW_ATTEMPTS))
+        queue = []
+        for row in cur:
+            if row["target_username"].lower() in exclude:
+                continue
+            queue.append(dict(row))
+            if len(queue) >= limit:
+                break
+        return queue
+    except Exception as e:
+        log.error("unfollow_queue(%s): %s", username, e)
+        return []
+    finally:
+        conn.close()
+
+
+def has_history(username):
+    """True if the ledger knows any follow made by this account."""
+    conn = _get_db()
+    try:
+        return conn.execute(
+            "SELECT 1 FROM relationship_ledger WHERE username = ? AND followed_at IS NOT NULL LIMIT 1",
+            (username,),
+        ).fetchone() is not None
+    except Exception:
+        return False
+    finally:
+        conn.close()
+
+
+def ledger_stats(username):
+    """Counts for dashboards/logs: following, unfollowed, stuck."""
+    conn = _get_db()
+    try:
+        row = conn.execute("""
+            SELECT
+                SUM(CASE WHEN unfollowed_at IS NULL AND followed_at IS NOT NULL THEN 1 ELSE 0 END) AS following,
+                SUM(CASE WHEN unfollowed_at IS NOT NULL THEN 1 ELSE 0 END) AS unfollowed,
+                SUM(CASE WHEN unfollowed_at IS NULL AND unfollow_attempts >= ? THEN 1 ELSE 0 END) AS stuck
+            FROM relationship_ledger WHERE username = ?
+        """, (MAX_UNFOLLOW_ATTEMPTS, username)).fetchone()
+        return {k: row[k] or 0 for k in ('following', 'unfollowed', 'stuck')}
+    except Exception as e:
+        log.error("ledger_stats(%s): %s", username, e)
+        return {'following': 0, 'unfollowed': 0, 'stuck': 0}
+    finally:
+        conn.close()
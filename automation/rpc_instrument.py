@@ -0,0 +1,427 @@
+"""
+uiautomator2 RPC Instrumentation
+=================================
+Wraps the u2 device object so every round-trip to the phone is timed:
+dump_hierarchy, screenshot, click, swipe, app_current, selector
+exists(timeout=...), etc.
+
+Each call is recorded twice:
+  * into the live metrics registry (automation/metrics.py) as
+      rpc_seconds{device, method, action}      histogram
+      rpc_errors_total{device, method, action} counter
+    so it shows up on /metrics and /api/metrics/rpc;
+  * into a per-device RpcRecorder that keeps raw samples for the current
+    bot session and can dump a JSON report (p50/p95/max, error rate) to
+    logs/rpc/<serial>/.
+
+The "action" label comes from a thread-local context that BotEngine sets
+around each action:
+
+    with rpc_action('follow'):
+        action_func()
+
+DeviceConnection.connect() wraps the device automatically — callers keep
+using conn.device exactly as before.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from automation.metrics import get_registry
+
+log = logging.getLogger(__name__)
+
+FARM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPORT_DIR = os.path.join(FARM_DIR, 'logs', 'rpc')
+
+# Device methods that hit the phone (one HTTP/JSON-RPC round-trip or more).
+DEVICE_METHODS = frozenset({
+    'dump_hierarchy', 'screenshot', 'click', 'double_click', 'long_click',
+    'swipe', 'swipe_ext', 'drag', 'press', 'send_keys', 'clear_text',
+    'set_input_ime', 'window_size', 'app_current', 'app_start', 'app_stop',
+    'app_wait', 'app_info', 'shell', 'set_orientation', 'freeze_rotation',
+    'screen_on', 'screen_off', 'unlock', 'exists', 'click_exists',
+})
+# Properties whose getter is itself an RPC.
+DEVICE_PROPERTIES = frozenset({'info', 'orientation'})
+
+# UiObject / XPathSelector methods.
+SELECTOR_METHODS = frozenset({
+    'exists', 'wait', 'wait_gone', 'click', 'click_exists', 'click_gone',
+    'long_click', 'get_text', 'set_text', 'clear_text', 'bounds', 'center',
+    'get', 'get_last_match', 'all', 'scroll', 'swipe', 'screenshot',
+})
+SELECTOR_PROPERTIES = frozenset({'info', 'count', 'text'})
+# Methods returning another selector — wrapped so chained calls are timed.
+SELECTOR_CHAIN = frozenset({'child', 'sibling', 'child_by_text', 'left',
+                            'right', 'up', 'down'})
+
+MAX_SAMPLES = 2048   # per (method, action) per session
+
+_ctx = threading.local()
+
+
+@contextmanager
+def rpc_action(name):
+    """Attribute RPCs made inside the block to action `name`."""
+    prev = getattr(_ctx, 'action', None)
+    _ctx.action = name
+    try:
+        yield
+    finally:
+        _ctx.action = prev
+
+
+def current_action():
+    return getattr(_ctx, 'action', None) or 'none'
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+class _Series:
+    __slots__ = ('count', 'errors', 'total', 'max', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = []
+
+    def add(self, seconds, ok):
+        self.count += 1
+        self.total += seconds
+        if not ok:
+            self.errors += 1
+        if seconds > self.max:
+            self.max = seconds
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(seconds)
+        else:
+            # reservoir sampling keeps percentiles unbiased on long sessions
+            j = random.randrange(self.count)
+            if j < MAX_SAMPLES:
+                self.samples[j] = seconds
+
+    def to_dict(self):
+        s = sorted(self.samples)
+        ms = lambda v: round(v * 1000, 1) if v is not None else None  # noqa: E731
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'error_rate': round(self.errors / self.count, 4) if self.count else 0,
+            'total_s': round(self.total, 3),
+            'avg_ms': ms(self.total / self.count) if self.count else None,
+            'p50_ms': ms(_percentile(s, 50)),
+            'p95_ms': ms(_percentile(s, 95)),
+            'max_ms': ms(self.max),
+        }
+
+
+class RpcRecorder:
+    """Per-device RPC timings for the current session."""
+
+    def __init__(self, device_serial, registry=None):
+        self.device_serial = device_serial
+        self.registry = registry or get_registry()
+        self._lock = threading.Lock()
+        self._series = {}      # (method, action) -> _Series
+        self._started = time.time()
+        self.last_rpc = None   # epoch of the last completed RPC (hang watchdog)
+
+    def record(self, method, seconds, ok=True):
+        action = current_action()
+        labels = {'device': self.device_serial, 'method': method, 'action': action}
+        self.last_rpc = time.time()
+        self.registry.observe('rpc_seconds', seconds, **labels)
+        if not ok:
+            self.registry.inc('rpc_errors_total', **labels)
+        with self._lock:
+            series = self._series.get((method, action))
+            if series is None:
+                series = self._series[(method, action)] = _Series()
+            series.add(seconds, ok)
+
+    def timed(self, method, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record(method, time.perf_counter() - start, ok=False)
+            raise
+        self.record(method, time.perf_counter() - start)
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+            self._started = time.time()
+
+    def report(self):
+        """Session summary: per method (all actions) and per method+action."""
+        with self._lock:
+            items = list(self._series.items())
+            started = self._started
+        by_method = {}
+        for (method, _action), series in items:
+            agg = by_method.get(method)
+            if agg is None:
+                agg = by_method[method] = _Series()
+            agg.count += series.count
+            agg.errors += series.errors
+            agg.total += series.total
+            agg.max = max(agg.max, series.max)
+            agg.samples.extend(series.samples)
+        total_s = sum(s.total for _, s in items)
+        return {
+            'device': self.device_serial,
+            'started_at': started,
+            'ended_at': time.time(),
+            'rpc_count': sum(s.count for _, s in items),
+            'rpc_errors': sum(s.errors for _, s in items),
+            'rpc_total_s': round(total_s, 3),
+            'methods': {m: s.to_dict() for m, s in
+                        sorted(by_method.items(), key=lambda kv: -kv[1].total)},
+            'by_action': [dict(method=m, action=a, **s.to_dict()) for (m, a), s in
+                          sorted(items, key=lambda kv: -kv[1].total)],
+        }
+
+    def dump(self, session_id=None, extra=None):
+        """Write the session report to logs/rpc/<serial>/ and return its path."""
+        report = self.report()
+        if not report['rpc_count']:
+            return None
+        report['session_id'] = session_id
+        if extra:
+            report.update(extra)
+        out_dir = os.path.join(REPORT_DIR, self.device_serial)
+        os.makedirs(out_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d_%H%M%S', time.localtime(report['ended_at']))
+        fname = f"{stamp}_{session_id}.json" if session_id else f"{stamp}.json"
+        path = os.path.join(out_dir, fname)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        return path
+
+
+class _TimedExists:
+    """u2's `exists` is both truthy (`if sel.exists:`) and callable
+    (`sel.exists(timeout=3)`); keep both forms timed."""
+
+    __slots__ = ('_exists', '_method', '_recorder')
+
+    def __init__(self, exists, method, recorder):
+        self._exists = exists
+        self._method = method
+        self._recorder = recorder
+
+    def __bool__(self):
+        return bool(self._recorder.timed(self._method, bool, self._exists))
+
+    def __call__(self, *args, **kwargs):
+        return self._recorder.timed(self._method, self._exists, *args, **kwargs)
+
+
+class _SelectorProxy:
+    """Wraps a UiObject / XPathSelector so its RPC methods are timed."""
+
+    __slots__ = ('_obj', '_prefix', '_recorder')
+
+    def __init__(self, obj, prefix, recorder):
+        object.__setattr__(self, '_obj', obj)
+        object.__setattr__(self, '_prefix', prefix)
+        object.__setattr__(self, '_recorder', recorder)
+
+    def __getattr__(self, name):
+        rec = self._recorder
+        if name in SELECTOR_PROPERTIES:
+            return rec.timed(f"{self._prefix}.{name}", getattr, self._obj, name)
+        attr = getattr(self._obj, name)
+        if name == 'exists' and callable(attr):
+            return _TimedExists(attr, f"{self._prefix}.exists", rec)
+        if name in SELECTOR_METHODS and callable(attr):
+            method = f"{self._prefix}.{name}"
+            return lambda *a, **kw: rec.timed(method, attr, *a, **kw)
+        if name in SELECTOR_CHAIN and callable(attr):
+            prefix = self._prefix
+            return lambda *a, **kw: _SelectorProxy(attr(*a, **kw), prefix, rec)
+        return attr
+
+    def __setattr__(self, name, value):
+        setattr(self._obj, name, value)
+
+    def __call__(self, *args, **kwargs):
+        return _SelectorProxy(self._obj(*args, **kwargs), self._prefix, self._recorder)
+
+    def __getitem__(self, index):
+        return _SelectorProxy(self._obj[index], self._prefix, self._recorder)
+
+    def __len__(self):
+        return self._recorder.timed(f"{self._prefix}.count", len, self._obj)
+
+    def __bool__(self):
+        # UiObject truthiness is len() — an RPC; plain objects are truthy.
+        if hasattr(type(self._obj), '__len__'):
+            return len(self) > 0
+        return bool(self._obj)
+
+    def __iter__(self):
+        for item in self._obj:
+            yield _SelectorProxy(item, self._prefix, self._recorder)
+
+    def __repr__(self):
+        return repr(self._obj)
+
+
+class InstrumentedDevice:
+    """Transparent proxy around a uiautomator2 Device.
+
+    Attribute reads/writes fall through to the wrapped device; only the
+    names in DEVICE_METHODS / DEVICE_PROPERTIES and selector calls are
+    timed. `raw` gives back the unwrapped device.
+    """
+
+    __slots__ = ('_device', '_recorder', '_wrapped')
+
+    def __init__(self, device, device_serial, recorder=None):
+        object.__setattr__(self, '_device', device)
+        object.__setattr__(self, '_recorder', recorder or RpcRecorder(device_serial))
+        object.__setattr__(self, '_wrapped', {})
+
+    @property
+    def raw(self):
+        return self._device
+
+    @property
+    def rpc_recorder(self):
+        return self._recorder
+
+    def __getattr__(self, name):
+        if name in DEVICE_PROPERTIES:
+            return self._recorder.timed(name, getattr, self._device, name)
+        fn = self._wrapped.get(name)
+        if fn is not None:
+            return fn
+        attr = getattr(self._device, name)
+        if name in DEVICE_METHODS and callable(attr):
+            rec = self._recorder
+            fn = self._wrapped[name] = lambda *a, **kw: rec.timed(name, attr, *a, **kw)
+            return fn
+        if name == 'xpath':
+            return _SelectorProxy(attr, 'xpath', self._recorder)
+        return attr
+
+    def __setattr__(self, name, value):
+        setattr(self._device, name, value)
+
+    def __call__(self, *args, **kwargs):
+        return _SelectorProxy(self._device(*args, **kwargs), 'selector', self._recorder)
+
+    def __repr__(self):
+        return f"<InstrumentedDevice {self._device!r}>"
+
+
+def instrument(device, device_serial, recorder=None):
+    """Wrap `device` unless it is already instrumented (or None)."""
+    if device is None or isinstance(device, InstrumentedDevice):
+        return device
+    return InstrumentedDevice(device, device_serial, recorder)
+
+
+def get_recorder(device):
+    """The RpcRecorder behind an instrumented device, or None."""
+    return device.rpc_recorder if isinstance(device, InstrumentedDevice) else None
+
+
+# ---------------------------------------------------------------------------
+#  Dashboard helpers
+# ---------------------------------------------------------------------------
+
+def summarize_rpc(snapshots):
+    """Per device+method latency/error table from published runner snapshots."""
+    rows = {}
+    for snap in snapshots:
+        errors = {}
+        for c in snap.get('counters', []):
+            if c['name'] == 'rpc_errors_total':
+                lb = c['labels']
+                key = (lb.get('device'), lb.get('method'))
+                errors[key] = errors.get(key, 0) + c['value']
+        for h in snap.get('histograms', []):
+            if h['name'] != 'rpc_seconds':
+                continue
+            lb = h['labels']
+            key = (lb.get('device'), lb.get('method'))
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = {'device': key[0], 'method': key[1],
+                                   'count': 0, 'sum': 0.0, 'errors': 0,
+                                   'buckets': {}}
+            row['count'] += h['count']
+            row['sum'] += h['sum']
+            for le, n in h['buckets']:
+                row['buckets'][le] = row['buckets'].get(le, 0) + n
+        for key, n in errors.items():
+            if key in rows:
+                rows[key]['errors'] += n
+
+    out = []
+    for row in rows.values():
+        count = row['count']
+        p95 = None
+        if count:
+            target, seen = 0.95 * count, 0
+            for le in sorted(row['buckets']):
+                seen += row['buckets'][le]
+                if seen >= target:
+                    p95 = le
+                    break
+        out.append({
+            'device': row['device'],
+            'method': row['method'],
+            'count': count,
+            'errors': row['errors'],
+            'error_rate': round(row['errors'] / count, 4) if count else 0,
+            'avg_ms': round(row['sum'] / count * 1000, 1) if count else None,
+            'p95_le_ms': round(p95 * 1000, 1) if p95 is not None else None,
+        })
+    out.sort(key=lambda r: (r['device'] or '', -(r['avg_ms'] or 0) * r['count']))
+    return out
+
+
+def list_reports(device_serial=None, limit=50):
+    """Newest session report files (metadata only)."""
+    if not os.path.isdir(REPORT_DIR):
+        return []
+    devices = [device_serial] if device_serial else sorted(os.listdir(REPORT_DIR))
+    found = []
+    for dev in devices:
+        d = os.path.join(REPORT_DIR, os.path.basename(dev))
+        if not os.path.isdir(d):
+            continue
+        for fname in os.listdir(d):
+            if fname.endswith('.json'):
+                path = os.path.join(d, fname)
+                found.append({'device': dev, 'file': fname,
+                              'mtime': os.path.getmtime(path)})
+    found.sort(key=lambda r: r['mtime'], reverse=True)
+    return found[:limit]
+
+
+def load_report(device_serial, fname):
+    path = os.path.join(REPORT_DIR, os.path.basename(device_serial),
+                        os.path.basename(fname))
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,537 @@
+"""
+Farm Runtime Planner
+=====================
+Packs each device's account time windows into a 24h timetable, so no hour
+sits idle while an account still wants runtime and no two accounts claim
+the same hour:
+
+    python -m automation.runtime_planner                  # preview, every device
+    python -m automation.runtime_planner --device 10.1.11.4_5555 --apply
+    python -m automation.runtime_planner --apply --full --json
+
+    from automation.runtime_planner import plan, capacity
+    report = plan(apply=True)        # incremental: unchanged devices skipped
+    capacity()                       # idle hours per device, current windows
+
+Inputs per account (account_settings.settings_json, all optional):
+    daily_runtime_hours   hours per day it should run (0-24). Default: the
+                          length of its current window; an always-active
+                          (0-0) account is "flexible" and shares whatever
+                          hours are left. 0 clears its window (OFF below).
+    allowed_hours         hours it may run: "8-22", "22-4", "8-12,18-23"
+                          or a list of hours. Default: any.
+    pin_time_window       true: keep its current window untouched.
+
+Planning, per device (one account runs at a time — run_device picks the
+account whose window covers the hour):
+    1. pinned accounts keep their hours;
+    2. the others keep what they already had, as far as it is allowed and
+       within their demand — re-planning moves as little as possible;
+    3. missing hours are added one per account per round (most constrained
+       account first, hours next to its block first); when every allowed
+       hour is taken, an augmenting path shifts other accounts to free
+       hours they may use, so the fixed demands met are maximal;
+    4. flexible accounts share the remaining free hours round-robin;
+    5. hours are swapped between accounts while that reduces the number
+       of windows (fewer app switches per day).
+An account left with no hour at all (its allowed hours are all taken)
+keeps its window and is listed under `unplaced`; a flexible one stays the
+always-active fallback. One that asks for 0 hours gets start_time /
+end_time 'off' — start==end would make it always-active — which run_device
+never picks.
+
+apply=True writes start_time / end_time back (comma-separated multi-window
+form when an account's hours aren't contiguous) and records the plan in
+runtime_plans. Running runners pick the new windows up at their next
+cycle (run_device's roster reload). The stored fingerprint covers every
+input, including the current windows, so incremental plan() only re-plans
+devices whose accounts, settings or windows changed since.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sys
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.connection import connect
+from db.migrations import require_schema
+
+log = logging.getLogger(__name__)
+
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       'db', 'phone_farm.db')
+HOURS = 24
+ALL_HOURS = frozenset(range(HOURS))
+MAX_SWAP_PASSES = 20
+OFF = 'off'             # start_time / end_time of an account with no hours
+
+
+# ---------------------------------------------------------------------------
+# Hours <-> windows
+# ---------------------------------------------------------------------------
+
+def _ints(value):
+    return [int(x.strip()) % HOURS for x in str(value or '0').split(',') if x.strip().isdigit()]
+
+
+def window_hours(start_str, end_str):
+    """(hours, always_active) for a start_time / end_time pair, with
+    run_device's rules: start==end always-active, start>end wraps midnight,
+    comma-separated lists are several windows, OFF is no hour at all."""
+    if str(start_str).strip().lower() == OFF:
+        return frozenset(), False
+    starts, ends = _ints(start_str) or [0], _ints(end_str) or [0]
+    while len(ends) < len(starts):
+        ends.append(ends[-1])
+    while len(starts) < len(ends):
+        starts.append(starts[-1])
+    windows = list(zip(starts, ends))
+    if all(s == e for s, e in windows):
+        return ALL_HOURS, True
+    hours = set()
+    for s, e in windows:
+        if s != e:
+            hours.update(range(s, e) if s < e else list(range(s, HOURS)) + list(range(e)))
+    return frozenset(hours), False
+
+
+def runs(hours):
+    """Contiguous blocks of `hours` on the 24h circle, as [(start, end)]
+    with end exclusive (end < start wraps midnight)."""
+    if not hours:
+        return []
+    if len(hours) == HOURS:
+        return [(0, 0)]
+    out = []
+    for h in sorted(hours):
+        if (h - 1) % HOURS not in hours:
+            e = h
+            while e in hours:
+                e = (e + 1) % HOURS
+            out.append((h, e))
+    return out
+
+
+def to_windows(hours):
+    """(start_time, end_time) strings for accounts.start_time / end_time."""
+    if not hours:
+        return OFF, OFF
+    blocks = runs(hours)
+    return (','.join(str(s) for s, _ in blocks), ','.join(str(e) for _, e in blocks))
+
+
+def parse_allowed(value):
+    """allowed_hours setting -> frozenset of hours (ALL_HOURS if unset)."""
+    if value in (None, '', []):
+        return ALL_HOURS
+    if isinstance(value, (list, tuple)):
+        return frozenset(int(h) % HOURS for h in value)
+    hours = set()
+    for part in str(value).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            s, e = (int(x) % HOURS for x in part.split('-', 1))
+            hours.update(window_hours(s, e)[0])
+        else:
+            hours.add(int(part) % HOURS)
+    return frozenset(hours)
+
+
+# ---------------------------------------------------------------------------
+# Inputs
+# ---------------------------------------------------------------------------
+
+def _account_input(row, settings):
+    current, always = window_hours(row['start_time'], row['end_time'])
+    allowed = parse_allowed(settings.get('allowed_hours'))
+    demand = settings.get('daily_runtime_hours')
+    if demand in (None, ''):
+        demand = None if always else len(current)
+    else:
+        demand = max(0, min(HOURS, int(demand)))
+    return {
+        'id': row['id'],
+        'username': row['username'],
+        'start_time': row['start_time'],
+        'end_time': row['end_time'],
+        'current': current,
+        'always_active': always,
+        'allowed': allowed,
+        'demand': demand,
+        'pinned': bool(settings.get('pin_time_window')),
+    }
+
+
+def load_accounts(conn, device_serial):
+    """Planner inputs for the device's active accounts."""
+    rows = conn.execute("""
+        SELECT a.id, a.username, a.start_time, a.end_time, s.settings_json
+        FROM accounts a
+        LEFT JOIN account_settings s ON s.account_id = a.id
+        WHERE a.device_serial = ? AND a.status = 'active'
+        ORDER BY a.id
+    """, (device_serial,)).fetchall()
+    out = []
+    for row in rows:
+        try:
+            settings = json.loads(row['settings_json'] or '{}')
+        except ValueError:
+            settings = {}
+        try:
+            out.append(_account_input(row, settings))
+        except (TypeError, ValueError) as e:
+            log.warning("[planner] %s: bad runtime settings (%s) — keeping its window",
+                        row['username'], e)
+            out.append(_account_input(row, {'pin_time_window': True}))
+    return out
+
+
+def fingerprint(accounts):
+    """Hash of every planner input of a device."""
+    key = [(a['id'], a['start_time'], a['end_time'], sorted(a['allowed']), a['demand'],
+            a['pinned']) for a in accounts]
+    return hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Planning one device
+# ---------------------------------------------------------------------------
+
+def _distance(h, hours):
+    """Circular distance from hour h to the nearest of `hours` (0 if none)."""
+    if not hours:
+        return 0
+    return min(min((h - x) % HOURS, (x - h) % HOURS) for x in hours)
+
+
+class _Board:
+    """Hour -> account ownership of one device while planning."""
+
+    def __init__(self, accounts):
+        self.accounts = {a['id']: a for a in accounts}
+        self.owner = [None] * HOURS
+        self.hours = {a['id']: set() for a in accounts}
+        self.movable = {a['id'] for a in accounts if not a['pinned']}
+
+    def give(self, aid, h):
+        prev = self.owner[h]
+        if prev is not None:
+            self.hours[prev].discard(h)
+        self.owner[h] = aid
+        if aid is not None:
+            self.hours[aid].add(h)
+
+    def free_allowed(self, aid):
+        allowed = self.accounts[aid]['allowed']
+        return [h for h in range(HOURS) if self.owner[h] is None and h in allowed]
+
+    def best_free(self, aid):
+        free = self.free_allowed(aid)
+        if not free:
+            return None
+        mine = self.hours[aid]
+        return min(free, key=lambda h: (_distance(h, mine), h))
+
+    def augment(self, aid):
+        """Give `aid` one more hour by shifting other (unpinned) accounts
+        along a path that ends on a free hour. False if there is none."""
+        # BFS over accounts; parent[b] = (a, h): a takes hour h from b
+        parent = {aid: None}
+        queue = [aid]
+        while queue:
+            a = queue.pop(0)
+            free = self.best_free(a) if a != aid else None
+            if free is not None:
+                # unwind: a takes the free hour, each predecessor takes the
+                # hour its successor just vacated
+                self.give(a, free)
+                while parent[a] is not None:
+                    prev, h = parent[a]
+                    self.give(prev, h)
+                    a = prev
+                return True
+            for h in sorted(self.accounts[a]['allowed']):
+                b = self.owner[h]
+                if b is None or b in parent or b not in self.movable:
+                    continue
+                parent[b] = (a, h)
+                queue.append(b)
+        return False
+
+    def n_runs(self, aid):
+        return len(runs(self.hours[aid])) if aid is not None else 0
+
+    def compact(self):
+        """Swap hours while it cuts the total number of windows."""
+        for _ in range(MAX_SWAP_PASSES):
+            improved = False
+            for h1 in range(HOURS):
+                a = self.owner[h1]
+                if a is None or a not in self.movable:
+                    continue
+                for h2 in range(HOURS):
+                    b = self.owner[h2]
+                    if h2 == h1 or b == a or (b is not None and b not in self.movable):
+                        continue
+                    if h2 not in self.accounts[a]['allowed'] or (
+                            b is not None and h1 not in self.accounts[b]['allowed']):
+                        continue
+                    before = self.n_runs(a) + self.n_runs(b)
+                    self.give(a, h2)
+                    self.give(b, h1)
+                    if self.n_runs(a) + self.n_runs(b) < before:
+                        improved = True
+                        a = self.owner[h1]
+                        if a is None or a not in self.movable:
+                            break
+                    else:
+                        self.give(a, h1)
+                        self.give(b, h2)
+            if not improved:
+                return
+
+
+def plan_device(accounts):
+    """{account id: frozenset(hours)} for one device's planner inputs."""
+    board = _Board(accounts)
+    fixed = [a for a in accounts if not a['pinned'] and a['demand'] is not None]
+    flexible = [a for a in accounts if not a['pinned'] and a['demand'] is None]
+
+    # 1. pinned keep their hours (always-active pinned ones stay a fallback)
+    for a in accounts:
+        if a['pinned'] and not a['always_active']:
+            for h in sorted(a['current']):
+                if board.owner[h] is None:
+                    board.give(a['id'], h)
+
+    # 2. keep current hours, in window order, up to the demand (an
+    #    always-active account holds no particular hour)
+    for a in fixed:
+        if a['always_active']:
+            continue
+        target = min(a['demand'], len(a['allowed']))
+        for s, e in runs(a['current']):
+            h = s
+            while len(board.hours[a['id']]) < target:
+                if board.owner[h] is None and h in a['allowed']:
+                    board.give(a['id'], h)
+                h = (h + 1) % HOURS
+                if h == e:
+                    break
+
+    # 3. one more hour per account per round, most constrained first
+    fixed.sort(key=lambda a: (len(a['allowed']), -a['demand'], a['id']))
+    progress = True
+    while progress:
+        progress = False
+        for a in fixed:
+            if len(board.hours[a['id']]) >= min(a['demand'], len(a['allowed'])):
+                continue
+            h = board.best_free(a['id'])
+            if h is not None:
+                board.give(a['id'], h)
+                progress = True
+            elif board.augment(a['id']):
+                progress = True
+
+    # 4. flexible accounts share what's left
+    progress = bool(flexible)
+    while progress:
+        progress = False
+        for a in sorted(flexible, key=lambda a: (len(board.hours[a['id']]), a['id'])):
+            h = board.best_free(a['id'])
+            if h is not None:
+                board.give(a['id'], h)
+                progress = True
+
+    # 5. fewer windows
+    board.compact()
+    return {aid: frozenset(hours) for aid, hours in board.hours.items()}
+
+
+def _device_report(device_serial, accounts, assignment):
+    pinned_fallback = any(a['pinned'] and a['always_active'] for a in accounts)
+    busy = set()
+    rows = []
+    for a in accounts:
+        hours = assignment.get(a['id'], frozenset())
+        pinned_always = a['pinned'] and a['always_active']
+        if not pinned_always:
+            busy |= hours
+        if a['pinned'] or (not hours and a['demand'] != 0):
+            start, end = a['start_time'], a['end_time']     # pinned / unplaced
+        else:
+            start, end = to_windows(hours)
+        rows.append({
+            'account_id': a['id'],
+            'username': a['username'],
+            'demand': a['demand'],
+            'pinned': a['pinned'],
+            'hours': len(hours) if not pinned_always else None,
+            'start_time': start,
+            'end_time': end,
+            'before': (a['start_time'], a['end_time']),
+            'changed': (str(a['start_time']), str(a['end_time'])) != (str(start), str(end)),
+            'short_by': (max(0, a['demand'] - len(hours))
+                         if a['demand'] is not None and not a['pinned'] else 0),
+        })
+    idle = [] if pinned_fallback else sorted(ALL_HOURS - busy)
+    return {
+        'device_serial': device_serial,
+        'accounts': rows,
+        'busy_hours': HOURS if pinned_fallback else len(busy),
+        'idle_hours': idle,
+        'utilisation': round((HOURS - len(idle)) / HOURS, 3),
+        'unplaced': [r['username'] for r in rows
+                     if r['hours'] == 0 and not r['pinned'] and r['demand'] != 0],
+    }
+
+
+# ---------------------------------------------------------------------------
+# Farm
+# ---------------------------------------------------------------------------
+
+def _devices(conn, serials=None):
+    if serials:
+        return [s.replace(':', '_') for s in serials]
+    return [r[0] for r in conn.execute(
+        "SELECT DISTINCT device_serial FROM accounts "
+        "WHERE status = 'active' AND device_serial IS NOT NULL ORDER BY device_serial")]
+
+
+def plan(serials=None, apply=False, full=False, db_path=None):
+    """Plan (and with apply=True write) the timetable of `serials` (default:
+    every device with active accounts). Incremental unless full=True:
+    devices whose inputs match their stored plan are reported as skipped."""
+    path = db_path or DB_PATH
+    require_schema(path)
+    conn = connect(path)
+    try:
+        stored = {r['device_serial']: r['fingerprint']
+                  for r in conn.execute("SELECT device_serial, fingerprint FROM runtime_plans")}
+        reports = []
+        for serial in _devices(conn, serials):
+            accounts = load_accounts(conn, serial)
+            fp = fingerprint(accounts)
+            if not full and stored.get(serial) == fp:
+                reports.append({'device_serial': serial, 'skipped': 'unchanged'})
+                continue
+            report = _device_report(serial, accounts, plan_device(accounts))
+            report['skipped'] = None
+            if apply:
+                _apply(conn, serial, report)
+            reports.append(report)
+        if apply:
+            conn.commit()
+    finally:
+        conn.close()
+    return {
+        'applied': apply,
+        'devices': reports,
+        'changed_accounts': sum(1 for r in reports for a in r.get('accounts', ())
+                                if a['changed']),
+        'idle_hours': sum(len(r['idle_hours']) for r in reports if 'idle_hours' in r),
+    }
+
+
+def _apply(conn, serial, report):
+    for a in report['accounts']:
+        if a['changed']:
+            conn.execute("UPDATE accounts SET start_time = ?, end_time = ? WHERE id = ?",
+                         (a['start_time'], a['end_time'], a['account_id']))
+    # fingerprint of what is now in the DB, so the next incremental run skips it
+    fp = fingerprint(load_accounts(conn, serial))
+    conn.execute("""
+        INSERT OR REPLACE INTO runtime_plans
+            (device_serial, fingerprint, busy_hours, idle_hours, plan_json, planned_at)
+        VALUES (?, ?, ?, ?, ?, datetime('now'))
+    """, (serial, fp, report['busy_hours'], ','.join(map(str, report['idle_hours'])),
+          json.dumps(report)))
+    log.info("[planner] %s: %d/24 hours planned, idle %s", serial,
+             report['busy_hours'], report['idle_hours'] or '-')
+
+
+def capacity(serials=None, db_path=None):
+    """Idle hours per device from the windows currently in the DB (an
+    always-active account covers every hour nobody else has)."""
+    path = db_path or DB_PATH
+    conn = connect(path)
+    try:
+        out = []
+        for serial in _devices(conn, serials):
+            accounts = load_accounts(conn, serial)
+            busy, fallback, overlap = set(), False, set()
+            for a in accounts:
+                if a['always_active']:
+                    fallback = True
+                    continue
+                overlap |= busy & a['current']
+                busy |= a['current']
+            idle = [] if fallback else sorted(ALL_HOURS - busy)
+            out.append({
+                'device_serial': serial,
+                'accounts': len(accounts),
+                'idle_hours': idle,
+                'overlap_hours': sorted(overlap),
+                'utilisation': round((HOURS - len(idle)) / HOURS, 3),
+            })
+        return out
+    finally:
+        conn.close()
+
+
+def _print_report(report):
+    for dev in report['devices']:
+        if dev.get('skipped'):
+            print(f"{dev['device_serial']}: {dev['skipped']}")
+            continue
+        print(f"{dev['device_serial']}: {dev['busy_hours']}/24 hours, "
+              f"idle {dev['idle_hours'] or '-'}")
+        for a in dev['accounts']:
+            mark = '*' if a['changed'] else ' '
+            extra = ' pinned' if a['pinned'] else (f" short {a['short_by']}h" if a['short_by'] else '')
+            print(f"  {mark} {a['username']:<28} {a['start_time']:>10} -> {a['end_time']:<10} "
+                  f"({a['hours'] if a['hours'] is not None else 'fallback'}h){extra}")
+    verb = 'changed' if report['applied'] else 'would change'
+    print(f"{report['changed_accounts']} account windows {verb}; "
+          f"{report['idle_hours']} idle device-hours")
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Plan account time windows per device')
+    parser.add_argument('--device', action='append', help='device serial (repeatable)')
+    parser.add_argument('--apply', action='store_true', help='write the windows back')
+    parser.add_argument('--full', action='store_true', help='re-plan unchanged devices too')
+    parser.add_argument('--capacity', action='store_true',
+                        help='only report idle hours of the current windows')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if args.capacity:
+        result = capacity(args.device)
+        if args.json:
+            print(json.dumps(result, indent=2))
+        else:
+            for d in result:
+                print(f"{d['device_serial']}: {d['accounts']} accounts, "
+                      f"idle {d['idle_hours'] or '-'}, overlap {d['overlap_hours'] or '-'}")
+        return 0
+    report = plan(args.device, apply=args.apply, full=args.full)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
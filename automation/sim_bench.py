@@ -0,0 +1,328 @@
+"""
+Hydra Simulated Farm Bench
+===========================
+End-to-end throughput of the follow pipeline — FollowAction -> IGController
+-> uiautomator2 RPCs -> phone_farm.db — on simulated devices
+(automation/device_sim.py), no phones needed:
+
+    python -m automation.sim_bench                        # 50 devices, 1 device-hour, 60x
+    python -m automation.sim_bench --devices 10 --hours 0.25 --speed 120 --json
+    python -m automation.sim_bench --latency-scale 2 --jitter 0.5 --popup-rate 0.1
+
+Each device runs BotEngine's loop for the follow action: create_session,
+FollowAction.execute() inside rpc_action('follow'), end_session, a 30-90s
+cooldown. Reported:
+    actions / hour      follows per simulated hour, farm-wide and per device
+    RPCs / action       from each DeviceConnection's RpcRecorder, with the
+                        methods that cost the most device time
+    DB contention       statements, mean / max execute() time and
+                        'database is locked' errors (db.connection.pool_stats)
+
+--speed N compresses time.sleep() / time.time() N-fold in the bench's device
+threads (every other thread keeps the real clock), so one device-hour takes
+60/N wall minutes. Device latency is simulated in that
+clock; the database is real and is not slowed down, so at --speed N the DB
+sees the load of N x --devices phones — raise --speed to find where SQLite
+starts to push back.
+
+The bench never writes db/phone_farm.db: it takes a consistent copy into a
+scratch directory (or builds an empty schema when there is no DB yet) and
+db.connection.redirect() sends every connect() to phone_farm.db — helpers,
+bot_logger, tag_dedup, the relationship ledger — to the copy. Accounts
+'sim_acct_NN' on serials 'sim-NN_5555' are seeded there; the copy is deleted
+afterwards unless --keep-db. Simulated adb calls are routed only for the
+duration of the run (device_sim.adb_router()).
+"""
+
+import json
+import logging
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from automation import device_sim
+from automation.actions import helpers
+from automation.actions.follow import FollowAction
+from automation.device_connection import get_connection
+from automation.rpc_instrument import rpc_action
+from db import connection
+from db.connection import pool_stats
+from db.migrations import migrate
+
+log = logging.getLogger(__name__)
+
+PACKAGE = 'com.instagram.androie'
+SOURCES_PER_ACCOUNT = 5
+COOLDOWN = (30, 90)          # BotEngine's pause between actions
+
+
+def sim_serial(i):
+    return '%s%02d_5555' % (device_sim.SIM_PREFIX, i)
+
+
+def sim_username(i):
+    return 'sim_acct_%02d' % i
+
+
+_clock = threading.local()        # .fast: this thread runs on the bench clock
+_clock_lock = threading.Lock()
+
+
+def bench_thread():
+    """Put the calling thread on the accelerated clock."""
+    _clock.fast = True
+
+
+@contextmanager
+def accelerated_clock(speed):
+    """time.sleep() / time.time() run `speed` times faster inside the block,
+    in threads that called bench_thread() only. Yields the bench clock."""
+    if not _clock_lock.acquire(blocking=False):
+        raise RuntimeError("accelerated_clock is already active")
+    real_sleep, real_time = time.sleep, time.time
+    origin = real_time()
+
+    def bench_time():
+        return origin + (real_time() - origin) * speed
+
+    def fast_time():
+        return bench_time() if getattr(_clock, 'fast', False) else real_time()
+
+    def fast_sleep(seconds):
+        if getattr(_clock, 'fast', False):
+            seconds = max(0.0, seconds) / speed
+        real_sleep(seconds)
+
+    time.sleep, time.time = fast_sleep, fast_time
+    try:
+        yield bench_time
+    finally:
+        time.sleep, time.time = real_sleep, real_time
+        _clock_lock.release()
+
+
+# ---------------------------------------------------------------------------
+# Scratch DB / seed
+# ---------------------------------------------------------------------------
+
+@contextmanager
+def scratch_db(keep=False):
+    """A copy of phone_farm.db that every connect() to it uses inside the
+    block. The copy is taken with the backup API, so a farm writing to the
+    DB meanwhile is fine. Yields the copy's path."""
+    workdir = tempfile.mkdtemp(prefix='hydra_sim_db_')
+    path = os.path.join(workdir, 'phone_farm.db')
+    if os.path.exists(connection.DB_PATH):
+        src = sqlite3.connect('file:%s?mode=ro' % connection.DB_PATH, uri=True)
+        dst = sqlite3.connect(path)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+    migrate(path)
+    try:
+        with connection.redirect(connection.DB_PATH, path):
+            yield path
+    finally:
+        if keep:
+            print(f"Scratch DB kept at {path}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def seed(devices):
+    """Insert one follow-enabled account per simulated device; returns rows."""
+    settings = json.dumps({'default_action_limit_perday': 1000000, 'enable_filters': False})
+    accounts = []
+    conn = helpers.get_db()
+    try:
+        for i in range(devices):
+            cur = conn.execute("""
+                INSERT INTO accounts
+                    (device_serial, username, instagram_package, status,
+                     follow_enabled, follow_action, start_time, end_time)
+                VALUES (?, ?, ?, 'active', 'True', '10,20', '0', '0')
+            """, (sim_serial(i), sim_username(i), PACKAGE))
+            account_id = cur.lastrowid
+            conn.execute("INSERT INTO account_settings (account_id, settings_json) VALUES (?, ?)",
+                         (account_id, settings))
+            conn.executemany(
+                "INSERT INTO account_sources (account_id, source_type, value) VALUES (?, 'sources', ?)",
+                [(account_id, 'sim_source_%02d' % ((i + k) % 20))
+                 for k in range(SOURCES_PER_ACCOUNT)])
+            row = conn.execute("SELECT * FROM accounts WHERE id = ?", (account_id,)).fetchone()
+            account = dict(row)
+            account['package'] = PACKAGE
+            accounts.append(account)
+        conn.commit()
+    finally:
+        conn.close()
+    return accounts
+
+
+# ---------------------------------------------------------------------------
+# Run
+# ---------------------------------------------------------------------------
+
+def _device_loop(account, deadline, clock, results_dir, out):
+    bench_thread()
+    serial = account['device_serial']
+    stats = out[serial] = {'sessions': 0, 'follows': 0, 'errors': 0, 'skipped': 0,
+                           'crashes': 0}
+    conn = get_connection(serial)
+    device = conn.connect()
+    if device is None:
+        stats['crashes'] += 1
+        return
+    device.raw.account = account['username']
+    while clock() < deadline:
+        session_id = helpers.create_session(serial, account['username'])
+        stats['sessions'] += 1
+        status = 'completed'
+        try:
+            action = FollowAction(device, serial, account, session_id, package=PACKAGE)
+            action.ctrl.results_dir = results_dir
+            with rpc_action('follow'):
+                result = action.execute()
+            stats['follows'] += result['follows_done']
+            stats['errors'] += result['errors']
+            stats['skipped'] += result['skipped']
+        except Exception as e:
+            log.error("[%s] follow crashed: %s", serial, e)
+            stats['crashes'] += 1
+            status = 'error'
+        helpers.end_session(session_id, status, actions_executed=stats['follows'])
+        time.sleep(random.randint(*COOLDOWN))
+    stats['rpc'] = conn.rpc.report()
+
+
+def run(devices=50, hours=1.0, speed=60.0, keep_db=False):
+    """Drive `devices` simulated phones for `hours` of device time."""
+    with scratch_db(keep_db), device_sim.adb_router():
+        return _run(devices, hours, speed)
+
+
+def _run(devices, hours, speed):
+    accounts = seed(devices)
+    results_dir = tempfile.mkdtemp(prefix='hydra_sim_')
+    db_before = pool_stats()
+    out = {}
+    try:
+        with accelerated_clock(speed) as clock:
+            started_v, started_w = clock(), time.perf_counter()
+            deadline = started_v + hours * 3600
+            threads = [threading.Thread(target=_device_loop, name='sim-%s' % a['device_serial'],
+                                        args=(a, deadline, clock, results_dir, out), daemon=True)
+                       for a in accounts]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            device_s = clock() - started_v
+            wall_s = time.perf_counter() - started_w
+    finally:
+        shutil.rmtree(results_dir, ignore_errors=True)
+    return _report(out, devices, device_s, wall_s, speed, db_before, pool_stats())
+
+
+def _report(out, devices, device_s, wall_s, speed, db_before, db_after):
+    follows = sum(s['follows'] for s in out.values())
+    hours = device_s / 3600 if device_s else 0
+    methods = {}
+    rpc_count = 0
+    for s in out.values():
+        rpc = s.get('rpc') or {}
+        rpc_count += rpc.get('rpc_count', 0)
+        for name, m in rpc.get('methods', {}).items():
+            agg = methods.setdefault(name, {'count': 0, 'device_s': 0.0})
+            agg['count'] += m['count']
+            agg['device_s'] += m['total_s'] * speed
+    top = sorted(methods.items(), key=lambda kv: -kv[1]['device_s'])[:8]
+    statements = db_after['statements'] - db_before['statements']
+    db_ms = db_after['statement_ms'] - db_before['statement_ms']
+    return {
+        'devices': devices,
+        'speed': speed,
+        'device_hours': round(hours, 3),
+        'wall_seconds': round(wall_s, 1),
+        'sessions': sum(s['sessions'] for s in out.values()),
+        'follows': follows,
+        'errors': sum(s['errors'] for s in out.values()),
+        'crashes': sum(s['crashes'] for s in out.values()),
+        'actions_per_hour': round(follows / hours, 1) if hours else None,
+        'actions_per_hour_per_device': round(follows / hours / devices, 1) if hours else None,
+        'rpc_count': rpc_count,
+        'rpcs_per_action': round(rpc_count / follows, 1) if follows else None,
+        'rpc_top_methods': [{'method': name, 'count': m['count'],
+                             'device_s_per_action': round(m['device_s'] / follows, 2)
+                             if follows else None}
+                            for name, m in top],
+        'db': {
+            'statements': statements,
+            'statements_per_wall_s': round(statements / wall_s, 1) if wall_s else None,
+            'avg_ms': round(db_ms / statements, 2) if statements else None,
+            'max_ms': db_after['statement_max_ms'],
+            'slow': db_after['slow'] - db_before['slow'],
+            'locked': db_after['locked'] - db_before['locked'],
+            'share_of_wall': round(db_ms / 1000 / (wall_s * devices), 4) if wall_s else None,
+        },
+    }
+
+
+def _print_report(r):
+    db = r['db']
+    print(f"{r['devices']} simulated devices, {r['device_hours']} device-hours "
+          f"in {r['wall_seconds']}s wall (speed {r['speed']}x)")
+    print(f"  sessions {r['sessions']}  follows {r['follows']}  errors {r['errors']}  "
+          f"crashes {r['crashes']}")
+    print(f"  actions/hour      {r['actions_per_hour']}  "
+          f"({r['actions_per_hour_per_device']} per device)")
+    print(f"  RPCs/action       {r['rpcs_per_action']}  ({r['rpc_count']} RPCs)")
+    for m in r['rpc_top_methods']:
+        print(f"      {m['method']:<24} {m['count']:>8}  {m['device_s_per_action']}s/action")
+    print(f"  DB statements     {db['statements']}  ({db['statements_per_wall_s']}/s wall)")
+    print(f"  DB execute()      avg {db['avg_ms']} ms  max {db['max_ms']} ms  "
+          f"slow {db['slow']}  locked {db['locked']}  "
+          f"({db['share_of_wall'] or 0:.1%} of device-thread wall time)")
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Simulated-farm throughput bench')
+    parser.add_argument('--devices', type=int, default=50)
+    parser.add_argument('--hours', type=float, default=1.0, help='device time to simulate')
+    parser.add_argument('--speed', type=float, default=60.0, help='clock acceleration')
+    parser.add_argument('--latency-scale', type=float, default=1.0)
+    parser.add_argument('--jitter', type=float, default=0.25)
+    parser.add_argument('--popup-rate', type=float, default=0.02)
+    parser.add_argument('--fixtures', default=device_sim.FIXTURE_DIR)
+    parser.add_argument('--keep-db', action='store_true',
+                        help='keep the scratch copy of phone_farm.db the run wrote to')
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    device_sim.configure(latency_scale=args.latency_scale, jitter=args.jitter,
+                         popup_rate=args.popup_rate, fixtures=args.fixtures)
+    report = run(args.devices, args.hours, args.speed, args.keep_db)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -18,7 +18,9 @@ Tags live in account_settings.settings_json as:
 import json
 import logging
 import os
-import sqlite3
+
+from db.connection import connect
+from db.migrations import require_schema
 
 log = logging.getLogger(__name__)
 
@@ -35,43 +37,11 @@ def _get_db_path():
 
 
 def _get_db():
-    path = _get_db_path()
-    conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    return conn
-
-
-def ensure_table():
-    """Create the tag_followed_targets table if it doesn't exist."""
-    conn = _get_db()
-    try:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS tag_followed_targets (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                tag TEXT NOT NULL,
-                target_username TEXT NOT NULL,
-                followed_by TEXT NOT NULL,
-                device_serial TEXT,
-                followed_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime')),
-                UNIQUE(tag, target_username)
-            )
-        """)
-        conn.execute("""
-            CREATE INDEX IF NOT EXISTS idx_tft_tag ON tag_followed_targets(tag)
-        """)
-        conn.execute("""
-            CREATE INDEX IF NOT EXISTS idx_tft_target ON tag_followed_targets(target_username)
-        """)
-        conn.commit()
-    except Exception as e:
-        log.error("ensure_table failed: %s", e)
-    finally:
-        conn.close()
+    return connect(_get_db_path())
 
 
-# Auto-create on import
-ensure_table()
+# tag_followed_targets is created by db/migrations.py
+require_schema(_get_db_path())
 
 
 # ---------------------------------------------------------------------------
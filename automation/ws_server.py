@@ -10,11 +10,37 @@ Usage:
     python -m automation.ws_server
 
 Events emitted:
-    bot_status    - Bot engine state change (starting/running/idle/error)
-    action_event  - Individual action completed (follow/unfollow/like/etc.)
-    device_status - Device connection state change
-    session_event - Bot session start/end
-    stats_update  - Periodic stats refresh
+    bot_status      - Bot engine state change (starting/running/idle/error)
+    action_event    - Individual action completed (follow/unfollow/like/etc.)
+    device_status   - Device connection state change
+    session_event   - Bot session start/end
+    state_delta     - Incremental changes to the status model
+    status_snapshot - Full state (on connect, or when a resume is too old)
+
+Every outgoing message carries a monotonically increasing `seq`. Messages
+that change the status model include a `changes` list:
+    {"op": "set", "key": "bot_status", "id": "<serial>", "value": {...}}
+    {"op": "del", "key": "active_sessions", "id": "<session id>"}
+    {"op": "set", "key": "today_actions", "id": "<action_type>", "value": 12}
+
+State is held in memory: broadcast_event() applies changes directly and a
+single reconcile loop (shared by all clients) picks up writes from runner
+processes with cheap incremental queries, so extra dashboard tabs add no DB
+load.
+
+Client commands:
+    ping
+    get_status                          -> status_snapshot
+    get_history {limit}                 -> event_history
+    subscribe {topics: ["device:<serial>", "account:<username>"]}
+                                        (empty list / "*" = everything)
+    resume {since: <seq>}               -> missed messages, or a snapshot
+Clients can also connect with ?since=<seq> to resume without a snapshot.
+
+Delivery is ordered per client: every send goes through _send_lock and a
+per-client cursor (last seq delivered), so a resume replay, a snapshot and
+live deltas reach a client in seq order, each once — a client is only
+registered for live delivery after its replay went out.
 """
 
 import asyncio
@@ -24,6 +50,7 @@ import threading
 import time
 import datetime
 from collections import deque
+from urllib.parse import parse_qs, urlsplit
 
 log = logging.getLogger(__name__)
 
@@ -32,14 +59,182 @@ log = logging.getLogger(__name__)
 # ---------------------------------------------------------------------------
 
 _clients = set()
+_subscriptions = {}            # websocket -> set of topics (None = all)
 _event_queue = deque(maxlen=500)  # Buffer recent events
 _broadcast_lock = threading.Lock()
+_cursors = {}                  # websocket -> last seq delivered to it
+_send_lock = None              # asyncio.Lock of the server loop
 _ws_loop = None
 _ws_thread = None
 _running = False
 
 WS_HOST = '0.0.0.0'
 WS_PORT = 5056
+RECONCILE_INTERVAL = 5         # seconds between DB reconcile passes
+
+
+# ---------------------------------------------------------------------------
+#  In-memory status model
+# ---------------------------------------------------------------------------
+
+class _StatusModel:
+    """Bot status, today's action counts and running sessions.
+
+    Seeded once from the DB, then kept current by broadcast_event() and
+    reconcile(). Mutations return change lists; callers hold _broadcast_lock.
+    """
+
+    def __init__(self):
+        self.bot_status = {}        # device_serial -> row dict
+        self.today_actions = {}     # action_type -> count
+        self.active_sessions = {}   # session id (str) -> row dict
+        self.day = None
+        self.action_watermark = 0   # last action_history.id counted
+        self.seeded = False
+
+    def snapshot(self):
+        return {
+            'bot_status': [self.bot_status[k] for k in sorted(self.bot_status)],
+            'today_actions': dict(self.today_actions),
+            'active_sessions': sorted(self.active_sessions.values(),
+                                      key=lambda r: r.get('session_start') or '',
+                                      reverse=True),
+            'connected_clients': len(_clients),
+        }
+
+    def apply_event(self, event_type, data):
+        """Fold an in-process event into the model."""
+        if event_type == 'bot_status' and data.get('device_serial'):
+            serial = data['device_serial']
+            row = dict(self.bot_status.get(serial) or {'device_serial': serial})
+            row['status'] = data.get('status', row.get('status'))
+            for k in ('username', 'account_id'):
+                if k in data:
+                    row[k] = data[k]
+            return self._set('bot_status', serial, row)
+        if event_type == 'session_event' and data.get('session_id') is not None:
+            sid = str(data['session_id'])
+            if data.get('status') == 'running':
+                return self._set('active_sessions', sid, {
+                    'id': data['session_id'],
+                    'device_serial': data.get('device_serial'),
+                    'username': data.get('username'),
+                    'session_start': data.get('session_start'),
+                    'status': 'running',
+                })
+            return self._del('active_sessions', sid)
+        return []
+
+    def reconcile(self, conn):
+        """Diff the model against the DB and return the changes.
+
+        Bot status and running sessions are tiny tables; action counts are
+        folded in incrementally by action_history.id so the daily
+        COUNT(*) ... GROUP BY only runs at seed time / day rollover.
+        """
+        changes = []
+        today = datetime.date.today().isoformat()
+
+        bot_rows = {r['device_serial']: dict(r) for r in conn.execute("""
+            SELECT bs.*, d.device_name
+            FROM bot_status bs
+            LEFT JOIN devices d ON d.device_serial = bs.device_serial
+        """)}
+        for serial, row in bot_rows.items():
+            cur = self.bot_status.get(serial) or {}
+            merged = dict(cur)
+            merged.update(row)
+            if merged != cur:
+                changes += self._set('bot_status', serial, merged)
+        for serial in set(self.bot_status) - set(bot_rows):
+            changes += self._del('bot_status', serial)
+
+        sessions = {str(r['id']): dict(r) for r in conn.execute("""
+            SELECT id, device_serial, username, session_start, status
+            FROM account_sessions
+            WHERE status='running'
+        """)}
+        for sid, row in sessions.items():
+            if self.active_sessions.get(sid) != row:
+                changes += self._set('active_sessions', sid, row)
+        for sid in set(self.active_sessions) - set(sessions):
+            changes += self._del('active_sessions', sid)
+
+        if self.day != today:
+            # Seed / day rollover: one full count, then incremental by id.
+            self.day = today
+            top = conn.execute("SELECT MAX(id) FROM action_history").fetchone()[0] or 0
+            counts = {r['action_type']: r['cnt'] for r in conn.execute("""
+                SELECT action_type, COUNT(*) as cnt
+                FROM action_history
+                WHERE timestamp >= ? AND success=1 AND id <= ?
+                GROUP BY action_type
+            """, (today, top))}
+            self.action_watermark = top
+            for k in set(self.today_actions) - set(counts):
+                changes += self._del('today_actions', k)
+            for k, v in counts.items():
+                if self.today_actions.get(k) != v:
+                    changes += self._set('today_actions', k, v)
+        else:
+            top = self.action_watermark
+            for r in conn.execute("""
+                SELECT action_type, COUNT(*) as cnt, MAX(id) as top
+                FROM action_history
+                WHERE id > ? AND success=1 AND timestamp >= ?
+                GROUP BY action_type
+            """, (self.action_watermark, today)):
+                changes += self._set('today_actions', r['action_type'],
+                                     self.today_actions.get(r['action_type'], 0) + r['cnt'])
+                top = max(top, r['top'])
+            # Advance past failed rows too so they aren't rescanned
+            top_any = conn.execute(
+                "SELECT MAX(id) FROM action_history WHERE id > ?",
+                (self.action_watermark,)).fetchone()[0]
+            self.action_watermark = max(top, top_any or 0)
+
+        self.seeded = True
+        return changes
+
+    def _set(self, key, ident, value):
+        getattr(self, key)[ident] = value
+        return [{'op': 'set', 'key': key, 'id': ident, 'value': value}]
+
+    def _del(self, key, ident):
+        if getattr(self, key).pop(ident, None) is None:
+            return []
+        return [{'op': 'del', 'key': key, 'id': ident}]
+
+
+_model = _StatusModel()
+_seq = 0
+
+
+def _topics_for(data):
+    """Topics an event belongs to (empty = farm-wide, sent to everyone)."""
+    topics = set()
+    if isinstance(data, dict):
+        if data.get('device_serial'):
+            topics.add(f"device:{data['device_serial']}")
+        if data.get('username'):
+            topics.add(f"account:{data['username']}")
+    return topics
+
+
+def _stamp(event, topics):
+    """Assign the next seq, serialise once and buffer. Caller holds the lock."""
+    global _seq
+    _seq += 1
+    event['seq'] = _seq
+    message = json.dumps(event, default=str)
+    entry = (_seq, event, message, frozenset(topics))
+    _event_queue.append(entry)
+    return entry
+
+
+def _wants(ws, topics):
+    subs = _subscriptions.get(ws)
+    return not subs or not topics or bool(subs & topics)
 
 
 def broadcast_event(event_type, data=None):
@@ -58,30 +253,90 @@ def broadcast_event(event_type, data=None):
     }
 
     with _broadcast_lock:
-        _event_queue.append(event)
+        changes = _model.apply_event(event_type, event['data'])
+        if changes:
+            event['changes'] = changes
+        entry = _stamp(event, _topics_for(event['data']))
 
     # Schedule async broadcast if loop is running
     if _ws_loop and _ws_loop.is_running():
-        asyncio.run_coroutine_threadsafe(_async_broadcast(event), _ws_loop)
+        asyncio.run_coroutine_threadsafe(_async_broadcast(entry), _ws_loop)
 
 
-async def _async_broadcast(event):
-    """Broadcast event to all connected WebSocket clients."""
+async def _async_broadcast(entry=None):
+    """Deliver what each registered client hasn't had yet (`entry` — the
+    buffer entry that triggered the call — is already in the buffer)."""
     if not _clients:
         return
+    async with _send_lock:
+        for ws in _clients.copy():
+            try:
+                await _flush(ws)
+            except Exception:
+                _drop_client(ws)
 
-    message = json.dumps(event)
-    disconnected = set()
 
-    for ws in _clients.copy():
-        try:
-            await ws.send(message)
-        except Exception:
-            disconnected.add(ws)
+def _drop_client(ws):
+    _clients.discard(ws)
+    _subscriptions.pop(ws, None)
+    _cursors.pop(ws, None)
+
+
+def _snapshot_entry():
+    """(seq, serialised snapshot). Caller holds _broadcast_lock."""
+    return _seq, json.dumps({
+        'type': 'status_snapshot',
+        'data': _model.snapshot(),
+        'seq': _seq,
+        'timestamp': datetime.datetime.now().isoformat(),
+    }, default=str)
+
 
-    # Clean up disconnected clients
-    for ws in disconnected:
-        _clients.discard(ws)
+async def _send_snapshot(websocket):
+    """Send the current state and move the client's cursor to it. Caller
+    holds _send_lock."""
+    with _broadcast_lock:
+        seq, message = _snapshot_entry()
+    await websocket.send(message)
+    _cursors[websocket] = seq
+
+
+async def _flush(websocket):
+    """Send buffered messages after the client's cursor, in seq order; a
+    snapshot instead if the gap has left the buffer. Caller holds _send_lock."""
+    since = _cursors.get(websocket)
+    if since is None:
+        return
+    with _broadcast_lock:
+        oldest = _event_queue[0][0] if _event_queue else _seq + 1
+        missed = [e for e in _event_queue if e[0] > since]
+        complete = since >= oldest - 1 and since <= _seq
+    if not complete:
+        await _send_snapshot(websocket)
+        return
+    for seq, _, message, topics in missed:
+        if _wants(websocket, topics):
+            await websocket.send(message)
+        _cursors[websocket] = seq
+
+
+async def _send_since(websocket, since):
+    """Replay buffered messages after `since`; snapshot if the gap is gone.
+    Caller holds _send_lock."""
+    _cursors[websocket] = since
+    await _flush(websocket)
+
+
+def _resume_seq(websocket):
+    """?since=<seq> on the connect URL, or None."""
+    path = getattr(websocket, 'path', None)
+    if path is None:
+        request = getattr(websocket, 'request', None)
+        path = getattr(request, 'path', '') if request is not None else ''
+    try:
+        return int(parse_qs(urlsplit(path or '').query).get('since', [None])[0])
+    except (TypeError, ValueError):
+        return None
 
 
 # ---------------------------------------------------------------------------
@@ -90,29 +345,32 @@ async def _async_broadcast(event):
 
 async def _ws_handler(websocket):
     """Handle a single WebSocket connection."""
-    _clients.add(websocket)
+    _subscriptions[websocket] = None
     client_addr = websocket.remote_address
     log.info("[WS] Client connected: %s", client_addr)
 
-    # Send recent events as history (last 50)
-    try:
-        with _broadcast_lock:
-            recent = list(_event_queue)[-50:]
-        for event in recent:
-            await websocket.send(json.dumps(event))
-    except Exception:
-        pass
+    if not _model.seeded:
+        await _reconcile_once()
 
-    # Send current status snapshot
-    try:
-        snapshot = _get_status_snapshot()
-        await websocket.send(json.dumps({
-            'type': 'status_snapshot',
-            'data': snapshot,
-            'timestamp': datetime.datetime.now().isoformat(),
-        }))
-    except Exception:
-        pass
+    # Replay / initial state and registration happen under _send_lock, so
+    # no live delta can go out before or in between them.
+    async with _send_lock:
+        try:
+            since = _resume_seq(websocket)
+            if since is not None:
+                await _send_since(websocket, since)
+            else:
+                # Recent events as history (last 50), then the current state
+                with _broadcast_lock:
+                    recent = [e[2] for e in list(_event_queue)[-50:]]
+                    seq, snapshot = _snapshot_entry()
+                for message in recent:
+                    await websocket.send(message)
+                await websocket.send(snapshot)
+                _cursors[websocket] = seq
+        except Exception:
+            _cursors.setdefault(websocket, _seq)
+        _clients.add(websocket)
 
     try:
         # Keep connection alive, listen for client messages
@@ -124,110 +382,113 @@ async def _ws_handler(websocket):
                 if cmd == 'ping':
                     await websocket.send(json.dumps({
                         'type': 'pong',
+                        'seq': _seq,
                         'timestamp': datetime.datetime.now().isoformat(),
                     }))
 
                 elif cmd == 'get_status':
-                    snapshot = _get_status_snapshot()
-                    await websocket.send(json.dumps({
-                        'type': 'status_snapshot',
-                        'data': snapshot,
-                        'timestamp': datetime.datetime.now().isoformat(),
-                    }))
+                    async with _send_lock:
+                        await _send_snapshot(websocket)
 
                 elif cmd == 'get_history':
                     limit = msg.get('limit', 50)
                     with _broadcast_lock:
-                        history = list(_event_queue)[-limit:]
+                        history = [e[1] for e in list(_event_queue)[-limit:]]
                     await websocket.send(json.dumps({
                         'type': 'event_history',
                         'data': history,
                         'timestamp': datetime.datetime.now().isoformat(),
+                    }, default=str))
+
+                elif cmd == 'subscribe':
+                    topics = msg.get('topics') or []
+                    if isinstance(topics, str):
+                        topics = [topics]
+                    _subscriptions[websocket] = (
+                        None if not topics or '*' in topics else set(topics))
+                    await websocket.send(json.dumps({
+                        'type': 'subscribed',
+                        'topics': sorted(_subscriptions[websocket] or []),
+                        'seq': _seq,
                     }))
 
+                elif cmd == 'resume':
+                    try:
+                        since = int(msg.get('since', 0))
+                    except (TypeError, ValueError):
+                        since = -1          # forces a snapshot
+                    async with _send_lock:
+                        await _send_since(websocket, since)
+
             except json.JSONDecodeError:
                 pass
 
     except Exception as e:
         log.debug("[WS] Client disconnected: %s (%s)", client_addr, e)
     finally:
-        _clients.discard(websocket)
+        _drop_client(websocket)
         log.info("[WS] Client disconnected: %s (total: %d)",
                  client_addr, len(_clients))
 
 
 def _get_status_snapshot():
-    """Get current status from DB for initial client sync."""
+    """Current status from the in-memory model (reconciled with the DB)."""
     try:
-        from automation.actions.helpers import get_db
-        conn = get_db()
+        if not _model.seeded:
+            _reconcile_sync()
+        with _broadcast_lock:
+            return _model.snapshot()
+    except Exception as e:
+        log.error("[WS] Status snapshot error: %s", e)
+        return {'error': str(e)}
 
-        # Bot status per device
-        bot_rows = conn.execute("""
-            SELECT bs.*, d.device_name
-            FROM bot_status bs
-            LEFT JOIN devices d ON d.device_serial = bs.device_serial
-            ORDER BY bs.device_serial
-        """).fetchall()
 
-        # Today's action summary
-        today = datetime.date.today().isoformat()
-        action_rows = conn.execute("""
-            SELECT action_type, COUNT(*) as cnt
-            FROM action_history
-            WHERE timestamp >= ? AND success=1
-            GROUP BY action_type
-        """, (today,)).fetchall()
-
-        # Active sessions
-        session_rows = conn.execute("""
-            SELECT device_serial, username, session_start, status
-            FROM account_sessions
-            WHERE status='running'
-            ORDER BY session_start DESC
-        """).fetchall()
+# ---------------------------------------------------------------------------
+#  Reconcile loop (replaces the periodic full-snapshot broadcaster)
+# ---------------------------------------------------------------------------
 
+def _reconcile_sync():
+    """Reconcile the model with the DB; returns the buffered delta entry."""
+    from automation.actions.helpers import get_db
+    conn = get_db()
+    try:
+        with _broadcast_lock:
+            changes = _model.reconcile(conn)
+            if not changes:
+                return []
+            # Group per device so topic subscribers only get their own rows
+            groups = {}
+            for ch in changes:
+                value = ch.get('value') if isinstance(ch.get('value'), dict) else {}
+                serial = ch['id'] if ch['key'] == 'bot_status' else value.get('device_serial')
+                groups.setdefault(serial, []).append(ch)
+            entries = []
+            now = datetime.datetime.now().isoformat()
+            for serial, group in groups.items():
+                topics = {f"device:{serial}"} if serial else set()
+                entries.append(_stamp({'type': 'state_delta', 'changes': group,
+                                       'timestamp': now}, topics))
+            return entries
+    finally:
         conn.close()
 
-        return {
-            'bot_status': [dict(r) for r in bot_rows],
-            'today_actions': {r['action_type']: r['cnt'] for r in action_rows},
-            'active_sessions': [dict(r) for r in session_rows],
-            'connected_clients': len(_clients),
-        }
 
+async def _reconcile_once():
+    try:
+        entries = await asyncio.get_running_loop().run_in_executor(None, _reconcile_sync)
     except Exception as e:
-        log.error("[WS] Status snapshot error: %s", e)
-        return {'error': str(e)}
+        log.debug("[WS] Reconcile error: %s", e)
+        return
+    for entry in entries:
+        await _async_broadcast(entry)
 
 
-# ---------------------------------------------------------------------------
-#  Periodic stats broadcaster
-# ---------------------------------------------------------------------------
-
 async def _stats_broadcaster():
-    """Periodically broadcast stats to all clients."""
+    """Reconcile the model and push deltas while anyone is listening."""
     while _running:
-        await asyncio.sleep(10)  # Every 10 seconds
+        await asyncio.sleep(RECONCILE_INTERVAL)
         if _clients:
-            try:
-                snapshot = _get_status_snapshot()
-                event = {
-                    'type': 'stats_update',
-                    'data': snapshot,
-                    'timestamp': datetime.datetime.now().isoformat(),
-                }
-                message = json.dumps(event)
-                disconnected = set()
-                for ws in _clients.copy():
-                    try:
-                        await ws.send(message)
-                    except Exception:
-                        disconnected.add(ws)
-                for ws in disconnected:
-                    _clients.discard(ws)
-            except Exception as e:
-                log.debug("[WS] Stats broadcast error: %s", e)
+            await _reconcile_once()
 
 
 # ---------------------------------------------------------------------------
@@ -237,9 +498,10 @@ async def _stats_broadcaster():
 async def _run_server():
     """Run the WebSocket server."""
     import websockets
-    global _running
+    global _running, _send_lock
 
     _running = True
+    _send_lock = asyncio.Lock()
     log.info("[WS] Starting WebSocket server on ws://%s:%d", WS_HOST, WS_PORT)
 
     # Start stats broadcaster
@@ -294,6 +556,7 @@ def get_ws_status():
         'port': WS_PORT,
         'connected_clients': len(_clients),
         'buffered_events': len(_event_queue),
+        'seq': _seq,
     }
 
 
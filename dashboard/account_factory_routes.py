@@ -19,7 +19,6 @@ Routes:
 
 import base64
 import os
-import sqlite3
 import sys
 import threading
 import time
@@ -34,6 +33,8 @@ _BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if _BASE not in sys.path:
     sys.path.insert(0, _BASE)
 
+from db.connection import connect  # noqa: E402
+
 _DB = os.path.join(_BASE, 'db', 'phone_farm.db')
 
 _jobs = {}
@@ -41,7 +42,7 @@ _jobs_lock = threading.Lock()
 
 
 def _ensure_accounts_table():
-    c = sqlite3.connect(_DB)
+    c = connect(_DB, row_factory=None)
     c.execute("""CREATE TABLE IF NOT EXISTS af_accounts (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         job_id TEXT,
@@ -62,7 +63,7 @@ def _ensure_accounts_table():
 
 
 def _ensure_gmail_table():
-    c = sqlite3.connect(_DB)
+    c = connect(_DB, row_factory=None)
     c.execute("""CREATE TABLE IF NOT EXISTS gmail_accounts (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         email TEXT UNIQUE,
@@ -97,7 +98,7 @@ def _persist_gmail(email, password, device_serial, linked_ig='', status='active'
         ts = int(now if now is not None else time.time())
         if not ip and device_serial:   # derive LAN ip from the serial
             ip = device_serial.replace('_5555', '').replace('_', ':').split(':')[0]
-        c = sqlite3.connect(_DB)
+        c = connect(_DB, row_factory=None)
         c.execute("""INSERT OR IGNORE INTO gmail_accounts
             (email, password, full_name, recovery_phone, device_serial, ip,
              linked_ig, status, created_at, last_used)
@@ -114,7 +115,7 @@ def _persist_account(job_id, device_serial, ident, status, recipe_ids, error='',
     try:
         _ensure_accounts_table()
         ts = int(now if now is not None else time.time())
-        c = sqlite3.connect(_DB)
+        c = connect(_DB, row_factory=None)
         c.execute("""INSERT INTO af_accounts
             (job_id, device_serial, username, full_name, password, email, gender,
              birthday, status, recipe_chain, error, created_at)
@@ -137,7 +138,7 @@ def _sync_account_to_accounts(device_serial, package, username, password, tag=''
     clone slot as 'replaced', then upsert the new account as active. Returns the new
     account id. Used by both the reconcile fix and the batch-create worker."""
     ts = int(now if now is not None else time.time())
-    c = sqlite3.connect(_DB)
+    c = connect(_DB, row_factory=None)
     try:
         # device_id: inherit from any row on this device, else the devices table
         row = c.execute("SELECT device_id FROM accounts WHERE device_serial=? "
@@ -178,7 +179,7 @@ def _retire_and_resolve(account_id, new_username='', resolved_by='reregister', n
     specific old account 'replaced' (clearing its time window) and resolve any open
     health events for it. Uses ISO timestamps to match the health-event convention."""
     iso = now or datetime.utcnow().isoformat()
-    c = sqlite3.connect(_DB)
+    c = connect(_DB, row_factory=None)
     try:
         c.execute("UPDATE accounts SET status='replaced', start_time='0', end_time='0', "
                   "updated_at=? WHERE id=?", (iso, account_id))
@@ -199,8 +200,7 @@ def page():
 
 @account_factory_bp.route('/api/account-factory/devices')
 def devices():
-    c = sqlite3.connect(_DB)
-    c.row_factory = sqlite3.Row
+    c = connect(_DB)
     rows = c.execute("""SELECT d.device_serial, d.device_name,
                                COUNT(a.id) AS accounts
                         FROM devices d
@@ -222,8 +222,7 @@ def capacity():
     import subprocess
     from concurrent.futures import ThreadPoolExecutor
 
-    c = sqlite3.connect(_DB)
-    c.row_factory = sqlite3.Row
+    c = connect(_DB)
     devs = c.execute("SELECT device_serial, device_name FROM devices "
                      "ORDER BY device_name").fetchall()
     accts = c.execute("SELECT device_serial, instagram_package, username, status "
@@ -294,7 +293,7 @@ def _free_slots_for_device(device_serial):
         clones = []
     if not clones:
         return []
-    c = sqlite3.connect(_DB)
+    c = connect(_DB, row_factory=None)
     active = {row[0] for row in c.execute(
         "SELECT instagram_package FROM accounts WHERE device_serial=? AND status='active' "
         "AND instagram_package IS NOT NULL", (device_serial,))}
@@ -304,7 +303,7 @@ def _free_slots_for_device(device_serial):
 
 def _allocate_free_slots(count, devices=None):
     """Pick `count` free slots, spread round-robin across devices for balance."""
-    c = sqlite3.connect(_DB)
+    c = connect(_DB, row_factory=None)
     devs = [r[0] for r in c.execute("SELECT device_serial FROM devices ORDER BY device_name")]
     c.close()
     if devices:
@@ -494,8 +493,7 @@ def reregister():
     if not account_id or not recipe_id:
         return jsonify({'error': 'account_id and recipe_id required'}), 400
 
-    c = sqlite3.connect(_DB)
-    c.row_factory = sqlite3.Row
+    c = connect(_DB)
     old = c.execute("SELECT * FROM accounts WHERE id=?", (account_id,)).fetchone()
     c.close()
     if not old:
@@ -726,8 +724,7 @@ def stop(job_id):
 @account_factory_bp.route('/api/account-factory/accounts')
 def accounts():
     _ensure_accounts_table()
-    c = sqlite3.connect(_DB)
-    c.row_factory = sqlite3.Row
+    c = connect(_DB)
     rows = c.execute("SELECT * FROM af_accounts ORDER BY created_at DESC LIMIT 200").fetchall()
     c.close()
     return jsonify({'accounts': [dict(r) for r in rows]})
@@ -836,8 +833,7 @@ def email_config():
 @account_factory_bp.route('/api/account-factory/gmails')
 def gmails():
     _ensure_gmail_table()
-    c = sqlite3.connect(_DB)
-    c.row_factory = sqlite3.Row
+    c = connect(_DB)
     rows = c.execute("SELECT * FROM gmail_accounts ORDER BY created_at DESC LIMIT 500").fetchall()
     c.close()
     return jsonify({'gmails': [dict(r) for r in rows]})
@@ -849,8 +845,7 @@ def gmails_csv():
     import io
     from flask import Response
     _ensure_gmail_table()
-    c = sqlite3.connect(_DB)
-    c.row_factory = sqlite3.Row
+    c = connect(_DB)
     rows = c.execute("SELECT email, password, full_name, device_serial, ip, "
                      "recovery_phone, linked_ig, status, created_at FROM gmail_accounts "
                      "ORDER BY created_at DESC").fetchall()
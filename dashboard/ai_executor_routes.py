@@ -27,6 +27,8 @@ _BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if _BASE not in sys.path:
     sys.path.insert(0, _BASE)  # so `import automation.ai_executor` resolves
 
+from db.connection import connect  # noqa: E402
+
 # in-memory run registry: run_id -> state
 _runs = {}
 _runs_lock = threading.Lock()
@@ -48,8 +50,7 @@ def _deepseek_key():
 def _clones(db_serial):
     """All clone packages on a device, ordered (same order as the UI list):
     index 0 = clone 1 (androie), ... So 'clone 6' = _clones()[5]."""
-    import sqlite3
-    c = sqlite3.connect(os.path.join(_BASE, 'db', 'phone_farm.db'))
+    c = connect(os.path.join(_BASE, 'db', 'phone_farm.db'), row_factory=None)
     rows = c.execute("SELECT instagram_package FROM accounts WHERE device_serial=? "
                      "AND instagram_package IS NOT NULL ORDER BY instagram_package",
                      (db_serial,)).fetchall()
@@ -84,9 +85,7 @@ def ai_executor_page():
 
 @ai_executor_bp.route('/api/ai-executor/devices')
 def ai_devices():
-    import sqlite3
-    c = sqlite3.connect(os.path.join(_BASE, 'db', 'phone_farm.db'))
-    c.row_factory = sqlite3.Row
+    c = connect(os.path.join(_BASE, 'db', 'phone_farm.db'))
     rows = c.execute("""SELECT d.device_serial, d.device_name,
                                COUNT(a.id) AS accounts
                         FROM devices d
@@ -100,10 +99,8 @@ def ai_devices():
 def ai_accounts(serial):
     """Accounts (username + clone package) on a device, so the UI can offer an
     unambiguous clone picker instead of guessing 'clone N'."""
-    import sqlite3
     db = serial.replace(':', '_')
-    c = sqlite3.connect(os.path.join(_BASE, 'db', 'phone_farm.db'))
-    c.row_factory = sqlite3.Row
+    c = connect(os.path.join(_BASE, 'db', 'phone_farm.db'))
     rows = c.execute("SELECT username, instagram_package, status FROM accounts "
                      "WHERE device_serial=? AND instagram_package IS NOT NULL "
                      "ORDER BY instagram_package", (db,)).fetchall()
@@ -503,11 +500,9 @@ def _compute_next_run(mode, interval_minutes, daily_time, jitter_minutes, now):
 
 @ai_executor_bp.route('/api/ai-executor/schedules', methods=['GET'])
 def schedules_list():
-    import sqlite3
     from automation.ai_executor import ensure_tables
     ensure_tables()
-    c = sqlite3.connect(os.path.join(_BASE, 'db', 'phone_farm.db'))
-    c.row_factory = sqlite3.Row
+    c = connect(os.path.join(_BASE, 'db', 'phone_farm.db'))
     rows = c.execute("""SELECT s.*, r.name AS recipe_name
                         FROM ai_schedules s LEFT JOIN ai_recipes r ON r.id=s.recipe_id
                         ORDER BY s.enabled DESC, s.next_run_at ASC""").fetchall()
@@ -517,7 +512,6 @@ def schedules_list():
 
 @ai_executor_bp.route('/api/ai-executor/schedules', methods=['POST'])
 def schedules_create():
-    import sqlite3
     import time as _t
     from automation.ai_executor import ensure_tables
     data = request.get_json() or {}
@@ -539,7 +533,7 @@ def schedules_create():
     else:
         next_run = _compute_next_run(mode, interval_minutes, daily_time, jitter, now)
     ensure_tables()
-    c = sqlite3.connect(os.path.join(_BASE, 'db', 'phone_farm.db'))
+    c = connect(os.path.join(_BASE, 'db', 'phone_farm.db'), row_factory=None)
     cur = c.execute("""INSERT INTO ai_schedules
         (recipe_id, name, device_serial, package, mode, interval_minutes,
          daily_time, jitter_minutes, next_run_at, enabled, created_at)
@@ -554,8 +548,7 @@ def schedules_create():
 
 @ai_executor_bp.route('/api/ai-executor/schedules/<int:sid>', methods=['DELETE'])
 def schedules_delete(sid):
-    import sqlite3
-    c = sqlite3.connect(os.path.join(_BASE, 'db', 'phone_farm.db'))
+    c = connect(os.path.join(_BASE, 'db', 'phone_farm.db'), row_factory=None)
     c.execute("DELETE FROM ai_schedules WHERE id=?", (sid,))
     c.commit()
     c.close()
@@ -564,8 +557,7 @@ def schedules_delete(sid):
 
 @ai_executor_bp.route('/api/ai-executor/schedules/<int:sid>/toggle', methods=['POST'])
 def schedules_toggle(sid):
-    import sqlite3
-    c = sqlite3.connect(os.path.join(_BASE, 'db', 'phone_farm.db'))
+    c = connect(os.path.join(_BASE, 'db', 'phone_farm.db'), row_factory=None)
     c.execute("UPDATE ai_schedules SET enabled = 1 - enabled WHERE id=?", (sid,))
     c.commit()
     row = c.execute("SELECT enabled FROM ai_schedules WHERE id=?", (sid,)).fetchone()
@@ -578,14 +570,12 @@ _scheduler_started = False
 
 
 def _scheduler_loop():
-    import sqlite3
     import time as _t
     db = os.path.join(_BASE, 'db', 'phone_farm.db')
     while True:
         try:
             now = _t.time()
-            c = sqlite3.connect(db)
-            c.row_factory = sqlite3.Row
+            c = connect(db)
             due = c.execute("SELECT * FROM ai_schedules WHERE enabled=1 AND "
                             "next_run_at IS NOT NULL AND next_run_at <= ?",
                             (now,)).fetchall()
@@ -604,7 +594,7 @@ def _scheduler_loop():
                 # schedule the next occurrence (or disable a 'once')
                 nxt = _compute_next_run(s['mode'], s['interval_minutes'],
                                         s['daily_time'], s['jitter_minutes'], now)
-                c2 = sqlite3.connect(db)
+                c2 = connect(db, row_factory=None)
                 if s['mode'] == 'once':
                     c2.execute("UPDATE ai_schedules SET enabled=0, last_run_at=?, "
                                "last_status=?, next_run_at=NULL WHERE id=?",
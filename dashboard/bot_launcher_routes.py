@@ -5,7 +5,8 @@ Blueprint: bot_launcher_bp, prefix: /api/bot
 
 Endpoints:
     GET  /api/bot/status           → status of all running bot processes
-    POST /api/bot/launch-all       → launch all devices
+    POST /api/bot/launch-all       → start all devices in the background (202)
+    GET  /api/bot/launch-report    → progress / readiness report of the farm start
     POST /api/bot/launch/<serial>  → launch a single device
     POST /api/bot/stop-all         → stop all bots
     POST /api/bot/stop/<serial>    → stop a single device bot
@@ -16,18 +17,22 @@ import os
 import sys
 import re
 import subprocess
-import sqlite3
 import datetime
+import threading
 import time
-import glob
 
 from flask import Blueprint, jsonify, request
 from phone_farm_db import update_device_status
+from db.connection import connect
 
 # Simple TTL cache for process scanning (avoid hitting WMIC on every refresh)
 _proc_cache = {'data': [], 'ts': 0}
 _PROC_CACHE_TTL = 5  # seconds
 
+# Background farm start (launch-all); one at a time
+_farm_start_thread = None
+_farm_start_lock = threading.Lock()
+
 bot_launcher_bp = Blueprint('bot_launcher', __name__, url_prefix='/api/bot')
 
 # Paths
@@ -48,9 +53,7 @@ if not os.path.exists(PYTHON_EXE):
 # ---------------------------------------------------------------------------
 
 def _get_db():
-    conn = sqlite3.connect(DB_PATH, timeout=10)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return connect(DB_PATH)
 
 
 def _get_all_devices():
@@ -210,20 +213,19 @@ def _launch_device(serial_db):
 # ---------------------------------------------------------------------------
 
 def _get_log_file(serial_db, date_str=None):
-    """Get the log file path for a device. Uses today's date if not specified."""
-    if date_str is None:
-        date_str = datetime.date.today().strftime('%Y-%m-%d')
-    return os.path.join(LOG_DIR, f'{serial_db}_{date_str}.log')
+    """Get the log file path for a device (plain or gzipped previous day).
+    Uses today's date if not specified; None if there is no such file."""
+    from automation.log_reader import log_path
+    return log_path(serial_db, date_str, LOG_DIR)
 
 
 def _tail_log(filepath, lines=100):
-    """Read the last N lines of a log file."""
-    if not os.path.exists(filepath):
+    """Read the last N lines of a log file (seeks back from EOF)."""
+    from automation.log_reader import tail
+    if not filepath or not os.path.exists(filepath):
         return []
     try:
-        with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
-            all_lines = f.readlines()
-            return [l.rstrip('\n\r') for l in all_lines[-lines:]]
+        return tail(filepath, lines)[0]
     except Exception as e:
         return [f'Error reading log: {e}']
 
@@ -276,16 +278,56 @@ def bot_status():
     })
 
 
+def _farm_start_running():
+    return _farm_start_thread is not None and _farm_start_thread.is_alive()
+
+
+def _run_farm_start(serials, **kwargs):
+    """Thread body of launch-all: warm-up + staggered launches. Progress
+    lands in the saved report (farm_start.last_report)."""
+    from automation import farm_start
+
+    def launch(serial):
+        success, info = _launch_device(serial)
+        if success:
+            try:
+                update_device_status(serial, 'connected')
+            except Exception:
+                pass
+        return success, info
+
+    try:
+        farm_start.start_farm(serials, launch, **kwargs)
+    except Exception as e:
+        print(f'[bot_launcher] Farm start failed: {e}')
+        report = farm_start.last_report() or {'devices': []}
+        report.update(phase='failed', error=str(e))
+        farm_start.save_report(report)
+
+
 @bot_launcher_bp.route('/launch-all', methods=['POST'])
 def launch_all():
     """
     POST /api/bot/launch-all
     Launch run_device.py for all (or specified) devices.
-    Body (optional): {"devices": ["10.1.11.4:5555", ...], "delay": 2}
+    Body (optional): {"devices": ["10.1.11.4:5555", ...], "delay": 2, "jitter": 1,
+                      "warmup": true, "concurrency": 6}
+
+    Devices are first connected from here, `concurrency` at a time
+    (automation/farm_start.py); runners then start ready devices first,
+    delay + up to jitter seconds apart, and attach to that connection.
+    That takes minutes on a full farm, so it runs in the background: the
+    response is 202 at once and GET /api/bot/launch-report follows it
+    (409 if a farm start is already running).
     """
+    global _farm_start_thread
+    from automation import farm_start
     data = request.get_json(silent=True) or {}
     requested_serials = data.get('devices', None)
-    delay = data.get('delay', 2.0)
+    delay = float(data.get('delay', 2.0))
+    jitter = float(data.get('jitter', farm_start.LAUNCH_JITTER))
+    warmup = bool(data.get('warmup', True))
+    concurrency = int(data.get('concurrency', farm_start.WARM_CONCURRENCY))
 
     # Get running processes first
     running_procs = _find_run_device_processes()
@@ -300,38 +342,44 @@ def launch_all():
         devices = _get_all_devices()
         serials_to_launch = [d['device_serial'] for d in devices if d['account_count'] > 0]
 
-    launched = []
-    skipped = []
-    failed = []
-
-    for serial in serials_to_launch:
-        if serial in running_serials:
-            skipped.append({'serial': serial, 'reason': 'already running'})
-            continue
-
-        success, info = _launch_device(serial)
-        if success:
-            launched.append(info)
-            try:
-                update_device_status(serial, 'connected')
-            except Exception:
-                pass
-        else:
-            failed.append({'serial': serial, 'error': info.get('error', 'unknown')})
-
-        # Delay between launches to avoid overwhelming the system
-        if delay > 0 and serial != serials_to_launch[-1]:
-            time.sleep(delay)
+    skipped = [{'serial': s, 'reason': 'already running'}
+               for s in serials_to_launch if s in running_serials]
+    to_start = [s for s in serials_to_launch if s not in running_serials]
+
+    # Warm-up, then launches staggered to avoid overwhelming adb / Wi-Fi
+    with _farm_start_lock:
+        if _farm_start_running():
+            return jsonify({'success': False,
+                            'error': 'a farm start is already in progress'}), 409
+        _farm_start_thread = threading.Thread(
+            target=_run_farm_start, args=(to_start,), name='farm-start', daemon=True,
+            kwargs={'warmup': warmup, 'concurrency': concurrency,
+                    'delay': delay, 'jitter': jitter})
+        _farm_start_thread.start()
 
     return jsonify({
         'success': True,
-        'launched': len(launched),
+        'starting': len(to_start),
         'skipped': len(skipped),
-        'failed': len(failed),
-        'devices': launched,
         'skipped_details': skipped,
-        'failed_details': failed,
-    })
+        'report_url': '/api/bot/launch-report',
+    }), 202
+
+
+@bot_launcher_bp.route('/launch-report', methods=['GET'])
+def launch_report():
+    """
+    GET /api/bot/launch-report
+    Readiness report of the last farm start (warm-up states and timings).
+    While one is running, `running` is true and the report is its progress
+    (phase 'warmup' / 'launching').
+    """
+    from automation.farm_start import last_report
+    running = _farm_start_running()
+    report = last_report()
+    if report is None and not running:
+        return jsonify({'success': False, 'error': 'no farm start recorded'}), 404
+    return jsonify({'success': True, 'running': running, 'report': report})
 
 
 @bot_launcher_bp.route('/launch/<serial>', methods=['POST'])
@@ -393,21 +441,37 @@ def launch_single(serial):
 def stop_all():
     """
     POST /api/bot/stop-all
-    Stop all running run_device.py processes.
+    Stop all running runners: over their control channels where they have
+    one, killing the run_device.py processes that don't answer.
     """
-    processes = _find_run_device_processes()
+    from automation import control
+
+    stopped = 0
+    failed = 0
+    details = []
+
+    acked = set()
+    for info in control.list_runners():
+        reply = control.send(info['name'], 'stop', now=True)
+        if reply and reply.get('ok'):
+            acked.add(info['name'])
+            stopped += 1
+            details.append({'serial': info['name'], 'pid': info['pid'], 'status': 'stopping'})
+            try:
+                update_device_status(info['name'], 'disconnected')
+            except Exception:
+                pass
 
-    if not processes:
+    processes = [p for p in _find_run_device_processes(use_cache=False)
+                 if p['serial'] not in acked]
+
+    if not processes and not acked:
         return jsonify({
             'success': True,
             'stopped': 0,
             'message': 'No bot processes were running',
         })
 
-    stopped = 0
-    failed = 0
-    details = []
-
     for p in processes:
         if _kill_pid(p['pid']):
             stopped += 1
@@ -449,9 +513,31 @@ def stop_all():
 def stop_single(serial):
     """
     POST /api/bot/stop/<serial>
-    Stop the run_device.py process for a specific device.
+    Stop the runner for a specific device. Asks it over its control channel
+    to abort the current session and exit (also works for a device of the
+    in-process farm); the process is killed only when there is no channel
+    or with body {"force": true}.
     """
+    from automation import control
+
     serial_db = serial.replace(':', '_')
+    data = request.get_json(silent=True) or {}
+    if not data.get('force'):
+        reply = control.send(serial_db, 'stop', now=True)
+        if reply and reply.get('ok'):
+            try:
+                update_device_status(serial_db, 'disconnected')
+            except Exception:
+                pass
+            _invalidate_proc_cache()
+            return jsonify({
+                'success': True,
+                'serial': serial_db,
+                'stopped': 1,
+                'status': 'stopping',
+                'via': 'control',
+            })
+
     procs = _find_process_for_serial(serial_db)
 
     if not procs:
@@ -485,29 +571,107 @@ def stop_single(serial):
         'serial': serial_db,
         'stopped': stopped,
         'status': 'stopped',
+        'via': 'kill',
     })
 
 
+@bot_launcher_bp.route('/control/<serial>', methods=['GET', 'POST'])
+def control_runner(serial):
+    """
+    GET  /api/bot/control/<serial>  -> the runner's live status
+    POST /api/bot/control/<serial>  {"command": "wake" | "pause" | "resume" |
+                                     "run" | "stop" | "status",
+                                     "action": "follow",   (run)
+                                     "now": true}          (stop: abort session)
+    Delivered immediately over the runner's control channel.
+    """
+    from automation import control
+
+    serial_db = serial.replace(':', '_')
+    data = request.get_json(silent=True) or {}
+    command = data.pop('command', None) if request.method == 'POST' else 'status'
+    if command not in control.COMMANDS:
+        return jsonify({'success': False, 'error': 'bad_command',
+                        'message': f"command must be one of {', '.join(control.COMMANDS)}"}), 400
+
+    reply = control.send(serial_db, command, **data)
+    if reply is None:
+        return jsonify({
+            'success': False,
+            'error': 'not_running',
+            'message': f'No runner with a control channel for {serial_db}',
+        }), 404
+    ok = reply.pop('ok', False)
+    if not ok:
+        return jsonify({'success': False, 'error': 'rejected',
+                        'message': reply.get('error')}), 409
+    return jsonify({'success': True, 'serial': serial_db, 'command': command, **reply})
+
+
+@bot_launcher_bp.route('/plan', methods=['GET', 'POST'])
+def runtime_plan():
+    """
+    GET  /api/bot/plan[?device=<serial>&full=1]
+        Preview the planned account windows per device and the idle hours
+        of the current windows (automation/runtime_planner.py).
+    POST /api/bot/plan  {"devices": [...], "full": false}
+        Apply: write the windows back. Incremental unless full — devices
+        whose accounts/settings/windows didn't change since their last
+        plan are skipped. Running bots pick the windows up next cycle.
+    """
+    from automation import runtime_planner
+
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        devices = data.get('devices') or None
+        full = bool(data.get('full'))
+        apply = True
+    else:
+        devices = request.args.getlist('device') or None
+        full = request.args.get('full', '0') in ('1', 'true', 'yes')
+        apply = False
+
+    try:
+        report = runtime_planner.plan(devices, apply=apply, full=full)
+        capacity = runtime_planner.capacity(devices)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    return jsonify({'success': True, **report, 'capacity': capacity})
+
+
 @bot_launcher_bp.route('/logs/<serial>', methods=['GET'])
 def get_logs(serial):
     """
     GET /api/bot/logs/<serial>
     Get recent log output for a device.
-    Query params: lines (default 100), date (YYYY-MM-DD, default today)
+    Query params:
+        lines   max lines (default 100)
+        date    YYYY-MM-DD (default today, else the newest file)
+        offset  return only lines appended after this byte offset — pass
+                back the `offset` of the previous response to poll
+        at      start at this time (HH:MM[:SS] or full timestamp) and read
+                forward instead of tailing
+        grep    only lines containing this (case-insensitive)
+    `reset` is true when the file was replaced since `offset`; the lines
+    are then a fresh tail.
     """
+    from automation import log_reader
+
     serial_db = serial.replace(':', '_')
     lines_count = request.args.get('lines', 100, type=int)
     date_str = request.args.get('date', None)
+    since = request.args.get('offset', None, type=int)
+    at = request.args.get('at')
+    grep = request.args.get('grep') or None
 
     log_file = _get_log_file(serial_db, date_str)
 
-    if not os.path.exists(log_file):
+    if log_file is None:
         # Try to find any log file for this device
-        pattern = os.path.join(LOG_DIR, f'{serial_db}_*.log')
-        available = sorted(glob.glob(pattern), reverse=True)
+        available = log_reader.available_logs(serial_db, LOG_DIR)
 
         if available:
-            log_file = available[0]
+            log_file = available[0]['path']
         else:
             return jsonify({
                 'success': True,
@@ -517,7 +681,17 @@ def get_logs(serial):
                 'log_file': None,
             })
 
-    lines = _tail_log(log_file, lines_count)
+    reset = False
+    try:
+        if since is not None:
+            lines, offset, reset = log_reader.read_since(log_file, since, lines_count, grep)
+        elif at:
+            start = log_reader.seek_time(log_file, at)
+            lines, offset = log_reader.read_from(log_file, start, lines_count, grep)
+        else:
+            lines, offset = log_reader.tail(log_file, lines_count, grep)
+    except OSError as e:
+        return jsonify({'success': False, 'error': f'Error reading log: {e}'}), 500
 
     return jsonify({
         'success': True,
@@ -525,4 +699,6 @@ def get_logs(serial):
         'lines': lines,
         'line_count': len(lines),
         'log_file': os.path.basename(log_file),
+        'offset': offset,
+        'reset': reset,
     })
@@ -14,6 +14,8 @@ from flask import Blueprint, jsonify, request
 # Add uiAutomator to path (now inside dashboard folder)
 sys.path.insert(0, str(Path(__file__).parent / "uiAutomator"))
 
+from db.connection import connect
+
 from bot_db import (
     get_bot_status, update_bot_status,
     query_account_sessions, calculate_device_metrics,
@@ -515,8 +517,7 @@ def get_device_accounts(device_serial):
     phone_farm_db = get_root_dir() / 'db' / 'phone_farm.db'
     if phone_farm_db.exists():
         try:
-            conn = sqlite3.connect(str(phone_farm_db))
-            conn.row_factory = sqlite3.Row
+            conn = connect(str(phone_farm_db))
             cursor = conn.cursor()
 
             cursor.execute("""
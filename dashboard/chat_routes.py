@@ -29,6 +29,7 @@ ROOT = HERE.parent.parent
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
+from db.connection import connect  # noqa: E402
 from hydra_tools import call_tool, get_openai_tools  # noqa: E402
 
 # Local module
@@ -46,9 +47,7 @@ DB_PATH = ROOT / "db" / "phone_farm.db"
 # Chat history persistence (chat_sessions + chat_messages tables)
 # ─────────────────────────────────────────────────────────────
 def _chat_db() -> sqlite3.Connection:
-    conn = sqlite3.connect(str(DB_PATH))
-    conn.row_factory = sqlite3.Row
-    return conn
+    return connect(str(DB_PATH))
 
 
 def _init_chat_tables():
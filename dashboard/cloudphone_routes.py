@@ -30,7 +30,6 @@ Routes:
 import asyncio
 import json
 import os
-import sqlite3
 import sys
 import threading
 import uuid
@@ -42,6 +41,7 @@ cloudphone_bp = Blueprint('cloudphone', __name__)
 _BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if _BASE not in sys.path:
     sys.path.insert(0, _BASE)
+from db.connection import connect  # noqa: E402
 _DB = os.path.join(_BASE, 'db', 'phone_farm.db')
 
 CP_WS_URL = os.environ.get('CLOUDPHONE_WS', 'ws://127.0.0.1:33332/')
@@ -184,8 +184,7 @@ def devices():
 
     meta = {}
     try:
-        c = sqlite3.connect(_DB)
-        c.row_factory = sqlite3.Row
+        c = connect(_DB)
         for r in c.execute("SELECT device_serial, device_name, device_group FROM devices"):
             meta[r['device_serial']] = (r['device_name'], r['device_group'])
         c.close()
@@ -112,20 +112,27 @@ def _spoof_single_media(media_path, preset='medium', allow_mirror=True):
                   os.path.basename(media_path or ''), e)
         return media_path
 
-# Wake-signal dir — "Post NOW" drops one file per device serial here; the
-# per-device run_device.py runners consume it to skip their cooldown sleep.
-# Same path as defined in run_device.py.
+# Wake-signal dir — "Post NOW" drops one file per device serial here when
+# the runner has no control channel (automation/control.py); runners
+# consume it to skip their cooldown sleep. Same path as in run_device.py.
 WAKE_DIR = os.path.join(BASE_DIR, 'runtime', 'wake')
 
 
 def _drop_wake_file(device_serial):
-    """Create / touch a wake-signal file for one device serial. The matching
-    DeviceRunner._sleep() consumes it on its next iteration."""
+    """Wake the device's runner: a control-channel 'wake' (immediate), else
+    a wake-signal file the runner's next sleep consumes."""
     if not device_serial:
         return False
+    safe = device_serial.replace(':', '_')
+    try:
+        from automation import control
+        reply = control.send(safe, 'wake')
+        if reply and reply.get('ok'):
+            return True
+    except Exception as e:
+        log.debug("control wake failed for %s: %s", device_serial, e)
     try:
         os.makedirs(WAKE_DIR, exist_ok=True)
-        safe = device_serial.replace(':', '_')
         path = os.path.join(WAKE_DIR, safe + '.touch')
         with open(path, 'w', encoding='utf-8') as f:
             f.write(datetime.utcnow().isoformat())
@@ -15,7 +15,6 @@ API endpoints:
 import os
 import sys
 import json
-import sqlite3
 import subprocess
 import threading
 import time
@@ -31,79 +30,22 @@ DB_PATH = os.path.join(
 
 device_manager_bp = Blueprint('device_manager', __name__)
 
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+from db.connection import connect  # noqa: E402
+from db.migrations import require_schema  # noqa: E402
+
 
 def _get_conn():
-    """Thread-safe connection with Row factory."""
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    return conn
-
-
-# Auto-create missing tables on import
-try:
-    import sys as _sys
-    _migrations_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    if _migrations_dir not in _sys.path:
-        _sys.path.insert(0, _migrations_dir)
-    from db.migrations import ensure_schema
-    ensure_schema()
-except Exception as _e:
-    # Fallback: create the most critical missing table inline
-    try:
-        _conn = sqlite3.connect(DB_PATH)
-        _conn.executescript("""
-            CREATE TABLE IF NOT EXISTS follower_snapshots (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                account_id INTEGER NOT NULL,
-                username TEXT,
-                followers INTEGER DEFAULT 0,
-                following INTEGER DEFAULT 0,
-                posts INTEGER DEFAULT 0,
-                captured_at TEXT DEFAULT (datetime('now')),
-                FOREIGN KEY (account_id) REFERENCES accounts(id)
-            );
-            CREATE TABLE IF NOT EXISTS job_orders (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                job_name TEXT, job_type TEXT NOT NULL, target TEXT,
-                target_count INTEGER DEFAULT 0, completed_count INTEGER DEFAULT 0,
-                limit_per_hour INTEGER DEFAULT 50, limit_per_day INTEGER DEFAULT 200,
-                comment_text TEXT, status TEXT DEFAULT 'active', priority INTEGER DEFAULT 0,
-                created_at TEXT DEFAULT (datetime('now')), updated_at TEXT,
-                report_reason TEXT, comment_list_id INTEGER, ai_mode TEXT,
-                vision_ai INTEGER DEFAULT 0, finished_at TEXT
-            );
-            CREATE TABLE IF NOT EXISTS job_assignments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                job_id INTEGER NOT NULL, account_id INTEGER NOT NULL,
-                device_serial TEXT, username TEXT, status TEXT DEFAULT 'assigned',
-                completed_count INTEGER DEFAULT 0, last_action_at TEXT,
-                created_at TEXT DEFAULT (datetime('now'))
-            );
-            CREATE TABLE IF NOT EXISTS job_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                job_id INTEGER NOT NULL, account_id INTEGER NOT NULL,
-                action_type TEXT, target TEXT, status TEXT, error_message TEXT,
-                created_at TEXT DEFAULT (datetime('now'))
-            );
-        """)
-        _conn.commit()
-        _conn.close()
-    except Exception:
-        pass
-
-# Ensure is_private and private_switched_at columns exist on accounts
-try:
-    _conn2 = sqlite3.connect(DB_PATH)
-    _existing = [r[1] for r in _conn2.execute("PRAGMA table_info(accounts)").fetchall()]
-    if 'is_private' not in _existing:
-        _conn2.execute("ALTER TABLE accounts ADD COLUMN is_private INTEGER DEFAULT 0")
-    if 'private_switched_at' not in _existing:
-        _conn2.execute("ALTER TABLE accounts ADD COLUMN private_switched_at TEXT")
-    _conn2.commit()
-    _conn2.close()
-except Exception:
-    pass
+    """Thread-safe pooled connection with Row factory."""
+    return connect(DB_PATH)
+
+
+# Schema (follower_snapshots, job tables, accounts.is_private...) is owned by
+# db/migrations.py — one integer compare per process; ensure_schema() is the
+# explicit repair path (`python -m db.migrations`), not a startup step.
+require_schema(DB_PATH)
 
 
 def _row_to_dict(row):
@@ -311,6 +253,8 @@ def _get_accounts_with_stats(conn, device_serial, target_date=None):
     # snap_latest = most recent snapshot ever (fallback when nothing on/before date)
     # snap_today  = latest snapshot AS OF end of target_date (value "on that day")
     # snap_yesterday = latest snapshot AS OF end of (target_date - 1) (for delta)
+    # Each is one seek on idx_follower_snapshots_account_time per account of
+    # this device (a window over the whole table read every snapshot).
     rows = conn.execute("""
         SELECT a.id, a.device_serial, a.username, a.status,
                a.start_time, a.end_time, a.instagram_package,
@@ -323,23 +267,18 @@ def _get_accounts_with_stats(conn, device_serial, target_date=None):
                COALESCE(snap_yesterday.followers, snap_latest.followers) as prev_followers,
                COALESCE(snap_yesterday.following, snap_latest.following) as prev_following
         FROM accounts a
-        LEFT JOIN (
-            SELECT account_id, followers, following,
-                   ROW_NUMBER() OVER (PARTITION BY account_id ORDER BY captured_at DESC) as rn
-            FROM follower_snapshots
-        ) snap_latest ON snap_latest.account_id = a.id AND snap_latest.rn = 1
-        LEFT JOIN (
-            SELECT account_id, followers, following,
-                   ROW_NUMBER() OVER (PARTITION BY account_id ORDER BY captured_at DESC) as rn
-            FROM follower_snapshots
-            WHERE captured_at < ?
-        ) snap_today ON snap_today.account_id = a.id AND snap_today.rn = 1
-        LEFT JOIN (
-            SELECT account_id, followers, following,
-                   ROW_NUMBER() OVER (PARTITION BY account_id ORDER BY captured_at DESC) as rn
-            FROM follower_snapshots
-            WHERE captured_at < ?
-        ) snap_yesterday ON snap_yesterday.account_id = a.id AND snap_yesterday.rn = 1
+        LEFT JOIN follower_snapshots snap_latest ON snap_latest.id = (
+            SELECT id FROM follower_snapshots
+            WHERE account_id = a.id
+            ORDER BY captured_at DESC LIMIT 1)
+        LEFT JOIN follower_snapshots snap_today ON snap_today.id = (
+            SELECT id FROM follower_snapshots
+            WHERE account_id = a.id AND captured_at < ?
+            ORDER BY captured_at DESC LIMIT 1)
+        LEFT JOIN follower_snapshots snap_yesterday ON snap_yesterday.id = (
+            SELECT id FROM follower_snapshots
+            WHERE account_id = a.id AND captured_at < ?
+            ORDER BY captured_at DESC LIMIT 1)
         WHERE a.device_serial = ?
           AND COALESCE(a.status, '') != 'replaced'
         ORDER BY CAST(COALESCE(a.start_time, '0') AS INTEGER), a.username
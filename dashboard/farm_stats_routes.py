@@ -2,10 +2,13 @@
 farm_stats_routes.py - Farm Stats & Analytics Dashboard
 READ-ONLY analytics over phone_farm.db tables:
   action_history, account_stats, account_sessions, bot_status, bot_logs
+All-time / per-day action counts include archived rows via db.retention's
+rollups (action_history keeps only the retention window).
 """
 
 from flask import Blueprint, render_template, jsonify, request
 from phone_farm_db import get_conn, row_to_dict
+from db.retention import history_counts, retention_status, run_retention_once
 from datetime import datetime, timedelta
 
 farm_stats_bp = Blueprint('farm_stats', __name__)
@@ -35,23 +38,27 @@ def api_summary():
     conn = get_conn()
     try:
         today = _today()
+        tomorrow = _date_n_days_ago(-1)
         week_ago = _date_n_days_ago(7)
 
-        # Total actions today
+        # Total actions today (plain ranges, not date(col) = ?, so the
+        # timestamp indexes apply)
         r = conn.execute(
-            "SELECT COUNT(*) as cnt FROM action_history WHERE date(timestamp) = ?", (today,)
+            "SELECT COUNT(*) as cnt FROM action_history WHERE timestamp >= ? AND timestamp < ?",
+            (today, tomorrow)
         ).fetchone()
         actions_today = r['cnt'] if r else 0
 
         # Total actions this week
         r = conn.execute(
-            "SELECT COUNT(*) as cnt FROM action_history WHERE date(timestamp) >= ?", (week_ago,)
+            "SELECT COUNT(*) as cnt FROM action_history WHERE timestamp >= ?", (week_ago,)
         ).fetchone()
         actions_week = r['cnt'] if r else 0
 
-        # Total actions all time
-        r = conn.execute("SELECT COUNT(*) as cnt FROM action_history").fetchone()
-        actions_all = r['cnt'] if r else 0
+        # Total actions all time (live + archived) and failures, for the error rate
+        by_outcome = {r['outcome']: r['n'] for r in
+                      history_counts('action_history', group_by=('outcome',))}
+        actions_all = sum(by_outcome.values())
 
         # Active devices
         r = conn.execute(
@@ -65,14 +72,14 @@ def api_summary():
 
         # Sessions today
         r = conn.execute(
-            "SELECT COUNT(*) as cnt FROM account_sessions WHERE date(session_start) = ?", (today,)
+            "SELECT COUNT(*) as cnt FROM account_sessions WHERE session_start >= ? AND session_start < ?",
+            (today, tomorrow)
         ).fetchone()
         sessions_today = r['cnt'] if r else 0
 
         # Error rate
-        r = conn.execute("SELECT COUNT(*) as total, SUM(CASE WHEN success=0 THEN 1 ELSE 0 END) as failed FROM action_history").fetchone()
-        total_acts = r['total'] if r else 0
-        failed_acts = r['failed'] if r else 0
+        total_acts = actions_all
+        failed_acts = by_outcome.get('0', 0)
         error_rate = round((failed_acts / total_acts * 100), 1) if total_acts > 0 else 0
 
         return jsonify({
@@ -94,66 +101,40 @@ def api_summary():
 
 @farm_stats_bp.route('/api/farm-stats/actions-over-time')
 def api_actions_over_time():
-    conn = get_conn()
-    try:
-        days = request.args.get('days', '30')
-        if days == 'all':
-            where = ''
-            params = []
-        else:
-            n = int(days)
-            since = _date_n_days_ago(n)
-            where = 'WHERE date(timestamp) >= ?'
-            params = [since]
+    days = request.args.get('days', '30')
+    since = None if days == 'all' else _date_n_days_ago(int(days))
+    rows = history_counts('action_history', start=since, group_by=('day', 'kind'))
 
-        rows = conn.execute(f"""
-            SELECT date(timestamp) as day, action_type, COUNT(*) as cnt
-            FROM action_history
-            {where}
-            GROUP BY day, action_type
-            ORDER BY day
-        """, params).fetchall()
-
-        # Build {date: {type: count}}
-        data = {}
-        action_types = set()
-        for r in rows:
-            d = r['day']
-            at = r['action_type']
-            action_types.add(at)
-            if d not in data:
-                data[d] = {}
-            data[d][at] = r['cnt']
-
-        dates = sorted(data.keys())
-        action_types = sorted(action_types)
-
-        series = {}
-        for at in action_types:
-            series[at] = [data.get(d, {}).get(at, 0) for d in dates]
-
-        return jsonify({'dates': dates, 'series': series, 'action_types': action_types})
-    finally:
-        conn.close()
+    # Build {date: {type: count}}
+    data = {}
+    action_types = set()
+    for r in rows:
+        d = r['day']
+        at = r['kind']
+        action_types.add(at)
+        if d not in data:
+            data[d] = {}
+        data[d][at] = r['n']
+
+    dates = sorted(data.keys())
+    action_types = sorted(action_types)
+
+    series = {}
+    for at in action_types:
+        series[at] = [data.get(d, {}).get(at, 0) for d in dates]
+
+    return jsonify({'dates': dates, 'series': series, 'action_types': action_types})
 
 
 # ── API: Action breakdown (doughnut) ────────────────────────────────
 
 @farm_stats_bp.route('/api/farm-stats/action-breakdown')
 def api_action_breakdown():
-    conn = get_conn()
-    try:
-        rows = conn.execute("""
-            SELECT action_type, COUNT(*) as cnt
-            FROM action_history
-            GROUP BY action_type
-            ORDER BY cnt DESC
-        """).fetchall()
-        labels = [r['action_type'] for r in rows]
-        values = [r['cnt'] for r in rows]
-        return jsonify({'labels': labels, 'values': values})
-    finally:
-        conn.close()
+    rows = sorted(history_counts('action_history', group_by=('kind',)),
+                  key=lambda r: -r['n'])
+    labels = [r['kind'] for r in rows]
+    values = [r['n'] for r in rows]
+    return jsonify({'labels': labels, 'values': values})
 
 
 # ── API: Follower growth ────────────────────────────────────────────
@@ -301,6 +282,7 @@ def api_device_stats():
     conn = get_conn()
     try:
         today = _today()
+        tomorrow = _date_n_days_ago(-1)
 
         rows = conn.execute("""
             SELECT
@@ -310,15 +292,33 @@ def api_device_stats():
                 bs.last_check_at,
                 bs.actions_today,
                 bs.accounts_run_today,
-                (SELECT COUNT(DISTINCT ah.username) FROM action_history ah WHERE ah.device_serial = bs.device_serial) as total_accounts,
-                (SELECT COUNT(*) FROM action_history ah WHERE ah.device_serial = bs.device_serial AND date(ah.timestamp) = ?) as actions_today_actual,
-                (SELECT COUNT(*) FROM account_sessions s WHERE s.device_serial = bs.device_serial AND date(s.session_start) = ?) as sessions_today
+                (SELECT COUNT(*) FROM action_history ah WHERE ah.device_serial = bs.device_serial
+                    AND ah.timestamp >= ? AND ah.timestamp < ?) as actions_today_actual,
+                (SELECT COUNT(*) FROM account_sessions s WHERE s.device_serial = bs.device_serial
+                    AND s.session_start >= ? AND s.session_start < ?) as sessions_today
             FROM bot_status bs
             ORDER BY bs.device_serial
-        """, (today, today)).fetchall()
-        return jsonify([dict(r) for r in rows])
+        """, (today, tomorrow, today, tomorrow)).fetchall()
+
+        # Distinct accounts ever run per device, archived history included
+        # (DISTINCT pairs straight off idx_action_history_device_user)
+        accounts = {r['device_serial']: r['n'] for r in conn.execute("""
+            SELECT device_serial, COUNT(*) AS n FROM (
+                SELECT DISTINCT device_serial, username FROM action_history
+                WHERE username != ''
+                UNION
+                SELECT grp, subject FROM archive_rollups
+                WHERE source_table = 'action_history' AND subject != ''
+            ) GROUP BY device_serial
+        """)}
     finally:
         conn.close()
+    out = []
+    for r in rows:
+        d = dict(r)
+        d['total_accounts'] = accounts.get(d['device_serial'], 0)
+        out.append(d)
+    return jsonify(out)
 
 
 # ── API: Error log ──────────────────────────────────────────────────
@@ -339,3 +339,16 @@ def api_errors():
         return jsonify([dict(r) for r in rows])
     finally:
         conn.close()
+
+
+# ── API: Retention / archives ───────────────────────────────────────
+
+@farm_stats_bp.route('/api/farm-stats/retention')
+def api_retention_status():
+    return jsonify(retention_status())
+
+
+@farm_stats_bp.route('/api/farm-stats/retention/run', methods=['POST'])
+def api_retention_run():
+    data = request.get_json(silent=True) or {}
+    return jsonify(run_retention_once(dry_run=bool(data.get('dry_run'))))
@@ -0,0 +1,164 @@
+"""
+lazy_blueprints.py — take route-module imports off the startup path
+====================================================================
+simple_app.py used to import every *_routes.py module at startup, and each
+of those pulls in its own tree (uiAutomator, PIL/piexif, LLM providers, adb
+helpers...), all before the server could even bind its port.
+
+Blueprints are declared instead of imported:
+
+    lazy = LazyBlueprints(app)
+    lazy.add('proxy_routes', 'proxy_bp')
+    lazy.add('job_orders_routes', 'job_orders_bp', url_prefix='/job-orders')
+    lazy.add('chat_routes', 'chat_bp', optional=True)
+    lazy.install()
+
+install() registers the eager ones and starts a background thread that
+imports the rest, so the server comes up while they load. A WSGI wrapper
+in front of app.wsgi_app registers every pending blueprint, under a lock,
+before the FIRST request is dispatched — concurrent first requests wait
+for it. After that the app's routing state is never touched again: Flask
+forbids setup methods once it has served a request, and other threads are
+routing against the url_map by then.
+
+  - eager=True for modules with import-time side effects the farm relies on
+    (e.g. ai_executor_routes starts its scheduler thread on import);
+  - HYDRA_EAGER_BLUEPRINTS=1 restores the old import-everything startup.
+
+optional=True keeps the old feature-gated behaviour: an import failure
+prints "[name] disabled — import failed" and the blueprint is dropped.
+A required module that fails to import is logged and its URLs 404 until
+the dashboard is restarted.
+"""
+
+import importlib
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger('dashboard')
+
+
+class _Entry:
+    __slots__ = ('module', 'attr', 'options', 'optional', 'eager', 'name')
+
+    def __init__(self, module, attr, options, optional, eager, name):
+        self.module = module
+        self.attr = attr
+        self.options = options
+        self.optional = optional
+        self.eager = eager
+        self.name = name or module
+
+
+class LazyBlueprints:
+    """Defers `import module; app.register_blueprint(module.attr)` off the
+    startup path, finishing before the first request is dispatched."""
+
+    def __init__(self, app):
+        self.app = app
+        self._pending = []          # [_Entry] in declaration order
+        self._loaded = {}           # name -> seconds spent importing+registering
+        self._failed = {}           # name -> error string
+        self._lock = threading.Lock()
+        self._sealed = False        # True once the first request went through
+        self._importer = None
+
+    def add(self, module, attr, url_prefix=None, optional=False, eager=False,
+            name=None):
+        """Declare a blueprint. url_prefix overrides the Blueprint() one,
+        same as app.register_blueprint(bp, url_prefix=...)."""
+        options = {} if url_prefix is None else {'url_prefix': url_prefix}
+        entry = _Entry(module, attr, options, optional, eager, name)
+        self._pending.append(entry)
+        return entry
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def _register(self, entry):
+        """Import + register one pending blueprint. Caller holds the lock
+        and no request has been dispatched yet."""
+        t0 = time.perf_counter()
+        self._pending.remove(entry)
+        try:
+            bp = getattr(importlib.import_module(entry.module), entry.attr)
+        except Exception as e:
+            self._failed[entry.name] = str(e)
+            if entry.optional:
+                print(f"[{entry.name}] disabled — import failed: {e}")
+            else:
+                log.exception("Blueprint %s failed to import", entry.name)
+            return
+        try:
+            self.app.register_blueprint(bp, **entry.options)
+        except Exception as e:
+            log.exception("Blueprint %s failed to register", entry.name)
+            self._failed[entry.name] = str(e)
+            return
+        self._loaded[entry.name] = time.perf_counter() - t0
+
+    def load(self, entries):
+        with self._lock:
+            for entry in list(entries):
+                if entry in self._pending:
+                    self._register(entry)
+
+    def load_all(self):
+        self.load(list(self._pending))
+
+    def _import_pending(self):
+        """Background warm-up: import (not register) the pending modules so
+        the first request finds them in sys.modules."""
+        for entry in list(self._pending):
+            if self._sealed:
+                return
+            try:
+                importlib.import_module(entry.module)
+            except Exception:
+                pass        # reported by _register()
+
+    def _seal(self):
+        with self._lock:
+            if self._sealed:
+                return
+            t0 = time.perf_counter()
+            for entry in list(self._pending):
+                self._register(entry)
+            self._sealed = True
+        log.info("Lazy blueprints registered before first request in %.0f ms",
+                 (time.perf_counter() - t0) * 1000)
+
+    # ------------------------------------------------------------------
+    # WSGI
+    # ------------------------------------------------------------------
+
+    def install(self):
+        """Register eager blueprints now, import the rest in the background
+        and hook the WSGI app so all are registered before first dispatch."""
+        if os.environ.get('HYDRA_EAGER_BLUEPRINTS', '').strip() in ('1', 'true', 'yes'):
+            self.load_all()
+        else:
+            self.load([e for e in self._pending if e.eager])
+        if self._pending:
+            self._importer = threading.Thread(target=self._import_pending, daemon=True,
+                                              name='blueprint-import')
+            self._importer.start()
+        inner = self.app.wsgi_app
+
+        def lazy_wsgi_app(environ, start_response):
+            if not self._sealed:
+                self._seal()
+            return inner(environ, start_response)
+
+        self.app.wsgi_app = lazy_wsgi_app
+        return self
+
+    def status(self):
+        return {
+            'pending': [e.name for e in self._pending],
+            'loaded_ms': {k: round(v * 1000, 1) for k, v in self._loaded.items()},
+            'failed': dict(self._failed),
+        }
@@ -33,10 +33,15 @@ import json
 import os
 import sys
 import time
-import urllib.request
-import urllib.error
+from pathlib import Path
 from typing import Any, Callable, Iterable, Iterator
 
+_ROOT = str(Path(__file__).resolve().parent.parent)
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+
+from automation.http_pool import get_pool  # noqa: E402
+
 
 # OpenAI-compatible base URLs for known providers
 PROVIDER_DEFAULTS = {
@@ -58,42 +63,18 @@ OPENAI_COMPAT_PROVIDERS = {"openai", "deepseek", "groq", "ollama", "openai_compa
 
 
 # ─────────────────────────────────────────────────────────────
-# HTTP helpers (stdlib only — no extra deps)
+# HTTP helpers — pooled keep-alive transport (automation/http_pool.py)
 # ─────────────────────────────────────────────────────────────
+# Tool loops make several calls per chat turn; reusing the TLS connection
+# removes a full handshake from every round.
 def _http_post_stream(url: str, headers: dict, body: dict, timeout: int = 120) -> Iterator[str]:
     """POST JSON, yield each line of a streaming response (SSE 'data: ...')."""
-    data = json.dumps(body).encode("utf-8")
-    req = urllib.request.Request(url, data=data, headers=headers, method="POST")
-    try:
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            for raw in resp:
-                line = raw.decode("utf-8", errors="replace").rstrip("\n\r")
-                if not line:
-                    continue
-                yield line
-    except urllib.error.HTTPError as e:
-        body_text = ""
-        try:
-            body_text = e.read().decode("utf-8", errors="replace")
-        except Exception:
-            pass
-        raise RuntimeError(f"HTTP {e.code}: {body_text or e.reason}") from e
+    yield from get_pool().post_stream(url, headers, body, timeout=timeout)
 
 
 def _http_post_json(url: str, headers: dict, body: dict, timeout: int = 60) -> dict:
     """POST JSON, return parsed JSON response."""
-    data = json.dumps(body).encode("utf-8")
-    req = urllib.request.Request(url, data=data, headers=headers, method="POST")
-    try:
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            return json.loads(resp.read().decode("utf-8", errors="replace"))
-    except urllib.error.HTTPError as e:
-        body_text = ""
-        try:
-            body_text = e.read().decode("utf-8", errors="replace")
-        except Exception:
-            pass
-        raise RuntimeError(f"HTTP {e.code}: {body_text or e.reason}") from e
+    return get_pool().post_json(url, headers, body, timeout=timeout)
 
 
 # ─────────────────────────────────────────────────────────────
@@ -24,10 +24,13 @@ try:
 except ImportError:
     _HAS_SOURCE_MANAGER = False
 
+from db.connection import connect  # noqa: E402
+
 # Create a Blueprint for the sources management routes
 sources_bp = Blueprint('sources', __name__)
 
-# Helper function to get a database connection
+# Helper function to get a database connection — legacy per-device DBs;
+# phone_farm.db goes through the pooled db.connection.connect()
 def get_db_connection(db_path):
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
@@ -55,7 +58,7 @@ def get_devices():
             conn.close()
             return devices
 
-        conn = get_db_connection(PHONE_FARM_DB)
+        conn = connect(PHONE_FARM_DB)
         cursor = conn.cursor()
         cursor.execute('SELECT id, device_serial, device_name, ip_address, status FROM devices ORDER BY device_serial')
         devices = []
@@ -86,7 +89,7 @@ def get_accounts(device_id):
             conn.close()
             return accounts
 
-        conn = get_db_connection(PHONE_FARM_DB)
+        conn = connect(PHONE_FARM_DB)
         cursor = conn.cursor()
         cursor.execute(
             'SELECT id, device_serial, username, password, instagram_package, status, start_time, end_time FROM accounts WHERE device_serial = ?',
@@ -110,7 +113,7 @@ def get_account_tags(device_id, account_name):
     try:
         # Try phone_farm.db first (new system)
         if os.path.exists(PHONE_FARM_DB):
-            conn = get_db_connection(PHONE_FARM_DB)
+            conn = connect(PHONE_FARM_DB)
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT t.name
@@ -186,7 +189,7 @@ def get_all_accounts_with_sources(source_type='follow'):
     try:
         db_source_type = _DB_SOURCE_TYPE_MAP.get(source_type, source_type)
 
-        conn = get_db_connection(PHONE_FARM_DB)
+        conn = connect(PHONE_FARM_DB)
         cursor = conn.cursor()
 
         cursor.execute('''
@@ -272,7 +275,7 @@ def update_sources_files(account_data, source_type=None):
         # blocked, so you couldn't remove the last/all sources.
         username_list = [u.strip() for u in (usernames or '').split('\n') if u.strip()]
 
-        conn = sqlite3.connect(PHONE_FARM_DB)
+        conn = connect(PHONE_FARM_DB, row_factory=None)
         cursor = conn.cursor()
 
         success_count = 0
@@ -390,7 +393,7 @@ def api_sources_info():
     db_key = _DB_SOURCE_TYPE_MAP.get(action_type)
     if db_key:
         try:
-            conn = get_db_connection(PHONE_FARM_DB)
+            conn = connect(PHONE_FARM_DB)
             cursor = conn.cursor()
             cursor.execute(
                 'SELECT id FROM accounts WHERE device_serial = ? AND username = ?',
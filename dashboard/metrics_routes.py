@@ -0,0 +1,88 @@
+"""
+metrics_routes.py - Live runner metrics
+=========================================
+Aggregates the memory-mapped snapshots each run_device.py process publishes
+(automation/metrics.py) — no SQLite queries involved.
+
+Routes:
+  GET /metrics             → Prometheus text exposition (all live runners)
+  GET /api/metrics/live    → JSON: per-runner counters/gauges/latency + totals
+  GET /api/metrics/rpc     → JSON: u2 RPC latency/error rate per device+method
+  GET /api/metrics/rpc/reports[?device=]        → saved per-session RPC reports
+  GET /api/metrics/rpc/reports/<device>/<file>  → one report
+  GET /api/metrics/db      → JSON: this process's SQLite pool + slow-query counts
+"""
+
+import os
+import sys
+
+from flask import Blueprint, Response, jsonify, request
+
+_BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _BASE not in sys.path:
+    sys.path.insert(0, _BASE)
+
+from automation.metrics import read_published, render_prometheus, summarize  # noqa: E402
+from automation.rpc_instrument import list_reports, load_report, summarize_rpc  # noqa: E402
+from db.connection import pool_stats  # noqa: E402
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+def _max_age():
+    try:
+        return max(1, int(request.args.get('max_age', 30)))
+    except (TypeError, ValueError):
+        return 30
+
+
+@metrics_bp.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint."""
+    text = render_prometheus(read_published(max_age=_max_age()))
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+
+@metrics_bp.route('/api/metrics/live')
+def api_metrics_live():
+    """Live throughput/latency for every runner that published recently."""
+    try:
+        return jsonify({'success': True, **summarize(read_published(max_age=_max_age()))})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@metrics_bp.route('/api/metrics/rpc')
+def api_metrics_rpc():
+    """Live u2 RPC latency table (slow phone vs slow link vs slow code)."""
+    try:
+        rows = summarize_rpc(read_published(max_age=_max_age()))
+        device = request.args.get('device')
+        if device:
+            rows = [r for r in rows if r['device'] == device]
+        return jsonify({'success': True, 'rpc': rows, 'count': len(rows)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@metrics_bp.route('/api/metrics/rpc/reports')
+def api_metrics_rpc_reports():
+    try:
+        limit = min(500, max(1, int(request.args.get('limit', 50))))
+    except (TypeError, ValueError):
+        limit = 50
+    reports = list_reports(request.args.get('device'), limit=limit)
+    return jsonify({'success': True, 'reports': reports, 'count': len(reports)})
+
+
+@metrics_bp.route('/api/metrics/rpc/reports/<device>/<fname>')
+def api_metrics_rpc_report(device, fname):
+    report = load_report(device, fname)
+    if report is None:
+        return jsonify({'success': False, 'error': 'Report not found'}), 404
+    return jsonify({'success': True, 'report': report})
+
+
+@metrics_bp.route('/api/metrics/db')
+def api_metrics_db():
+    return jsonify({'success': True, 'pool': pool_stats()})
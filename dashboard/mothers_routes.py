@@ -8,7 +8,7 @@ Endpoints:
 """
 
 import os
-import sqlite3
+import sys
 import subprocess
 import time
 from flask import Blueprint, jsonify, request, render_template, abort, Response
@@ -17,13 +17,13 @@ mothers_bp = Blueprint('mothers', __name__)
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DB_PATH = os.path.join(BASE_DIR, 'db', 'phone_farm.db')
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+from db.connection import connect  # noqa: E402
 
 
 def _conn():
-    c = sqlite3.connect(DB_PATH, timeout=10)
-    c.row_factory = sqlite3.Row
-    c.execute("PRAGMA journal_mode=WAL")
-    return c
+    return connect(DB_PATH)
 
 
 def _normalize_tag(tag):
@@ -258,7 +258,8 @@ def list_slaves(account_id):
         today_rows = conn.execute(f"""
             SELECT username, action_type, COUNT(*) AS cnt
             FROM action_history
-            WHERE username IN ({ph}) AND DATE(timestamp)=DATE('now') AND success=1
+            WHERE username IN ({ph}) AND success=1
+              AND timestamp >= DATE('now') AND timestamp < DATE('now', '+1 day')
             GROUP BY username, action_type
         """, slave_usernames).fetchall()
         week_rows = conn.execute(f"""
@@ -272,7 +273,8 @@ def list_slaves(account_id):
         err_rows = conn.execute(f"""
             SELECT username, COUNT(*) AS cnt
             FROM action_history
-            WHERE username IN ({ph}) AND DATE(timestamp)=DATE('now') AND success=0
+            WHERE username IN ({ph}) AND success=0
+              AND timestamp >= DATE('now') AND timestamp < DATE('now', '+1 day')
             GROUP BY username
         """, slave_usernames).fetchall()
         last_rows = conn.execute(f"""
@@ -677,72 +679,41 @@ def device_stream(device_serial):
     """
     MJPEG stream of the device screen via multipart/x-mixed-replace.
     Browser <img src=this> auto-refreshes as frames arrive (no flicker).
-    Re-encodes PNG → JPEG for ~3x smaller frames (smoother on LAN).
+
+    All tabs watching the same device share ONE capture session
+    (screen_stream.py: scrcpy H.264 when PyAV is available, otherwise a
+    single screencap loop) — opening more tabs no longer multiplies adb load.
 
     Query params:
-      quality (int 1-100, default 75)  — JPEG quality
+      quality (int 10-95, default 75)  — JPEG quality
       scale (float 0.1-1.0, default 0.6) — resize factor (0.6 → ~640x1152)
+      fps (float 0.5-20, default 8)     — max frame rate for this viewer
     """
+    from screen_stream import BOUNDARY, mjpeg_stream
+
     adb_serial = device_serial.replace('_', ':')
-    quality = max(10, min(95, int(request.args.get('quality', 75))))
-    scale = max(0.1, min(1.0, float(request.args.get('scale', 0.6))))
-    boundary = b'frame'
-
-    def gen():
-        from io import BytesIO
-        from PIL import Image
-        last_err_log = 0.0
-        while True:
-            try:
-                proc = subprocess.run(
-                    ['adb', '-s', adb_serial, 'exec-out', 'screencap', '-p'],
-                    capture_output=True, timeout=5, check=False
-                )
-                png = proc.stdout
-                if proc.returncode != 0 or not png or len(png) < 100:
-                    # Throttle on errors so we don't spam ADB
-                    time.sleep(0.5)
-                    continue
-                # Decode PNG → resize → encode JPEG
-                try:
-                    img = Image.open(BytesIO(png))
-                    if img.mode == 'RGBA':
-                        img = img.convert('RGB')
-                    if scale < 1.0:
-                        new_w = max(64, int(img.width * scale))
-                        new_h = max(64, int(img.height * scale))
-                        img = img.resize((new_w, new_h), Image.BILINEAR)
-                    buf = BytesIO()
-                    img.save(buf, format='JPEG', quality=quality, optimize=False)
-                    body = buf.getvalue()
-                except Exception:
-                    # Fall back to raw PNG
-                    body = png
-                    mime = b'image/png'
-                else:
-                    mime = b'image/jpeg'
-
-                yield (b'--' + boundary + b'\r\n'
-                       b'Content-Type: ' + mime + b'\r\n'
-                       b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n'
-                       + body + b'\r\n')
-                time.sleep(0.05)  # tiny breath between frames
-            except GeneratorExit:
-                return
-            except Exception:
-                # Don't spam logs — slow down on persistent errors
-                if time.time() - last_err_log > 5:
-                    last_err_log = time.time()
-                time.sleep(1)
+    try:
+        quality = max(10, min(95, int(request.args.get('quality', 75))))
+        scale = max(0.1, min(1.0, float(request.args.get('scale', 0.6))))
+        fps = max(0.5, min(20.0, float(request.args.get('fps', 8))))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Bad quality/scale/fps'}), 400
 
     return Response(
-        gen(),
-        mimetype='multipart/x-mixed-replace; boundary=' + boundary.decode(),
+        mjpeg_stream(adb_serial, fps=fps, scale=scale, quality=quality),
+        mimetype='multipart/x-mixed-replace; boundary=' + BOUNDARY.decode(),
         headers={'Cache-Control': 'no-store, no-cache', 'Pragma': 'no-cache',
                  'X-Accel-Buffering': 'no'}
     )
 
 
+@mothers_bp.route('/api/devices/streams', methods=['GET'])
+def device_streams_status():
+    """Live capture sessions: backend, viewers, target fps, frame age."""
+    from screen_stream import stream_status
+    return jsonify({'success': True, 'streams': stream_status()})
+
+
 @mothers_bp.route('/api/devices/<path:device_serial>/tap', methods=['POST'])
 def device_tap(device_serial):
     """Forward a tap event to the device. Body: {x: int, y: int} (device pixels)."""
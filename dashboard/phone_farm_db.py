@@ -5,107 +5,40 @@ Single source of truth for all device/account operations.
 All new blueprints should use this module instead of direct DB access.
 """
 
+import copy
+import json
 import sqlite3
 import os
+import sys
+import threading
+import time
 from datetime import datetime
 
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+from db.migrations import require_schema, ROW_VERSION_TABLES
+from db.connection import connect
+
 # Path to the central database
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'db', 'phone_farm.db')
+DB_PATH = os.path.join(_ROOT, 'db', 'phone_farm.db')
 
 CLONE_LETTERS = list('efghijklmnop')  # 12 clone slots per device
 
 
-def get_conn():
-    """Get a connection to phone_farm.db with Row factory."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA foreign_keys=ON")
-    return conn
+# Tables fronted by the read-through cache (see "READ-THROUGH CACHE" below);
+# their row_versions triggers are created by db/migrations.py
+_CACHE_TABLES = ROW_VERSION_TABLES
 
 
-def _ensure_columns():
-    """Add missing columns to existing tables (safe migrations)."""
-    try:
-        conn = get_conn()
-        # Add device_group to devices table
-        try:
-            conn.execute("ALTER TABLE devices ADD COLUMN device_group TEXT DEFAULT ''")
-            conn.commit()
-        except Exception:
-            pass  # Column already exists
-
-        # ── Business Profile columns on accounts table ──
-        for col_def in [
-            "ALTER TABLE accounts ADD COLUMN is_business_profile INTEGER DEFAULT 0",
-            "ALTER TABLE accounts ADD COLUMN business_category TEXT DEFAULT ''",
-            "ALTER TABLE accounts ADD COLUMN business_switched_at TEXT",
-        ]:
-            try:
-                conn.execute(col_def)
-                conn.commit()
-            except Exception:
-                pass  # Column already exists
-
-        # ── Insights tables ──
-        conn.executescript("""
-            CREATE TABLE IF NOT EXISTS account_insights (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                account_id INTEGER NOT NULL,
-                username TEXT NOT NULL,
-                device_serial TEXT NOT NULL,
-                period_type TEXT NOT NULL DEFAULT '7d',
-                accounts_reached INTEGER DEFAULT 0,
-                accounts_reached_delta REAL DEFAULT 0,
-                accounts_engaged INTEGER DEFAULT 0,
-                accounts_engaged_delta REAL DEFAULT 0,
-                profile_visits INTEGER DEFAULT 0,
-                website_clicks INTEGER DEFAULT 0,
-                email_clicks INTEGER DEFAULT 0,
-                follower_demographics TEXT DEFAULT '{}',
-                engagement_breakdown TEXT DEFAULT '{}',
-                captured_at TEXT NOT NULL DEFAULT (datetime('now')),
-                FOREIGN KEY (account_id) REFERENCES accounts(id)
-            );
-
-            CREATE INDEX IF NOT EXISTS idx_insights_username ON account_insights(username);
-            CREATE INDEX IF NOT EXISTS idx_insights_captured ON account_insights(captured_at);
-            CREATE INDEX IF NOT EXISTS idx_insights_account ON account_insights(account_id);
-
-            CREATE TABLE IF NOT EXISTS content_insights (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                account_id INTEGER NOT NULL,
-                username TEXT NOT NULL,
-                device_serial TEXT NOT NULL,
-                content_type TEXT NOT NULL,
-                content_id TEXT,
-                reach INTEGER DEFAULT 0,
-                impressions INTEGER DEFAULT 0,
-                likes INTEGER DEFAULT 0,
-                comments INTEGER DEFAULT 0,
-                shares INTEGER DEFAULT 0,
-                saves INTEGER DEFAULT 0,
-                plays INTEGER DEFAULT 0,
-                profile_visits INTEGER DEFAULT 0,
-                follows INTEGER DEFAULT 0,
-                exits INTEGER DEFAULT 0,
-                forwards INTEGER DEFAULT 0,
-                backwards INTEGER DEFAULT 0,
-                replies INTEGER DEFAULT 0,
-                captured_at TEXT NOT NULL DEFAULT (datetime('now')),
-                FOREIGN KEY (account_id) REFERENCES accounts(id)
-            );
-
-            CREATE INDEX IF NOT EXISTS idx_content_insights_username ON content_insights(username);
-            CREATE INDEX IF NOT EXISTS idx_content_insights_captured ON content_insights(captured_at);
-        """)
-        conn.commit()
+def get_conn():
+    """Get a pooled connection to phone_farm.db with Row factory (db.connection)."""
+    return connect(DB_PATH, foreign_keys=True)
 
-        conn.close()
-    except Exception:
-        pass
 
-_ensure_columns()
+# Schema (insights tables, business columns, row_versions triggers) is owned
+# by db/migrations.py — one integer compare per process instead of ALTER probes.
+require_schema(DB_PATH)
 
 
 def row_to_dict(row):
@@ -119,42 +52,192 @@ def rows_to_dicts(rows):
 
 
 # ─────────────────────────────────────────────
-# DEVICE operations
+# READ-THROUGH CACHE (devices / accounts / settings)
 # ─────────────────────────────────────────────
+# Process-wide cache shared by every blueprint. Each entry remembers the
+# row_versions counters it was built from; a read costs one SELECT against a
+# pooled connection and only reloads when a trigger has bumped the
+# version (any process) or a write in this module called _invalidate().
 
-def get_all_devices():
-    """Get all devices with account counts."""
-    conn = get_conn()
+_cache_lock = threading.Lock()
+_cache = {}                    # name -> (versions tuple, data)
+_settings_parsed = {}          # account_id -> (settings_json text, parsed dict)
+_settings_lock = threading.Lock()
+
+
+def _row_versions(conn):
     try:
-        devices = rows_to_dicts(conn.execute("""
-            SELECT d.*,
-                   COUNT(a.id) as account_count
-            FROM devices d
-            LEFT JOIN accounts a ON a.device_id = d.id
-            GROUP BY d.id
-            ORDER BY d.device_serial
-        """).fetchall())
-        return devices
-    finally:
-        conn.close()
+        return {r['name']: r['version']
+                for r in conn.execute("SELECT name, version FROM row_versions")}
+    except sqlite3.Error:
+        return None  # pre-migration DB — cache disabled, always read through
 
 
-def get_device_by_id(device_id):
-    conn = get_conn()
+def _cached(name, tables, loader, ttl=None):
+    """Return cached data for `name`, reloading if any of `tables` changed.
+
+    ttl: optional max age in seconds, for data that also depends on tables
+    without row_versions triggers (e.g. action_history — too hot to track).
+    """
+    conn = connect(DB_PATH)
     try:
-        row = conn.execute("SELECT * FROM devices WHERE id = ?", (device_id,)).fetchone()
-        return row_to_dict(row)
+        versions = _row_versions(conn)
+        key = tuple(versions.get(t) for t in tables) if versions is not None else None
+        now = time.time()
+        with _cache_lock:
+            entry = _cache.get(name)
+            if (entry is not None and key is not None and entry[0] == key
+                    and (ttl is None or now - entry[2] < ttl)):
+                return entry[1]
+        data = loader(conn)
     finally:
         conn.close()
+    if key is not None:
+        with _cache_lock:
+            _cache[name] = (key, data, now)
+    return data
 
 
-def get_device_by_serial(serial):
-    conn = get_conn()
+def cached_query(name, tables, loader, ttl=None):
+    """Shared read-through cache for report blueprints.
+
+    loader(conn) runs on a pooled read connection and its result is reused
+    until a row_versions counter of `tables` moves (any process) or `ttl`
+    seconds pass. Treat the returned data as read-only.
+    """
+    return _cached(name, tables, loader, ttl=ttl)
+
+
+def _invalidate(*tables):
+    """Drop cache entries that depend on `tables` (all entries if none given)."""
+    with _cache_lock:
+        if not tables:
+            _cache.clear()
+            return
+        for name in list(_cache):
+            if any(t in _CACHE_DEPS.get(name, ()) for t in tables):
+                _cache.pop(name, None)
+
+
+def _id_key(value):
+    # Route args / JSON bodies often carry ids as strings; SQLite coerced them
     try:
-        row = conn.execute("SELECT * FROM devices WHERE device_serial = ?", (serial,)).fetchone()
-        return row_to_dict(row)
-    finally:
-        conn.close()
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _sort_key(value):
+    # SQLite sorts NULL first, then text in binary order
+    return (value is not None, value or '')
+
+
+def _load_devices(conn):
+    rows = rows_to_dicts(conn.execute("SELECT * FROM devices").fetchall())
+    rows.sort(key=lambda d: _sort_key(d.get('device_serial')))
+    return {
+        'list': rows,
+        'by_id': {d['id']: d for d in rows},
+        'by_serial': {d['device_serial']: d for d in rows},
+    }
+
+
+def _load_accounts(conn):
+    rows = rows_to_dicts(conn.execute("SELECT * FROM accounts").fetchall())
+    rows.sort(key=lambda a: (_sort_key(a.get('device_serial')),
+                             _sort_key(a.get('username'))))
+    by_device = {}
+    for a in rows:
+        by_device.setdefault(a.get('device_serial'), []).append(a)
+    return {
+        'list': rows,
+        'by_id': {a['id']: a for a in rows},
+        'by_device': by_device,
+    }
+
+
+def _load_settings(conn):
+    """Merge the current settings rows into the parsed cache.
+
+    Only rows whose JSON text changed since the last load are re-parsed, so a
+    single settings edit doesn't re-parse every account.
+    """
+    with _settings_lock:
+        merged = {}
+        for r in conn.execute("SELECT account_id, settings_json FROM account_settings"):
+            aid, text = r['account_id'], r['settings_json'] or '{}'
+            prev = _settings_parsed.get(aid)
+            if prev is not None and prev[0] == text:
+                merged[aid] = prev
+                continue
+            try:
+                merged[aid] = (text, json.loads(text))
+            except ValueError:
+                merged[aid] = (text, {})
+        _settings_parsed.clear()
+        _settings_parsed.update(merged)
+        return {aid: parsed for aid, (_, parsed) in merged.items()}
+
+
+_CACHE_DEPS = {
+    'devices': ('devices',),
+    'accounts': ('accounts',),
+    'settings': ('account_settings',),
+}
+
+
+def _devices_cache():
+    return _cached('devices', _CACHE_DEPS['devices'], _load_devices)
+
+
+def _accounts_cache():
+    return _cached('accounts', _CACHE_DEPS['accounts'], _load_accounts)
+
+
+def _settings_cache():
+    return _cached('settings', _CACHE_DEPS['settings'], _load_settings)
+
+
+def get_all_account_settings():
+    """Parsed settings for every account: {account_id: settings_dict}.
+
+    The dicts are shared with the cache — treat them as read-only (use
+    get_account_settings() for a private copy you can modify).
+    """
+    return dict(_settings_cache())
+
+
+def clear_cache():
+    """Drop every cached entry (e.g. after restoring a DB backup)."""
+    _invalidate()
+
+
+# ─────────────────────────────────────────────
+# DEVICE operations
+# ─────────────────────────────────────────────
+
+def get_all_devices():
+    """Get all devices with account counts."""
+    counts = {}
+    for a in _accounts_cache()['list']:
+        if a.get('device_id') is not None:
+            counts[a['device_id']] = counts.get(a['device_id'], 0) + 1
+    devices = []
+    for d in _devices_cache()['list']:
+        d = dict(d)
+        d['account_count'] = counts.get(d['id'], 0)
+        devices.append(d)
+    return devices
+
+
+def get_device_by_id(device_id):
+    d = _devices_cache()['by_id'].get(_id_key(device_id))
+    return dict(d) if d else None
+
+
+def get_device_by_serial(serial):
+    d = _devices_cache()['by_serial'].get(serial)
+    return dict(d) if d else None
 
 
 def add_device(device_serial, device_name=None, ip_address=None, adb_port=5555, notes=None):
@@ -172,6 +255,7 @@ def add_device(device_serial, device_name=None, ip_address=None, adb_port=5555,
             VALUES (?, ?, ?, ?, 'disconnected', ?, ?, ?, ?)
         """, (device_serial, device_name, ip_address, adb_port, now, notes, now, now))
         conn.commit()
+        _invalidate('devices')
         return get_device_by_serial(device_serial)
     finally:
         conn.close()
@@ -192,6 +276,7 @@ def update_device(device_id, **kwargs):
     try:
         conn.execute(f"UPDATE devices SET {set_clause} WHERE id = ?", values)
         conn.commit()
+        _invalidate('devices')
         return True
     finally:
         conn.close()
@@ -207,6 +292,7 @@ def update_device_status(device_serial, status, last_seen=None):
             (status, now, now, device_serial)
         )
         conn.commit()
+        _invalidate('devices')
     finally:
         conn.close()
 
@@ -278,6 +364,7 @@ def delete_device(device_id, force=False):
         # Finally delete the device row
         conn.execute("DELETE FROM devices WHERE id = ?", (device_id,))
         conn.commit()
+        _invalidate(*_CACHE_TABLES)
 
         if force and count > 0:
             return True, (f"Device deleted (cascade): "
@@ -295,51 +382,33 @@ def delete_device(device_id, force=False):
 
 def get_all_accounts(status_filter=None, device_serial=None):
     """Get accounts with optional filters."""
-    conn = get_conn()
-    try:
-        query = """
-            SELECT a.*, d.device_name, d.device_group
-            FROM accounts a
-            LEFT JOIN devices d ON d.id = a.device_id
-            WHERE 1=1
-        """
-        params = []
-        if status_filter:
-            if isinstance(status_filter, list):
-                placeholders = ','.join('?' * len(status_filter))
-                query += f" AND a.status IN ({placeholders})"
-                params.extend(status_filter)
-            else:
-                query += " AND a.status = ?"
-                params.append(status_filter)
-        if device_serial:
-            query += " AND a.device_serial = ?"
-            params.append(device_serial)
-        query += " ORDER BY a.device_serial, a.username"
-        return rows_to_dicts(conn.execute(query, params).fetchall())
-    finally:
-        conn.close()
+    if status_filter and not isinstance(status_filter, list):
+        status_filter = [status_filter]
+    devices = _devices_cache()['by_id']
+    if device_serial:
+        source = _accounts_cache()['by_device'].get(device_serial, [])
+    else:
+        source = _accounts_cache()['list']
+    out = []
+    for a in source:
+        if status_filter and a.get('status') not in status_filter:
+            continue
+        a = dict(a)
+        d = devices.get(a.get('device_id'))
+        a['device_name'] = d.get('device_name') if d else None
+        a['device_group'] = d.get('device_group') if d else None
+        out.append(a)
+    return out
 
 
 def get_accounts_for_device(device_serial):
     """Get all accounts on a specific device."""
-    conn = get_conn()
-    try:
-        return rows_to_dicts(conn.execute(
-            "SELECT * FROM accounts WHERE device_serial = ? ORDER BY username",
-            (device_serial,)
-        ).fetchall())
-    finally:
-        conn.close()
+    return [dict(a) for a in _accounts_cache()['by_device'].get(device_serial, [])]
 
 
 def get_account_by_id(account_id):
-    conn = get_conn()
-    try:
-        row = conn.execute("SELECT * FROM accounts WHERE id = ?", (account_id,)).fetchone()
-        return row_to_dict(row)
-    finally:
-        conn.close()
+    a = _accounts_cache()['by_id'].get(_id_key(account_id))
+    return dict(a) if a else None
 
 
 def get_used_clone_letters(device_serial):
@@ -420,6 +489,7 @@ def add_account(device_serial, username, password, two_fa_token=None,
               story_enabled, comment_enabled, mute_enabled,
               start_time, end_time, warmup, warmup_until, now, now))
         conn.commit()
+        _invalidate('accounts')
 
         # Get the inserted account
         row = conn.execute(
@@ -457,6 +527,7 @@ def update_account(account_id, **kwargs):
     try:
         conn.execute(f"UPDATE accounts SET {set_clause} WHERE id = ?", values)
         conn.commit()
+        _invalidate('accounts')
         return True
     finally:
         conn.close()
@@ -472,6 +543,7 @@ def update_account_status(account_id, status, notes=None):
             (status, now, account_id)
         )
         conn.commit()
+        _invalidate('accounts')
         return True
     finally:
         conn.close()
@@ -490,6 +562,7 @@ def bulk_update_status(account_ids, status):
             [status, now] + list(account_ids)
         )
         conn.commit()
+        _invalidate('accounts')
         return len(account_ids)
     finally:
         conn.close()
@@ -500,22 +573,12 @@ def bulk_update_status(account_ids, status):
 # ─────────────────────────────────────────────
 
 def get_account_settings(account_id):
-    conn = get_conn()
-    try:
-        row = conn.execute(
-            "SELECT settings_json FROM account_settings WHERE account_id = ?",
-            (account_id,)
-        ).fetchone()
-        if row:
-            import json
-            return json.loads(row['settings_json'])
-        return {}
-    finally:
-        conn.close()
+    """Parsed settings for one account (a private copy, safe to modify)."""
+    settings = _settings_cache().get(_id_key(account_id))
+    return copy.deepcopy(settings) if settings else {}
 
 
 def upsert_account_settings(account_id, settings_dict):
-    import json
     conn = get_conn()
     try:
         now = datetime.utcnow().isoformat()
@@ -526,6 +589,7 @@ def upsert_account_settings(account_id, settings_dict):
             ON CONFLICT(account_id) DO UPDATE SET settings_json = ?, updated_at = ?
         """, (account_id, json_str, now, json_str, now))
         conn.commit()
+        _invalidate('account_settings')
     finally:
         conn.close()
 
@@ -613,6 +677,7 @@ def set_warmup(account_id, warmup_until):
             (warmup_until, now, account_id)
         )
         conn.commit()
+        _invalidate('accounts')
         return True
     finally:
         conn.close()
@@ -628,6 +693,7 @@ def clear_warmup(account_id):
             (now, account_id)
         )
         conn.commit()
+        _invalidate('accounts')
         return True
     finally:
         conn.close()
@@ -646,6 +712,7 @@ def bulk_set_warmup(account_ids, warmup_until):
             [warmup_until, now] + list(account_ids)
         )
         conn.commit()
+        _invalidate('accounts')
         return len(account_ids)
     finally:
         conn.close()
@@ -666,6 +733,7 @@ def expire_warmups():
             (now, today)
         )
         conn.commit()
+        _invalidate('accounts')
         return cursor.rowcount
     finally:
         conn.close()
@@ -34,6 +34,7 @@ except Exception:
 import sys
 sys.path.insert(0, str(Path(__file__).parent))
 from settings_routes import get_ai_config
+from db.connection import connect
 
 # Create blueprint
 profile_automation_bp = Blueprint('profile_automation', __name__, url_prefix='/api/profile_automation')
@@ -1010,7 +1011,7 @@ def single_account_action():
 
     Body: { device_serial, username, bio? , uploaded_picture_id? }
     """
-    import sys, time as _t, sqlite3 as _sq
+    import sys, time as _t
     from pathlib import Path as _P
     data = request.get_json() or {}
     device_serial = (data.get('device_serial') or '').strip()
@@ -1031,7 +1032,7 @@ def single_account_action():
     pkg = 'com.instagram.android'
     try:
         _pf = str(_P(__file__).parent.parent / 'db' / 'phone_farm.db')
-        _con = _sq.connect(_pf)
+        _con = connect(_pf, row_factory=None)
         _r = _con.execute("SELECT instagram_package FROM accounts WHERE device_serial=? AND username=?",
                           (device_serial, username)).fetchone()
         _con.close()
@@ -1250,10 +1251,7 @@ def get_accounts_with_details():
         import json
 
         phone_farm_db = Path(__file__).parent.parent / "db" / "phone_farm.db"
-        conn = sqlite3.connect(str(phone_farm_db), timeout=30)
-        conn.execute("PRAGMA journal_mode=WAL")
-        conn.execute("PRAGMA busy_timeout=30000")
-        conn.row_factory = sqlite3.Row
+        conn = connect(str(phone_farm_db), timeout=30)
         cursor = conn.cursor()
 
         # Get all accounts with settings and device info
@@ -1816,10 +1814,7 @@ def generate_personas_endpoint():
 
         # Get account details from DB to enrich assignments
         phone_farm_db = Path(__file__).parent.parent / "db" / "phone_farm.db"
-        conn = sqlite3.connect(str(phone_farm_db), timeout=30)
-        conn.execute("PRAGMA journal_mode=WAL")
-        conn.execute("PRAGMA busy_timeout=30000")
-        conn.row_factory = sqlite3.Row
+        conn = connect(str(phone_farm_db), timeout=30)
         cursor = conn.cursor()
 
         # Build lookup
@@ -1989,10 +1984,7 @@ def execute_personas_endpoint():
 
         # ── PHASE 1: Read-only — gather all data with NO write locks ──
         phone_farm_db = Path(__file__).parent.parent / "db" / "phone_farm.db"
-        farm_conn = sqlite3.connect(str(phone_farm_db), timeout=30)
-        farm_conn.execute("PRAGMA journal_mode=WAL")
-        farm_conn.execute("PRAGMA busy_timeout=30000")
-        farm_conn.row_factory = sqlite3.Row
+        farm_conn = connect(str(phone_farm_db), timeout=30)
 
         # Pre-fetch all account packages in one query
         account_ids = [a.get('account_id') for a in assignments if a.get('account_id')]
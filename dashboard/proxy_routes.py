@@ -18,7 +18,7 @@ Endpoints:
 
   Device Proxy Actions:
     POST   /api/devices/<serial>/proxy/open     Open SuperProxy on device
-    GET    /api/devices/<serial>/proxy/status    Check proxy status on device
+    GET    /api/devices/<serial>/proxy/status    Proxy status on device (shared health cache)
     POST   /api/devices/<serial>/proxy/toggle    Toggle proxy on/off
     POST   /api/devices/<serial>/proxy/set       Set a specific proxy on device
     GET    /api/devices/<serial>/proxy/inspect   Dump SuperProxy UI for debugging
@@ -38,6 +38,7 @@ from flask import Blueprint, jsonify, request, render_template
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'automation'))
 
+from db.connection import connect
 from db.proxy_tables import init_proxy_tables
 
 proxy_bp = Blueprint('proxy_management', __name__)
@@ -50,12 +51,8 @@ DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__)
 
 
 def get_conn():
-    """Get a SQLite connection with Row factory."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA foreign_keys=ON")
-    return conn
+    """Get a pooled SQLite connection with Row factory."""
+    return connect(DB_PATH, foreign_keys=True)
 
 
 def row_to_dict(row):
@@ -105,6 +102,15 @@ def _get_superproxy_controller(device_serial):
     return controller, None
 
 
+def _invalidate_health(device_serial):
+    """Drop the shared proxy health state after changing the device's proxy."""
+    try:
+        from automation import proxy_health
+        proxy_health.invalidate(device_serial)
+    except Exception:
+        pass
+
+
 def _log_proxy_action(device_serial, proxy_id, proxy_host, proxy_port, action, details=None):
     """Log a proxy action to device_proxy_history."""
     try:
@@ -438,23 +444,67 @@ def api_open_superproxy(serial):
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
+def _assigned_proxy(device_serial):
+    """Current proxy of a device from the pool assignment (no UI)."""
+    conn = get_conn()
+    try:
+        row = conn.execute(
+            """SELECT host, port, proxy_type AS type, username FROM proxies
+               WHERE assigned_device_serial IN (?, ?) ORDER BY updated_at DESC LIMIT 1""",
+            (device_serial.replace(':', '_'), device_serial.replace('_', ':'))
+        ).fetchone()
+    except sqlite3.Error:
+        row = None
+    finally:
+        conn.close()
+    proxy = row_to_dict(row) or {'host': None, 'port': None, 'type': None, 'username': None}
+    proxy['source'] = 'assignment'
+    return proxy
+
+
 @proxy_bp.route('/api/devices/<serial>/proxy/status', methods=['GET'])
 def api_proxy_status(serial):
-    """Check if proxy is active on a device."""
-    try:
-        controller, err = _get_superproxy_controller(serial)
-        if err:
-            return jsonify({'status': 'error', 'message': err}), 500
+    """
+    Check if proxy is active on a device.
 
-        result = controller.is_proxy_active()
-        current = controller.get_current_proxy()
+    Served from the per-device proxy health cache the runners share
+    (automation/proxy_health.py); the SuperProxy UI is only driven when the
+    adb probe finds no VPN, or with ?details=1 (current proxy read from the
+    app instead of the pool assignment). ?refresh=1 skips the cache.
+    """
+    try:
+        from automation import proxy_health
+        details = request.args.get('details', '').lower() in ('1', 'true', 'yes')
+        refresh = request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+        controller = None
+
+        def ui_check():
+            nonlocal controller
+            controller, err = _get_superproxy_controller(serial)
+            if err:
+                raise RuntimeError(err)
+            return controller.is_proxy_active()
+
+        health = proxy_health.check(serial, ui_fallback=ui_check, force=refresh)
+        if details:
+            if controller is None:
+                controller, err = _get_superproxy_controller(serial)
+                if err:
+                    return jsonify({'status': 'error', 'message': err}), 500
+            current = controller.get_current_proxy()
+        else:
+            current = _assigned_proxy(serial)
 
         return jsonify({
             'status': 'success',
             'data': {
-                'active': result['active'],
-                'confidence': result['confidence'],
-                'indicators': result['indicators'],
+                'active': health['active'],
+                'confidence': health['confidence'],
+                'indicators': health['indicators'],
+                'method': health['method'],
+                'checked_at': health['checked_at'],
+                'age': health['age'],
+                'cached': health['cached'],
                 'current_proxy': current,
             }
         })
@@ -475,6 +525,7 @@ def api_toggle_proxy(serial):
             return jsonify({'status': 'error', 'message': err}), 500
 
         result = controller.toggle_proxy(enable=enable)
+        _invalidate_health(serial)
 
         action = 'toggled_on' if enable else 'toggled_off'
         _log_proxy_action(serial, None, None, None, action, result.get('message', ''))
@@ -535,6 +586,7 @@ def api_set_proxy(serial):
             username=username,
             password=password,
         )
+        _invalidate_health(serial)
 
         # Update proxy assignment in DB
         if result['success'] and proxy_id:
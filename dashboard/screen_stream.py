@@ -0,0 +1,431 @@
+"""
+screen_stream.py — shared per-device live screen capture
+=========================================================
+One capture session per device, no matter how many browser tabs watch it.
+
+    browser tab ─┐
+    browser tab ─┼──  CaptureSession(device)  ──  scrcpy-server (H.264)
+    browser tab ─┘         ring buffer            └─ fallback: screencap loop
+
+Backends:
+  scrcpy     dashboard/scrcpy-server.jar pushed to the device, hardware H.264
+             decoded once here with PyAV. Used when `av` is importable.
+  screencap  one `adb exec-out screencap -p` loop per device (not per tab).
+
+Each decoded frame is JPEG-encoded ONCE and appended to a small ring buffer.
+Viewers block on a condition variable and always take the newest frame
+(slow viewers skip frames instead of queueing them). A viewer joining mid-
+stream is handed the latest complete frame immediately — decoding happens
+server-side, so nobody waits for the next H.264 IDR.
+
+Demand-driven rates:
+  - fps / scale / quality follow the most demanding connected viewer;
+  - STREAM_FPS_BUDGET is split across all live sessions so 10 open devices
+    don't peg the host CPU or saturate adb;
+  - a session stops IDLE_GRACE seconds after its last viewer leaves.
+
+Used by mothers_routes.device_stream (MJPEG multipart).
+"""
+
+import io
+import logging
+import os
+import random
+import select
+import socket
+import struct
+import subprocess
+import threading
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+ADB = os.environ.get('HYDRA_ADB', 'adb')
+SCRCPY_JAR = os.environ.get('SCRCPY_JAR',
+                            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scrcpy-server.jar'))
+SCRCPY_VERSION = os.environ.get('SCRCPY_VERSION', '2.4')
+SCRCPY_MAX_SIZE = int(os.environ.get('HYDRA_STREAM_MAX_SIZE', 1280))
+SCRCPY_BIT_RATE = os.environ.get('HYDRA_STREAM_BIT_RATE', '4000000')
+
+STREAM_FPS_BUDGET = float(os.environ.get('HYDRA_STREAM_FPS_BUDGET', 60))
+MAX_FPS = 20
+RING_SIZE = 8
+IDLE_GRACE = 10.0      # seconds a session lingers after its last viewer
+KEEPALIVE = 2.0        # resend the last frame when the screen is idle
+SCRCPY_RETRIES = 3     # consecutive scrcpy failures before falling back
+
+BOUNDARY = b'frame'
+
+
+def _scrcpy_available():
+    if not os.path.exists(SCRCPY_JAR):
+        return False
+    try:
+        import av  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _encode_jpeg(img, native_w, scale, quality):
+    """PIL image → JPEG bytes at `scale` of the device's native width."""
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    target_w = max(64, int(native_w * scale))
+    if target_w < img.width:
+        target_h = max(64, int(img.height * target_w / img.width))
+        img = img.resize((target_w, target_h), 2)   # Image.BILINEAR
+    buf = io.BytesIO()
+    img.save(buf, format='JPEG', quality=quality, optimize=False)
+    return buf.getvalue()
+
+
+def mjpeg_part(body, mime=b'image/jpeg'):
+    return (b'--' + BOUNDARY + b'\r\n'
+            b'Content-Type: ' + mime + b'\r\n'
+            b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n'
+            + body + b'\r\n')
+
+
+class CaptureSession:
+    """Captures one device's screen and fans frames out to its viewers."""
+
+    def __init__(self, adb_serial):
+        self.adb_serial = adb_serial
+        self.backend = None
+        self.started_at = time.time()
+        self.frames = 0
+        self.errors = 0
+        self.native_size = None
+        self._cond = threading.Condition()
+        self._ring = deque(maxlen=RING_SIZE)
+        self._seq = 0
+        self._viewers = {}            # viewer id -> (fps, scale, quality)
+        self._next_viewer = 0
+        self._idle_since = None
+        self.stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name=f"screen-{adb_serial}")
+        self._thread.start()
+
+    # ── viewers ──────────────────────────────────────────────────────
+    def add_viewer(self, fps, scale, quality):
+        with self._cond:
+            self._next_viewer += 1
+            self._viewers[self._next_viewer] = (fps, scale, quality)
+            self._idle_since = None
+            return self._next_viewer
+
+    def remove_viewer(self, vid):
+        with self._cond:
+            self._viewers.pop(vid, None)
+            if not self._viewers:
+                self._idle_since = time.time()
+
+    def viewer_count(self):
+        with self._cond:
+            return len(self._viewers)
+
+    def demand(self):
+        """(fps, scale, quality) wanted by the most demanding viewer."""
+        with self._cond:
+            if not self._viewers:
+                return 1.0, 0.5, 70
+            vals = list(self._viewers.values())
+        fps = min(MAX_FPS, max(v[0] for v in vals))
+        fps = min(fps, _service.fps_share())
+        return max(0.5, fps), max(v[1] for v in vals), max(v[2] for v in vals)
+
+    def _should_stop(self):
+        with self._cond:
+            if self._viewers:
+                return False
+            if self._idle_since is None:
+                self._idle_since = time.time()
+            return time.time() - self._idle_since > IDLE_GRACE
+
+    # ── frames ───────────────────────────────────────────────────────
+    def publish(self, body, mime=b'image/jpeg'):
+        with self._cond:
+            self._seq += 1
+            self._ring.append((self._seq, time.time(), body, mime))
+            self.frames += 1
+            self._cond.notify_all()
+
+    def latest(self):
+        with self._cond:
+            return self._ring[-1] if self._ring else None
+
+    def wait_frame(self, after_seq, timeout):
+        """Newest frame newer than `after_seq`; the current one on timeout."""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self.stopped or (self._ring and self._ring[-1][0] > after_seq),
+                timeout)
+            return self._ring[-1] if self._ring else None
+
+    # ── capture loop ─────────────────────────────────────────────────
+    def _run(self):
+        try:
+            if _scrcpy_available():
+                failures = 0
+                while failures < SCRCPY_RETRIES and not self._should_stop():
+                    self.backend = 'scrcpy'
+                    produced = self.frames
+                    try:
+                        self._run_scrcpy()
+                        failures = 0
+                    except Exception as e:
+                        self.errors += 1
+                        failures = failures + 1 if self.frames == produced else 1
+                        log.info("[stream %s] scrcpy stopped: %s", self.adb_serial, e)
+                        time.sleep(0.5)
+            if not self._should_stop():
+                self.backend = 'screencap'
+                self._run_screencap()
+        except Exception as e:
+            log.warning("[stream %s] capture failed: %s", self.adb_serial, e)
+        finally:
+            with self._cond:
+                self.stopped = True
+                self._cond.notify_all()
+            _service.discard(self)
+
+    def _run_screencap(self):
+        try:
+            from PIL import Image
+        except ImportError:
+            Image = None          # no Pillow → forward the raw PNG
+        while not self._should_stop():
+            fps, scale, quality = self.demand()
+            t0 = time.time()
+            try:
+                proc = subprocess.run(
+                    [ADB, '-s', self.adb_serial, 'exec-out', 'screencap', '-p'],
+                    capture_output=True, timeout=10, check=False)
+                png = proc.stdout
+                if proc.returncode != 0 or not png or len(png) < 100:
+                    self.errors += 1
+                    time.sleep(0.5)
+                    continue
+                if Image is None:
+                    self.publish(png, b'image/png')
+                else:
+                    img = Image.open(io.BytesIO(png))
+                    self.native_size = img.size
+                    self.publish(_encode_jpeg(img, img.width, scale, quality))
+            except Exception as e:
+                self.errors += 1
+                log.debug("[stream %s] screencap error: %s", self.adb_serial, e)
+                time.sleep(1)
+                continue
+            dt = time.time() - t0
+            if dt < 1.0 / fps:
+                time.sleep(1.0 / fps - dt)
+
+    def _native_width(self):
+        """Physical screen width via `wm size` (scrcpy frames are pre-scaled)."""
+        try:
+            out = subprocess.run([ADB, '-s', self.adb_serial, 'shell', 'wm', 'size'],
+                                 capture_output=True, text=True, timeout=5).stdout
+            sizes = [line.split(':', 1)[1].strip() for line in out.splitlines() if ':' in line]
+            if sizes:
+                w, h = sizes[-1].split('x')     # Override size wins over Physical
+                self.native_size = (int(w), int(h))
+                return int(w)
+        except Exception:
+            pass
+        return None
+
+    def _run_scrcpy(self):
+        import av
+
+        scid = format(random.randint(0, 0x7fffffff), '08x')
+        native_w = self._native_width()
+        srv = sock = None
+        port = None
+        try:
+            subprocess.run([ADB, '-s', self.adb_serial, 'push', SCRCPY_JAR,
+                            '/data/local/tmp/scrcpy-server.jar'],
+                           capture_output=True, timeout=25)
+            r = subprocess.run([ADB, '-s', self.adb_serial, 'forward', 'tcp:0',
+                                f'localabstract:scrcpy_{scid}'],
+                               capture_output=True, text=True, timeout=10)
+            port = int((r.stdout or '').strip() or 0)
+            if not port:
+                raise RuntimeError('adb forward failed')
+            srv = subprocess.Popen(
+                [ADB, '-s', self.adb_serial, 'shell',
+                 'CLASSPATH=/data/local/tmp/scrcpy-server.jar', 'app_process', '/',
+                 'com.genymobile.scrcpy.Server', SCRCPY_VERSION,
+                 f'scid={scid}', 'log_level=error', 'audio=false', 'control=false',
+                 'video=true', f'max_size={SCRCPY_MAX_SIZE}',
+                 f'video_bit_rate={SCRCPY_BIT_RATE}', f'max_fps={MAX_FPS}',
+                 'tunnel_forward=true'],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            for _ in range(100):
+                try:
+                    s = socket.create_connection(('127.0.0.1', port), timeout=1)
+                    s.settimeout(6)
+                    if s.recv(1):              # dummy byte → server is up
+                        sock = s
+                        break
+                    s.close()
+                except Exception:
+                    pass
+                time.sleep(0.1)
+            if not sock:
+                raise RuntimeError('scrcpy server did not start')
+
+            def rx(n, idle_ok=False):
+                b = b''
+                while len(b) < n:
+                    try:
+                        c = sock.recv(n - len(b))
+                    except socket.timeout:
+                        if idle_ok and not b:
+                            raise TimeoutError   # idle at a clean frame boundary
+                        continue
+                    if not c:
+                        raise EOFError('scrcpy stream closed')
+                    b += c
+                return b
+
+            rx(64)   # device name
+            rx(12)   # codec id + width + height
+            sock.settimeout(KEEPALIVE)
+            codec = av.CodecContext.create('h264', 'r')
+            try:
+                codec.thread_count = 1
+                codec.flags |= 0x00080000   # AV_CODEC_FLAG_LOW_DELAY
+            except Exception:
+                pass
+
+            def decode(data):
+                last = None
+                for pkt in codec.parse(data):
+                    for fr in codec.decode(pkt):
+                        last = fr
+                return last
+
+            pending = None        # decoded but not yet encoded (fps throttle)
+            last_encode = 0.0
+            while not self._should_stop():
+                try:
+                    _pts, size = struct.unpack('>QI', rx(12, idle_ok=True))
+                    fr = decode(rx(size))
+                    if fr is not None:
+                        pending = fr
+                    # drop-to-latest: drain what is already buffered
+                    while select.select([sock], [], [], 0)[0]:
+                        _pts, size = struct.unpack('>QI', rx(12))
+                        fr = decode(rx(size))
+                        if fr is not None:
+                            pending = fr
+                except TimeoutError:
+                    pass              # idle screen — flush whatever is pending
+                fps, scale, quality = self.demand()
+                now = time.time()
+                if pending is not None and now - last_encode >= 1.0 / fps:
+                    img = pending.to_image()
+                    self.publish(_encode_jpeg(img, native_w or img.width, scale, quality))
+                    pending = None
+                    last_encode = now
+        finally:
+            for closer in (lambda: sock and sock.close(),
+                           lambda: srv and srv.kill()):
+                try:
+                    closer()
+                except Exception:
+                    pass
+            if port:
+                try:
+                    subprocess.run([ADB, '-s', self.adb_serial, 'forward', '--remove',
+                                    f'tcp:{port}'], capture_output=True, timeout=5)
+                except Exception:
+                    pass
+
+    def status(self):
+        fps, scale, quality = self.demand()
+        latest = self.latest()
+        return {
+            'device': self.adb_serial,
+            'backend': self.backend,
+            'viewers': self.viewer_count(),
+            'frames': self.frames,
+            'errors': self.errors,
+            'fps_target': round(fps, 2),
+            'scale': scale,
+            'quality': quality,
+            'native_size': self.native_size,
+            'last_frame_age': round(time.time() - latest[1], 2) if latest else None,
+            'uptime': round(time.time() - self.started_at, 1),
+        }
+
+
+class _StreamService:
+    """Registry of live capture sessions, one per device."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def get(self, adb_serial):
+        with self._lock:
+            s = self._sessions.get(adb_serial)
+            if s is None or s.stopped:
+                s = self._sessions[adb_serial] = CaptureSession(adb_serial)
+            return s
+
+    def discard(self, session):
+        with self._lock:
+            if self._sessions.get(session.adb_serial) is session:
+                del self._sessions[session.adb_serial]
+
+    def fps_share(self):
+        """Per-session fps ceiling from the farm-wide budget."""
+        with self._lock:
+            active = sum(1 for s in self._sessions.values() if s._viewers) or 1
+        return STREAM_FPS_BUDGET / active
+
+    def status(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return [s.status() for s in sessions]
+
+
+_service = _StreamService()
+
+
+def stream_status():
+    return _service.status()
+
+
+def mjpeg_stream(adb_serial, fps=8, scale=0.6, quality=75):
+    """Generator of multipart MJPEG parts for one viewer of `adb_serial`."""
+    fps = max(0.5, min(MAX_FPS, float(fps)))
+    min_dt = 1.0 / fps
+    session = _service.get(adb_serial)
+    vid = session.add_viewer(fps, scale, quality)
+    last_seq = 0
+    try:
+        while True:
+            if session.stopped:
+                # capture thread died — hand the viewer to a fresh session
+                session.remove_viewer(vid)
+                time.sleep(1)
+                session = _service.get(adb_serial)
+                vid = session.add_viewer(fps, scale, quality)
+                last_seq = 0
+            t0 = time.time()
+            frame = session.wait_frame(last_seq, KEEPALIVE)
+            if frame is None:
+                continue
+            last_seq = frame[0]
+            yield mjpeg_part(frame[2], frame[3])   # first pass: latest frame on join
+            dt = time.time() - t0
+            if dt < min_dt:
+                time.sleep(min_dt - dt)
+    finally:
+        session.remove_viewer(vid)
@@ -20,6 +20,11 @@ from logging.handlers import RotatingFileHandler
 import base64
 import io
 
+# `python simple_app.py --profile-startup` — import-time waterfall, no server
+if __name__ == '__main__' and '--profile-startup' in sys.argv:
+    from startup_profile import profile_startup
+    sys.exit(profile_startup('simple_app'))
+
 # ── Crash Logging Setup ──────────────────────────────────────────────
 LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
 os.makedirs(LOG_DIR, exist_ok=True)
@@ -61,89 +66,14 @@ from flask import Flask, render_template, jsonify, request, send_from_directory,
 from functools import wraps
 from werkzeug.security import generate_password_hash, check_password_hash
 from jap_api_utils import JAP_API_KEY, save_jap_api_key, load_jap_api_key
-from manage_sources import sources_bp
-from profile_automation_routes import profile_automation_bp
-from settings_routes import settings_bp
-from login_automation_routes import login_bp
-from bot_manager_routes import bot_manager_bp
-from bot_settings_routes import bot_settings_bp
-from bulk_import_routes import bulk_import_bp
-from job_orders_routes import job_orders_bp
-from follow_list_routes import follow_list_bp
-from bot_launcher_routes import bot_launcher_bp
-from device_management_routes import device_management_bp
-from import_v2_routes import import_v2_bp
-from login_automation_v2_routes import login_v2_bp
-from ig_preview_routes import ig_preview_bp
-from spoofing_routes import spoofing_bp
+from lazy_blueprints import LazyBlueprints
+# Route modules are imported in the background and registered before the
+# first request — see "Register blueprints" below and lazy_blueprints.py.
 try:
     from feature_flags import is_enabled as _ff_enabled
 except Exception:
     def _ff_enabled(name): return True
-if _ff_enabled("assistant_chat"):
-    try:
-        from chat_routes import chat_bp
-    except Exception as _e:
-        chat_bp = None
-        print(f"[chat] disabled — import failed: {_e}")
-else:
-    chat_bp = None
-    print("[chat] disabled via feature_flags")
-# ai_executor + account_factory are internal IP — excluded from client builds.
-# Guarded so a dist with the files removed (feature off) still starts cleanly.
-if _ff_enabled("ai_executor"):
-    try:
-        from ai_executor_routes import ai_executor_bp
-    except Exception as _e:
-        ai_executor_bp = None
-        print(f"[ai_executor] disabled — import failed: {_e}")
-else:
-    ai_executor_bp = None
-    print("[ai_executor] disabled via feature_flags")
-if _ff_enabled("account_factory"):
-    try:
-        from account_factory_routes import account_factory_bp
-    except Exception as _e:
-        account_factory_bp = None
-        print(f"[account_factory] disabled — import failed: {_e}")
-else:
-    account_factory_bp = None
-    print("[account_factory] disabled via feature_flags")
-# cloudphone — internal live-mirror tooling (wraps our cloudphone app + scrcpy +
-# PyAV); excluded from client builds.
-if _ff_enabled("cloudphone"):
-    try:
-        from cloudphone_routes import cloudphone_bp
-    except Exception as _e:
-        cloudphone_bp = None
-        print(f"[cloudphone] disabled — import failed: {_e}")
-else:
-    cloudphone_bp = None
-    print("[cloudphone] disabled via feature_flags")
-# mother_dashboard — internal mother/slaves feature, excluded from client builds.
-if _ff_enabled("mother_dashboard"):
-    try:
-        from mothers_routes import mothers_bp
-    except Exception as _e:
-        mothers_bp = None
-        print(f"[mother_dashboard] disabled — import failed: {_e}")
-else:
-    mothers_bp = None
-    print("[mother_dashboard] disabled via feature_flags")
 import auth_users
-from user_management_routes import user_management_bp
-from job_orders_v2_routes import job_orders_v2_bp
-from content_schedule_routes import content_schedule_bp
-from farm_stats_routes import farm_stats_bp
-from account_health_routes import account_health_bp
-from proxy_routes import proxy_bp
-from device_manager_routes import device_manager_bp
-from deploy_routes import deploy_bp
-from comment_routes import comment_bp
-from flow_map_routes import flow_map_bp
-from source_quality_routes import source_quality_bp
-from sync_routes import sync_bp
-from analytics_routes import analytics_bp
 
 # Database paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -1650,7 +1580,27 @@ def update_order_status(order_id, status):
 
 # Get all devices
 def get_devices():
-    # Try old Onimator devices.db first
+    # Central phone_farm.db first — served from phone_farm_db's shared
+    # read-through cache, so list pages don't re-query per request.
+    try:
+        from phone_farm_db import get_all_devices as _pf_all_devices
+        rows = _pf_all_devices()
+        if rows:
+            rows.sort(key=lambda d: (d.get('device_name') is not None, d.get('device_name') or ''))
+            return [{
+                'deviceid': d['device_serial'],
+                'devicename': d['device_name'],
+                'ip_address': d['ip_address'],
+                'status': d['status'] or 'active',
+                'accounts_count': d['account_count'],
+                '_source': 'phone_farm_db'
+            } for d in rows]
+    except Exception as e:
+        print(f"Error getting devices from phone_farm.db: {e}")
+
+    # Fallback: legacy Onimator devices.db (pre-migration installs only)
+    if not os.path.exists(DEVICES_DB):
+        return []
     try:
         conn = get_db_connection(DEVICES_DB)
         cursor = conn.cursor()
@@ -1658,117 +1608,45 @@ def get_devices():
         devices = [row_to_dict(row) for row in cursor.fetchall()]
         conn.close()
 
-        if devices:
-            # Add accounts count for each device
-            for device in devices:
-                device_id = device.get('deviceid')
-                if device_id:
-                    accounts_db_path = os.path.join(BASE_DIR, device_id, 'accounts.db')
-                    if os.path.exists(accounts_db_path):
-                        try:
-                            acc_conn = get_db_connection(accounts_db_path)
-                            acc_cursor = acc_conn.cursor()
-                            acc_cursor.execute('SELECT COUNT(*) FROM accounts')
-                            count = acc_cursor.fetchone()[0]
-                            acc_conn.close()
-                            device['accounts_count'] = count
-                        except:
-                            device['accounts_count'] = 0
-                    else:
+        # Add accounts count for each device
+        for device in devices:
+            device_id = device.get('deviceid')
+            if device_id:
+                accounts_db_path = os.path.join(BASE_DIR, device_id, 'accounts.db')
+                if os.path.exists(accounts_db_path):
+                    try:
+                        acc_conn = get_db_connection(accounts_db_path)
+                        acc_cursor = acc_conn.cursor()
+                        acc_cursor.execute('SELECT COUNT(*) FROM accounts')
+                        count = acc_cursor.fetchone()[0]
+                        acc_conn.close()
+                        device['accounts_count'] = count
+                    except:
                         device['accounts_count'] = 0
-            return devices
-    except Exception as e:
-        pass  # Old devices.db not available, fall through to phone_farm.db
-
-    # Fallback: read from phone_farm.db (central DB)
-    try:
-        conn = get_db_connection(PHONE_FARM_DB)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT d.id, d.device_serial, d.device_name, d.ip_address, d.status,
-                   COUNT(a.id) as accounts_count
-            FROM devices d
-            LEFT JOIN accounts a ON a.device_id = d.id
-            GROUP BY d.id
-            ORDER BY d.device_name
-        ''')
-        rows = cursor.fetchall()
-        conn.close()
-
-        devices = []
-        for row in rows:
-            devices.append({
-                'deviceid': row['device_serial'],
-                'devicename': row['device_name'],
-                'ip_address': row['ip_address'],
-                'status': row['status'] or 'active',
-                'accounts_count': row['accounts_count'],
-                '_source': 'phone_farm_db'
-            })
+                else:
+                    device['accounts_count'] = 0
         return devices
     except Exception as e:
-        print(f"Error getting devices from phone_farm.db: {e}")
+        print(f"Error getting devices from devices.db: {e}")
         return []
 
 # Get accounts for a device
 def get_accounts(deviceid):
-    # Try old Onimator per-device accounts.db first
-    try:
-        accounts_db_path = os.path.join(BASE_DIR, deviceid, 'accounts.db')
-        if os.path.exists(accounts_db_path):
-            conn = get_db_connection(accounts_db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute("PRAGMA table_info(accounts)")
-            columns = [row[1] for row in cursor.fetchall()]
-            cursor.execute('SELECT * FROM accounts')
-            accounts_raw = cursor.fetchall()
-            conn.close()
-
-            if accounts_raw:
-                accounts = []
-                for account_raw in accounts_raw:
-                    account = dict(account_raw)
-                    essential_fields = {
-                        'starttime': '0', 'endtime': '0',
-                        'follow': 'Off', 'unfollow': 'Off', 'like': 'Off',
-                        'comment': 'Off', 'story': 'Off', 'mute': 'Off',
-                        'random': 'Off', 'followlimit': '50'
-                    }
-                    for field, default_value in essential_fields.items():
-                        if field not in account or account[field] is None:
-                            account[field] = default_value
-                    accounts.append(account)
-                return accounts
-    except Exception as e:
-        print(f"Old accounts.db not available for {deviceid}: {e}")
-
-    # Fallback: read from phone_farm.db
+    # Central phone_farm.db first (shared cache, see get_devices)
     try:
-        conn = get_db_connection(PHONE_FARM_DB)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT a.*, d.device_name
-            FROM accounts a
-            JOIN devices d ON a.device_id = d.id
-            WHERE a.device_serial = ?
-            ORDER BY a.username
-        ''', (deviceid,))
-        rows = cursor.fetchall()
-        conn.close()
-
+        from phone_farm_db import get_accounts_for_device as _pf_accounts, get_device_by_id as _pf_device
         accounts = []
-        for row in rows:
-            r = dict(row)
+        for r in _pf_accounts(deviceid):
+            device = _pf_device(r.get('device_id')) if r.get('device_id') is not None else None
+            if not device:
+                continue  # unlinked account (matches the old INNER JOIN)
             accounts.append({
                 'account': r.get('username', ''),
                 'password': r.get('password', ''),
                 'email': r.get('email', ''),
                 'instagram_package': r.get('instagram_package', ''),
                 'deviceid': r.get('device_serial', deviceid),
-                'devicename': r.get('device_name', ''),
+                'devicename': device.get('device_name', ''),
                 'starttime': r.get('start_time', '0') or '0',
                 'endtime': r.get('end_time', '0') or '0',
                 'follow': 'On' if r.get('follow_enabled') else 'Off',
@@ -1793,9 +1671,39 @@ def get_accounts(deviceid):
                 'followlimit': r.get('follow_limit_perday', '50') or '50',
                 '_source': 'phone_farm_db'
             })
-        return accounts
+        if accounts:
+            return accounts
     except Exception as e:
         print(f"Error getting accounts for device {deviceid} from phone_farm.db: {e}")
+
+    # Fallback: legacy Onimator per-device accounts.db
+    accounts_db_path = os.path.join(BASE_DIR, deviceid, 'accounts.db')
+    if not os.path.exists(accounts_db_path):
+        return []
+    try:
+        conn = get_db_connection(accounts_db_path)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM accounts')
+        accounts_raw = cursor.fetchall()
+        conn.close()
+
+        accounts = []
+        for account_raw in accounts_raw:
+            account = dict(account_raw)
+            essential_fields = {
+                'starttime': '0', 'endtime': '0',
+                'follow': 'Off', 'unfollow': 'Off', 'like': 'Off',
+                'comment': 'Off', 'story': 'Off', 'mute': 'Off',
+                'random': 'Off', 'followlimit': '50'
+            }
+            for field, default_value in essential_fields.items():
+                if field not in account or account[field] is None:
+                    account[field] = default_value
+            accounts.append(account)
+        return accounts
+    except Exception as e:
+        print(f"Old accounts.db not available for {deviceid}: {e}")
         return []
 
 # Get stats for an account
@@ -2581,13 +2489,14 @@ def _forbidden_response(perm):
 # Ensure config exists + migrate to the multi-user format at import time
 auth_users.load_config()
 
-# Ensure DB schema is up to date (creates DB on fresh install + runs migrations)
+# Ensure DB schema is up to date (creates DB on fresh install + runs migrations).
+# migrate() is one integer compare unless a new versioned step shipped.
 try:
     import sys as _sys
     _parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     if _parent not in _sys.path:
         _sys.path.insert(0, _parent)
-    from db.migrations import ensure_schema as _ensure_schema
+    from db.migrations import migrate as _migrate_schema
     _db_dir = os.path.join(_parent, 'db')
     _db_path = os.path.join(_db_dir, 'phone_farm.db')
     os.makedirs(_db_dir, exist_ok=True)
@@ -2602,9 +2511,9 @@ try:
                         capture_output=True, timeout=60, cwd=_parent, check=False)
         except Exception as _ie:
             print(f"[WARNING] init_db.py run failed: {_ie}")
-    # Always run ensure_schema to add any missing columns (safe to call repeatedly)
+    # Versioned one-shot step — full table/column check only after an update
     if os.path.exists(_db_path):
-        _ensure_schema(_db_path)
+        _migrate_schema(_db_path)
 except Exception as _e:
     print(f"[WARNING] Schema migration failed: {_e}")
 
@@ -2903,45 +2812,70 @@ def users_page():
 
 # Media folder watcher is in a separate script
 
-# Register blueprints
-app.register_blueprint(sources_bp)
-app.register_blueprint(profile_automation_bp)
-app.register_blueprint(settings_bp)
-app.register_blueprint(login_bp)
-app.register_blueprint(bot_manager_bp)
-app.register_blueprint(bot_settings_bp)
-app.register_blueprint(bulk_import_bp)
-app.register_blueprint(job_orders_bp, url_prefix='/job-orders')
-app.register_blueprint(follow_list_bp)
-app.register_blueprint(bot_launcher_bp)
-if ai_executor_bp is not None:
-    app.register_blueprint(ai_executor_bp)
-if account_factory_bp is not None:
-    app.register_blueprint(account_factory_bp)
-app.register_blueprint(device_management_bp)
-app.register_blueprint(import_v2_bp)
-app.register_blueprint(login_v2_bp)
-app.register_blueprint(job_orders_v2_bp)
-app.register_blueprint(content_schedule_bp)
-app.register_blueprint(ig_preview_bp)
-app.register_blueprint(spoofing_bp)
-app.register_blueprint(farm_stats_bp)
-app.register_blueprint(account_health_bp)
-app.register_blueprint(proxy_bp)
-app.register_blueprint(device_manager_bp)
-app.register_blueprint(deploy_bp)
-app.register_blueprint(comment_bp)
-app.register_blueprint(flow_map_bp)
-app.register_blueprint(source_quality_bp)
-app.register_blueprint(sync_bp)
-app.register_blueprint(analytics_bp)
-if cloudphone_bp is not None:
-    app.register_blueprint(cloudphone_bp)
-if mothers_bp is not None:
-    app.register_blueprint(mothers_bp)
-app.register_blueprint(user_management_bp)
-if chat_bp is not None:
-    app.register_blueprint(chat_bp)
+# Register blueprints (lazily — modules are imported off the startup path and
+# registered before the first request; HYDRA_EAGER_BLUEPRINTS=1 imports them
+# all up front)
+lazy_blueprints = LazyBlueprints(app)
+lazy_blueprints.add('manage_sources', 'sources_bp')
+lazy_blueprints.add('profile_automation_routes', 'profile_automation_bp')
+lazy_blueprints.add('settings_routes', 'settings_bp')
+lazy_blueprints.add('login_automation_routes', 'login_bp')
+lazy_blueprints.add('bot_manager_routes', 'bot_manager_bp')
+lazy_blueprints.add('bot_settings_routes', 'bot_settings_bp')
+lazy_blueprints.add('bulk_import_routes', 'bulk_import_bp')
+lazy_blueprints.add('job_orders_routes', 'job_orders_bp', url_prefix='/job-orders')
+lazy_blueprints.add('follow_list_routes', 'follow_list_bp')
+lazy_blueprints.add('bot_launcher_routes', 'bot_launcher_bp')
+# ai_executor + account_factory are internal IP — excluded from client builds.
+# optional=True so a dist with the files removed (feature off) still starts cleanly.
+if _ff_enabled("ai_executor"):
+    # eager: starts the AI schedule runner thread on import
+    lazy_blueprints.add('ai_executor_routes', 'ai_executor_bp', optional=True,
+                        eager=True, name='ai_executor')
+else:
+    print("[ai_executor] disabled via feature_flags")
+if _ff_enabled("account_factory"):
+    lazy_blueprints.add('account_factory_routes', 'account_factory_bp', optional=True,
+                        name='account_factory')
+else:
+    print("[account_factory] disabled via feature_flags")
+lazy_blueprints.add('device_management_routes', 'device_management_bp')
+lazy_blueprints.add('import_v2_routes', 'import_v2_bp')
+lazy_blueprints.add('login_automation_v2_routes', 'login_v2_bp')
+lazy_blueprints.add('job_orders_v2_routes', 'job_orders_v2_bp')
+lazy_blueprints.add('content_schedule_routes', 'content_schedule_bp')
+lazy_blueprints.add('ig_preview_routes', 'ig_preview_bp')
+lazy_blueprints.add('spoofing_routes', 'spoofing_bp')
+lazy_blueprints.add('farm_stats_routes', 'farm_stats_bp')
+lazy_blueprints.add('account_health_routes', 'account_health_bp')
+lazy_blueprints.add('proxy_routes', 'proxy_bp')
+lazy_blueprints.add('device_manager_routes', 'device_manager_bp')
+lazy_blueprints.add('deploy_routes', 'deploy_bp')
+lazy_blueprints.add('comment_routes', 'comment_bp')
+lazy_blueprints.add('flow_map_routes', 'flow_map_bp')
+lazy_blueprints.add('source_quality_routes', 'source_quality_bp')
+lazy_blueprints.add('sync_routes', 'sync_bp')
+lazy_blueprints.add('analytics_routes', 'analytics_bp')
+lazy_blueprints.add('metrics_routes', 'metrics_bp')
+# cloudphone — internal live-mirror tooling (wraps our cloudphone app + scrcpy +
+# PyAV); excluded from client builds.
+if _ff_enabled("cloudphone"):
+    lazy_blueprints.add('cloudphone_routes', 'cloudphone_bp', optional=True,
+                        name='cloudphone')
+else:
+    print("[cloudphone] disabled via feature_flags")
+# mother_dashboard — internal mother/slaves feature, excluded from client builds.
+if _ff_enabled("mother_dashboard"):
+    lazy_blueprints.add('mothers_routes', 'mothers_bp', optional=True,
+                        name='mother_dashboard')
+else:
+    print("[mother_dashboard] disabled via feature_flags")
+lazy_blueprints.add('user_management_routes', 'user_management_bp')
+if _ff_enabled("assistant_chat"):
+    lazy_blueprints.add('chat_routes', 'chat_bp', optional=True, name='chat')
+else:
+    print("[chat] disabled via feature_flags")
+lazy_blueprints.install()
 
 # ── Documentation routes ─────────────────────────────────────────────
 DOCS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'docs')
@@ -3258,7 +3192,8 @@ def api_accounts_overview():
             "SELECT username, MAX(timestamp) t FROM action_history GROUP BY username")}
         today_cnt = {r['username']: r['c'] for r in conn.execute(
             "SELECT username, COUNT(*) c FROM action_history "
-            "WHERE DATE(timestamp)=DATE('now','localtime') AND success=1 GROUP BY username")}
+            "WHERE timestamp >= DATE('now','localtime') AND timestamp < DATE('now','localtime','+1 day') "
+            "AND success=1 GROUP BY username")}
         last_post = {r['account_id']: r['t'] for r in conn.execute("""
             WITH s AS (SELECT account_id, captured_at, posts_count,
                        LAG(posts_count) OVER (PARTITION BY account_id ORDER BY captured_at) pp
@@ -4941,4 +4876,10 @@ if __name__ == '__main__':
     app.config['TEMPLATES_AUTO_RELOAD'] = True
     app.jinja_env.auto_reload = True
     app.jinja_env.cache = {}
+    # Archive old history rows + incremental VACUUM/ANALYZE (HYDRA_RETENTION=0 disables)
+    try:
+        from db.retention import start_retention_scheduler
+        start_retention_scheduler()
+    except Exception as _re:
+        print(f"[WARNING] DB retention scheduler not started: {_re}")
     app.run(debug=False, host='0.0.0.0', port=5055)
@@ -5,17 +5,19 @@ Tracks which tag groups and source accounts generate the best follower growth.
 Also provides warm-up status per account.
 
 API endpoints:
-  GET /api/source-quality?days=7      → Tag performance + source scoring
-  GET /api/warmup-status              → Warm-up status per account
+  GET /api/source-quality?days=7      → Tag performance + source scoring (cached per period)
+  GET /api/warmup-status              → Warm-up status per account (cached)
   POST /api/warmup-toggle             → Toggle warmup on/off for an account
 """
 
 import os
 import json
-import sqlite3
 from datetime import datetime, timedelta
 from flask import Blueprint, render_template, jsonify, request
 
+from phone_farm_db import cached_query
+from db.connection import connect
+
 # DB path
 DB_PATH = os.path.join(
     os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
@@ -26,11 +28,8 @@ source_quality_bp = Blueprint('source_quality', __name__)
 
 
 def _get_conn():
-    """Thread-safe connection with Row factory."""
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    return conn
+    """Thread-safe pooled connection with Row factory."""
+    return connect(DB_PATH)
 
 
 def _date_n_days_ago(n):
@@ -49,251 +48,280 @@ def source_quality_page():
 
 
 # ── API: Source Quality Scoring ──────────────────────────────────────
+# Set-based: three queries per period regardless of farm size, cached via
+# phone_farm_db.cached_query. New follower snapshots / account edits bump
+# row_versions and invalidate immediately; follow counts come from
+# action_history (not version-tracked) so entries also expire after
+# REPORT_TTL seconds. Follows older than the action_history retention window
+# come from db.retention's archive_rollups (same counts, per day/account/source).
+
+REPORT_TTL = 60
+
+# Successful follows, live rows + archived rollups: (username, source_username, n)
+_FOLLOWS_CTE = """
+    follow_rows AS (
+        SELECT username, source_username, 1 AS n
+        FROM action_history
+        WHERE action_type = 'follow' AND success = 1 AND timestamp >= :since
+        UNION ALL
+        SELECT subject, NULLIF(source_username, ''), n
+        FROM archive_rollups
+        WHERE source_table = 'action_history' AND kind = 'follow' AND outcome = '1'
+          AND day >= :since
+    ),
+"""
+
+# `timestamp >= 'YYYY-MM-DD'` equals `date(timestamp) >= ...` for both the
+# 'YYYY-MM-DD HH:MM:SS' and ISO 'T' formats, but can use the index.
+# Per-account follower growth in the period: latest minus earliest snapshot,
+# picked with window functions over idx_follower_snapshots_user_time.
+_GROWTH_CTE = """
+    ranked AS (
+        SELECT username, COALESCE(followers, 0) AS followers,
+               ROW_NUMBER() OVER (PARTITION BY username ORDER BY captured_at ASC)  AS rn_asc,
+               ROW_NUMBER() OVER (PARTITION BY username ORDER BY captured_at DESC) AS rn_desc
+        FROM follower_snapshots
+        WHERE captured_at >= :since
+    ),
+    growth AS (
+        SELECT username,
+               MAX(CASE WHEN rn_desc = 1 THEN followers END) -
+               MAX(CASE WHEN rn_asc = 1 THEN followers END) AS growth
+        FROM ranked
+        WHERE rn_asc = 1 OR rn_desc = 1
+        GROUP BY username
+    )
+"""
+
+_TAG_REPORT_SQL = """
+    WITH tag_accounts AS (
+        SELECT tag, COUNT(*) AS account_count
+        FROM accounts
+        WHERE tag IS NOT NULL AND tag != ''
+        GROUP BY tag
+    ),
+    tag_users AS (
+        SELECT DISTINCT tag, username
+        FROM accounts
+        WHERE tag IS NOT NULL AND tag != ''
+    ),
+""" + _FOLLOWS_CTE + """
+    follows AS (
+        SELECT username, SUM(n) AS cnt
+        FROM follow_rows
+        GROUP BY username
+    ),
+""" + _GROWTH_CTE + """
+    SELECT ta.tag, ta.account_count,
+           COALESCE(SUM(f.cnt), 0)   AS total_follows,
+           COALESCE(SUM(g.growth), 0) AS growth,
+           COUNT(g.username)          AS snapshot_accounts,
+           (SELECT COALESCE(SUM(growth), 0) FROM growth) AS total_growth
+    FROM tag_accounts ta
+    JOIN tag_users tu ON tu.tag = ta.tag
+    LEFT JOIN follows f ON f.username = tu.username
+    LEFT JOIN growth g  ON g.username = tu.username
+    GROUP BY ta.tag
+    ORDER BY ta.account_count DESC
+"""
+
+_SOURCE_REPORT_SQL = "WITH " + _FOLLOWS_CTE + """
+    top AS (
+        SELECT source_username,
+               SUM(n) AS follows_count,
+               COUNT(DISTINCT username) AS used_by_accounts
+        FROM follow_rows
+        WHERE source_username IS NOT NULL
+        GROUP BY source_username
+        ORDER BY follows_count DESC
+        LIMIT 50
+    ),
+    source_tag AS (
+        SELECT asrc.value AS source_username, MIN(a.tag) AS tag
+        FROM account_sources asrc
+        JOIN accounts a ON a.id = asrc.account_id
+        WHERE asrc.source_type = 'sources'
+          AND a.tag IS NOT NULL AND a.tag != ''
+          AND asrc.value IN (SELECT source_username FROM top)
+        GROUP BY asrc.value
+    )
+    SELECT top.source_username, top.follows_count, top.used_by_accounts,
+           st.tag AS used_by_tag
+    FROM top
+    LEFT JOIN source_tag st ON st.source_username = top.source_username
+    ORDER BY top.follows_count DESC
+"""
+
+_TOTAL_GROWTH_SQL = "WITH " + _GROWTH_CTE + "SELECT COALESCE(SUM(growth), 0) FROM growth"
+
+_OVERALL_SQL = "WITH " + _FOLLOWS_CTE.rstrip().rstrip(',') + """
+    SELECT
+        (SELECT SUM(n) FROM follow_rows)                       AS total_follows,
+        EXISTS (SELECT 1 FROM follower_snapshots)              AS has_snapshots,
+        (SELECT COUNT(*) FROM accounts
+          WHERE tag IS NULL OR tag = '')                       AS untagged
+"""
+
+
+def _build_source_quality(conn, since, period_days):
+    params = {'since': since}
+    tag_rows = conn.execute(_TAG_REPORT_SQL, params).fetchall()
+    source_rows = conn.execute(_SOURCE_REPORT_SQL, params).fetchall()
+    overall = conn.execute(_OVERALL_SQL, params).fetchone()
+
+    by_tag = []
+    for tr in tag_rows:
+        total_follows = tr['total_follows']
+        has_snapshots = tr['snapshot_accounts'] > 0
+        growth = tr['growth']
+        conversion = round((growth / total_follows * 100), 1) if total_follows > 0 else 0
+        by_tag.append({
+            'tag': tr['tag'],
+            'accounts': tr['account_count'],
+            'total_follows': total_follows,
+            'follower_growth': growth if has_snapshots else None,
+            'conversion_rate': conversion if has_snapshots else None,
+            'has_snapshots': has_snapshots,
+            'period_days': period_days,
+        })
+
+    by_source = [{
+        'source_username': sr['source_username'],
+        'follows_from_source': sr['follows_count'],
+        'used_by_accounts': sr['used_by_accounts'],
+        'used_by_tag': sr['used_by_tag'],
+    } for sr in source_rows]
+
+    total_follows_all = overall['total_follows'] or 0
+    has_any_snapshots = bool(overall['has_snapshots'])
+    total_growth = 0
+    if has_any_snapshots:
+        # the tag query already carries the farm-wide sum; untagged-only
+        # farms need the one extra query
+        if tag_rows:
+            total_growth = tag_rows[0]['total_growth']
+        else:
+            total_growth = conn.execute(_TOTAL_GROWTH_SQL, params).fetchone()[0]
+
+    avg_conversion = round((total_growth / total_follows_all * 100), 1) if total_follows_all > 0 and has_any_snapshots else 0
+
+    return {
+        'by_tag': by_tag,
+        'by_source': by_source,
+        'overall': {
+            'total_follows': total_follows_all,
+            'total_growth': total_growth if has_any_snapshots else None,
+            'avg_conversion': avg_conversion if has_any_snapshots else None,
+            'has_snapshots': has_any_snapshots,
+        },
+        'untagged_accounts': overall['untagged'] or 0,
+    }
+
 
 @source_quality_bp.route('/api/source-quality')
 def api_source_quality():
-    conn = _get_conn()
-    try:
-        days_param = request.args.get('days', '7')
-        if days_param == 'all':
-            since = '1970-01-01'
-            period_days = None
-        else:
+    days_param = request.args.get('days', '7')
+    if days_param == 'all':
+        since = '1970-01-01'
+        period_days = None
+    else:
+        try:
             period_days = int(days_param)
-            since = _date_n_days_ago(period_days)
-
-        # ── By Tag ──────────────────────────────────────────────
-        # Get all accounts grouped by tag
-        tag_rows = conn.execute("""
-            SELECT a.tag, COUNT(a.id) as account_count,
-                   GROUP_CONCAT(a.id) as account_ids
-            FROM accounts a
-            WHERE a.tag IS NOT NULL AND a.tag != ''
-            GROUP BY a.tag
-            ORDER BY account_count DESC
-        """).fetchall()
-
-        by_tag = []
-        for tr in tag_rows:
-            tag = tr['tag']
-            account_ids = [int(x) for x in tr['account_ids'].split(',')]
-            account_count = tr['account_count']
-            placeholders = ','.join('?' * len(account_ids))
-
-            # Get usernames for these account_ids
-            username_rows = conn.execute(
-                f"SELECT username FROM accounts WHERE id IN ({placeholders})",
-                account_ids
-            ).fetchall()
-            usernames = [r['username'] for r in username_rows]
-            u_placeholders = ','.join('?' * len(usernames))
-
-            # Sum successful follows in period
-            follows_row = conn.execute(f"""
-                SELECT COUNT(*) as cnt FROM action_history
-                WHERE username IN ({u_placeholders})
-                  AND action_type = 'follow'
-                  AND success = 1
-                  AND date(timestamp) >= ?
-            """, usernames + [since]).fetchone()
-            total_follows = follows_row['cnt'] if follows_row else 0
-
-            # Calculate follower growth from follower_snapshots
-            # Growth = latest snapshot - earliest snapshot for each account in period
-            growth = 0
-            has_snapshots = False
-            for uname in usernames:
-                earliest = conn.execute("""
-                    SELECT followers FROM follower_snapshots
-                    WHERE username = ? AND date(captured_at) >= ?
-                    ORDER BY captured_at ASC LIMIT 1
-                """, (uname, since)).fetchone()
-                latest = conn.execute("""
-                    SELECT followers FROM follower_snapshots
-                    WHERE username = ? AND date(captured_at) >= ?
-                    ORDER BY captured_at DESC LIMIT 1
-                """, (uname, since)).fetchone()
-                if earliest and latest:
-                    has_snapshots = True
-                    growth += (latest['followers'] or 0) - (earliest['followers'] or 0)
-
-            conversion = round((growth / total_follows * 100), 1) if total_follows > 0 else 0
-
-            by_tag.append({
-                'tag': tag,
-                'accounts': account_count,
-                'total_follows': total_follows,
-                'follower_growth': growth if has_snapshots else None,
-                'conversion_rate': conversion if has_snapshots else None,
-                'has_snapshots': has_snapshots,
-                'period_days': period_days,
-            })
-
-        # ── By Source ───────────────────────────────────────────
-        source_rows = conn.execute("""
-            SELECT ah.source_username,
-                   COUNT(*) as follows_count,
-                   COUNT(DISTINCT ah.username) as used_by_accounts
-            FROM action_history ah
-            WHERE ah.source_username IS NOT NULL
-              AND ah.action_type = 'follow'
-              AND ah.success = 1
-              AND date(ah.timestamp) >= ?
-            GROUP BY ah.source_username
-            ORDER BY follows_count DESC
-            LIMIT 50
-        """, (since,)).fetchall()
-
-        by_source = []
-        for sr in source_rows:
-            src = sr['source_username']
-            # Try to find which tag uses this source
-            tag_row = conn.execute("""
-                SELECT a.tag FROM accounts a
-                JOIN account_sources asrc ON asrc.account_id = a.id
-                WHERE asrc.value = ? AND asrc.source_type = 'sources'
-                  AND a.tag IS NOT NULL AND a.tag != ''
-                LIMIT 1
-            """, (src,)).fetchone()
-            used_by_tag = tag_row['tag'] if tag_row else None
-
-            by_source.append({
-                'source_username': src,
-                'follows_from_source': sr['follows_count'],
-                'used_by_accounts': sr['used_by_accounts'],
-                'used_by_tag': used_by_tag,
-            })
-
-        # ── Overall ─────────────────────────────────────────────
-        overall_row = conn.execute("""
-            SELECT COUNT(*) as total_follows FROM action_history
-            WHERE action_type = 'follow' AND success = 1
-              AND date(timestamp) >= ?
-        """, (since,)).fetchone()
-        total_follows_all = overall_row['total_follows'] if overall_row else 0
-
-        # Total growth from snapshots
-        total_growth = 0
-        has_any_snapshots = False
-        snap_check = conn.execute("SELECT COUNT(*) as cnt FROM follower_snapshots").fetchone()
-        if snap_check and snap_check['cnt'] > 0:
-            has_any_snapshots = True
-            growth_row = conn.execute("""
-                SELECT username,
-                       MAX(CASE WHEN rn_desc = 1 THEN followers END) -
-                       MAX(CASE WHEN rn_asc = 1 THEN followers END) as growth
-                FROM (
-                    SELECT username, followers,
-                           ROW_NUMBER() OVER(PARTITION BY username ORDER BY captured_at DESC) as rn_desc,
-                           ROW_NUMBER() OVER(PARTITION BY username ORDER BY captured_at ASC) as rn_asc
-                    FROM follower_snapshots
-                    WHERE date(captured_at) >= ?
-                ) sub
-                WHERE rn_desc = 1 OR rn_asc = 1
-                GROUP BY username
-            """, (since,)).fetchall()
-            for gr in growth_row:
-                if gr['growth']:
-                    total_growth += gr['growth']
-
-        avg_conversion = round((total_growth / total_follows_all * 100), 1) if total_follows_all > 0 and has_any_snapshots else 0
-
-        # ── Untagged accounts summary ───────────────────────────
-        untagged_row = conn.execute("""
-            SELECT COUNT(*) as cnt FROM accounts
-            WHERE tag IS NULL OR tag = ''
-        """).fetchone()
-        untagged_count = untagged_row['cnt'] if untagged_row else 0
-
-        return jsonify({
-            'by_tag': by_tag,
-            'by_source': by_source,
-            'overall': {
-                'total_follows': total_follows_all,
-                'total_growth': total_growth if has_any_snapshots else None,
-                'avg_conversion': avg_conversion if has_any_snapshots else None,
-                'has_snapshots': has_any_snapshots,
-            },
-            'untagged_accounts': untagged_count,
-            'period': days_param,
-        })
-    finally:
-        conn.close()
+        except ValueError:
+            return jsonify({'error': 'days must be an integer or "all"'}), 400
+        since = _date_n_days_ago(period_days)
+
+    report = cached_query(
+        f'source_quality:{since}',
+        ('accounts', 'follower_snapshots'),
+        lambda conn: _build_source_quality(conn, since, period_days),
+        ttl=REPORT_TTL)
+    return jsonify(dict(report, period=days_param))
 
 
 # ── API: Warm-up Status ─────────────────────────────────────────────
 
-@source_quality_bp.route('/api/warmup-status')
-def api_warmup_status():
-    conn = _get_conn()
-    try:
-        today = _today()
-
-        rows = conn.execute("""
-            SELECT a.id, a.username, a.device_serial, a.tag, a.status,
-                   a.warmup, a.warmup_until,
-                   d.device_name
-            FROM accounts a
-            LEFT JOIN devices d ON d.id = a.device_id
-            ORDER BY a.warmup DESC, a.tag, a.username
-        """).fetchall()
-
-        accounts = []
-        for r in rows:
-            acc_id = r['id']
-            username = r['username']
-
-            # Days active: days since first action
-            first_action = conn.execute("""
-                SELECT MIN(timestamp) as first_ts FROM action_history
-                WHERE username = ?
-            """, (username,)).fetchone()
-            if first_action and first_action['first_ts']:
-                try:
-                    first_dt = datetime.fromisoformat(first_action['first_ts'])
-                    days_active = (datetime.utcnow() - first_dt).days
-                except (ValueError, TypeError):
-                    days_active = 0
-            else:
+_WARMUP_SQL = """
+    WITH first_action AS (
+        SELECT username, MIN(first_ts) AS first_ts
+        FROM (SELECT username, MIN(timestamp) AS first_ts
+              FROM action_history
+              GROUP BY username
+              UNION ALL
+              SELECT subject, MIN(day)
+              FROM archive_rollups
+              WHERE source_table = 'action_history'
+              GROUP BY subject)
+        GROUP BY username
+    ),
+    today AS (
+        SELECT username, COUNT(*) AS cnt
+        FROM action_history
+        WHERE timestamp >= :today AND timestamp < :tomorrow AND success = 1
+        GROUP BY username
+    )
+    SELECT a.id, a.username, a.device_serial, a.tag, a.status,
+           a.warmup, a.warmup_until,
+           d.device_name,
+           fa.first_ts,
+           COALESCE(t.cnt, 0) AS actions_today,
+           s.settings_json
+    FROM accounts a
+    LEFT JOIN devices d ON d.id = a.device_id
+    LEFT JOIN first_action fa ON fa.username = a.username
+    LEFT JOIN today t ON t.username = a.username
+    LEFT JOIN account_settings s ON s.account_id = a.id
+    ORDER BY a.warmup DESC, a.tag, a.username
+"""
+
+
+def _build_warmup_status(conn, today):
+    tomorrow = (datetime.strptime(today, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+    rows = conn.execute(_WARMUP_SQL, {'today': today, 'tomorrow': tomorrow}).fetchall()
+    now = datetime.utcnow()
+
+    accounts = []
+    for r in rows:
+        # Days active: days since first action
+        days_active = 0
+        if r['first_ts']:
+            try:
+                days_active = (now - datetime.fromisoformat(r['first_ts'])).days
+            except (ValueError, TypeError):
                 days_active = 0
 
-            # Actions today
-            actions_today_row = conn.execute("""
-                SELECT COUNT(*) as cnt FROM action_history
-                WHERE username = ? AND date(timestamp) = ? AND success = 1
-            """, (username, today)).fetchone()
-            actions_today = actions_today_row['cnt'] if actions_today_row else 0
-
-            # Check warmup from account_settings JSON too
-            settings_warmup = False
-            settings_row = conn.execute("""
-                SELECT settings_json FROM account_settings WHERE account_id = ?
-            """, (acc_id,)).fetchone()
-            if settings_row:
-                try:
-                    sj = json.loads(settings_row['settings_json'])
-                    settings_warmup = sj.get('warmup_mode', False)
-                except (json.JSONDecodeError, TypeError):
-                    pass
+        # Check warmup from account_settings JSON too
+        settings_warmup = False
+        if r['settings_json']:
+            try:
+                settings_warmup = json.loads(r['settings_json']).get('warmup_mode', False)
+            except (json.JSONDecodeError, TypeError, AttributeError):
+                pass
+
+        accounts.append({
+            'id': r['id'],
+            'username': r['username'],
+            'device_serial': r['device_serial'],
+            'device_name': r['device_name'],
+            'tag': r['tag'] or '',
+            'status': r['status'],
+            'days_active': days_active,
+            'actions_today': r['actions_today'],
+            'warmup': bool(r['warmup']) or settings_warmup,
+            'warmup_until': r['warmup_until'],
+        })
+    return accounts
 
-            is_warmup = bool(r['warmup']) or settings_warmup
-
-            accounts.append({
-                'id': acc_id,
-                'username': username,
-                'device_serial': r['device_serial'],
-                'device_name': r['device_name'],
-                'tag': r['tag'] or '',
-                'status': r['status'],
-                'days_active': days_active,
-                'actions_today': actions_today,
-                'warmup': is_warmup,
-                'warmup_until': r['warmup_until'],
-            })
-
-        return jsonify(accounts)
-    finally:
-        conn.close()
+
+@source_quality_bp.route('/api/warmup-status')
+def api_warmup_status():
+    today = _today()
+    accounts = cached_query(
+        f'warmup_status:{today}',
+        ('accounts', 'devices', 'account_settings'),
+        lambda conn: _build_warmup_status(conn, today),
+        ttl=REPORT_TTL)
+    return jsonify(accounts)
 
 
 # ── API: Toggle Warm-up ─────────────────────────────────────────────
@@ -22,6 +22,7 @@ import json
 import logging
 import os
 import sqlite3
+import sys
 import threading
 import time
 import uuid
@@ -42,6 +43,9 @@ spoofing_bp = Blueprint('spoofing', __name__)
 # spoof_storage at CALL TIME so a settings change applies without restart.
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DB_PATH = os.path.join(BASE_DIR, 'db', 'phone_farm.db')
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+from db.connection import connect  # noqa: E402
 
 _DB_INIT_DONE = False
 _WORKER_STARTED = False
@@ -109,9 +113,7 @@ def _init_db():
 
 def _conn():
     _init_db()
-    c = sqlite3.connect(DB_PATH, timeout=15)
-    c.row_factory = sqlite3.Row
-    return c
+    return connect(DB_PATH, timeout=15)
 
 
 # ─────────────────────────────────────────────────────────────────
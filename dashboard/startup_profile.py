@@ -0,0 +1,166 @@
+"""
+startup_profile.py — import-time waterfall for dashboard/server startup
+========================================================================
+Re-runs the startup steps in a child interpreter under `python -X importtime`
+and prints where the time went:
+
+    python dashboard/simple_app.py --profile-startup
+    python run_server.py --profile-startup
+    python dashboard/startup_profile.py simple_app      # same as the first
+
+Output:
+  - wall time per startup step (import, create_app(), ...);
+  - a waterfall of imports — start offset on the import clock, cumulative
+    and self time, nested by who imported what (entries under --min-ms are
+    hidden, their time stays in the parent's cumulative);
+  - the modules with the most self time (the ones worth making lazy).
+
+The child only builds the app; it never binds a port.
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+
+DASHBOARD_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(DASHBOARD_DIR)
+
+_MARK = '__STARTUP_PROFILE__'
+_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S.*)$')
+
+_CHILD = '''
+import json, sys, time
+_steps = []
+_ns = {}
+for _label, _code in %r:
+    _t = time.perf_counter()
+    exec(_code, _ns)
+    _steps.append((_label, time.perf_counter() - _t))
+sys.stdout.flush()
+print(%r + json.dumps(_steps))
+'''
+
+# Known targets: name -> (cwd, [(label, code), ...])
+TARGETS = {
+    'simple_app': (DASHBOARD_DIR, [('import simple_app', 'import simple_app')]),
+    'run_server': (ROOT, [('import run_server', 'import run_server'),
+                          ('create_app()', 'run_server.create_app()')]),
+}
+
+
+def parse_importtime(text):
+    """-X importtime stderr -> [{name, self_us, cum_us, depth, start_us}]
+    in import (pre-)order, with start offsets on the import clock."""
+    rows = []
+    for line in text.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append([int(m.group(1)), int(m.group(2)), len(m.group(3)), m.group(4)])
+    if not rows:
+        return []
+    base = min(r[2] for r in rows)
+    clock = 0
+    pending = []    # finished subtrees waiting for their parent's line
+    # Entries are printed post-order: everything between a module's start and
+    # its line is its own subtree, so its end is the running sum of self time.
+    for self_us, cum_us, indent, name in rows:
+        clock += self_us
+        depth = (indent - base) // 2
+        node = {'name': name.strip(), 'self_us': self_us, 'cum_us': cum_us,
+                'depth': depth, 'start_us': clock - cum_us, 'children': []}
+        while pending and pending[-1]['depth'] > depth:
+            node['children'].insert(0, pending.pop())
+        pending.append(node)
+
+    out = []
+
+    def _walk(node):
+        children = node.pop('children')
+        out.append(node)
+        for child in children:
+            _walk(child)
+
+    for node in pending:
+        _walk(node)
+    return out
+
+
+def run(target, extra_env=None):
+    """Run a TARGETS entry in a child; returns (steps, imports, stderr_tail)."""
+    cwd, steps = TARGETS[target]
+    env = dict(os.environ, **(extra_env or {}))
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _CHILD % (steps, _MARK)],
+        cwd=cwd, env=env, capture_output=True, text=True, errors='replace')
+    timings = []
+    for line in proc.stdout.splitlines():
+        if line.startswith(_MARK):
+            timings = json.loads(line[len(_MARK):])
+    imports = parse_importtime(proc.stderr)
+    tail = [l for l in proc.stderr.splitlines() if not l.startswith('import time:')]
+    if proc.returncode != 0 and not timings:
+        raise RuntimeError('startup failed:\n' + '\n'.join(tail[-20:]))
+    return timings, imports, tail
+
+
+def _bar(start, width, total, cols=40):
+    if total <= 0:
+        return ''
+    a = int(start / total * cols)
+    b = max(a + 1, int((start + width) / total * cols))
+    return ' ' * a + '█' * (min(b, cols) - a)
+
+
+def render(target, timings, imports, min_ms=5.0, max_depth=3, top=15):
+    lines = [f"Startup profile: {target}", '']
+    wall = sum(t for _, t in timings)
+    for label, t in timings:
+        lines.append(f"  {label:<24} {t * 1000:9.1f} ms")
+    import_total = sum(i['self_us'] for i in imports) / 1000
+    lines.append(f"  {'total':<24} {wall * 1000:9.1f} ms   "
+                 f"(import clock {import_total:.1f} ms, incl. interpreter startup)")
+    lines.append('')
+
+    clock = max((i['start_us'] + i['cum_us'] for i in imports), default=0)
+    shown = [i for i in imports
+             if i['cum_us'] >= min_ms * 1000 and i['depth'] <= max_depth]
+    lines.append(f"  {'start ms':>9} {'cum ms':>8} {'self ms':>8}  module")
+    for i in shown:
+        name = '  ' * i['depth'] + i['name']
+        lines.append(f"  {i['start_us'] / 1000:9.1f} {i['cum_us'] / 1000:8.1f} "
+                     f"{i['self_us'] / 1000:8.1f}  {name:<48} "
+                     f"{_bar(i['start_us'], i['cum_us'], clock)}")
+    lines.append('')
+
+    lines.append(f"  Top {top} by self time:")
+    for i in sorted(imports, key=lambda i: -i['self_us'])[:top]:
+        lines.append(f"  {i['self_us'] / 1000:9.1f} ms  {i['name']}")
+    return '\n'.join(lines)
+
+
+def profile_startup(target, min_ms=5.0, max_depth=3, top=15, extra_env=None):
+    """Run + print. Exit code for the caller's sys.exit()."""
+    try:
+        timings, imports, _ = run(target, extra_env=extra_env)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(render(target, timings, imports, min_ms=min_ms, max_depth=max_depth, top=top))
+    return 0
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Startup import-time waterfall')
+    parser.add_argument('target', nargs='?', default='simple_app', choices=sorted(TARGETS))
+    parser.add_argument('--min-ms', type=float, default=5.0,
+                        help='Hide imports faster than this (cumulative)')
+    parser.add_argument('--depth', type=int, default=3, help='Max nesting shown')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--eager', action='store_true',
+                        help='Profile with HYDRA_EAGER_BLUEPRINTS=1 for comparison')
+    args = parser.parse_args()
+    sys.exit(profile_startup(args.target, args.min_ms, args.depth, args.top,
+                             {'HYDRA_EAGER_BLUEPRINTS': '1'} if args.eager else None))
@@ -15,7 +15,6 @@ Routes:
 import os
 import sys
 import json
-import sqlite3
 import subprocess
 import threading
 import time
@@ -29,6 +28,9 @@ from flask import Blueprint, render_template, jsonify, request
 # ── Paths ──────────────────────────────────────────────────────────
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DB_PATH = os.path.join(BASE_DIR, 'db', 'phone_farm.db')
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+from db.connection import connect  # noqa: E402
 BACKUP_DIR = os.path.join(BASE_DIR, 'db', 'backups')
 
 sync_bp = Blueprint('sync', __name__)
@@ -71,10 +73,7 @@ def _get_state():
 
 # ── Database helpers ──────────────────────────────────────────────
 def _get_conn():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    return conn
+    return connect(DB_PATH)
 
 
 def _ensure_columns():
@@ -0,0 +1,260 @@
+"""
+Hydra DB Connections
+=====================
+One connection factory for phone_farm.db (and any other SQLite file the
+runtime opens repeatedly):
+
+    from db.connection import connect
+    conn = connect()                    # Row factory, pooled, tuned
+    try:
+        conn.execute(...)
+        conn.commit()
+    finally:
+        conn.close()                    # back to the pool, not closed
+
+Callers keep the usual open/close pattern. close() rolls back anything
+left uncommitted (what a real close would do) and parks the connection in
+an idle pool; the next connect() for the same file — from any thread —
+takes it back instead of opening a new one. A connection is only ever used
+by the thread that checked it out. Werkzeug serves each request on a fresh
+thread, so idle connections are shared between threads (LIFO) rather than
+tied to the thread that opened them.
+
+Every new connection gets:
+    journal_mode=WAL, synchronous=NORMAL   durable at checkpoint, no fsync per commit
+    cache_size / mmap_size                 HYDRA_SQLITE_CACHE_KB (16384) / HYDRA_SQLITE_MMAP_MB (256)
+    temp_store=MEMORY                      sorts / temp b-trees off disk
+    busy_timeout                           `timeout` seconds (10), same as sqlite3.connect
+    cached_statements=256                  prepared statements survive across calls now
+
+Statements slower than HYDRA_SLOW_QUERY_MS (250) are logged on the
+'db.slow' logger with their SQL (never parameters). pool_stats() also
+counts every statement, its total / max time and 'database is locked'
+errors — time spent in execute() includes waiting on busy_timeout, so
+those numbers are the contention gauge (automation/sim_bench.py).
+
+redirect(src, dst) makes connect(src) open dst for the duration of a block
+(automation/sim_bench.py runs the action code against a scratch copy of
+phone_farm.db that way, whatever path each module computes).
+
+Not for: connections with isolation_level=None or ATTACHed databases
+(migrations, retention) and one-shot scripts — use sqlite3.connect.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+slow_log = logging.getLogger('db.slow')
+
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'phone_farm.db')
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+CACHE_KB = _env_int('HYDRA_SQLITE_CACHE_KB', 16384)
+MMAP_MB = _env_int('HYDRA_SQLITE_MMAP_MB', 256)
+SLOW_QUERY_MS = _env_int('HYDRA_SLOW_QUERY_MS', 250)
+MAX_IDLE = _env_int('HYDRA_SQLITE_POOL_IDLE', 8)        # per DB file
+STATEMENT_CACHE = 256
+DEFAULT_TIMEOUT = 10
+
+_lock = threading.Lock()   # guards _idle, _generation and _stats
+_idle = {}              # path -> [PooledConnection] (LIFO)
+_generation = 0
+_redirects = {}         # abspath -> abspath, see redirect()
+_stats = {'opened': 0, 'reused': 0, 'closed': 0, 'slow': 0,
+          'statements': 0, 'statement_ms': 0.0, 'statement_max_ms': 0.0, 'locked': 0}
+
+
+def _log_slow(sql, started):
+    ms = (time.perf_counter() - started) * 1000
+    slow = ms >= SLOW_QUERY_MS
+    with _lock:
+        _stats['statements'] += 1
+        _stats['statement_ms'] += ms
+        if ms > _stats['statement_max_ms']:
+            _stats['statement_max_ms'] = ms
+        if slow:
+            _stats['slow'] += 1
+    if slow:
+        slow_log.warning("Slow query (%.0f ms): %s", ms, ' '.join(str(sql).split())[:500])
+
+
+def _timed(call, sql, *args):
+    t = time.perf_counter()
+    try:
+        return call(sql, *args)
+    except sqlite3.OperationalError as e:
+        if 'locked' in str(e) or 'busy' in str(e):
+            with _lock:
+                _stats['locked'] += 1
+        raise
+    finally:
+        _log_slow(sql, t)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor whose execute*() calls feed the slow-query log."""
+
+    def execute(self, sql, parameters=()):
+        return _timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return _timed(super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return _timed(super().executescript, sql_script)
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3.Connection whose close() returns it to the pool."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool_path = None
+        self._pool_gen = _generation
+        self._pid = os.getpid()
+        self._in_use = False
+        self._foreign_keys = False
+        self._busy_ms = None
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return _timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return _timed(super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return _timed(super().executescript, sql_script)
+
+    def close(self):
+        if not self._in_use:
+            return          # already back in the pool (double close)
+        self._in_use = False
+        if not _release(self):
+            self.discard()
+
+    def discard(self):
+        """Really close (bypasses the pool)."""
+        self._in_use = False
+        with _lock:
+            _stats['closed'] += 1
+        super().close()
+
+
+def _open(path, timeout):
+    conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE, factory=PooledConnection)
+    conn._pool_path = path
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{int(CACHE_KB)}")
+    conn.execute(f"PRAGMA mmap_size={int(MMAP_MB) * 1048576}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    with _lock:
+        _stats['opened'] += 1
+    return conn
+
+
+def _release(conn):
+    """Park a closed-by-caller connection. False -> caller really closes it."""
+    if conn._pid != os.getpid() or conn._pool_gen != _generation:
+        return False
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+    except sqlite3.Error:
+        return False
+    with _lock:
+        idle = _idle.setdefault(conn._pool_path, [])
+        if len(idle) >= MAX_IDLE:
+            return False
+        idle.append(conn)
+    return True
+
+
+def connect(db_path=None, row_factory=sqlite3.Row, foreign_keys=False,
+            timeout=DEFAULT_TIMEOUT):
+    """Tuned, pooled connection to `db_path` (default db/phone_farm.db).
+    Close it as usual; row_factory / foreign_keys / timeout are re-applied on
+    every checkout, so callers never see a previous user's settings."""
+    path = os.path.abspath(db_path or DB_PATH)
+    path = _redirects.get(path, path)
+    conn = None
+    with _lock:
+        idle = _idle.get(path)
+        while idle:
+            candidate = idle.pop()
+            if candidate._pid == os.getpid() and candidate._pool_gen == _generation:
+                conn = candidate
+                _stats['reused'] += 1
+                break
+    if conn is None:
+        conn = _open(path, timeout)
+    conn._in_use = True
+    conn.row_factory = row_factory
+    conn.text_factory = str
+    if conn.isolation_level != '':
+        conn.isolation_level = ''
+    if conn._foreign_keys != bool(foreign_keys):
+        conn.execute(f"PRAGMA foreign_keys={'ON' if foreign_keys else 'OFF'}")
+        conn._foreign_keys = bool(foreign_keys)
+    busy_ms = int(timeout * 1000)
+    if conn._busy_ms != busy_ms:
+        conn.execute(f"PRAGMA busy_timeout={busy_ms}")
+        conn._busy_ms = busy_ms
+    return conn
+
+
+@contextmanager
+def redirect(src, dst):
+    """connect(src) opens dst inside the block (process-wide)."""
+    src, dst = os.path.abspath(src), os.path.abspath(dst)
+    with _lock:
+        if src in _redirects:
+            raise RuntimeError("%s is already redirected" % src)
+        _redirects[src] = dst
+    try:
+        yield dst
+    finally:
+        with _lock:
+            _redirects.pop(src, None)
+        reset_pool()
+
+
+def reset_pool():
+    """Close idle connections; connections checked out now are closed when
+    released. Use after replacing the DB file (restore, fresh install)."""
+    global _generation
+    with _lock:
+        _generation += 1
+        idle = [c for conns in _idle.values() for c in conns]
+        _idle.clear()
+    for conn in idle:
+        try:
+            conn.discard()
+        except sqlite3.Error:
+            pass
+
+
+def pool_stats():
+    """Counters since process start + idle connections per DB file."""
+    with _lock:
+        idle = {path: len(conns) for path, conns in _idle.items()}
+        stats = dict(_stats, idle=idle, slow_query_ms=SLOW_QUERY_MS)
+    stats['statement_ms'] = round(stats['statement_ms'], 1)
+    stats['statement_max_ms'] = round(stats['statement_max_ms'], 1)
+    return stats
@@ -0,0 +1,189 @@
+"""
+Hydra Keyset Pagination + Streaming Export
+===========================================
+Cursor-based paging and NDJSON / CSV export for the history tables the
+dashboard lists and analysts pull weeks of:
+
+    DATASETS        action_history   action_history  ordered by (timestamp, id)
+                    sessions         account_sessions ordered by (session_start, id)
+                    bot_logs         bot_logs        ordered by (timestamp, id)
+
+    rows, next_cursor = fetch_page(conn, 'action_history',
+                                   filters={'device_serial': s}, since='2026-10-01',
+                                   cursor=request.args.get('cursor'), limit=100)
+
+    for chunk in export('bot_logs', 'csv', filters={'level': 'ERROR'}):
+        ...                                      # str chunks, one per batch
+
+Pages are newest first. The cursor is the (time, id) of the last row
+served, so page N costs the same as page 1 — `WHERE (time, id) < (?, ?)`
+is a range seek on the (filter column, time) indexes from migration step
+11 instead of OFFSET re-reading every earlier row. export() walks the same
+keyset in BATCH_ROWS statements and yields each batch as text, so memory
+stays flat and no read transaction is held while the client drains the
+response. Rows with a NULL time column (the columns default to now) are
+not reachable by a keyset and are left out.
+
+Filters: equality on the dataset's filter columns; since (inclusive) and
+until (exclusive) compare against the time column as text
+('YYYY-MM-DD[ HH:MM:SS]').
+"""
+
+import base64
+import binascii
+import csv
+import io
+import json
+from collections import namedtuple
+
+from db.connection import connect
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+BATCH_ROWS = 2000
+
+# filters: request argument / column name -> cast applied to its value
+Dataset = namedtuple('Dataset', 'table time_column filters')
+
+DATASETS = {
+    'action_history': Dataset('action_history', 'timestamp', {
+        'device_serial': str, 'username': str, 'action_type': str, 'success': int,
+    }),
+    'sessions': Dataset('account_sessions', 'session_start', {
+        'device_serial': str, 'username': str, 'status': str,
+    }),
+    'bot_logs': Dataset('bot_logs', 'timestamp', {
+        'device_serial': str, 'username': str, 'action_type': str, 'level': str,
+    }),
+}
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def get_dataset(name):
+    """DATASETS entry, ValueError for an unknown name."""
+    try:
+        return DATASETS[name]
+    except KeyError:
+        raise ValueError(f"unknown dataset {name!r} (expected one of {', '.join(DATASETS)})")
+
+
+# ─── Cursor ──────────────────────────────────────────────────────────
+
+def encode_cursor(time_value, row_id):
+    raw = json.dumps([time_value, row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(time, id) from encode_cursor(); ValueError if it isn't one."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        time_value, row_id = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        raise ValueError(f"invalid cursor {cursor!r}")
+    if not isinstance(time_value, str) or not isinstance(row_id, int):
+        raise ValueError(f"invalid cursor {cursor!r}")
+    return time_value, row_id
+
+
+def clamp_limit(limit, default=DEFAULT_LIMIT):
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, MAX_LIMIT))
+
+
+# ─── SQL ─────────────────────────────────────────────────────────────
+
+def page_sql(name, filters=None, since=None, until=None, after=None, limit=DEFAULT_LIMIT,
+             columns='*'):
+    """(sql, params) for one page; `after` is a decoded (time, id) cursor."""
+    ds = get_dataset(name)
+    tc = ds.time_column
+    where = [f"{tc} IS NOT NULL"]
+    params = []
+    for column, value in (filters or {}).items():
+        cast = ds.filters.get(column)
+        if cast is None or value is None or value == '':
+            continue
+        where.append(f"{column} = ?")
+        params.append(cast(value))
+    if since:
+        where.append(f"{tc} >= ?")
+        params.append(since)
+    if until:
+        where.append(f"{tc} < ?")
+        params.append(until)
+    if after is not None:
+        where.append(f"({tc}, id) < (?, ?)")
+        params.extend(after)
+    sql = (f"SELECT {columns} FROM {ds.table} WHERE {' AND '.join(where)} "
+           f"ORDER BY {tc} DESC, id DESC LIMIT ?")
+    params.append(int(limit))
+    return sql, params
+
+
+def fetch_page(conn, name, filters=None, since=None, until=None, cursor=None,
+               limit=DEFAULT_LIMIT):
+    """(rows as dicts, next_cursor or None). Raises ValueError on a bad cursor."""
+    ds = get_dataset(name)
+    limit = clamp_limit(limit)
+    after = decode_cursor(cursor) if cursor else None
+    # One extra row says whether there is a next page without a COUNT(*)
+    sql, params = page_sql(name, filters, since, until, after, limit + 1)
+    rows = [dict(r) for r in conn.execute(sql, params).fetchall()]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[ds.time_column], last['id'])
+    return rows, next_cursor
+
+
+# ─── Streaming export ────────────────────────────────────────────────
+
+def iter_batches(name, filters=None, since=None, until=None, db_path=None,
+                 batch=BATCH_ROWS):
+    """Yield (column names, [row tuples]) batches, newest first, until done."""
+    ds = get_dataset(name)
+    after = None
+    while True:
+        conn = connect(db_path, row_factory=None)
+        try:
+            cur = conn.execute(*page_sql(name, filters, since, until, after, batch))
+            columns = [d[0] for d in cur.description]
+            rows = cur.fetchall()
+        finally:
+            conn.close()
+        if not rows:
+            return
+        yield columns, rows
+        if len(rows) < batch:
+            return
+        last = rows[-1]
+        after = (last[columns.index(ds.time_column)], last[columns.index('id')])
+
+
+def export(name, fmt='ndjson', filters=None, since=None, until=None, db_path=None,
+           batch=BATCH_ROWS):
+    """Text chunks of an NDJSON or CSV export (CSV starts with a header row)."""
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r} (expected ndjson or csv)")
+    header_done = False
+    for columns, rows in iter_batches(name, filters, since, until, db_path, batch):
+        if fmt == 'ndjson':
+            yield ''.join(json.dumps(dict(zip(columns, r)), ensure_ascii=False) + '\n'
+                          for r in rows)
+            continue
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator='\n')
+        if not header_done:
+            writer.writerow(columns)
+            header_done = True
+        writer.writerows(rows)
+        yield buf.getvalue()
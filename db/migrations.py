@@ -2,19 +2,34 @@
 Hydra DB Migrations
 ====================
 Central place for ALL table definitions and schema migrations.
-Run ensure_schema() on every dashboard/bot startup to guarantee
-all tables exist, even on fresh installs.
 
-When adding a new table:
-  1. Add CREATE TABLE IF NOT EXISTS to SCHEMA_TABLES
-  2. If altering existing table, add ALTER to MIGRATIONS list
-  3. That's it — runs automatically on startup
+Versioned runner: STEPS is an ordered list of numbered migrations. Applied
+steps are recorded in the `schema_version` table and the DB is stamped with
+PRAGMA user_version = LATEST_VERSION. After that, verifying the schema is a
+single integer compare — no CREATE TABLE IF NOT EXISTS / ALTER probing in
+runners, bot sessions or request handlers.
+
+    migrate()          run pending steps (startup / deploy); no-op when current
+    require_schema()   once per process: migrate() if needed, then free
+    ensure_schema()    force every step again (repair); `python -m db.migrations`
+
+Pending steps run inside one BEGIN IMMEDIATE transaction, so concurrent
+runner processes starting together wait for the first one instead of all
+migrating at once, and a failed step leaves the DB at its old version.
+
+When changing the schema:
+  1. Append a new step to STEPS with the next version number
+     (a function taking the connection; must not COMMIT itself)
+  2. Update the CREATE TABLE in init_db.py too so fresh installs match
+  3. That's it — runs once on the next startup of every process
+Never edit or renumber a step that has shipped.
 """
 
 import sqlite3
 import os
 import sys
 import logging
+import threading
 
 log = logging.getLogger(__name__)
 
@@ -427,50 +442,598 @@ MIGRATIONS = [
     {'name': 'add_posts_count_to_follower_snapshots',
      'sql': "ALTER TABLE follower_snapshots ADD COLUMN posts_count INTEGER DEFAULT 0",
      'check': "SELECT sql FROM sqlite_master WHERE name='follower_snapshots' AND sql LIKE '%posts_count%'"},
+
+    # Report indexes (source quality / warm-up status) — per-account growth
+    # windows, per-period follow counts, first-action + today-actions lookups
+    {'name': 'idx_follower_snapshots_user_time',
+     'sql': "CREATE INDEX IF NOT EXISTS idx_follower_snapshots_user_time ON follower_snapshots(username, captured_at)",
+     'check': "SELECT name FROM sqlite_master WHERE type='index' AND name='idx_follower_snapshots_user_time'"},
+    {'name': 'idx_action_history_type_time',
+     'sql': "CREATE INDEX IF NOT EXISTS idx_action_history_type_time ON action_history(action_type, timestamp)",
+     'check': "SELECT name FROM sqlite_master WHERE type='index' AND name='idx_action_history_type_time'"},
+    {'name': 'idx_action_history_user_time',
+     'sql': "CREATE INDEX IF NOT EXISTS idx_action_history_user_time ON action_history(username, timestamp)",
+     'check': "SELECT name FROM sqlite_master WHERE type='index' AND name='idx_action_history_user_time'"},
 ]
 
 
-def ensure_schema(db_path=None):
-    """
-    Ensure all tables exist and migrations are applied.
-    Safe to call on every startup — uses IF NOT EXISTS and checks.
-    """
-    path = db_path or DB_PATH
-    conn = sqlite3.connect(path)
+def _statements(script):
+    """Split an SQL script into statements (trigger bodies kept whole), so it
+    can run inside the migration transaction — executescript() would COMMIT."""
+    buf = ''
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            if buf.strip().strip(';').strip():
+                yield buf.strip()
+            buf = ''
+    if buf.strip():
+        yield buf.strip()
+
+
+def _run_script(conn, script):
+    for stmt in _statements(script):
+        try:
+            conn.execute(stmt)
+        except sqlite3.OperationalError as e:
+            # e.g. an index on a column an older table version doesn't have yet
+            log.warning("Schema statement skipped (%s): %s", e, stmt.split('\n', 1)[0][:80])
+
+
+def _columns(conn, table):
+    return {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
 
-    # Create all tables — prefer the COMPLETE schema from init_db.py (single source
-    # of truth, ~41 tables); fall back to the legacy subset below if unavailable.
+
+def _add_columns(conn, table, columns):
+    """ALTER TABLE ADD COLUMN for each (name, type) the table doesn't have."""
+    existing = _columns(conn, table)
+    if not existing:
+        return
+    for name, col_type in columns:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {col_type}")
+            log.info("Added %s.%s", table, name)
+
+
+# ─── Versioned steps ─────────────────────────────────────────────────
+
+def _step_baseline(conn):
+    """Everything ensure_schema() used to apply on every startup: the full
+    init_db.py schema, the legacy subset above, db.models' schema and both
+    ALTER lists (MIGRATIONS here, _MIGRATIONS in db.models)."""
     full = _full_schema()
     if full:
-        conn.executescript(full)
-        conn.commit()
-    conn.executescript(SCHEMA_TABLES)
+        _run_script(conn, full)
+    _run_script(conn, SCHEMA_TABLES)
+    try:
+        from db import models
+        _run_script(conn, models.SCHEMA_SQL)
+        model_columns = models._MIGRATIONS
+    except Exception as e:
+        log.warning("db.models schema unavailable: %s", e)
+        model_columns = []
 
-    # Run migrations
     for m in MIGRATIONS:
-        # Use migration name if provided, else derive from SQL for logs
         m_name = m.get('name') or (m.get('sql', '')[:60] + '...')
         try:
-            # Check if migration already applied
-            if m.get('check'):
-                result = conn.execute(m['check']).fetchone()
-                if result:
-                    continue  # Already applied
-
+            if m.get('check') and conn.execute(m['check']).fetchone():
+                continue  # Already applied
             conn.execute(m['sql'])
-            conn.commit()
             log.info("Migration applied: %s", m_name)
         except Exception as e:
             # Likely already applied (duplicate column, etc.)
             if 'duplicate' not in str(e).lower() and 'already exists' not in str(e).lower():
                 log.warning("Migration '%s' skipped: %s", m_name, e)
 
-    conn.commit()
-    conn.close()
-    log.info("Schema check complete — all tables verified")
+    for table, column, col_type in model_columns:
+        _add_columns(conn, table, [(column, col_type)])
+
+
+def _step_bot_logs(conn):
+    """bot_logs indexes (was automation.bot_logger.init_log_table on import)."""
+    _add_columns(conn, 'bot_logs', [('module', 'TEXT'), ('created_at', 'TEXT')])
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bot_logs_timestamp ON bot_logs(timestamp DESC)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bot_logs_device ON bot_logs(device_serial)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bot_logs_level ON bot_logs(level)")
+
+
+def _step_action_history_source(conn):
+    """action_history.source_username (was probed in helpers.get_db)."""
+    _add_columns(conn, 'action_history', [('source_username', 'TEXT')])
+
+
+def _step_scraped_users(conn):
+    """Was ScrapeAction.__init__ -> ensure_scraped_table() on every session."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS scraped_users (
+            id              INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id      INTEGER NOT NULL,
+            source_username TEXT NOT NULL,
+            scraped_username TEXT NOT NULL,
+            scraped_at      TEXT DEFAULT (datetime('now')),
+            used            INTEGER DEFAULT 0,
+            UNIQUE(account_id, scraped_username)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scraped_account ON scraped_users(account_id, used)")
+
+
+def _step_tag_followed_targets(conn):
+    """Cross-account follow dedup (was automation.tag_dedup.ensure_table)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tag_followed_targets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tag TEXT NOT NULL,
+            target_username TEXT NOT NULL,
+            followed_by TEXT NOT NULL,
+            device_serial TEXT,
+            followed_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime')),
+            UNIQUE(tag, target_username)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tft_tag ON tag_followed_targets(tag)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tft_target ON tag_followed_targets(target_username)")
+
+
+def _step_insights(conn):
+    """Insights tables + device/business columns
+    (was dashboard.phone_farm_db._ensure_columns on import)."""
+    _add_columns(conn, 'devices', [('device_group', "TEXT DEFAULT ''")])
+    _add_columns(conn, 'accounts', [
+        ('is_business_profile', 'INTEGER DEFAULT 0'),
+        ('business_category', "TEXT DEFAULT ''"),
+        ('business_switched_at', 'TEXT'),
+    ])
+    _run_script(conn, """
+        CREATE TABLE IF NOT EXISTS account_insights (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id INTEGER NOT NULL,
+            username TEXT NOT NULL,
+            device_serial TEXT NOT NULL,
+            period_type TEXT NOT NULL DEFAULT '7d',
+            accounts_reached INTEGER DEFAULT 0,
+            accounts_reached_delta REAL DEFAULT 0,
+            accounts_engaged INTEGER DEFAULT 0,
+            accounts_engaged_delta REAL DEFAULT 0,
+            profile_visits INTEGER DEFAULT 0,
+            website_clicks INTEGER DEFAULT 0,
+            email_clicks INTEGER DEFAULT 0,
+            follower_demographics TEXT DEFAULT '{}',
+            engagement_breakdown TEXT DEFAULT '{}',
+            captured_at TEXT NOT NULL DEFAULT (datetime('now')),
+            FOREIGN KEY (account_id) REFERENCES accounts(id)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_insights_username ON account_insights(username);
+        CREATE INDEX IF NOT EXISTS idx_insights_captured ON account_insights(captured_at);
+        CREATE INDEX IF NOT EXISTS idx_insights_account ON account_insights(account_id);
+
+        CREATE TABLE IF NOT EXISTS content_insights (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            account_id INTEGER NOT NULL,
+            username TEXT NOT NULL,
+            device_serial TEXT NOT NULL,
+            content_type TEXT NOT NULL,
+            content_id TEXT,
+            reach INTEGER DEFAULT 0,
+            impressions INTEGER DEFAULT 0,
+            likes INTEGER DEFAULT 0,
+            comments INTEGER DEFAULT 0,
+            shares INTEGER DEFAULT 0,
+            saves INTEGER DEFAULT 0,
+            plays INTEGER DEFAULT 0,
+            profile_visits INTEGER DEFAULT 0,
+            follows INTEGER DEFAULT 0,
+            exits INTEGER DEFAULT 0,
+            forwards INTEGER DEFAULT 0,
+            backwards INTEGER DEFAULT 0,
+            replies INTEGER DEFAULT 0,
+            captured_at TEXT NOT NULL DEFAULT (datetime('now')),
+            FOREIGN KEY (account_id) REFERENCES accounts(id)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_content_insights_username ON content_insights(username);
+        CREATE INDEX IF NOT EXISTS idx_content_insights_captured ON content_insights(captured_at);
+    """)
+
+
+# Tables fronted by dashboard/phone_farm_db's read-through cache. Triggers
+# bump a counter on every write, from any process (dashboard, runners,
+# scripts), so cache validity is one tiny SELECT.
+ROW_VERSION_TABLES = ('devices', 'accounts', 'account_settings', 'follower_snapshots')
+
+# Further inputs of automation.action_plan's session plans (which also
+# watch accounts, account_settings and follower_snapshots).
+PLAN_VERSION_TABLES = ('job_orders', 'job_assignments', 'content_schedule')
+
+
+def _version_triggers(conn, tables):
+    """row_versions counter + INSERT/UPDATE/DELETE triggers for each of
+    `tables` that exists."""
+    existing = {r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table'")}
+    for table in tables:
+        if table not in existing:
+            continue
+        conn.execute(
+            "INSERT OR IGNORE INTO row_versions (name, version) VALUES (?, 0)",
+            (table,))
+        for op in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_rv_{table}_{op.lower()}
+                AFTER {op} ON {table}
+                BEGIN
+                    UPDATE row_versions SET version = version + 1
+                    WHERE name = '{table}';
+                END
+            """)
+
+
+def _step_row_versions(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS row_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    _version_triggers(conn, ROW_VERSION_TABLES)
+
+
+def _step_relationship_ledger(conn):
+    """automation.relationship_ledger table, seeded from action_history
+    (latest follow per target, then targets whose latest unfollow came
+    after that follow)."""
+    existed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='relationship_ledger'"
+    ).fetchone() is not None
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS relationship_ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            target_username TEXT NOT NULL,
+            device_serial TEXT,
+            source_username TEXT,
+            followed_at TEXT,
+            unfollowed_at TEXT,
+            unfollow_attempts INTEGER DEFAULT 0,
+            last_attempt_at TEXT,
+            UNIQUE(username, target_username)
+        )
+    """)
+    # Unfollow queue: still-followed targets of one account, oldest first
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_rl_queue
+        ON relationship_ledger(username, followed_at)
+        WHERE unfollowed_at IS NULL
+    """)
+    if existed:
+        return
+    conn.execute("""
+        INSERT OR IGNORE INTO relationship_ledger
+            (username, target_username, device_serial, source_username, followed_at)
+        SELECT username, target_username, device_serial, source_username,
+               MAX(timestamp)
+        FROM action_history
+        WHERE action_type = 'follow' AND success = 1
+          AND target_username IS NOT NULL AND username IS NOT NULL
+        GROUP BY username, target_username
+    """)
+    conn.execute("""
+        UPDATE relationship_ledger
+        SET unfollowed_at = (
+            SELECT MAX(ah.timestamp) FROM action_history ah
+            WHERE ah.username = relationship_ledger.username
+              AND ah.target_username = relationship_ledger.target_username
+              AND ah.action_type = 'unfollow' AND ah.success = 1
+        )
+        WHERE unfollowed_at IS NULL
+          AND (SELECT MAX(ah.timestamp) FROM action_history ah
+               WHERE ah.username = relationship_ledger.username
+                 AND ah.target_username = relationship_ledger.target_username
+                 AND ah.action_type = 'unfollow' AND ah.success = 1) >= followed_at
+    """)
+    count = conn.execute("SELECT COUNT(*) FROM relationship_ledger").fetchone()[0]
+    log.info("relationship_ledger backfilled: %d rows", count)
+
+
+def _step_archive_rollups(conn):
+    """db.retention bookkeeping: per-day counts of archived history rows
+    (all-time reports stay exact without opening archives) and a run log."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS archive_rollups (
+            source_table TEXT NOT NULL,
+            day TEXT NOT NULL,
+            grp TEXT NOT NULL DEFAULT '',
+            subject TEXT NOT NULL DEFAULT '',
+            kind TEXT NOT NULL DEFAULT '',
+            outcome TEXT NOT NULL DEFAULT '',
+            source_username TEXT NOT NULL DEFAULT '',
+            n INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (source_table, day, grp, subject, kind, outcome, source_username)
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_archive_rollups_subject
+        ON archive_rollups(source_table, subject, day)
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS archive_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            month TEXT NOT NULL,
+            rows_moved INTEGER NOT NULL DEFAULT 0,
+            archived_at TEXT DEFAULT (datetime('now', 'localtime'))
+        )
+    """)
+
+
+# Indexes called for by `python -m db.query_bench` (EXPLAIN QUERY PLAN over
+# the dashboard / automation query catalog on a production-size DB).
+QUERY_PLAN_INDEXES = [
+    # Today / this-week counts, per-type breakdowns, recent activity,
+    # retention range scans — covering, so day counts never touch the table
+    ("idx_action_history_time",
+     "action_history(timestamp, action_type, success, username)", None),
+    # Daily-limit checks and per-account counts (successful actions only)
+    ("idx_action_history_limits",
+     "action_history(username, action_type, timestamp)", "success = 1"),
+    # Distinct accounts per device (farm stats device table)
+    ("idx_action_history_device_user", "action_history(device_serial, username)", None),
+    # Error log (newest failures first)
+    ("idx_action_history_errors", "action_history(timestamp)", "success = 0"),
+    # "Already done by this account" and per-job daily counts
+    ("idx_job_history_job_account",
+     "job_history(job_id, account_id, status, created_at)", None),
+    # Job detail history (newest first) and jobs-today card
+    ("idx_job_history_job_time", "job_history(job_id, created_at)", None),
+    ("idx_job_history_created", "job_history(created_at)", None),
+    # Latest / per-day snapshot per account (window functions, growth deltas)
+    ("idx_follower_snapshots_account_time",
+     "follower_snapshots(account_id, captured_at)", None),
+    # Sessions today (farm-wide and per device), running-session poll
+    ("idx_account_sessions_start", "account_sessions(session_start)", None),
+    ("idx_account_sessions_device_start",
+     "account_sessions(device_serial, session_start)", None),
+    ("idx_account_sessions_running", "account_sessions(status)",
+     "status = 'running'"),
+]
+
+
+def _step_query_plan_indexes(conn):
+    """QUERY_PLAN_INDEXES, then fresh planner statistics for the tables."""
+    for name, target, where in QUERY_PLAN_INDEXES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}"
+                     + (f" WHERE {where}" if where else ""))
+    conn.execute("PRAGMA analysis_limit=1000")
+    for table in ('action_history', 'job_history', 'follower_snapshots',
+                  'account_sessions'):
+        conn.execute(f"ANALYZE {table}")
+
+
+# Keyset pagination / export (db/keyset.py): every filter column paired
+# with the dataset's time column, so `filter = ? AND (time, id) < (?, ?)
+# ORDER BY time DESC, id DESC` is one index range walk. The single-column
+# bot_logs indexes are prefixes of their replacements.
+KEYSET_INDEXES = [
+    ("idx_action_history_device_time", "action_history(device_serial, timestamp)"),
+    ("idx_account_sessions_user_start", "account_sessions(username, session_start)"),
+    ("idx_bot_logs_device_time", "bot_logs(device_serial, timestamp)"),
+    ("idx_bot_logs_user_time", "bot_logs(username, timestamp)"),
+    ("idx_bot_logs_action_time", "bot_logs(action_type, timestamp)"),
+    ("idx_bot_logs_level_time", "bot_logs(level, timestamp)"),
+]
+
+
+def _step_keyset_indexes(conn):
+    for name, target in KEYSET_INDEXES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+    conn.execute("DROP INDEX IF EXISTS idx_bot_logs_device")
+    conn.execute("DROP INDEX IF EXISTS idx_bot_logs_level")
+    conn.execute("PRAGMA analysis_limit=1000")
+    conn.execute("ANALYZE bot_logs")
+
+
+# Full-text index over bot_logs (automation/bot_logger.search_logs).
+# External-content FTS5: the text lives once, in bot_logs; the triggers keep
+# the index in step with the logger's INSERTs and with retention's DELETEs.
+BOT_LOGS_FTS = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS bot_logs_fts USING fts5(
+        message, error_detail,
+        content='bot_logs', content_rowid='id',
+        tokenize="unicode61 remove_diacritics 2"
+    );
+    CREATE TRIGGER IF NOT EXISTS bot_logs_fts_ai AFTER INSERT ON bot_logs BEGIN
+        INSERT INTO bot_logs_fts (rowid, message, error_detail)
+        VALUES (new.id, new.message, new.error_detail);
+    END;
+    CREATE TRIGGER IF NOT EXISTS bot_logs_fts_ad AFTER DELETE ON bot_logs BEGIN
+        INSERT INTO bot_logs_fts (bot_logs_fts, rowid, message, error_detail)
+        VALUES ('delete', old.id, old.message, old.error_detail);
+    END;
+    CREATE TRIGGER IF NOT EXISTS bot_logs_fts_au AFTER UPDATE OF message, error_detail ON bot_logs BEGIN
+        INSERT INTO bot_logs_fts (bot_logs_fts, rowid, message, error_detail)
+        VALUES ('delete', old.id, old.message, old.error_detail);
+        INSERT INTO bot_logs_fts (rowid, message, error_detail)
+        VALUES (new.id, new.message, new.error_detail);
+    END;
+"""
+
+
+def _step_bot_logs_fts(conn):
+    """BOT_LOGS_FTS, indexing the rows already logged. The full rebuild only
+    runs when the index is new or its row count drifted from bot_logs — on a
+    forced re-run the triggers have kept it current. Skipped (search falls
+    back to LIKE) on an SQLite build without FTS5."""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp._fts5_probe")
+    except sqlite3.OperationalError as e:
+        log.warning("FTS5 unavailable (%s) — bot_logs search will use LIKE", e)
+        return
+    created = not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name='bot_logs_fts'").fetchone()
+    for stmt in _statements(BOT_LOGS_FTS):
+        conn.execute(stmt)
+    if created or _fts_out_of_step(conn):
+        conn.execute("INSERT INTO bot_logs_fts (bot_logs_fts) VALUES ('rebuild')")
+
+
+def _fts_out_of_step(conn):
+    """True if bot_logs_fts doesn't index one row per bot_logs row. The
+    table is external-content, so count(*) on it reads bot_logs itself —
+    the docsize shadow table holds one row per indexed document."""
+    indexed = conn.execute("SELECT count(*) FROM bot_logs_fts_docsize").fetchone()[0]
+    logged = conn.execute("SELECT count(*) FROM bot_logs").fetchone()[0]
+    return indexed != logged
+
+
+def _step_runtime_plans(conn):
+    """Last timetable automation/runtime_planner.py applied per device; the
+    fingerprint of its inputs makes re-planning incremental."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS runtime_plans (
+            device_serial TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            busy_hours INTEGER NOT NULL,
+            idle_hours TEXT NOT NULL DEFAULT '',
+            plan_json TEXT NOT NULL,
+            planned_at TEXT NOT NULL DEFAULT (datetime('now'))
+        )
+    """)
+
+
+def _step_plan_input_versions(conn):
+    """row_versions triggers on the remaining session-plan inputs."""
+    _version_triggers(conn, PLAN_VERSION_TABLES)
+
+
+# (version, name, step) — append only.
+STEPS = [
+    (1, 'baseline', _step_baseline),
+    (2, 'bot_logs_indexes', _step_bot_logs),
+    (3, 'action_history_source_username', _step_action_history_source),
+    (4, 'scraped_users', _step_scraped_users),
+    (5, 'tag_followed_targets', _step_tag_followed_targets),
+    (6, 'insights_tables', _step_insights),
+    (7, 'row_versions_triggers', _step_row_versions),
+    (8, 'relationship_ledger', _step_relationship_ledger),
+    (9, 'archive_rollups', _step_archive_rollups),
+    (10, 'query_plan_indexes', _step_query_plan_indexes),
+    (11, 'keyset_pagination_indexes', _step_keyset_indexes),
+    (12, 'bot_logs_fts', _step_bot_logs_fts),
+    (13, 'runtime_plans', _step_runtime_plans),
+    (14, 'plan_input_versions', _step_plan_input_versions),
+]
+
+LATEST_VERSION = STEPS[-1][0]
+
+
+# ─── Runner ──────────────────────────────────────────────────────────
+
+def _user_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def applied_versions(conn):
+    """{version: (name, applied_at)} from schema_version ({} if missing)."""
+    try:
+        return {r[0]: (r[1], r[2]) for r in conn.execute(
+            "SELECT version, name, applied_at FROM schema_version")}
+    except sqlite3.OperationalError:
+        return {}
+
+
+def migrate(db_path=None, force=False):
+    """
+    Bring the DB to LATEST_VERSION. Returns True if any step ran.
+
+    Fast path is one PRAGMA user_version read. Otherwise every step not in
+    schema_version runs (all of them with force=True) inside a single
+    IMMEDIATE transaction, then user_version is stamped.
+    """
+    path = db_path or DB_PATH
+    conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+    try:
+        if not force and _user_version(conn) == LATEST_VERSION:
+            return False
+        conn.execute("BEGIN IMMEDIATE")     # one migrator; others wait here
+        try:
+            if not force and _user_version(conn) == LATEST_VERSION:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TEXT NOT NULL DEFAULT (datetime('now'))
+                )
+            """)
+            done = applied_versions(conn)
+            for version, name, step in STEPS:
+                if version in done and not force:
+                    continue
+                step(conn)
+                conn.execute(
+                    "INSERT OR REPLACE INTO schema_version (version, name, applied_at) "
+                    "VALUES (?, ?, datetime('now'))", (version, name))
+                log.info("Schema step %d applied: %s", version, name)
+            conn.execute(f"PRAGMA user_version = {int(LATEST_VERSION)}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+    log.info("Schema at version %d: %s", LATEST_VERSION, path)
+    return True
+
+
+def ensure_schema(db_path=None):
+    """Re-run every step (all idempotent) and re-stamp. For repairs — normal
+    startups use migrate()."""
+    migrate(db_path, force=True)
+
+
+_checked = set()
+_checked_lock = threading.Lock()
+
+
+def require_schema(db_path=None):
+    """Once per process per DB: migrate() if the DB isn't at LATEST_VERSION.
+    Modules that need their tables call this at import instead of running
+    their own CREATE TABLE / ALTER probes."""
+    path = os.path.abspath(db_path or DB_PATH)
+    if path in _checked:
+        return
+    with _checked_lock:
+        if path in _checked:
+            return
+        try:
+            migrate(path)
+        except Exception as e:
+            log.error("Schema migration failed for %s: %s", path, e)
+        _checked.add(path)
+
+
+def schema_status(db_path=None):
+    """Current/latest version and applied steps — for health endpoints."""
+    conn = sqlite3.connect(db_path or DB_PATH)
+    try:
+        applied = applied_versions(conn)
+        return {
+            'user_version': _user_version(conn),
+            'latest_version': LATEST_VERSION,
+            'applied': [{'version': v, 'name': n, 'applied_at': a}
+                        for v, (n, a) in sorted(applied.items())],
+            'pending': [{'version': v, 'name': n}
+                        for v, n, _ in STEPS if v not in applied],
+        }
+    finally:
+        conn.close()
 
 
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
     ensure_schema()
-    print("Schema verified OK")
+    print(f"Schema verified OK (version {LATEST_VERSION})")
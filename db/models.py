@@ -38,10 +38,11 @@ Tables:
 """
 
 import os
-import sqlite3
 import json
 import datetime
 
+from db.connection import connect
+
 # ---------------------------------------------------------------------------
 # Database location
 # ---------------------------------------------------------------------------
@@ -50,13 +51,8 @@ DB_PATH = os.path.join(DB_DIR, "phone_farm.db")
 
 
 def get_connection(db_path=None):
-    """Thread-safe connection with Row factory."""
-    path = db_path or DB_PATH
-    conn = sqlite3.connect(path, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA foreign_keys=ON")
-    return conn
+    """Thread-safe pooled connection with Row factory (db.connection)."""
+    return connect(db_path or DB_PATH, foreign_keys=True)
 
 
 def row_to_dict(row):
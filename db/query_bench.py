@@ -0,0 +1,809 @@
+"""
+Hydra Query Bench
+==================
+Index advisor + query-plan regression gate for phone_farm.db.
+
+    python -m db.query_bench generate [--scale small|prod]
+        synthetic DB at db/bench/phone_farm.db — 50 devices, 3000 accounts,
+        90 days of history; 1M action rows (small) or 20M (prod)
+    python -m db.query_bench check [--save-baseline] [--db PATH]
+        EXPLAIN QUERY PLAN + median timing of every QUERIES entry;
+        exit status 1 on a failure (the regression gate)
+    python -m db.query_bench advise
+        for each flagged query, a candidate index built from its WHERE /
+        ORDER BY columns, tried on the bench DB inside a rolled-back
+        transaction, with the resulting plan and timing
+
+A query fails the gate when its plan reads a whole BIG_TABLES table (plain
+SCAN without an index, or an AUTOMATIC index built from a scan) that is not
+in its allow_scan, or when its median time exceeds SLOWDOWN x the saved
+baseline (and FLOOR_MS). Timings only compare against a baseline saved on
+the same machine; plans are checked everywhere.
+
+QUERIES mirrors the hot statements in dashboard/ and automation/ (origin
+names the call site). When adding or changing one of those, update its
+entry here and re-run `check`; indexes the advisor calls for go into a
+db/migrations.py step (see QUERY_PLAN_INDEXES).
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import statistics
+import sys
+import time
+from collections import namedtuple
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.keyset import page_sql
+from db.migrations import migrate
+from db.retention import history_counts_sql
+
+log = logging.getLogger(__name__)
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench')
+BENCH_DB = os.path.join(BENCH_DIR, 'phone_farm.db')
+BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+SCALES = {
+    'small': {'devices': 50, 'accounts': 3000, 'actions': 1_000_000, 'days': 90},
+    'prod': {'devices': 50, 'accounts': 3000, 'actions': 20_000_000, 'days': 90},
+}
+CHUNK_ROWS = 500_000
+
+# Tables that grow with farm activity — a full scan of one is a regression
+BIG_TABLES = {
+    'action_history', 'bot_logs', 'job_history', 'follower_snapshots',
+    'account_sessions', 'relationship_ledger', 'tag_followed_targets',
+}
+
+SLOWDOWN = 2.0
+FLOOR_MS = 5.0
+REPEAT = 5
+
+# (name, origin, sql, args, allow_scan)
+#   sql:  str; {users} / {ids} expand to 20 placeholders each, or
+#         callable(params) -> str for SQL built at runtime
+#   args: callable(params) -> tuple
+Query = namedtuple('Query', 'name origin sql args allow_scan')
+Query.__new__.__defaults__ = ((),)
+
+
+def _hc(**kw):
+    """SQL/args of a db.retention.history_counts() call."""
+    return (lambda p: history_counts_sql('action_history', start=p.get(kw.get('start')),
+                                         group_by=kw['group_by'])[0],
+            lambda p: tuple(history_counts_sql('action_history', start=p.get(kw.get('start')),
+                                               group_by=kw['group_by'])[1]))
+
+
+def _ks(dataset, after=None, since=None, limit=100, **filters):
+    """SQL/args of a db.keyset page. Filter values are params keys, except
+    literal action types / levels; `after` is a params key for the cursor
+    time (page N of a deep scroll)."""
+    def build(p):
+        resolved = {col: p.get(v, v) for col, v in filters.items()}
+        cursor = (p[after], 1 << 62) if after else None
+        return page_sql(dataset, resolved, since=p.get(since), after=cursor, limit=limit)
+    return (lambda p: build(p)[0], lambda p: tuple(build(p)[1]))
+
+
+QUERIES = [
+    # ── Automation (per action / per account, runs constantly) ──
+    Query('limit_today_count', 'automation/actions/helpers.py get_today_action_count', """
+        SELECT COUNT(*) as cnt FROM action_history
+        WHERE device_serial=? AND username=? AND action_type=?
+          AND timestamp >= ? AND success=1
+    """, lambda p: (p['device'], p['user'], 'follow', p['today'])),
+    Query('recently_interacted', 'automation/actions/helpers.py get_recently_interacted', """
+        SELECT DISTINCT target_username FROM action_history
+        WHERE device_serial=? AND username=? AND action_type=?
+          AND timestamp >= ? AND success=1
+          AND target_username IS NOT NULL
+    """, lambda p: (p['device'], p['user'], 'like', p['week_ago'])),
+    Query('job_today_count', 'automation/actions/job_executor.py get_job_today_count', """
+        SELECT COUNT(*) as cnt FROM job_history
+        WHERE job_id = ? AND account_id = ? AND status = 'success'
+          AND created_at >= ?
+    """, lambda p: (p['job_id'], p['account_id'], p['today'])),
+    Query('job_already_done', 'automation/actions/job_executor.py (follow/like/share jobs)',
+          "SELECT COUNT(*) FROM job_history "
+          "WHERE job_id = ? AND account_id = ? AND status = 'success'",
+          lambda p: (p['job_id'], p['account_id'])),
+    Query('job_comments_used', 'automation/actions/job_executor.py unique comments',
+          "SELECT comment_used FROM job_history WHERE job_id = ? AND comment_used IS NOT NULL",
+          lambda p: (p['job_id'],)),
+    Query('unfollow_queue', 'automation/relationship_ledger.py unfollow_queue', """
+        SELECT target_username, followed_at, source_username
+        FROM relationship_ledger
+        WHERE username = ? AND unfollowed_at IS NULL
+          AND followed_at IS NOT NULL AND followed_at <= ?
+          AND unfollow_attempts < ?
+        ORDER BY followed_at ASC
+    """, lambda p: (p['user'], p['week_ago'], 3)),
+    Query('ledger_stats', 'automation/relationship_ledger.py ledger_stats', """
+        SELECT
+            SUM(CASE WHEN unfollowed_at IS NULL AND followed_at IS NOT NULL THEN 1 ELSE 0 END) AS following,
+            SUM(CASE WHEN unfollowed_at IS NOT NULL THEN 1 ELSE 0 END) AS unfollowed,
+            SUM(CASE WHEN unfollowed_at IS NULL AND unfollow_attempts >= ? THEN 1 ELSE 0 END) AS stuck
+        FROM relationship_ledger WHERE username = ?
+    """, lambda p: (3, p['user'])),
+    Query('tag_dedup_check', 'automation/tag_dedup.py is_already_followed_by_tag', """
+        SELECT 1 FROM tag_followed_targets
+        WHERE tag IN (?, ?) AND target_username = ?
+        LIMIT 1
+    """, lambda p: ('tag01', 'tag02', 'target0000042')),
+    Query('ws_today_seed', 'automation/ws_server.py day rollover', """
+        SELECT action_type, COUNT(*) as cnt
+        FROM action_history
+        WHERE timestamp >= ? AND success=1 AND id <= ?
+        GROUP BY action_type
+    """, lambda p: (p['today'], p['max_action_id'])),
+    Query('ws_today_delta', 'automation/ws_server.py incremental counts', """
+        SELECT action_type, COUNT(*) as cnt, MAX(id) as top
+        FROM action_history
+        WHERE id > ? AND success=1 AND timestamp >= ?
+        GROUP BY action_type
+    """, lambda p: (p['max_action_id'] - 500, p['today'])),
+    Query('ws_running_sessions', 'automation/ws_server.py active sessions', """
+        SELECT id, device_serial, username, session_start, status
+        FROM account_sessions
+        WHERE status='running'
+    """, lambda p: ()),
+    Query('api_stats_by_type', 'automation/api.py api_stats_summary', """
+        SELECT action_type, COUNT(*) as cnt
+        FROM action_history
+        WHERE timestamp >= ? AND success=1
+        GROUP BY action_type
+    """, lambda p: (p['today'],)),
+    Query('api_stats_sessions', 'automation/api.py api_stats_summary', """
+        SELECT COUNT(*) as cnt FROM account_sessions
+        WHERE session_start >= ?
+    """, lambda p: (p['today'],)),
+    Query('api_stats_accounts', 'automation/api.py api_stats_summary', """
+        SELECT COUNT(DISTINCT username) as cnt FROM action_history
+        WHERE timestamp >= ? AND success=1
+    """, lambda p: (p['today'],)),
+    Query('api_history_all', 'automation/api.py api_action_history (no filter)',
+          *_ks('action_history')),
+    Query('api_history_device', 'automation/api.py api_action_history (device)',
+          *_ks('action_history', device_serial='device')),
+    Query('api_history_device_deep', 'automation/api.py api_action_history (device, page N)',
+          *_ks('action_history', device_serial='device', after='week_ago')),
+    Query('api_history_type_range', 'db/keyset.py export (action type, week)',
+          *_ks('action_history', action_type='follow', since='week_ago')),
+    Query('api_sessions_device', 'automation/api.py api_sessions',
+          *_ks('sessions', device_serial='device', limit=50)),
+    Query('api_sessions_user', 'automation/api.py api_sessions (account)',
+          *_ks('sessions', username='user', limit=50)),
+    Query('bot_logs_device', 'automation/bot_logger.py get_logs_from_db',
+          *_ks('bot_logs', device_serial='device', limit=200)),
+    Query('bot_logs_level_deep', 'automation/bot_logger.py get_logs_from_db (level, page N)',
+          *_ks('bot_logs', level='ERROR', after='week_ago', limit=200)),
+    Query('bot_logs_search_hour', 'automation/bot_logger.py search_logs (last hour)',
+          "SELECT l.id, l.timestamp, l.level, l.device_serial, "
+          "snippet(bot_logs_fts, 0, '**', '**', '…', 16) "
+          "FROM bot_logs_fts JOIN bot_logs l ON l.id = bot_logs_fts.rowid "
+          "WHERE bot_logs_fts MATCH ? AND l.timestamp >= ? AND bot_logs_fts.rowid >= ? "
+          "ORDER BY bot_logs_fts.rowid DESC LIMIT ?",
+          lambda p: ('"UiAutomationNotConnectedError"', p['hour_ago'], p['hour_ago_log_id'], 50)),
+    Query('bot_logs_search_by_device', 'automation/bot_logger.py search_logs (per-device counts)',
+          "SELECT l.device_serial, COUNT(*), MIN(l.timestamp), MAX(l.timestamp) "
+          "FROM bot_logs_fts JOIN bot_logs l ON l.id = bot_logs_fts.rowid "
+          "WHERE bot_logs_fts MATCH ? AND l.timestamp >= ? AND bot_logs_fts.rowid >= ? "
+          "GROUP BY l.device_serial",
+          lambda p: ('"UiAutomationNotConnectedError"', p['hour_ago'], p['hour_ago_log_id'])),
+    Query('bot_logs_errors_today', 'automation/bot_logger.py get_log_stats',
+          "SELECT COUNT(*) as cnt FROM bot_logs WHERE timestamp >= ? AND level='ERROR'",
+          lambda p: (p['today'],)),
+
+    # ── Dashboard ──
+    Query('farm_actions_today', 'dashboard/farm_stats_routes.py api_summary',
+          "SELECT COUNT(*) as cnt FROM action_history WHERE timestamp >= ? AND timestamp < ?",
+          lambda p: (p['today'], p['tomorrow'])),
+    Query('farm_actions_week', 'dashboard/farm_stats_routes.py api_summary',
+          "SELECT COUNT(*) as cnt FROM action_history WHERE timestamp >= ?",
+          lambda p: (p['week_ago'],)),
+    Query('farm_sessions_today', 'dashboard/farm_stats_routes.py api_summary',
+          "SELECT COUNT(*) as cnt FROM account_sessions WHERE session_start >= ? AND session_start < ?",
+          lambda p: (p['today'], p['tomorrow'])),
+    Query('farm_outcomes', 'dashboard/farm_stats_routes.py api_summary (all time)',
+          *_hc(group_by=('outcome',)), allow_scan=('action_history',)),
+    Query('farm_actions_over_time', 'dashboard/farm_stats_routes.py api_actions_over_time',
+          *_hc(start='month_ago', group_by=('day', 'kind'))),
+    Query('farm_action_breakdown', 'dashboard/farm_stats_routes.py api_action_breakdown',
+          *_hc(group_by=('kind',)), allow_scan=('action_history',)),
+    Query('farm_recent_activity', 'dashboard/farm_stats_routes.py api_recent_activity', """
+        SELECT id, device_serial, username, action_type, target_username,
+               target_post_id, success, timestamp, error_message
+        FROM action_history
+        ORDER BY timestamp DESC
+        LIMIT ?
+    """, lambda p: (50,)),
+    Query('farm_device_stats', 'dashboard/farm_stats_routes.py api_device_stats', """
+        SELECT
+            bs.device_serial,
+            (SELECT COUNT(*) FROM action_history ah WHERE ah.device_serial = bs.device_serial
+                AND ah.timestamp >= ? AND ah.timestamp < ?) as actions_today_actual,
+            (SELECT COUNT(*) FROM account_sessions s WHERE s.device_serial = bs.device_serial
+                AND s.session_start >= ? AND s.session_start < ?) as sessions_today
+        FROM bot_status bs
+        ORDER BY bs.device_serial
+    """, lambda p: (p['today'], p['tomorrow'], p['today'], p['tomorrow'])),
+    Query('farm_device_accounts', 'dashboard/farm_stats_routes.py api_device_stats (all time)', """
+        SELECT device_serial, COUNT(*) AS n FROM (
+            SELECT DISTINCT device_serial, username FROM action_history
+            WHERE username != ''
+            UNION
+            SELECT grp, subject FROM archive_rollups
+            WHERE source_table = 'action_history' AND subject != ''
+        ) GROUP BY device_serial
+    """, lambda p: ()),
+    Query('farm_errors', 'dashboard/farm_stats_routes.py api_errors', """
+        SELECT id, device_serial, username, action_type, target_username,
+               timestamp, error_message
+        FROM action_history
+        WHERE success = 0
+        ORDER BY timestamp DESC
+        LIMIT ?
+    """, lambda p: (100,)),
+    Query('mothers_slaves_today', 'dashboard/mothers_routes.py slave stats', """
+        SELECT username, action_type, COUNT(*) AS cnt
+        FROM action_history
+        WHERE username IN ({users}) AND success=1
+          AND timestamp >= DATE('now') AND timestamp < DATE('now', '+1 day')
+        GROUP BY username, action_type
+    """, lambda p: tuple(p['users'])),
+    Query('mothers_slaves_week', 'dashboard/mothers_routes.py slave stats', """
+        SELECT username, action_type, COUNT(*) AS cnt
+        FROM action_history
+        WHERE username IN ({users})
+          AND timestamp >= datetime('now', '-7 days')
+          AND success=1
+        GROUP BY username, action_type
+    """, lambda p: tuple(p['users'])),
+    Query('mothers_slaves_errors', 'dashboard/mothers_routes.py slave stats', """
+        SELECT username, COUNT(*) AS cnt
+        FROM action_history
+        WHERE username IN ({users}) AND success=0
+          AND timestamp >= DATE('now') AND timestamp < DATE('now', '+1 day')
+        GROUP BY username
+    """, lambda p: tuple(p['users'])),
+    Query('mothers_slaves_last', 'dashboard/mothers_routes.py slave stats', """
+        SELECT username, MAX(timestamp) AS last_at
+        FROM action_history
+        WHERE username IN ({users})
+        GROUP BY username
+    """, lambda p: tuple(p['users'])),
+    Query('mothers_prev_snapshot', 'dashboard/mothers_routes.py mother detail', """
+        SELECT followers, following, posts_count, captured_at FROM follower_snapshots
+        WHERE account_id=? AND captured_at <= datetime('now', '-7 days')
+        ORDER BY captured_at DESC LIMIT 1
+    """, lambda p: (p['account_id'],)),
+    Query('mothers_daily_snapshots', 'dashboard/mothers_routes.py growth chart', """
+        SELECT DATE(captured_at) AS day,
+               MAX(followers) AS followers,
+               MAX(following) AS following,
+               MAX(posts_count) AS posts
+        FROM follower_snapshots
+        WHERE account_id = ?
+          AND captured_at >= ?
+        GROUP BY DATE(captured_at)
+        ORDER BY day ASC
+    """, lambda p: (p['account_id'], p['month_ago'])),
+    Query('mothers_last_post', 'dashboard/mothers_routes.py last post per account', """
+        WITH snaps AS (
+            SELECT account_id, captured_at, posts_count,
+                   LAG(posts_count) OVER (
+                       PARTITION BY account_id ORDER BY captured_at
+                   ) AS prev_pc
+            FROM follower_snapshots
+            WHERE 1=1 AND account_id IN ({ids})
+        )
+        SELECT account_id, MAX(captured_at) AS last_post_at
+        FROM snaps
+        WHERE prev_pc IS NOT NULL AND posts_count > prev_pc
+        GROUP BY account_id
+    """, lambda p: tuple(p['account_ids'])),
+    Query('device_account_snapshots', 'dashboard/device_manager_routes.py device accounts', """
+        SELECT a.id, a.username,
+               COALESCE(snap_today.followers, snap_latest.followers, a.followers, 0) as followers,
+               COALESCE(snap_yesterday.followers, snap_latest.followers) as prev_followers
+        FROM accounts a
+        LEFT JOIN follower_snapshots snap_latest ON snap_latest.id = (
+            SELECT id FROM follower_snapshots
+            WHERE account_id = a.id
+            ORDER BY captured_at DESC LIMIT 1)
+        LEFT JOIN follower_snapshots snap_today ON snap_today.id = (
+            SELECT id FROM follower_snapshots
+            WHERE account_id = a.id AND captured_at < ?
+            ORDER BY captured_at DESC LIMIT 1)
+        LEFT JOIN follower_snapshots snap_yesterday ON snap_yesterday.id = (
+            SELECT id FROM follower_snapshots
+            WHERE account_id = a.id AND captured_at < ?
+            ORDER BY captured_at DESC LIMIT 1)
+        WHERE a.device_serial = ?
+          AND COALESCE(a.status, '') != 'replaced'
+        ORDER BY CAST(COALESCE(a.start_time, '0') AS INTEGER), a.username
+    """, lambda p: (p['tomorrow'], p['today'], p['device'])),
+    Query('device_action_counts', 'dashboard/device_manager_routes.py device accounts', """
+        SELECT username, action_type, COUNT(*) as cnt
+        FROM action_history
+        WHERE device_serial = ?
+          AND timestamp >= ?
+          AND timestamp < ?
+          AND success = 1
+        GROUP BY username, action_type
+    """, lambda p: (p['device'], p['today'], p['tomorrow'])),
+    Query('device_snapshot_history', 'dashboard/device_manager_routes.py account growth', """
+        SELECT
+            DATE(captured_at) AS date,
+            MAX(followers) AS followers,
+            MAX(following) AS following,
+            MAX(posts_count) AS posts
+        FROM follower_snapshots
+        WHERE username = ? AND device_serial = ?
+          AND captured_at >= ?
+        GROUP BY DATE(captured_at)
+        ORDER BY date ASC
+    """, lambda p: (p['user'], p['device'], p['month_ago'])),
+    Query('overview_last_action', 'dashboard/simple_app.py accounts overview',
+          "SELECT username, MAX(timestamp) t FROM action_history GROUP BY username",
+          lambda p: (), allow_scan=('action_history',)),
+    Query('overview_today_count', 'dashboard/simple_app.py accounts overview',
+          "SELECT username, COUNT(*) c FROM action_history "
+          "WHERE timestamp >= DATE('now','localtime') AND timestamp < DATE('now','localtime','+1 day') "
+          "AND success=1 GROUP BY username",
+          lambda p: ()),
+    Query('overview_latest_snapshot', 'dashboard/simple_app.py accounts overview', """
+        SELECT account_id, followers, following, captured_at,
+               ROW_NUMBER() OVER (PARTITION BY account_id ORDER BY captured_at DESC) rn
+        FROM follower_snapshots
+    """, lambda p: (), allow_scan=('follower_snapshots',)),
+    Query('job_detail_history', 'dashboard/job_orders_v2_routes.py api_job_history', """
+        SELECT jh.*, a.username
+        FROM job_history jh
+        LEFT JOIN accounts a ON a.id = jh.account_id
+        WHERE jh.job_id = ?
+        ORDER BY jh.created_at DESC
+        LIMIT ?
+    """, lambda p: (p['job_id'], 100)),
+    Query('jobs_actions_today', 'dashboard/job_orders_v2_routes.py api_job_stats',
+          "SELECT COUNT(*) AS c FROM job_history WHERE created_at >= ?",
+          lambda p: (p['today'],)),
+    Query('source_follows', 'dashboard/source_quality_routes.py follow_rows', """
+        WITH follow_rows AS (
+            SELECT username, source_username, 1 AS n
+            FROM action_history
+            WHERE action_type = 'follow' AND success = 1 AND timestamp >= ?
+            UNION ALL
+            SELECT subject, NULLIF(source_username, ''), n
+            FROM archive_rollups
+            WHERE source_table = 'action_history' AND kind = 'follow' AND outcome = '1'
+              AND day >= ?
+        )
+        SELECT source_username, SUM(n) FROM follow_rows GROUP BY source_username
+    """, lambda p: (p['month_ago'], p['month_ago'])),
+    Query('warmup_today', 'dashboard/source_quality_routes.py warm-up status', """
+        SELECT username, COUNT(*) AS cnt
+        FROM action_history
+        WHERE timestamp >= ? AND timestamp < ? AND success = 1
+        GROUP BY username
+    """, lambda p: (p['today'], p['tomorrow'])),
+    Query('retention_oldest', 'db/retention.py archive_table',
+          "SELECT MIN(timestamp) FROM action_history WHERE timestamp >= ? AND timestamp < ?",
+          lambda p: ('2000', p['month_ago'])),
+]
+
+
+# ─── Synthetic DB ────────────────────────────────────────────────────
+
+# Per-row values derive from a multiplicative hash of the row number, not
+# random(): SQLite may re-evaluate a subquery column per reference, and
+# device / username / action type must agree within a row. Same scale ->
+# same data.
+_HASH = "((i * 2654435761) % 4294967291)"
+
+_ACTIONS_SQL = f"""
+    WITH RECURSIVE n(i) AS (SELECT :lo UNION ALL SELECT i + 1 FROM n WHERE i + 1 < :hi),
+    r(i, h) AS (SELECT i, {_HASH} FROM n)
+    INSERT INTO action_history (device_serial, username, action_type, target_username,
+                                success, timestamp, source_username, error_message)
+    SELECT printf('10.1.0.%d_5555', (h % :accounts) % :devices + 1),
+           printf('user%05d', h % :accounts + 1),
+           CASE WHEN (h / 7) % 100 < 40 THEN 'follow'
+                WHEN (h / 7) % 100 < 70 THEN 'like'
+                WHEN (h / 7) % 100 < 80 THEN 'unfollow'
+                WHEN (h / 7) % 100 < 92 THEN 'story_view'
+                WHEN (h / 7) % 100 < 97 THEN 'comment'
+                ELSE 'dm' END,
+           printf('target%07d', (h / 701) % 5000000),
+           (h / 13) % 20 != 0,
+           datetime(:t0 + i * :span / :rows, 'unixepoch'),
+           CASE WHEN (h / 7) % 100 < 40 THEN printf('source%03d', (h / 3) % 500) END,
+           CASE WHEN (h / 13) % 20 = 0 THEN 'Action blocked' END
+    FROM r
+"""
+
+_LOGS_SQL = f"""
+    WITH RECURSIVE n(i) AS (SELECT :lo UNION ALL SELECT i + 1 FROM n WHERE i + 1 < :hi),
+    r(i, h) AS (SELECT i, {_HASH} FROM n)
+    INSERT INTO bot_logs (timestamp, level, device_serial, username, action_type,
+                          message, module, created_at)
+    SELECT datetime(:t0 + i * :span / :rows, 'unixepoch'),
+           CASE WHEN h % 50 = 0 THEN 'ERROR' WHEN h % 10 = 0 THEN 'WARNING' ELSE 'INFO' END,
+           printf('10.1.0.%d_5555', (h % :accounts) % :devices + 1),
+           printf('user%05d', h % :accounts + 1),
+           'follow',
+           CASE WHEN h % 50 = 0 THEN printf('UiAutomationNotConnectedError on dump %d', i)
+                ELSE printf('synthetic log line %d', i) END, 'bench',
+           datetime(:t0 + i * :span / :rows, 'unixepoch')
+    FROM r
+"""
+
+_JOB_HISTORY_SQL = f"""
+    WITH RECURSIVE n(i) AS (SELECT :lo UNION ALL SELECT i + 1 FROM n WHERE i + 1 < :hi),
+    r(i, h) AS (SELECT i, {_HASH} FROM n)
+    INSERT INTO job_history (job_id, account_id, action_type, target, status, created_at,
+                             comment_used)
+    SELECT h % 300 + 1, (h / 300) % :accounts + 1, 'follow', 'target',
+           CASE WHEN (h / 7) % 10 = 0 THEN 'failed' ELSE 'success' END,
+           datetime(:t0 + i * :span / :rows, 'unixepoch'),
+           CASE WHEN h % 4 = 0 THEN printf('comment %d', h % 1000) END
+    FROM r
+"""
+
+_PER_ACCOUNT_DAY = """
+    WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i + 1 < :accounts * :days),
+    r(acc, day) AS (SELECT i % :accounts + 1, i / :accounts FROM n)
+"""
+
+
+def _chunked(conn, sql, rows, **params):
+    for lo in range(0, rows, CHUNK_ROWS):
+        conn.execute(sql, dict(params, lo=lo, hi=min(lo + CHUNK_ROWS, rows), rows=rows))
+
+
+def generate(path=BENCH_DB, scale='small', actions=None):
+    """Build a synthetic phone_farm.db at `path` (replaced if present).
+    Schema comes from db.migrations, so it has exactly the production
+    indexes; they are dropped for the bulk load and rebuilt afterwards."""
+    cfg = dict(SCALES[scale])
+    if actions:
+        cfg['actions'] = int(actions)
+    devices, accounts, days = cfg['devices'], cfg['accounts'], cfg['days']
+    rows = cfg['actions']
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    migrate(path)
+
+    started = time.time()
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("PRAGMA cache_size=-262144")
+        indexes = conn.execute(
+            f"SELECT name, sql FROM sqlite_master WHERE type='index' AND sql IS NOT NULL "
+            f"AND tbl_name IN ({','.join('?' * len(BIG_TABLES))})", sorted(BIG_TABLES)).fetchall()
+        for name, _ in indexes:
+            conn.execute(f"DROP INDEX {name}")
+
+        now = int(time.time())
+        t0 = now - days * 86400
+        span = days * 86400
+        common = {'devices': devices, 'accounts': accounts, 'days': days, 't0': t0}
+        conn.execute("BEGIN")
+        conn.execute("""
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :devices)
+            INSERT INTO devices (device_serial, device_name, ip_address, status)
+            SELECT printf('10.1.0.%d_5555', i), printf('Phone %02d', i),
+                   printf('10.1.0.%d', i), 'connected' FROM n
+        """, common)
+        conn.execute("""
+            INSERT INTO bot_status (device_serial, status, started_at)
+            SELECT device_serial, 'running', datetime('now', '-2 hours') FROM devices
+        """)
+        conn.execute("""
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :accounts)
+            INSERT INTO accounts (id, device_id, device_serial, username, status, tag,
+                                  is_mother, start_time, end_time, follow_enabled)
+            SELECT i, (i - 1) % :devices + 1, printf('10.1.0.%d_5555', (i - 1) % :devices + 1),
+                   printf('user%05d', i), 'active', printf('tag%02d', i % 40),
+                   i % 100 = 0, (i / :devices) % 24, (i / :devices) % 24 + 1, 'True'
+            FROM n
+        """, common)
+        conn.execute("""
+            INSERT INTO account_settings (account_id, settings_json)
+            SELECT id, json_object('tags', tag, 'enable_tags', json('true'),
+                                   'enable_dont_follow_sametag_accounts', json('true'))
+            FROM accounts
+        """)
+        conn.execute("""
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 300)
+            INSERT INTO job_orders (id, job_name, job_type, target, target_count, status)
+            SELECT i, printf('job %d', i),
+                   CASE i % 4 WHEN 0 THEN 'follow' WHEN 1 THEN 'like'
+                              WHEN 2 THEN 'comment' ELSE 'share' END,
+                   printf('target%07d', i), 1000,
+                   CASE WHEN i % 3 = 0 THEN 'completed' ELSE 'active' END
+            FROM n
+        """)
+        conn.execute("""
+            INSERT INTO job_assignments (job_id, account_id, device_serial, username)
+            SELECT j.id, a.id, a.device_serial, a.username
+            FROM job_orders j JOIN accounts a ON a.id % 150 = j.id % 150
+        """)
+        _chunked(conn, _ACTIONS_SQL, rows, span=span, **common)
+        log.info("action_history: %d rows (%.0fs)", rows, time.time() - started)
+        _chunked(conn, _LOGS_SQL, rows // 2, span=30 * 86400, **dict(common, t0=now - 30 * 86400))
+        _chunked(conn, _JOB_HISTORY_SQL, rows // 20, span=span, **common)
+        conn.execute(_PER_ACCOUNT_DAY + """
+            INSERT INTO follower_snapshots (account_id, username, device_serial, followers,
+                                            following, posts, posts_count, captured_at)
+            SELECT acc, printf('user%05d', acc), printf('10.1.0.%d_5555', (acc - 1) % :devices + 1),
+                   1000 + acc % 500 + day * 3, 300 + day, 10 + day / 7, 10 + day / 7,
+                   datetime(:t0 + day * 86400 + acc * 29 % 86400, 'unixepoch')
+            FROM r
+        """, common)
+        conn.execute(_PER_ACCOUNT_DAY + """
+            INSERT INTO account_sessions (device_serial, username, session_start, session_end,
+                                          status)
+            SELECT printf('10.1.0.%d_5555', (acc - 1) % :devices + 1), printf('user%05d', acc),
+                   datetime(:t0 + day * 86400 + acc * 29 % 86400, 'unixepoch'),
+                   datetime(:t0 + day * 86400 + acc * 29 % 86400 + 2400, 'unixepoch'),
+                   CASE WHEN day = :days - 1 AND acc % 20 = 0 THEN 'running' ELSE 'completed' END
+            FROM r
+        """, common)
+        conn.execute("""
+            INSERT OR IGNORE INTO relationship_ledger (username, target_username, device_serial,
+                                                       source_username, followed_at, unfollowed_at)
+            SELECT username, target_username, device_serial, source_username, timestamp,
+                   CASE WHEN id % 2 = 0 AND timestamp < datetime('now', '-5 days')
+                        THEN datetime(timestamp, '+5 days') END
+            FROM action_history WHERE action_type = 'follow' AND success = 1
+        """)
+        conn.execute("""
+            INSERT OR IGNORE INTO tag_followed_targets (tag, target_username, followed_by,
+                                                        device_serial, followed_at)
+            SELECT printf('tag%02d', CAST(substr(username, 5) AS INTEGER) % 40),
+                   target_username, username, device_serial, timestamp
+            FROM action_history WHERE action_type = 'follow' AND success = 1
+        """)
+        conn.execute("COMMIT")
+
+        for name, sql in indexes:
+            t = time.time()
+            conn.execute(sql)
+            log.info("index %s (%.0fs)", name, time.time() - t)
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+    log.info("Bench DB %s ready: %s (%.0fs)", path, cfg, time.time() - started)
+    return cfg
+
+
+# ─── Plan check ──────────────────────────────────────────────────────
+
+_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?(.*)$')
+_SEARCH = re.compile(r'^SEARCH (?:TABLE )?(\w+)(?: AS (\w+))?(.*)$')
+
+
+def _params(conn):
+    """Realistic parameter values taken from the DB being checked."""
+    one = lambda sql: conn.execute(sql).fetchone()          # noqa: E731
+    acct = one("SELECT id, username, device_serial FROM accounts ORDER BY id LIMIT 1 OFFSET 41") \
+        or one("SELECT id, username, device_serial FROM accounts ORDER BY id LIMIT 1") \
+        or (1, 'user00001', 'device')
+    ids = [r[0] for r in conn.execute("SELECT id FROM accounts ORDER BY id LIMIT 20")]
+    users = [r[0] for r in conn.execute("SELECT username FROM accounts ORDER BY id LIMIT 20")]
+    job = one("SELECT id FROM job_orders WHERE status = 'active' ORDER BY id LIMIT 1")
+    day = lambda n: one(f"SELECT date('now', '{n:+d} days')")[0]   # noqa: E731
+    hour_ago = one("SELECT datetime('now', '-1 hour')")[0]
+    return {
+        'today': day(0), 'tomorrow': day(1), 'week_ago': day(-7), 'month_ago': day(-30),
+        'account_id': acct[0], 'user': acct[1], 'device': acct[2],
+        'job_id': job[0] if job else 1,
+        'max_action_id': one("SELECT COALESCE(MAX(id), 0) FROM action_history")[0],
+        'hour_ago': hour_ago,
+        'hour_ago_log_id': conn.execute(
+            "SELECT COALESCE(MIN(id), 0) FROM bot_logs WHERE timestamp >= ?",
+            (hour_ago,)).fetchone()[0],
+        'users': (users + ['user00000'] * 20)[:20],
+        'account_ids': (ids + [0] * 20)[:20],
+    }
+
+
+def _render(q, p):
+    sql = q.sql(p) if callable(q.sql) else q.sql
+    sql = sql.replace('{users}', ','.join('?' * 20)).replace('{ids}', ','.join('?' * 20))
+    return ' '.join(sql.split()), tuple(q.args(p))
+
+
+def full_scans(plan, allow=()):
+    """Big tables read end to end in an EXPLAIN QUERY PLAN detail list."""
+    out = []
+    for detail in plan:
+        m = _SCAN.match(detail) or _SEARCH.match(detail)
+        if not m or m.group(1) not in BIG_TABLES or m.group(1) in allow:
+            continue
+        rest = m.group(3)
+        if 'AUTOMATIC' in rest or (detail.startswith('SCAN') and 'USING' not in rest):
+            out.append(detail)
+    return out
+
+
+def explain(conn, sql, args):
+    return [r[3] for r in conn.execute('EXPLAIN QUERY PLAN ' + sql, args)]
+
+
+def time_query(conn, sql, args, repeat=REPEAT):
+    """Median wall time (ms) of executing + fetching all rows."""
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        conn.execute(sql, args).fetchall()
+        times.append((time.perf_counter() - t) * 1000)
+    return round(statistics.median(times), 2)
+
+
+def _open(path):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA cache_size=-65536")
+    return conn
+
+
+def check(path=BENCH_DB, baseline=BASELINE, repeat=REPEAT, only=None):
+    """Run the catalog; returns {'results': {name: ...}, 'failures': [...]}."""
+    migrate(path)
+    conn = _open(path)
+    try:
+        p = _params(conn)
+        base = {}
+        if baseline and os.path.exists(baseline):
+            with open(baseline) as f:
+                base = json.load(f).get('results', {})
+        results, failures = {}, []
+        for q in QUERIES:
+            if only and q.name not in only:
+                continue
+            sql, args = _render(q, p)
+            plan = explain(conn, sql, args)
+            scans = full_scans(plan, q.allow_scan)
+            ms = time_query(conn, sql, args, repeat)
+            results[q.name] = {'origin': q.origin, 'ms': ms, 'plan': plan, 'full_scans': scans}
+            if scans:
+                failures.append(f"{q.name}: full scan — {'; '.join(scans)}")
+            was = base.get(q.name, {}).get('ms')
+            if was is not None and ms > max(was * SLOWDOWN, FLOOR_MS):
+                failures.append(f"{q.name}: {ms:.1f} ms vs baseline {was:.1f} ms")
+        return {'results': results, 'failures': failures}
+    finally:
+        conn.close()
+
+
+# ─── Index advisor ───────────────────────────────────────────────────
+
+_PRED = re.compile(r'(?:\b(\w+)\.)?\b(\w+)\s*(=|>=|<=|<|>|\bIN\b|\bIS\b|\bBETWEEN\b)', re.I)
+_ALIAS = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.I)
+_ORDER = re.compile(r'\bORDER BY\s+(.+?)(?:\bLIMIT\b|\)|$)', re.I)
+_SQL_WORDS = {'where', 'on', 'join', 'left', 'inner', 'group', 'order', 'limit', 'union', 'as'}
+
+
+def suggest_index(conn, sql, table):
+    """Candidate column list for `table`: equality columns, then the first
+    range column (or the ORDER BY column) — the usual composite-index rule."""
+    cols = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+    aliases = {table}
+    for name, alias in _ALIAS.findall(sql):
+        if name == table and alias and alias.lower() not in _SQL_WORDS:
+            aliases.add(alias)
+    eq, rng = [], []
+    for alias, col, op in _PRED.findall(sql):
+        if col not in cols or (alias and alias not in aliases):
+            continue
+        bucket = eq if op.upper() in ('=', 'IN', 'IS') else rng
+        if col not in eq and col not in bucket:
+            bucket.append(col)
+    order = []
+    for m in _ORDER.findall(sql):
+        for part in m.split(','):
+            col = part.split()[0].split('.')[-1] if part.split() else ''
+            if col in cols and col not in eq:
+                order.append(col)
+    tail = rng[:1] or order[:1]
+    return eq + [c for c in tail if c not in eq]
+
+
+def advise(path=BENCH_DB, repeat=3, only=None):
+    """For every query with a disallowed full scan: the candidate index and
+    its plan / timing, measured inside a transaction that is rolled back."""
+    conn = _open(path)
+    conn.isolation_level = None
+    try:
+        p = _params(conn)
+        advice = []
+        for q in QUERIES:
+            if only and q.name not in only:
+                continue
+            sql, args = _render(q, p)
+            scans = full_scans(explain(conn, sql, args), q.allow_scan)
+            for detail in scans:
+                table = (_SCAN.match(detail) or _SEARCH.match(detail)).group(1)
+                cols = suggest_index(conn, sql, table)
+                item = {'query': q.name, 'origin': q.origin, 'table': table, 'scan': detail,
+                        'index': f"{table}({', '.join(cols)})" if cols else None}
+                if cols:
+                    before = time_query(conn, sql, args, repeat)
+                    conn.execute("BEGIN")
+                    try:
+                        conn.execute(f"CREATE INDEX bench_advice ON {table}({', '.join(cols)})")
+                        conn.execute(f"ANALYZE bench_advice")
+                        plan = explain(conn, sql, args)
+                        item.update(plan=plan, still_scans=full_scans(plan, q.allow_scan),
+                                    ms_before=before, ms_after=time_query(conn, sql, args, repeat))
+                    finally:
+                        conn.execute("ROLLBACK")
+                advice.append(item)
+        return advice
+    finally:
+        conn.close()
+
+
+def _print_check(report):
+    for name, r in report['results'].items():
+        access = [d for d in r['plan'] if d.startswith(('SCAN', 'SEARCH'))]
+        shown = (r['full_scans'] or access or r['plan'] or [''])[0]
+        flag = 'SCAN' if r['full_scans'] else 'ok  '
+        print(f"{flag} {r['ms']:>9.2f} ms  {name:<26} {shown}")
+    for f in report['failures']:
+        print(f"FAIL {f}")
+    print(f"{len(report['results'])} queries, {len(report['failures'])} failures")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='phone_farm.db query-plan regression gate')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    g = sub.add_parser('generate', help='Build the synthetic bench DB')
+    g.add_argument('--scale', choices=sorted(SCALES), default='small')
+    g.add_argument('--actions', type=int, help='Override the action_history row count')
+    g.add_argument('--db', default=BENCH_DB)
+    c = sub.add_parser('check', help='EXPLAIN + time the query catalog (exit 1 on failures)')
+    c.add_argument('--db', default=BENCH_DB)
+    c.add_argument('--baseline', default=BASELINE)
+    c.add_argument('--save-baseline', action='store_true')
+    c.add_argument('--repeat', type=int, default=REPEAT)
+    c.add_argument('--query', action='append', help='Only this catalog entry (repeatable)')
+    c.add_argument('--json', action='store_true', help='Print the full report as JSON')
+    a = sub.add_parser('advise', help='Candidate indexes for flagged queries')
+    a.add_argument('--db', default=BENCH_DB)
+    a.add_argument('--query', action='append')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.cmd == 'generate':
+        generate(args.db, args.scale, args.actions)
+    elif args.cmd == 'check':
+        report = check(args.db, None if args.save_baseline else args.baseline,
+                       args.repeat, args.query)
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            _print_check(report)
+        if args.save_baseline:
+            os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+            with open(args.baseline, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"Baseline saved to {args.baseline}")
+        sys.exit(1 if report['failures'] else 0)
+    else:
+        print(json.dumps(advise(args.db, only=args.query), indent=2))
@@ -0,0 +1,535 @@
+"""
+Hydra DB Retention
+===================
+Keeps the hot phone_farm.db small enough to live in the page cache.
+Dashboards and limit checks filter history tables by recent timestamp;
+everything older is moved into monthly archive files.
+
+Policies (days overridable via env):
+
+    action_history  timestamp   HYDRA_RETAIN_ACTION_HISTORY_DAYS  (90)
+    bot_logs        timestamp   HYDRA_RETAIN_BOT_LOGS_DAYS        (30)
+    job_history     created_at  HYDRA_RETAIN_JOB_HISTORY_DAYS     (90)
+                    — only rows of completed (or deleted) jobs: job
+                      progress and "already done" checks count the
+                      history of active jobs.
+
+Archive files: db/archive/phone_farm_YYYY-MM.db — same table names and
+columns as the hot DB, original ids kept. Rows move in small batches,
+each batch one IMMEDIATE transaction (INSERT OR IGNORE into the archive,
+rollup, DELETE from hot), so runners writing history are never blocked
+for long and an interrupted run is safely repeated.
+
+Rollups: every archived row is counted into archive_rollups (per day,
+device/job, account, action type, outcome, source) in the same
+transaction, so all-time counts stay exact without reading archives.
+
+Readers (pooled connections, db.connection):
+    history_counts()    counts over live rows + rollups (farm stats, reports)
+    query_history()     raw rows; unions in the archive months a date range
+                        needs (each opened read-only)
+    open_report_conn()  hot DB + archives ATTACHed read-only, for ad-hoc SQL
+
+Maintenance (after each run): PRAGMA incremental_vacuum, ANALYZE of the
+trimmed tables, WAL checkpoint. Incremental vacuum needs auto_vacuum=
+INCREMENTAL, which an existing DB only gets via one full VACUUM:
+    python -m db.retention --full-vacuum      (quiet window, farm stopped)
+
+Schedule: start_retention_scheduler() — started by the dashboard; set
+HYDRA_RETENTION=0 to disable. Manual: `python -m db.retention [--dry-run]`.
+"""
+
+import datetime
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from db.connection import connect
+
+log = logging.getLogger(__name__)
+
+DB_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(DB_DIR, 'phone_farm.db')
+ARCHIVE_DIR = os.path.join(DB_DIR, 'archive')
+
+BATCH_ROWS = 5000
+BATCH_PAUSE = 0.05          # seconds between batches — let runners write
+VACUUM_PAGES = 5000         # pages reclaimed per incremental_vacuum call
+DEFAULT_INTERVAL_HOURS = 6
+
+ROLLUP_DIMS = ('day', 'grp', 'subject', 'kind', 'outcome', 'source_username')
+
+# table -> time column, retention days, archive eligibility, rollup columns
+POLICIES = {
+    'action_history': {
+        'column': 'timestamp',
+        'days': 90,
+        'rollup': {'grp': 'device_serial', 'subject': 'username',
+                   'kind': 'action_type', 'outcome': 'success',
+                   'source_username': 'source_username'},
+    },
+    'bot_logs': {
+        'column': 'timestamp',
+        'days': 30,
+        'rollup': {'grp': 'device_serial', 'subject': 'username',
+                   'kind': 'action_type', 'outcome': 'level'},
+    },
+    'job_history': {
+        'column': 'created_at',
+        'days': 90,
+        'where': "job_id NOT IN (SELECT id FROM job_orders "
+                 "WHERE COALESCE(status, '') != 'completed')",
+        'rollup': {'grp': 'job_id', 'subject': 'account_id',
+                   'kind': 'action_type', 'outcome': 'status'},
+    },
+}
+
+_MONTH = re.compile(r'^\d{4}-\d{2}$')
+_ARCHIVE_FILE = re.compile(r'^phone_farm_(\d{4}-\d{2})\.db$')
+
+
+def retention_days(table):
+    env = os.environ.get(f'HYDRA_RETAIN_{table.upper()}_DAYS')
+    try:
+        return int(env) if env else POLICIES[table]['days']
+    except ValueError:
+        return POLICIES[table]['days']
+
+
+def _archive_path(month):
+    return os.path.join(ARCHIVE_DIR, f'phone_farm_{month}.db')
+
+
+def _next_month(month):
+    y, m = int(month[:4]), int(month[5:7])
+    return f'{y + m // 12:04d}-{m % 12 + 1:02d}'
+
+
+def _ro_uri(path):
+    return Path(path).resolve().as_uri() + '?mode=ro'
+
+
+def _rollup_expr(policy, dim):
+    if dim == 'day':
+        return f"substr({policy['column']}, 1, 10)"
+    col = policy['rollup'].get(dim)
+    return f"COALESCE(CAST({col} AS TEXT), '')" if col else "''"
+
+
+def _columns(conn, table, schema='main'):
+    return [r[1] for r in conn.execute(f'PRAGMA {schema}.table_info({table})')]
+
+
+def archived_months():
+    """Months with an archive file, oldest first."""
+    if not os.path.isdir(ARCHIVE_DIR):
+        return []
+    return sorted(m.group(1) for m in map(_ARCHIVE_FILE.match, os.listdir(ARCHIVE_DIR)) if m)
+
+
+def _months_in_range(start=None, end=None):
+    lo = start[:7] if start else None
+    hi = end[:7] if end else None
+    return [m for m in archived_months()
+            if (lo is None or m >= lo) and (hi is None or m <= hi)]
+
+
+# ---------------------------------------------------------------------------
+#  Archiving
+# ---------------------------------------------------------------------------
+
+def _ensure_archive_table(conn, table):
+    """Create / widen arc.<table> to the hot table's current columns."""
+    hot = conn.execute(f'PRAGMA main.table_info({table})').fetchall()
+    have = set(_columns(conn, table, 'arc'))
+    if not have:
+        defs = []
+        for _cid, name, col_type, _nn, _default, pk in hot:
+            defs.append(f'"{name}" {col_type or ""}{" PRIMARY KEY" if pk == 1 else ""}')
+        conn.execute(f'CREATE TABLE arc.{table} ({", ".join(defs)})')
+        col = POLICIES[table]['column']
+        conn.execute(f'CREATE INDEX IF NOT EXISTS arc.idx_{table}_{col} ON {table}({col})')
+        return
+    for _cid, name, col_type, *_ in hot:
+        if name not in have:
+            conn.execute(f'ALTER TABLE arc.{table} ADD COLUMN "{name}" {col_type or ""}')
+
+
+def archive_table(table, days=None, db_path=None, batch=BATCH_ROWS, dry_run=False):
+    """Move rows older than `days` into monthly archives.
+    Returns {month: rows moved (or eligible, with dry_run)}."""
+    policy = POLICIES[table]
+    col = policy['column']
+    days = retention_days(table) if days is None else days
+    cutoff = (datetime.date.today() - datetime.timedelta(days=days)).isoformat()
+    extra = f" AND {policy['where']}" if policy.get('where') else ''
+    # the '2000' floor keeps NULL / malformed timestamps out (never archived)
+    eligible = f"{col} >= ? AND {col} < ?{extra}"
+    moved = {}
+
+    conn = sqlite3.connect(db_path or DB_PATH, timeout=60, isolation_level=None)
+    try:
+        if not _columns(conn, table):
+            return moved
+        if dry_run:
+            for month, n in conn.execute(
+                    f"SELECT substr({col}, 1, 7), COUNT(*) FROM {table} "
+                    f"WHERE {eligible} GROUP BY 1 ORDER BY 1", ('2000', cutoff)):
+                moved[month] = n
+            return moved
+
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        rollup_cols = ', '.join(_rollup_expr(policy, d) for d in ROLLUP_DIMS)
+        floor = '2000'
+        while True:
+            row = conn.execute(f"SELECT MIN({col}) FROM {table} WHERE {eligible}",
+                               (floor, cutoff)).fetchone()
+            month = (row[0] or '')[:7]
+            if not _MONTH.match(month):
+                break
+            upper = min(_next_month(month) + '-01', cutoff)
+            n = _archive_month(conn, table, month, eligible, (month + '-01', upper),
+                               rollup_cols, batch)
+            moved[month] = moved.get(month, 0) + n
+            conn.execute(
+                "INSERT INTO archive_log (table_name, month, rows_moved) VALUES (?, ?, ?)",
+                (table, month, n))
+            log.info("Archived %d %s rows for %s", n, table, month)
+            floor = upper
+    finally:
+        conn.close()
+    return moved
+
+
+def _archive_month(conn, table, month, eligible, bounds, rollup_cols, batch):
+    conn.execute("ATTACH DATABASE ? AS arc", (_archive_path(month),))
+    try:
+        _ensure_archive_table(conn, table)
+        cols = ', '.join(f'"{c}"' for c in _columns(conn, table))
+        pick = f"SELECT id FROM main.{table} WHERE {eligible} ORDER BY id LIMIT {int(batch)}"
+        total = 0
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    f"INSERT OR IGNORE INTO arc.{table} ({cols}) "
+                    f"SELECT {cols} FROM main.{table} WHERE id IN ({pick})", bounds)
+                conn.execute(f"""
+                    INSERT INTO main.archive_rollups
+                        (source_table, {', '.join(ROLLUP_DIMS)}, n)
+                    SELECT ?, {rollup_cols}, COUNT(*)
+                    FROM main.{table} WHERE id IN ({pick})
+                    GROUP BY 2, 3, 4, 5, 6, 7
+                    ON CONFLICT (source_table, {', '.join(ROLLUP_DIMS)})
+                    DO UPDATE SET n = n + excluded.n
+                """, (table, *bounds))
+                n = conn.execute(f"DELETE FROM main.{table} WHERE id IN ({pick})",
+                                 bounds).rowcount
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            total += n
+            if n < batch:
+                return total
+            time.sleep(BATCH_PAUSE)
+    finally:
+        conn.execute("DETACH DATABASE arc")
+
+
+# ---------------------------------------------------------------------------
+#  Maintenance
+# ---------------------------------------------------------------------------
+
+def maintain(db_path=None, full_vacuum=False, tables=None):
+    """Reclaim free pages, refresh planner stats, truncate the WAL."""
+    conn = sqlite3.connect(db_path or DB_PATH, timeout=60, isolation_level=None)
+    out = {}
+    try:
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if full_vacuum and mode != 2:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            out['vacuum'] = 'full'
+        elif mode == 2:
+            before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            conn.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES})").fetchall()
+            after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            out['vacuum'] = f'incremental ({before - after} pages)'
+        else:
+            out['vacuum'] = 'skipped (auto_vacuum not incremental; run --full-vacuum once)'
+        conn.execute("PRAGMA analysis_limit = 1000")
+        for table in tables or POLICIES:
+            if _columns(conn, table):
+                conn.execute(f"ANALYZE {table}")
+        conn.execute("PRAGMA optimize")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    finally:
+        conn.close()
+    return out
+
+
+def run_retention(db_path=None, dry_run=False, full_vacuum=False, tables=None):
+    """Archive every policy table, then maintain(). Returns a summary dict."""
+    t0 = time.time()
+    result = {'tables': {}}
+    for table in tables or POLICIES:
+        try:
+            result['tables'][table] = archive_table(table, db_path=db_path, dry_run=dry_run)
+        except Exception as e:
+            log.error("Retention failed for %s: %s", table, e)
+            result['tables'][table] = {'error': str(e)}
+    if not dry_run:
+        try:
+            result['maintenance'] = maintain(db_path, full_vacuum=full_vacuum, tables=tables)
+        except Exception as e:
+            log.error("DB maintenance failed: %s", e)
+            result['maintenance'] = {'error': str(e)}
+    result['seconds'] = round(time.time() - t0, 2)
+    return result
+
+
+# ---------------------------------------------------------------------------
+#  Archive-aware readers
+# ---------------------------------------------------------------------------
+
+def history_counts_sql(table, start=None, end=None, group_by=('day',), filters=None):
+    """(sql, params) behind history_counts() — also run by db.query_bench."""
+    policy = POLICIES[table]
+    col = policy['column']
+    group_by = tuple(group_by or ())
+    filters = filters or {}
+    for d in (*group_by, *filters):
+        if d not in ROLLUP_DIMS:
+            raise ValueError(f'unknown dimension {d!r}')
+
+    live_where, live_params = [], []
+    roll_where, roll_params = ['source_table = ?'], [table]
+    if start:
+        live_where.append(f'{col} >= ?')
+        live_params.append(start)
+        roll_where.append('day >= ?')
+        roll_params.append(start[:10])
+    if end:
+        live_where.append(f'{col} < ?')
+        live_params.append(end)
+        roll_where.append('day < ?')
+        roll_params.append(end[:10])
+    for d, v in filters.items():
+        live_where.append(f'{_rollup_expr(policy, d)} = ?')
+        live_params.append(str(v))
+        roll_where.append(f'{d} = ?')
+        roll_params.append(str(v))
+
+    live_sel = ', '.join([f'{_rollup_expr(policy, d)} AS {d}' for d in group_by] + ['COUNT(*) AS n'])
+    live_grp = f" GROUP BY {', '.join(group_by)}" if group_by else ''
+    roll_sel = ', '.join([*group_by, 'n'])
+    outer = ', '.join([*group_by, 'SUM(n) AS n'])
+    outer_grp = f" GROUP BY {', '.join(group_by)} ORDER BY {', '.join(group_by)}" if group_by else ''
+    sql = (f"SELECT {outer} FROM ("
+           f"SELECT {live_sel} FROM {table}"
+           f"{' WHERE ' + ' AND '.join(live_where) if live_where else ''}{live_grp}"
+           f" UNION ALL SELECT {roll_sel} FROM archive_rollups WHERE {' AND '.join(roll_where)}"
+           f"){outer_grp}")
+    return sql, live_params + roll_params
+
+
+def history_counts(table, start=None, end=None, group_by=('day',), filters=None,
+                   db_path=None):
+    """Row counts over live rows + archive_rollups, grouped by any of
+    ROLLUP_DIMS. start/end are 'YYYY-MM-DD' (end exclusive); filters maps a
+    dim to the value it must equal ('outcome': '1' for successful actions).
+    Returns [{dim: value, ..., 'n': count}]."""
+    group_by = tuple(group_by or ())
+    sql, params = history_counts_sql(table, start, end, group_by, filters)
+    conn = connect(db_path or DB_PATH)
+    try:
+        rows = [dict(r) for r in conn.execute(sql, params)]
+    finally:
+        conn.close()
+    if not group_by:
+        return [{'n': (rows[0]['n'] if rows else 0) or 0}]
+    return rows
+
+
+def _sort_rows(rows, order_by):
+    for part in reversed([p.strip() for p in order_by.split(',') if p.strip()]):
+        bits = part.split()
+        key, desc = bits[0], len(bits) > 1 and bits[1].upper() == 'DESC'
+        rows.sort(key=lambda r: (r.get(key) is not None, r.get(key) or 0)
+                  if not isinstance(r.get(key), str) else (True, r.get(key)),
+                  reverse=desc)
+    return rows
+
+
+def query_history(table, where=None, params=(), start=None, end=None,
+                  columns=None, order_by=None, limit=None, db_path=None):
+    """Rows of `table` matching `where`, from the hot DB plus every archive
+    month the [start, end) range touches (all archives if start is None).
+
+    order_by: "col [ASC|DESC], ..." over result columns. When ordering by the
+    time column DESC and the hot DB alone fills `limit`, archives are skipped.
+    """
+    policy = POLICIES[table]
+    col = policy['column']
+    conds, args = ([f'({where})'] if where else []), list(params)
+    if start:
+        conds.append(f'{col} >= ?')
+        args.append(start)
+    if end:
+        conds.append(f'{col} < ?')
+        args.append(end)
+    tail = (f" ORDER BY {order_by}" if order_by else '') + \
+           (f" LIMIT {int(limit)}" if limit else '')
+
+    def _run(conn):
+        conn.row_factory = sqlite3.Row
+        have = _columns(conn, table)
+        if not have:
+            return []
+        want = columns or have
+        sel = ', '.join(f'"{c}"' if c in have else f'NULL AS "{c}"' for c in want)
+        sql = f"SELECT {sel} FROM {table}" + \
+              (f" WHERE {' AND '.join(conds)}" if conds else '') + tail
+        return [dict(r) for r in conn.execute(sql, args)]
+
+    hot = connect(db_path or DB_PATH)
+    try:
+        if columns is None:
+            columns = _columns(hot, table)
+        rows = _run(hot)
+    finally:
+        hot.close()
+
+    newest_first = bool(order_by) and order_by.split(',')[0].split() == [col, 'DESC']
+    if limit and newest_first and len(rows) >= limit:
+        return rows[:limit]
+
+    for month in _months_in_range(start, end):
+        arc = sqlite3.connect(_ro_uri(_archive_path(month)), uri=True, timeout=10)
+        try:
+            rows.extend(_run(arc))
+        except sqlite3.Error as e:
+            log.warning("Archive %s unreadable: %s", month, e)
+        finally:
+            arc.close()
+    if order_by:
+        _sort_rows(rows, order_by)
+    return rows[:limit] if limit else rows
+
+
+def open_report_conn(start=None, end=None, db_path=None):
+    """Read-only connection to the hot DB with the archive months for
+    [start, end) ATTACHed read-only as arc_YYYY_MM. Returns (conn, schemas).
+    SQLite attaches at most 10 databases; the newest 9 months win."""
+    conn = sqlite3.connect(_ro_uri(db_path or DB_PATH), uri=True, timeout=10)
+    conn.row_factory = sqlite3.Row
+    schemas = []
+    for month in _months_in_range(start, end)[-9:]:
+        name = 'arc_' + month.replace('-', '_')
+        conn.execute("ATTACH DATABASE ? AS " + name, (_ro_uri(_archive_path(month)),))
+        schemas.append(name)
+    return conn, schemas
+
+
+def retention_status(db_path=None):
+    """Sizes, policy windows, archives and the last archive runs."""
+    conn = connect(db_path or DB_PATH, row_factory=None)
+    try:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        tables = {}
+        for table, policy in POLICIES.items():
+            if not _columns(conn, table):
+                continue
+            rows, oldest = conn.execute(
+                f"SELECT COUNT(*), MIN({policy['column']}) FROM {table}").fetchone()
+            tables[table] = {'retain_days': retention_days(table), 'rows': rows, 'oldest': oldest}
+        try:
+            runs = [dict(zip(('table', 'month', 'rows', 'archived_at'), r)) for r in conn.execute(
+                "SELECT table_name, month, rows_moved, archived_at FROM archive_log "
+                "ORDER BY id DESC LIMIT 20")]
+        except sqlite3.OperationalError:
+            runs = []
+        return {
+            'db_size_mb': round(pages * page_size / 1048576, 1),
+            'freelist_pages': conn.execute("PRAGMA freelist_count").fetchone()[0],
+            'auto_vacuum': {0: 'none', 1: 'full', 2: 'incremental'}.get(
+                conn.execute("PRAGMA auto_vacuum").fetchone()[0]),
+            'tables': tables,
+            'archives': [{'month': m, 'size_mb': round(os.path.getsize(_archive_path(m)) / 1048576, 1)}
+                         for m in archived_months()],
+            'recent_runs': runs,
+        }
+    finally:
+        conn.close()
+
+
+# ---------------------------------------------------------------------------
+#  Schedule
+# ---------------------------------------------------------------------------
+
+_scheduler_thread = None
+_run_lock = threading.Lock()
+
+
+def run_retention_once(**kwargs):
+    """run_retention() unless another run is in progress in this process."""
+    if not _run_lock.acquire(blocking=False):
+        return {'skipped': 'already running'}
+    try:
+        return run_retention(**kwargs)
+    finally:
+        _run_lock.release()
+
+
+def start_retention_scheduler(interval_hours=DEFAULT_INTERVAL_HOURS, initial_delay=600):
+    """Daemon thread: first run `initial_delay` s after startup (not during
+    the restart itself), then every `interval_hours`."""
+    global _scheduler_thread
+    if os.environ.get('HYDRA_RETENTION', '1').strip() in ('0', 'false', 'no'):
+        log.info("DB retention disabled (HYDRA_RETENTION=0)")
+        return None
+    if _scheduler_thread is not None:
+        return _scheduler_thread
+
+    def _loop():
+        time.sleep(initial_delay)
+        while True:
+            try:
+                summary = run_retention_once()
+                log.info("DB retention run: %s", summary)
+            except Exception as e:
+                log.error("DB retention run failed: %s", e)
+            time.sleep(interval_hours * 3600)
+
+    _scheduler_thread = threading.Thread(target=_loop, daemon=True, name='db-retention')
+    _scheduler_thread.start()
+    return _scheduler_thread
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import sys
+    sys.path.insert(0, os.path.dirname(DB_DIR))
+    from db.migrations import require_schema
+
+    parser = argparse.ArgumentParser(description='Archive old history rows + DB maintenance')
+    parser.add_argument('--dry-run', action='store_true', help='Only count eligible rows per month')
+    parser.add_argument('--full-vacuum', action='store_true',
+                        help='Switch to auto_vacuum=INCREMENTAL with one full VACUUM (slow)')
+    parser.add_argument('--status', action='store_true', help='Print retention status and exit')
+    parser.add_argument('--table', action='append', choices=sorted(POLICIES))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    require_schema(DB_PATH)
+    if args.status:
+        print(json.dumps(retention_status(), indent=2))
+    else:
+        print(json.dumps(run_retention(dry_run=args.dry_run, full_vacuum=args.full_vacuum,
+                                       tables=args.table), indent=2))
@@ -0,0 +1,365 @@
+"""
+Phone Farm — In-process orchestrator.
+======================================
+Runs every device's bot loop (run_device.DeviceRunner -> BotEngine) as a
+thread of ONE Python process, instead of one console window and interpreter
+per device (launch_farm.py's default):
+
+    python launch_farm.py --in-process
+    python launch_farm.py --in-process --devices 10.1.11.4:5555,10.1.11.3:5555
+    python launch_farm.py --in-process --once --hang-timeout 900
+
+The loops spend nearly all their time in cooldown sleeps and waiting on
+device RPCs, so a thread each is enough; what 50 interpreters duplicated is
+now paid once:
+    - the automation stack, imported once
+    - db.connection's pool (connections + prepared statements) and the
+      http_pool keep-alive connections, shared by every device
+    - the process-wide metrics registry (RPC, engine and connection metrics,
+      all device-labelled), published as runner "farm"
+
+Still per device:
+    - a supervised thread running DeviceRunner.run()
+    - its own metrics registry, published under its serial like run_device.py
+      (cycles, actions, errors, state, current account)
+    - logs/<serial>_<date>.log; console lines carry the device tag, and
+      logs/farm_<date>.log gets every line
+
+Fault isolation (per device, the rest of the farm keeps running):
+    crash   DeviceRunner.run() raised, or returned without being stopped
+            (e.g. the device did not connect): restarted after 10s, 20s, 40s
+            ... capped at RESTART_MAX_DELAY; the backoff resets once a runner
+            has stayed up HEALTHY_AFTER seconds.
+    hang    no loop heartbeat and no completed device RPC for --hang-timeout
+            seconds: the runner and its BotEngine are told to stop, the
+            device connection is dropped (which fails the blocked RPC), and a
+            fresh runner starts when the old thread exits or after
+            HANG_GRACE seconds. Python cannot kill a thread — an abandoned one
+            keeps its stop flags and exits at its next check.
+
+Ctrl+C (or stop_farm.py) stops every runner after its current action.
+"""
+
+import datetime
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+
+FARM_DIR = os.path.dirname(os.path.abspath(__file__))
+if FARM_DIR not in sys.path:
+    sys.path.insert(0, FARM_DIR)
+
+import run_device  # noqa: E402
+from automation.farm_start import stagger_delay  # noqa: E402
+from run_device import (  # noqa: E402
+    CYAN, DIM, GREEN, RED, RESET, YELLOW, LOG_DIR,
+    ColoredFormatter, DeviceRunner, PlainFormatter,
+)
+
+log = logging.getLogger("farm_orchestrator")
+
+HANG_TIMEOUT = 600          # seconds without progress before a loop is "hung"
+HANG_GRACE = 60             # wait this long for an aborted thread to exit
+RESTART_BASE_DELAY = 10
+RESTART_MAX_DELAY = 300
+HEALTHY_AFTER = 600         # uptime that resets the restart backoff
+SUPERVISE_INTERVAL = 5
+
+# ---------------------------------------------------------------------------
+# Logging: one process, many devices
+# ---------------------------------------------------------------------------
+_thread_device = threading.local()
+
+
+def _stamp_records():
+    """Tag every log record with the device whose thread emitted it."""
+    factory = logging.getLogRecordFactory()
+
+    def _factory(*args, **kwargs):
+        record = factory(*args, **kwargs)
+        record.device_serial = getattr(_thread_device, 'serial', None)
+        record.device_tag = getattr(_thread_device, 'tag', None) or 'farm'
+        return record
+
+    logging.setLogRecordFactory(_factory)
+
+
+class _DeviceFilter(logging.Filter):
+    """Pass only records emitted from one device's runner thread."""
+
+    def __init__(self, serial):
+        super().__init__()
+        self.serial = serial
+
+    def filter(self, record):
+        return getattr(record, 'device_serial', None) == self.serial
+
+
+def setup_logging(devices):
+    """Console (tagged per record) + farm log file + one file per device."""
+    os.makedirs(LOG_DIR, exist_ok=True)
+    today = datetime.date.today().strftime("%Y-%m-%d")
+    _stamp_records()
+
+    root = logging.getLogger()
+    root.setLevel(logging.DEBUG)
+    root.handlers.clear()
+
+    ch = logging.StreamHandler(sys.stdout)
+    ch.setLevel(logging.INFO)
+    ch.setFormatter(ColoredFormatter('farm'))
+    root.addHandler(ch)
+
+    # PlainFormatter bakes its tag into the format string; hand it the
+    # record attribute instead so one file can hold every device.
+    fh = logging.FileHandler(os.path.join(LOG_DIR, f"farm_{today}.log"), encoding="utf-8")
+    fh.setLevel(logging.INFO)
+    fh.setFormatter(PlainFormatter('%(device_tag)s'))
+    root.addHandler(fh)
+
+    for d in devices:
+        serial = d["device_serial"]
+        dh = logging.FileHandler(os.path.join(LOG_DIR, f"{serial}_{today}.log"),
+                                 encoding="utf-8")
+        dh.setLevel(logging.DEBUG)
+        dh.setFormatter(PlainFormatter(_device_tag(d)))
+        dh.addFilter(_DeviceFilter(serial))
+        root.addHandler(dh)
+
+
+def _device_tag(device):
+    return f"{device['device_name']} ({device['device_serial']})"
+
+
+# ---------------------------------------------------------------------------
+# Supervision
+# ---------------------------------------------------------------------------
+class DeviceSlot:
+    """One device's runner thread, restarted on crash or hang."""
+
+    def __init__(self, device, once=False, dry_run=False):
+        from automation.metrics import MetricsRegistry
+        self.device = device
+        self.serial = device["device_serial"]
+        self.tag = _device_tag(device)
+        self.once = once
+        self.dry_run = dry_run
+        self.metrics = MetricsRegistry()    # survives restarts
+        self.runner = None
+        self.thread = None
+        self.started_at = None
+        self.restarts = 0
+        self.failures = 0                   # consecutive, drives the backoff
+        self.next_start = 0.0
+        self.aborted_at = None
+        self.finished = False
+        self.stopping = False
+        self.last_error = None
+
+    # -- lifecycle ---------------------------------------------------------
+
+    def start(self):
+        accounts = run_device.get_device_accounts(self.serial)
+        self.runner = DeviceRunner(self.serial, self.device["device_name"], accounts,
+                                   dry_run=self.dry_run, once=self.once,
+                                   registry=self.metrics)
+        self.started_at = time.time()
+        self.aborted_at = None
+        self.thread = threading.Thread(target=self._run, args=(self.runner,),
+                                       name=f"runner-{self.serial}", daemon=True)
+        self.thread.start()
+
+    def _run(self, runner):
+        _thread_device.serial = self.serial
+        _thread_device.tag = self.tag
+        try:
+            if not runner.accounts:
+                runner.log.error(f"{RED}No active accounts found for {self.serial}{RESET}")
+                return
+            runner.run()
+        except Exception as e:
+            self.last_error = str(e)[:200]
+            runner.log.error(f"{RED}Runner crashed: {e}{RESET}")
+            runner.log.debug(traceback.format_exc())
+        finally:
+            if runner is self.runner:
+                runner.print_summary()
+
+    def stop(self):
+        self.stopping = True
+        if self.runner is not None:
+            self.runner.stop()
+
+    def abort(self, reason):
+        """Stop a hung runner and break it out of its blocked RPC."""
+        from automation.device_connection import get_connection
+        from automation.metrics import get_registry
+        log.warning(f"{YELLOW}[{self.serial}] {reason} — aborting runner{RESET}")
+        get_registry().inc('orchestrator_aborts_total', device=self.serial)
+        self.aborted_at = time.time()
+        self.runner.abort()
+        try:
+            get_connection(self.serial).disconnect()
+        except Exception as e:
+            log.debug("[%s] disconnect during abort failed: %s", self.serial, e)
+
+    # -- health ------------------------------------------------------------
+
+    def idle_seconds(self):
+        """Seconds since the loop or its device last showed progress."""
+        from automation.device_connection import get_connection
+        last = max(self.runner.heartbeat, self.started_at)
+        rpc_last = get_connection(self.serial).rpc.last_rpc
+        if rpc_last:
+            last = max(last, rpc_last)
+        return time.time() - last
+
+    def supervise(self, now, running, hang_timeout):
+        """Called every SUPERVISE_INTERVAL by the orchestrator."""
+        if self.finished or self.thread is None:
+            return
+        alive = self.thread.is_alive()
+
+        if alive and self.aborted_at is None:
+            idle = self.idle_seconds()
+            if hang_timeout and idle > hang_timeout:
+                self.abort(f"no progress for {idle:.0f}s")
+            return
+
+        if alive and now - self.aborted_at < HANG_GRACE:
+            return              # give the aborted thread a chance to exit
+
+        # The runner is gone (or abandoned after an abort).
+        if alive:
+            log.warning(f"{RED}[{self.serial}] aborted runner did not exit in "
+                        f"{HANG_GRACE}s — abandoning its thread{RESET}")
+        if self.runner.stop_requested:
+            log.info(f"{CYAN}[{self.serial}] stopped via control channel — not restarting{RESET}")
+            self.finished = True
+            return
+        if not running or self.once or self.dry_run:
+            self.finished = True
+            return
+        if self.next_start == 0.0:
+            self._schedule_restart(now)
+        if now >= self.next_start:
+            self.next_start = 0.0
+            self.restarts += 1
+            log.info(f"{CYAN}[{self.serial}] restarting runner (restart #{self.restarts}){RESET}")
+            self.start()
+
+    def _schedule_restart(self, now):
+        from automation.metrics import get_registry
+        reason = 'hang' if self.aborted_at else 'exit'
+        if self.started_at and now - self.started_at >= HEALTHY_AFTER:
+            self.failures = 0
+        self.failures += 1
+        delay = min(RESTART_MAX_DELAY, RESTART_BASE_DELAY * 2 ** (self.failures - 1))
+        self.next_start = now + delay
+        get_registry().inc('orchestrator_restarts_total', device=self.serial, reason=reason)
+        log.warning(f"{YELLOW}[{self.serial}] runner stopped ({reason}) — "
+                    f"restarting in {delay}s{RESET}")
+
+    def status(self):
+        runner = self.runner
+        alive = self.thread is not None and self.thread.is_alive()
+        return {
+            'state': ('finished' if self.finished else
+                      'aborted' if self.aborted_at else
+                      'running' if alive else
+                      'stopped' if self.stopping else 'restarting'),
+            'restarts': self.restarts,
+            'last_error': self.last_error,
+            'idle_seconds': round(self.idle_seconds(), 1) if runner and not self.finished else None,
+        }
+
+
+class FarmOrchestrator:
+    """Starts one DeviceSlot per device and supervises them until stopped."""
+
+    def __init__(self, devices, once=False, dry_run=False, hang_timeout=HANG_TIMEOUT,
+                 delay=2.0, jitter=0.0):
+        self.slots = [DeviceSlot(d, once=once, dry_run=dry_run) for d in devices]
+        self.hang_timeout = hang_timeout
+        self.delay = delay
+        self.jitter = jitter
+        self._running = True
+        self._started = time.time()
+
+    def stop(self):
+        self._running = False
+        for slot in self.slots:
+            slot.stop()
+
+    def _metrics_state(self):
+        return {
+            'state': 'orchestrator',
+            'started_at': self._started,
+            'devices': {slot.serial: slot.status() for slot in self.slots},
+        }
+
+    def run(self):
+        from automation.metrics import start_publisher, stop_publisher
+        start_publisher('farm', extra_fn=self._metrics_state)
+        try:
+            for i, slot in enumerate(self.slots):
+                if not self._running:
+                    break
+                log.info(f"Starting {CYAN}{slot.tag}{RESET}")
+                slot.start()
+                # Stagger connects like the window launcher does
+                if (self.delay > 0 or self.jitter > 0) and i < len(self.slots) - 1:
+                    time.sleep(stagger_delay(self.delay, self.jitter))
+
+            while self._running:
+                now = time.time()
+                for slot in self.slots:
+                    slot.supervise(now, self._running, self.hang_timeout)
+                if all(slot.finished for slot in self.slots):
+                    break
+                time.sleep(SUPERVISE_INTERVAL)
+        finally:
+            self.stop()
+            # Runners finish their current action; don't wait on a hung one forever
+            deadline = time.time() + HANG_GRACE
+            for slot in self.slots:
+                if slot.thread is not None:
+                    slot.thread.join(timeout=max(0.0, deadline - time.time()))
+            stop_publisher()
+        log.info(f"{GREEN}All device loops stopped.{RESET}")
+
+
+def run_farm(devices, once=False, dry_run=False, hang_timeout=HANG_TIMEOUT, delay=2.0,
+             jitter=0.0, warmup=None):
+    """Entry point used by launch_farm.py --in-process.
+
+    warmup: dict of automation.farm_start.warm_up() options to connect the
+    devices (concurrency-limited) before their loops start; the loops then
+    reuse those connections. None skips the phase."""
+    setup_logging(devices)
+    if warmup is not None and not dry_run:
+        from automation.farm_start import warm_up, format_report
+        report = warm_up([d['device_serial'] for d in devices], handoff=False, **warmup)
+        log.info(format_report(report))
+        # Ready devices first, in the order they came up
+        rank = {e['serial']: i for i, e in enumerate(report['devices'])}
+        devices = sorted(devices, key=lambda d: rank.get(d['device_serial'], len(rank)))
+    orchestrator = FarmOrchestrator(devices, once=once, dry_run=dry_run,
+                                    hang_timeout=hang_timeout, delay=delay, jitter=jitter)
+
+    def shutdown_handler(sig, frame):
+        log.info(f"\n{YELLOW}Ctrl+C received — stopping all devices gracefully...{RESET}")
+        orchestrator.stop()
+
+    signal.signal(signal.SIGINT, shutdown_handler)
+    if hasattr(signal, 'SIGBREAK'):
+        signal.signal(signal.SIGBREAK, shutdown_handler)
+
+    log.info(f"{GREEN}In-process farm: {len(devices)} devices, pid {os.getpid()}{RESET} "
+             f"{DIM}(hang timeout {hang_timeout}s){RESET}")
+    orchestrator.run()
+    return orchestrator
@@ -1,24 +1,34 @@
 """
 Phone Farm — Multi-device launcher (Python).
 =============================================
-Opens a new console window for each device and runs run_device.py in it.
+Opens a new console window for each device and runs run_device.py in it,
+or (--in-process) runs every device loop as a thread of this process —
+see farm_orchestrator.py.
 
 Usage:
     python launch_farm.py                                   # launch ALL devices
     python launch_farm.py --devices 10.1.11.4:5555,10.1.11.3:5555
     python launch_farm.py --dry-run                         # preview only
     python launch_farm.py --once                            # pass --once to each runner
+    python launch_farm.py --in-process                      # one process for all devices
+    python launch_farm.py --no-warmup                       # skip the connection warm-up
+
+Before launching, every device is connected from here, --warmup-concurrency
+at a time (automation/farm_start.py); runners are then started ready
+devices first, --delay plus up to --jitter seconds apart, and attach to the
+connection that was just made instead of restarting UIAutomator.
 """
 
 import sys
 import os
 import argparse
 import subprocess
-import sqlite3
-import time
 
 FARM_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(FARM_DIR, "db", "phone_farm.db")
+if FARM_DIR not in sys.path:
+    sys.path.insert(0, FARM_DIR)
+from db.connection import connect  # noqa: E402
 PYTHON = os.path.join(FARM_DIR, "venv", "Scripts", "python.exe")
 if not os.path.exists(PYTHON):
     PYTHON = sys.executable
@@ -35,9 +45,7 @@ RESET   = "\033[0m"
 
 
 def get_db():
-    conn = sqlite3.connect(DB_PATH, timeout=10)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return connect(DB_PATH)
 
 
 def get_all_devices():
@@ -104,6 +112,19 @@ def main():
     parser.add_argument("--once", action="store_true", help="Pass --once to each runner")
     parser.add_argument("--delay", type=float, default=2.0,
                         help="Seconds between launching windows (default: 2)")
+    parser.add_argument("--jitter", type=float, default=1.0,
+                        help="Random extra seconds (0..N) between launches (default: 1)")
+    parser.add_argument("--no-warmup", action="store_true",
+                        help="Don't pre-connect devices; each runner connects on its own")
+    parser.add_argument("--warmup-concurrency", type=int, default=6,
+                        help="Devices connected at once during the warm-up (default: 6)")
+    parser.add_argument("--warmup-timeout", type=int, default=300,
+                        help="Upper bound on the whole warm-up phase in seconds (default: 300)")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Run all device loops in this process (farm_orchestrator.py)")
+    parser.add_argument("--hang-timeout", type=int, default=600,
+                        help="--in-process: restart a device loop idle this many seconds "
+                             "(default: 600, 0 = never)")
     args = parser.parse_args()
 
     # Gather devices
@@ -146,32 +167,48 @@ def main():
     print()
 
     if args.dry_run:
-        print(f"{MAGENTA}  --dry-run: would launch {len(devices)} windows. Exiting.{RESET}\n")
+        what = "device loops in this process" if args.in_process else "windows"
+        print(f"{MAGENTA}  --dry-run: would launch {len(devices)} {what}. Exiting.{RESET}\n")
+        return
+
+    warmup = None if args.no_warmup else {
+        'concurrency': args.warmup_concurrency, 'deadline': args.warmup_timeout}
+
+    if args.in_process:
+        from farm_orchestrator import run_farm
+        run_farm(devices, once=args.once, hang_timeout=args.hang_timeout, delay=args.delay,
+                 jitter=args.jitter, warmup=warmup)
         return
 
     # Launch
     extra = []
     if args.once:
         extra.append("--once")
+    names = {d["device_serial"]: d["device_name"] for d in devices}
 
-    print(f"{GREEN}Launching {len(devices)} device windows...{RESET}\n")
-
-    launched = 0
-    for d in devices:
-        serial = d["device_serial"]
-        name = d["device_name"]
+    def launch(serial):
+        name = names[serial]
         print(f"  Launching {CYAN}{name}{RESET} ({serial})...", end=" ")
         try:
             launch_device(serial, name, extra_args=extra)
             print(f"{GREEN}OK{RESET}")
-            launched += 1
+            return True
         except Exception as e:
             print(f"{RED}FAILED: {e}{RESET}")
-
-        if args.delay > 0 and launched < len(devices):
-            time.sleep(args.delay)
-
-    print(f"\n{GREEN}Done. {launched}/{len(devices)} windows launched.{RESET}")
+            return False, {'error': str(e)}
+
+    from automation import farm_start
+    if warmup:
+        print(f"{GREEN}Warming up {len(devices)} device connections "
+              f"({args.warmup_concurrency} at a time)...{RESET}")
+    report = farm_start.start_farm(
+        list(names), launch, warmup=bool(warmup),
+        concurrency=args.warmup_concurrency, deadline=args.warmup_timeout,
+        delay=args.delay, jitter=args.jitter,
+        on_warm=lambda r: print((farm_start.format_report(r) + "\n\n" if warmup else "")
+                                + f"{GREEN}Launching {len(devices)} device windows...{RESET}\n"))
+
+    print(f"\n{GREEN}Done. {report['launched']}/{len(devices)} windows launched.{RESET}")
     print(f"{DIM}Use stop_farm.py to shut them all down.{RESET}\n")
 
 
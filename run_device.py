@@ -16,7 +16,11 @@ Features:
     - Colored console output (device=cyan, account=yellow, actions=green, errors=red)
     - Dual logging: console + file (logs/<device_serial>_<date>.log)
     - Account rotation based on time windows
+    - Live roster: accounts added / disabled / re-windowed in the dashboard
+      are picked up at the next cycle, no restart needed
     - Graceful shutdown on Ctrl+C (SIGINT)
+    - Control channel (automation/control.py): wake, pause/resume, stop and
+      "run action X now" from the dashboard, delivered immediately
     - Auto-reconnect on device disconnect
     - Summary on exit (actions, errors, runtime)
 """
@@ -34,11 +38,12 @@ if hasattr(sys.stderr, 'reconfigure'):
 
 import re
 import signal
+import sqlite3
+import threading
 import time
 import datetime
 import logging
 import argparse
-import sqlite3
 import traceback
 
 # ---------------------------------------------------------------------------
@@ -48,6 +53,8 @@ FARM_DIR = os.path.dirname(os.path.abspath(__file__))
 if FARM_DIR not in sys.path:
     sys.path.insert(0, FARM_DIR)
 
+from db.connection import connect  # noqa: E402
+
 # Wake-signal files: dashboard "Post NOW" endpoint drops one here to ask
 # this runner to skip the next sleep. Same dir used by the dashboard side.
 WAKE_DIR = os.path.join(FARM_DIR, 'runtime', 'wake')
@@ -55,6 +62,14 @@ WAKE_DIR = os.path.join(FARM_DIR, 'runtime', 'wake')
 DB_PATH = os.path.join(FARM_DIR, "db", "phone_farm.db")
 LOG_DIR = os.path.join(FARM_DIR, "logs")
 
+# How often an idle runner (no account in window) re-checks its roster
+ROSTER_POLL_SECONDS = 30
+# How often a cycle cooldown prunes RPC reports / debug dumps
+ARTIFACT_ROTATE_SECONDS = 3600
+# How often a cooldown re-probes the proxy (inside proxy_health.TTL, so
+# a session start finds a fresh result)
+PROXY_REFRESH_SECONDS = 240
+
 # ---------------------------------------------------------------------------
 # ANSI colors (works on Windows 10+ with ENABLE_VIRTUAL_TERMINAL_PROCESSING)
 # ---------------------------------------------------------------------------
@@ -104,7 +119,9 @@ class ColoredFormatter(logging.Formatter):
         lvl_color = self.LEVEL_COLORS.get(record.levelno, WHITE)
         level = record.levelname[0]  # I, W, E, D, C
         msg = record.getMessage()
-        return f"{DIM}{ts}{RESET} {CYAN}{self.device_tag}{RESET} {lvl_color}{level} {msg}{RESET}"
+        # farm_orchestrator.py stamps records with the device they came from
+        tag = getattr(record, 'device_tag', None) or self.device_tag
+        return f"{DIM}{ts}{RESET} {CYAN}{tag}{RESET} {lvl_color}{level} {msg}{RESET}"
 
 
 class PlainFormatter(logging.Formatter):
@@ -126,10 +143,7 @@ class PlainFormatter(logging.Formatter):
 # DB helpers
 # ---------------------------------------------------------------------------
 def get_db():
-    conn = sqlite3.connect(DB_PATH, timeout=10)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    return conn
+    return connect(DB_PATH)
 
 
 def get_device_info(serial):
@@ -159,7 +173,10 @@ def _parse_time_windows(start_str, end_str):
     Supports comma-separated multi-windows: start="2,12" end="4,14" -> [(2,4), (12,14)]
     Single window: start="8" end="16" -> [(8,16)]
     Always-active: start="0" end="0" -> [(0,0)]
+    Off (runtime planner, 0 hours/day): start="off" -> [] (never picked)
     """
+    if str(start_str).strip().lower() == "off":
+        return []
     starts = [int(x.strip()) for x in str(start_str or "0").split(",") if x.strip().isdigit()]
     ends = [int(x.strip()) for x in str(end_str or "0").split(",") if x.strip().isdigit()]
 
@@ -193,7 +210,7 @@ def _is_in_window(now_hour, windows):
 
 def _is_always_active(windows):
     """Check if all windows are always-active (start==end)."""
-    return all(s == e for s, e in windows)
+    return bool(windows) and all(s == e for s, e in windows)
 
 
 def get_current_account(accounts):
@@ -227,6 +244,81 @@ def get_current_account(accounts):
     return None
 
 
+def build_hour_table(accounts):
+    """24 slots: the account get_current_account() picks at each hour (or None)."""
+    parsed = [(acct, _parse_time_windows(acct.get("start_time"), acct.get("end_time")))
+              for acct in accounts]
+    fallback = next((a for a, w in parsed if _is_always_active(w)), None)
+    table = []
+    for hour in range(24):
+        table.append(next((a for a, w in parsed
+                           if not _is_always_active(w) and _is_in_window(hour, w)),
+                          fallback))
+    return table
+
+
+def get_roster_version(conn):
+    """row_versions counter of the accounts table (bumped by a trigger on
+    every write, from any process), or None on a pre-migration DB."""
+    try:
+        row = conn.execute("SELECT version FROM row_versions WHERE name='accounts'").fetchone()
+    except sqlite3.Error:
+        return None
+    return row[0] if row else None
+
+
+class AccountRoster:
+    """A device's active accounts plus their hour -> account table.
+
+    refresh() costs one SELECT while nothing changed: the accounts
+    row_versions counter. When it moved, the roster is re-read and the hour
+    table rebuilt only if the device's rows actually differ (the counter
+    also moves for follower counts, other devices, ...). Without
+    row_versions the roster is re-read every time.
+    """
+
+    def __init__(self, device_serial, accounts=None):
+        self.device_serial = device_serial
+        self.version = None
+        self.accounts = []
+        self.hour_table = [None] * 24
+        if accounts is None:
+            self.refresh()
+        else:
+            self._set(accounts)
+            conn = get_db()
+            try:
+                self.version = get_roster_version(conn)
+            finally:
+                conn.close()
+
+    def _set(self, accounts):
+        self.accounts = accounts
+        self.hour_table = build_hour_table(accounts)
+
+    def refresh(self):
+        """Reload if the accounts changed; returns True when the roster did."""
+        conn = get_db()
+        try:
+            version = get_roster_version(conn)
+            if version is not None and version == self.version:
+                return False
+        finally:
+            conn.close()
+        accounts = get_device_accounts(self.device_serial)
+        self.version = version
+        if accounts == self.accounts:
+            return False
+        self._set(accounts)
+        return True
+
+    def current(self, hour=None):
+        """Account for `hour` (default now) — same rules as get_current_account()."""
+        if hour is None:
+            hour = datetime.datetime.now().hour
+        return self.hour_table[hour % 24]
+
+
 # ---------------------------------------------------------------------------
 # Setup logging for this device
 # ---------------------------------------------------------------------------
@@ -274,10 +366,11 @@ def setup_logging(device_serial, device_name):
 class DeviceRunner:
     """Runs the bot loop for a single device, rotating accounts."""
 
-    def __init__(self, device_serial, device_name, accounts, dry_run=False, once=False):
+    def __init__(self, device_serial, device_name, accounts, dry_run=False, once=False,
+                 registry=None):
         self.device_serial = device_serial   # DB format (underscore)
         self.device_name = device_name
-        self.accounts = accounts
+        self.roster = AccountRoster(device_serial, accounts)
         self.dry_run = dry_run
         self.once = once
         self._running = True
@@ -291,14 +384,53 @@ class DeviceRunner:
 
         self.log = logging.getLogger("run_device")
 
+        # Live metrics (published to runtime/metrics/ for the dashboard).
+        # farm_orchestrator.py passes a registry per device; standalone
+        # runners use the process-wide one.
+        from automation.metrics import get_registry
+        self.metrics = registry or get_registry()
+        # Prep work done inside pacing waits (automation/cooldown.py); the
+        # engine adds per-action prep to it each session.
+        from automation.cooldown import CooldownScheduler, rotate_debug_artifacts
+        self.cooldown = CooldownScheduler(self.device_serial, registry=self.metrics)
+        self.cooldown.every('rotate_artifacts',
+                            lambda: rotate_debug_artifacts(self.device_serial),
+                            ARTIFACT_ROTATE_SECONDS)
+        self.cooldown.every('proxy_health', self._refresh_proxy_health,
+                            PROXY_REFRESH_SECONDS)
+        self._state = "starting"
+        self._current_account = None
+        self._engine = None
+        # Last time the loop made progress (cycle start, sleep tick) —
+        # the orchestrator's hang watchdog reads it.
+        self.heartbeat = time.time()
+
         # Path to this device's wake-signal file (dashboard "Post NOW" drops
         # one here; _sleep() consumes it to short-circuit the cooldown).
+        # Only the fallback now: with the control channel up, wakes arrive
+        # as a socket command that sets _wake_event.
         safe_serial = self.device_serial.replace(':', '_')
         self._wake_file = os.path.join(WAKE_DIR, safe_serial + '.touch')
 
-    def _consume_wake(self):
+        # Control channel state (see _on_control)
+        self.control = None
+        self._plan_refresher = None
+        self._wake_event = threading.Event()
+        self._resumed = threading.Event()
+        self._resumed.set()
+        self._requested = []                 # action names queued by "run"
+        self.stop_requested = False          # "stop" command: don't restart me
+        self._control_lock = threading.Lock()
+
+    def _consume_wake(self, check_file=True):
         """Returns True (and removes the wake file) if a wake signal exists
         for this device. False otherwise. Used by _sleep to skip cooldown."""
+        if self._wake_event.is_set():
+            self._wake_event.clear()
+            self.log.info(f"{DIM}Wake signal received — skipping sleep{RESET}")
+            return True
+        if not check_file:
+            return False
         try:
             if os.path.exists(self._wake_file):
                 try:
@@ -314,6 +446,144 @@ class DeviceRunner:
     def stop(self):
         """Signal graceful stop."""
         self._running = False
+        self._wake_event.set()
+        self._resumed.set()
+
+    def abort(self):
+        """Stop, and tell the running BotEngine not to start another action."""
+        self.stop()
+        engine = self._engine
+        if engine is not None:
+            engine.stop()
+
+    @property
+    def accounts(self):
+        return self.roster.accounts
+
+    def _log_accounts(self):
+        for acct in self.accounts:
+            s, e = acct.get("start_time", "0"), acct.get("end_time", "0")
+            windows = _parse_time_windows(s, e)
+            if _is_always_active(windows):
+                window = "always"
+            else:
+                window = " + ".join(f"{ws}h-{we}h" for ws, we in windows if ws != we) or "off"
+            self.log.info(f"  {YELLOW}{acct['username']:<30}{RESET} window={window}  pkg={acct.get('instagram_package','default')}")
+
+    def _refresh_roster(self):
+        """Pick up dashboard edits to this device's accounts. True if changed."""
+        try:
+            changed = self.roster.refresh()
+        except Exception as e:
+            self.log.warning(f"{YELLOW}Could not reload accounts: {e}{RESET}")
+            return False
+        if changed:
+            self.metrics.inc('roster_reloads_total')
+            self.log.info(f"{CYAN}Accounts changed — {len(self.accounts)} active now:{RESET}")
+            self._log_accounts()
+        return changed
+
+    def _start_plan_refresher(self):
+        """Rebuild the accounts' session plans (automation.action_plan) in
+        the background, so a session starts on a ready plan."""
+        from automation.action_plan import start_refresher
+        self._plan_refresher = start_refresher(
+            self.device_serial, lambda: [a['id'] for a in self.accounts])
+
+    def _refresh_proxy_health(self):
+        """Cooldown prep: adb-only proxy probe into the shared cache."""
+        from automation import proxy_health
+        if not proxy_health.skip_check():
+            proxy_health.check(self.device_serial, force=True)
+
+    # -- control channel -------------------------------------------------
+
+    def _start_control(self):
+        from automation.control import ControlServer
+        try:
+            self.control = ControlServer(self.device_serial, self._on_control).start()
+        except OSError as e:
+            self.control = None
+            self.log.warning(f"{YELLOW}Control channel unavailable ({e}) — wake files only{RESET}")
+
+    def _stop_control(self):
+        if self.control is not None:
+            self.control.close()
+            self.control = None
+
+    def _on_control(self, command, args):
+        """automation.control handler; runs on the channel's thread."""
+        from automation.control import ControlError
+        if command == 'status':
+            state = self._metrics_state()
+            state.update({
+                'paused': not self._resumed.is_set(),
+                'requested_actions': list(self._requested),
+                'accounts': [a['username'] for a in self.accounts],
+                'total_actions': self.total_actions,
+                'total_errors': self.total_errors,
+                'uptime_seconds': round(time.time() - self._start_time),
+                'heartbeat_age': round(time.time() - self.heartbeat, 1),
+            })
+            return state
+        if command == 'wake':
+            self._wake_event.set()
+            return {'state': self._state}
+        if command == 'pause':
+            self._resumed.clear()
+            self.log.info(f"{MAGENTA}Paused via control channel (takes effect between sessions){RESET}")
+            return {'state': self._state}
+        if command == 'resume':
+            self._resumed.set()
+            self.log.info(f"{MAGENTA}Resumed via control channel{RESET}")
+            return {'state': self._state}
+        if command == 'stop':
+            self.log.info(f"{MAGENTA}Stop requested via control channel{RESET}")
+            self.stop_requested = True
+            if args.get('now'):
+                self.abort()
+            else:
+                self.stop()
+            return {'state': 'stopping'}
+        if command == 'run':
+            from automation.bot_engine import BotEngine
+            action = args.get('action')
+            if action not in BotEngine.action_names():
+                raise ControlError(f"unknown action {action!r}")
+            if self.roster.current() is None:
+                raise ControlError("no account is in its time window right now")
+            with self._control_lock:
+                if action not in self._requested:
+                    self._requested.append(action)
+            self._wake_event.set()
+            busy = self._engine is not None
+            self.log.info(f"{MAGENTA}Action '{action}' requested via control channel{RESET}")
+            return {'queued': list(self._requested),
+                    'starts': 'after the current session' if busy else 'now'}
+        raise ControlError(f"unsupported command {command!r}")
+
+    def _take_requested(self):
+        with self._control_lock:
+            requested, self._requested = self._requested, []
+        return requested
+
+    def _wait_resumed(self):
+        """Block while paused (keeps the heartbeat fresh)."""
+        self._state = "paused"
+        self.log.info(f"{YELLOW}Paused — waiting for resume...{RESET}")
+        while self._running and not self._resumed.wait(1):
+            self.heartbeat = time.time()
+        self._state = "running" if self._running else "stopping"
+
+    def _metrics_state(self):
+        """Non-metric runner state merged into each published snapshot."""
+        return {
+            'device_serial': self.device_serial,
+            'device_name': self.device_name,
+            'state': self._state,
+            'current_account': self._current_account,
+            'started_at': self._start_time,
+        }
 
     def run(self):
         """Main bot loop — keep rotating accounts until stopped."""
@@ -328,19 +598,27 @@ class DeviceRunner:
         self.log.info(f"{GREEN}{'='*60}")
 
         # Show accounts
-        for acct in self.accounts:
-            s, e = acct.get("start_time", "0"), acct.get("end_time", "0")
-            windows = _parse_time_windows(s, e)
-            if _is_always_active(windows):
-                window = "always"
-            else:
-                window = " + ".join(f"{ws}h-{we}h" for ws, we in windows if ws != we)
-            self.log.info(f"  {YELLOW}{acct['username']:<30}{RESET} window={window}  pkg={acct.get('instagram_package','default')}")
+        self._log_accounts()
 
         if self.dry_run:
             self.log.info(f"\n{MAGENTA}  --dry-run: would launch bot loop for the above. Exiting.{RESET}")
             return
 
+        from automation.metrics import start_publisher
+        start_publisher(self.device_serial, extra_fn=self._metrics_state,
+                        registry=self.metrics)
+        self.metrics.set_gauge('runner_start_time_seconds', self._start_time)
+
+        self._start_control()
+        self._start_plan_refresher()
+        try:
+            self._connect_and_loop(adb_serial)
+        finally:
+            if self._plan_refresher is not None:
+                self._plan_refresher.stop()
+            self._stop_control()
+
+    def _connect_and_loop(self, adb_serial):
         # Connect to device first
         self.log.info(f"\n{CYAN}Connecting to device {adb_serial}...{RESET}")
         try:
@@ -348,12 +626,21 @@ class DeviceRunner:
             conn = get_connection(self.device_serial)
 
             if conn.status != 'connected' or not conn.device:
-                self.log.info(f"{YELLOW}Device not yet connected, attempting connection...{RESET}")
-                device = conn.connect(timeout=45, max_attempts=2)
+                device = None
+                # Warmed up by the farm start coordinator: attach to the
+                # running UIAutomator instead of restarting it
+                from automation.farm_start import take_ready
+                if take_ready(self.device_serial):
+                    self.log.info(f"{CYAN}Device warmed up by farm start — attaching...{RESET}")
+                    device = conn.attach()
+                if device is None:
+                    self.log.info(f"{YELLOW}Device not yet connected, attempting connection...{RESET}")
+                    device = conn.connect(timeout=45, max_attempts=2)
                 if not device:
                     self.log.error(f"{RED}Failed to connect to device. Ensure it's on the network.{RESET}")
                     return
             else:
+                self.log.info(f"{CYAN}Reusing open connection (farm start warm-up){RESET}")
                 device = conn.device
 
             self.log.info(f"{GREEN}Connected! Screen: {device.window_size()}{RESET}")
@@ -376,26 +663,49 @@ class DeviceRunner:
         cycle = 0
         while self._running:
             cycle += 1
+            self.heartbeat = time.time()
             self.log.info(f"\n{BOLD}{'─'*50}")
             self.log.info(f"{BOLD}  Cycle #{cycle}  |  {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
             self.log.info(f"{BOLD}{'─'*50}{RESET}")
 
-            # Pick account for current time
-            acct = get_current_account(self.accounts)
+            self.metrics.inc('cycles_total')
+
+            if not self._resumed.is_set():
+                self._wait_resumed()
+                continue
+
+            # Pick account for current time (roster reloaded if it changed)
+            self._refresh_roster()
+            acct = self.roster.current()
+            requested = self._take_requested()
             if not acct:
+                if requested:
+                    self.log.warning(f"{YELLOW}Dropping requested {requested}: no account in window{RESET}")
                 self.log.info(f"{YELLOW}No account active for hour {datetime.datetime.now().hour}. Sleeping 5 min...{RESET}")
-                self._sleep(300)
+                self._current_account = None
+                self.metrics.inc('idle_cycles_total')
+                self._sleep(300, roster_poll=ROSTER_POLL_SECONDS)
                 continue
 
             username = acct["username"]
             self.accounts_run.add(username)
+            self._current_account = username
+            self._state = "running"
             self.log.info(f"{YELLOW}Account: {username}{RESET} (id={acct['id']})")
+            if requested:
+                self.log.info(f"{MAGENTA}Requested actions only: {', '.join(requested)}{RESET}")
 
             # Run bot engine
             try:
                 from automation.bot_engine import BotEngine
-                engine = BotEngine(self.device_serial, acct["id"])
-                result = engine.run()
+                engine = self._engine = BotEngine(self.device_serial, acct["id"],
+                                                  only_actions=requested,
+                                                  cooldown=self.cooldown)
+                try:
+                    with self.metrics.timer('session_seconds'):
+                        result = engine.run()
+                finally:
+                    self._engine = None
 
                 # Tally stats
                 actions_done = result.get("actions_completed", [])
@@ -406,11 +716,13 @@ class DeviceRunner:
                     action_name = a.get("action", "?")
                     self.total_actions += 1
                     self.action_log.append((username, action_name, True))
+                    self.metrics.inc('actions_total', action=action_name)
                     self.log.info(f"  {GREEN}✓ {action_name}{RESET}")
 
                 for err in errors:
                     self.total_errors += 1
                     self.action_log.append((username, "error", False))
+                    self.metrics.inc('errors_total', kind='action')
                     self.log.error(f"  {RED}✗ {err}{RESET}")
 
                 self.log.info(
@@ -418,9 +730,16 @@ class DeviceRunner:
                     f"{RED}{len(errors)} errors{RESET}, "
                     f"{DIM}{duration:.0f}s{RESET}"
                 )
+                timing = result.get("timing")
+                if timing:
+                    self.metrics.inc('session_pacing_seconds_total', timing['pacing_seconds'])
+                    self.metrics.inc('session_mechanical_seconds_total',
+                                     timing['mechanical_seconds'])
+                    self.metrics.inc('session_prep_seconds_total', timing['prep_seconds'])
 
             except Exception as e:
                 self.total_errors += 1
+                self.metrics.inc('errors_total', kind='engine')
                 self.log.error(f"{RED}Engine error: {e}{RESET}")
                 self.log.debug(traceback.format_exc())
 
@@ -430,6 +749,7 @@ class DeviceRunner:
                     from automation.device_connection import get_connection
                     conn = get_connection(self.device_serial)
                     dev = conn.connect(timeout=45, max_attempts=2)
+                    self.metrics.inc('runner_reconnects_total', result='ok' if dev else 'failed')
                     if dev:
                         self.log.info(f"{GREEN}Reconnected.{RESET}")
                     else:
@@ -445,22 +765,37 @@ class DeviceRunner:
             if self._running:
                 cooldown = 120  # 2 minutes between full cycles
                 self.log.info(f"{DIM}Cooling down {cooldown}s before next cycle...{RESET}")
-                self._sleep(cooldown)
+                # Housekeeping first, the rest of the 2 minutes as before
+                spent = self.cooldown.prep(cooldown, running=lambda: self._running)
+                self._sleep(cooldown - spent)
 
-    def _sleep(self, seconds):
+    def _sleep(self, seconds, roster_poll=None):
         """Sleep that respects _running flag AND wake signals.
         Checks both every second. A wake signal dropped at any point
         (including BEFORE this sleep started — e.g. arrived while a cycle
-        was running) short-circuits the sleep immediately."""
+        was running) short-circuits the sleep immediately.
+        roster_poll: also end the sleep when the account roster changes,
+        checked every that many seconds (idle sleeps)."""
         # Consume any pre-existing wake (arrived during the previous cycle)
         if self._consume_wake():
             return
-        for _ in range(int(seconds)):
-            if not self._running:
-                return
-            if self._consume_wake():
-                return
-            time.sleep(1)
+        # With the control channel up, wakes / stops set _wake_event and
+        # the wait below returns at once; the wake file is only polled
+        # when the channel couldn't start.
+        poll_file = self.control is None
+        self._state = "sleeping"
+        try:
+            for i in range(int(seconds)):
+                self.heartbeat = time.time()
+                if not self._running:
+                    return
+                if self._consume_wake(check_file=poll_file):
+                    return
+                if roster_poll and i and i % roster_poll == 0 and self._refresh_roster():
+                    return
+                self._wake_event.wait(1)
+        finally:
+            self._state = "running" if self._running else "stopping"
 
     def print_summary(self):
         """Print exit summary."""
@@ -556,6 +891,8 @@ Examples:
         runner.stop()
     finally:
         runner.print_summary()
+        from automation.metrics import stop_publisher
+        stop_publisher()
 
 
 if __name__ == "__main__":
@@ -10,6 +10,7 @@ Usage:
     python run_server.py
     python run_server.py --port 5000
     python run_server.py --auto-start-orchestrator
+    python run_server.py --profile-startup     # import-time waterfall, then exit
 """
 
 import os
@@ -41,10 +42,13 @@ def create_app():
     )
     app.secret_key = os.environ.get('SECRET_KEY', 'phone-farm-secret-2025')
 
-    # Initialize database
-    from db.models import init_db
-    db_path = init_db()
-    log.info("Database: %s", db_path)
+    # Initialize database — versioned migrations (db/migrations.py); a no-op
+    # integer compare unless a new step shipped since the last start
+    from db.migrations import migrate, DB_PATH, LATEST_VERSION
+    if migrate(DB_PATH):
+        log.info("Database migrated to schema v%d: %s", LATEST_VERSION, DB_PATH)
+    else:
+        log.info("Database: %s (schema v%d)", DB_PATH, LATEST_VERSION)
 
     # Register automation API blueprint
     from automation.api import automation_bp
@@ -84,8 +88,14 @@ def main():
     parser.add_argument('--debug', action='store_true', help='Debug mode')
     parser.add_argument('--auto-start-scheduler', action='store_true', default=True,
                        help='Auto-start the task scheduler on boot')
+    parser.add_argument('--profile-startup', action='store_true',
+                       help='Print an import-time waterfall of create_app() and exit')
     args = parser.parse_args()
 
+    if args.profile_startup:
+        from dashboard.startup_profile import profile_startup
+        sys.exit(profile_startup('run_server'))
+
     app = create_app()
 
     # Start task scheduler
@@ -95,6 +105,10 @@ def main():
         scheduler.start()
         log.info("Task scheduler started")
 
+    # Archive old history rows + incremental VACUUM/ANALYZE (HYDRA_RETENTION=0 disables)
+    from db.retention import start_retention_scheduler
+    start_retention_scheduler()
+
     log.info("Starting server on %s:%d", args.host, args.port)
     app.run(host=args.host, port=args.port, debug=args.debug, threaded=True)
 
@@ -1,7 +1,8 @@
 """
 Phone Farm — Stop all running bot processes.
 =============================================
-Finds and terminates all python processes running run_device.py.
+Finds and terminates all python processes running run_device.py, and an
+in-process farm (launch_farm.py --in-process).
 
 Usage:
     python stop_farm.py              # graceful stop (SIGINT / Ctrl+C)
@@ -54,6 +55,12 @@ def find_bot_processes():
                         "serial": serial,
                         "cmdline": cmdline,
                     })
+                elif "launch_farm.py" in cmdline and "--in-process" in cmdline:
+                    processes.append({
+                        "pid": proc.info["pid"],
+                        "serial": "(in-process farm)",
+                        "cmdline": cmdline,
+                    })
             except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
                 continue
     except Exception as e:
@@ -0,0 +1,34 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import pytest  # noqa: E402
+
+FARM_DB = os.path.join(ROOT, 'db', 'phone_farm.db')
+_farm_db_existed = os.path.exists(FARM_DB)
+
+
+@pytest.fixture
+def farm_db(tmp_path):
+    """A migrated scratch phone_farm.db that every connect() to the real one
+    is redirected to (db.connection.redirect)."""
+    from db import connection
+    from db.migrations import migrate
+    path = str(tmp_path / 'phone_farm.db')
+    migrate(path)
+    with connection.redirect(FARM_DB, path):
+        yield path
+
+
+def pytest_sessionfinish(session, exitstatus):
+    # Importing automation.actions.helpers runs the schema check, which
+    # creates db/phone_farm.db; don't leave one in a checkout that had none.
+    if not _farm_db_existed:
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(FARM_DB + suffix)
+            except OSError:
+                pass
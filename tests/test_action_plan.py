@@ -0,0 +1,125 @@
+"""automation/action_plan.py: session plans cached until a row_versions
+counter moves or the plan expires."""
+
+import json
+import time
+
+import pytest
+
+from automation import action_plan
+from db.connection import connect
+
+SERIAL = '10.0.0.1_5555'
+
+
+@pytest.fixture
+def account_id(farm_db):
+    conn = connect()
+    try:
+        cur = conn.execute(
+            "INSERT INTO accounts (device_serial, username, status, follow_enabled, "
+            "start_time, end_time) VALUES (?, 'plan_user', 'active', 'True', '0', '0')",
+            (SERIAL,))
+        conn.execute("INSERT INTO account_settings (account_id, settings_json) VALUES (?, ?)",
+                     (cur.lastrowid, json.dumps({'follow_limit_perday': 50})))
+        conn.commit()
+        yield cur.lastrowid
+    finally:
+        conn.close()
+        action_plan.invalidate()
+
+
+def _write(sql, params=()):
+    conn = connect()
+    try:
+        conn.execute(sql, params)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_plan_is_reused_while_inputs_are_unchanged(account_id):
+    first = action_plan.get_plan(SERIAL, account_id)
+    assert first is not None and not first.cached
+    second = action_plan.get_plan(SERIAL, account_id)
+    assert second.cached
+    assert second.built_at == first.built_at
+
+
+def test_settings_write_invalidates_the_plan(account_id):
+    action_plan.get_plan(SERIAL, account_id)
+    _write("UPDATE account_settings SET settings_json = ? WHERE account_id = ?",
+           (json.dumps({'follow_limit_perday': 7}), account_id))
+    plan = action_plan.get_plan(SERIAL, account_id)
+    assert not plan.cached
+    assert plan.settings.get('follow_limit_perday') == 7
+
+
+@pytest.mark.parametrize('sql', [
+    "INSERT INTO follower_snapshots (account_id, followers) VALUES ({id}, 10)",
+    "INSERT INTO job_orders (job_name, job_type, target) VALUES ('j', 'follow', 'someone')",
+    "INSERT INTO job_assignments (job_id, account_id, device_serial, username) "
+    "VALUES (1, {id}, '10.0.0.1_5555', 'plan_user')",
+])
+def test_write_to_other_plan_tables_invalidates(account_id, sql):
+    action_plan.get_plan(SERIAL, account_id)
+    assert action_plan.get_plan(SERIAL, account_id).cached
+    before = action_plan.plan_versions()
+    _write(sql.format(id=account_id))
+    assert action_plan.plan_versions() != before
+    assert not action_plan.get_plan(SERIAL, account_id).cached
+
+
+def test_expired_plan_is_rebuilt(account_id):
+    plan = action_plan.get_plan(SERIAL, account_id)
+    with action_plan._plans_lock:
+        action_plan._plans[account_id] = plan._replace(expires_at=time.time() - 1)
+    assert not action_plan.get_plan(SERIAL, account_id).cached
+
+
+def test_refresher_rebuilds_stale_plans(account_id):
+    refresher = action_plan.PlanRefresher(SERIAL, lambda: [account_id])
+    assert refresher.refresh() == 1
+    assert refresher.refresh() == 0
+    _write("UPDATE accounts SET status = 'active' WHERE id = ?", (account_id,))
+    assert refresher.refresh() == 1
+    assert action_plan.get_plan(SERIAL, account_id).cached
+
+
+def test_nothing_is_cached_without_row_versions(account_id):
+    _write("DROP TABLE row_versions")
+    assert action_plan.plan_versions() is None
+    action_plan.get_plan(SERIAL, account_id)
+    assert not action_plan.get_plan(SERIAL, account_id).cached
+
+
+def _warmup(account_id):
+    conn = connect()
+    try:
+        return tuple(conn.execute("SELECT warmup, warmup_until FROM accounts WHERE id = ?",
+                                  (account_id,)).fetchone())
+    finally:
+        conn.close()
+
+
+def test_building_a_plan_does_not_clear_expired_warmup(account_id):
+    _write("UPDATE accounts SET warmup = 1, warmup_until = '2000-01-01' WHERE id = ?",
+           (account_id,))
+    refresher = action_plan.PlanRefresher(SERIAL, lambda: [account_id])
+    assert refresher.refresh() == 1
+    plan = action_plan.get_plan(SERIAL, account_id)
+    assert plan.cached and not plan.warmup and plan.warmup_expired
+    assert _warmup(account_id) == (1, '2000-01-01')
+
+
+def test_session_clears_expired_warmup(account_id):
+    from automation.bot_engine import BotEngine
+    _write("UPDATE accounts SET warmup = 1, warmup_until = '2000-01-01' WHERE id = ?",
+           (account_id,))
+    engine = BotEngine(SERIAL, account_id)
+    engine._plan = action_plan.get_plan(SERIAL, account_id)
+    engine.account = dict(engine._plan.account)
+    engine.settings = dict(engine._plan.settings)
+    engine._determine_actions()
+    assert _warmup(account_id) == (0, None)
+    assert not action_plan.get_plan(SERIAL, account_id).warmup_expired
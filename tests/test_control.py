@@ -0,0 +1,74 @@
+"""automation/control.py: runner control channel round trips."""
+
+import json
+import os
+import socket
+
+import pytest
+
+from automation import control
+
+
+@pytest.fixture(autouse=True)
+def control_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(control, 'CONTROL_DIR', str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def server():
+    calls = []
+
+    def handler(command, args):
+        calls.append((command, args))
+        if command == 'pause' and args.get('refuse'):
+            raise control.ControlError('already paused')
+        if command == 'stop':
+            raise RuntimeError('boom')
+        return {'state': 'running'} if command == 'status' else None
+
+    srv = control.ControlServer('10.0.0.1_5555', handler).start()
+    srv.calls = calls
+    yield srv
+    srv.close()
+
+
+def test_command_round_trip(server):
+    assert control.send('10.0.0.1_5555', 'status') == {'ok': True, 'state': 'running'}
+    assert control.send('10.0.0.1_5555', 'run', action='follow') == {'ok': True}
+    assert server.calls == [('status', {}), ('run', {'action': 'follow'})]
+
+
+def test_errors_come_back_as_replies(server):
+    assert control.send('10.0.0.1_5555', 'pause', refuse=True) == {
+        'ok': False, 'error': 'already paused'}
+    assert control.send('10.0.0.1_5555', 'stop') == {'ok': False, 'error': 'stop failed: boom'}
+    reply = control.send('10.0.0.1_5555', 'reboot')
+    assert reply['ok'] is False and 'unknown command' in reply['error']
+
+
+def test_request_without_the_token_is_refused(server):
+    with socket.create_connection((control.HOST, server.port), timeout=2) as sock:
+        sock.sendall(json.dumps({'token': 'x' * 32, 'command': 'wake'}).encode() + b'\n')
+        reply = json.loads(control._read_line(sock))
+    assert reply == {'ok': False, 'error': 'bad token'}
+    assert server.calls == []
+
+
+def test_close_unregisters(server):
+    assert control.runner_info('10.0.0.1_5555')['port'] == server.port
+    server.close()
+    assert control.runner_info('10.0.0.1_5555') is None
+    assert control.send('10.0.0.1_5555', 'status') is None
+
+
+def test_entry_of_a_dead_runner_is_dropped(control_dir):
+    probe = socket.socket()
+    probe.bind((control.HOST, 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    path = control.registry_path('10.0.0.2_5555')
+    with open(path, 'w') as f:
+        json.dump({'name': '10.0.0.2_5555', 'pid': 1, 'port': port, 'token': 't'}, f)
+    assert control.send('10.0.0.2_5555', 'wake') is None
+    assert not os.path.exists(path)
@@ -0,0 +1,121 @@
+"""automation/cooldown.py: prep inside pacing waits keeps the wait's length."""
+
+import time
+
+import pytest
+
+from automation import cooldown
+
+
+class NullRegistry:
+    def inc(self, *a, **k):
+        pass
+
+    def observe(self, *a, **k):
+        pass
+
+
+@pytest.fixture
+def sched(monkeypatch):
+    monkeypatch.setattr(cooldown, 'MIN_PREP_WINDOW', 0.05)
+    return cooldown.CooldownScheduler('10.0.0.1_5555', NullRegistry())
+
+
+def _timed(fn, *args, **kwargs):
+    t = time.monotonic()
+    result = fn(*args, **kwargs)
+    return result, time.monotonic() - t
+
+
+def test_wait_keeps_its_deadline_with_prep(sched):
+    ran = []
+    sched.add('stage', lambda: (time.sleep(0.2), ran.append('stage')), estimate=0.2)
+    waited, took = _timed(sched.wait, 0.6)
+    assert ran == ['stage']
+    assert 0.6 <= took < 0.75
+    assert waited == pytest.approx(took, abs=0.01)
+
+
+def test_task_that_does_not_fit_stays_queued(sched):
+    sched.add('big', lambda: None, estimate=5)
+    _, took = _timed(sched.wait, 0.2)
+    assert took < 0.35
+    assert sched.pending() == ['big']
+
+
+def test_overrun_pushes_the_end_back_and_is_reported(sched):
+    sched.begin_session()
+    sched.add('slow', lambda: time.sleep(0.5), estimate=0.0)
+    _, took = _timed(sched.wait, 0.2)
+    assert 0.5 <= took < 0.65
+    report = sched.session_report()
+    assert report['prep_seconds'] == pytest.approx(0.2, abs=0.05)
+    assert report['overrun_seconds'] == pytest.approx(0.3, abs=0.05)
+    assert report['prep_tasks'] == {'slow': 1}
+    # the estimate learnt from the run keeps it out of short waits now
+    sched.add('slow', lambda: time.sleep(0.5), estimate=0.5)
+    _, took = _timed(sched.wait, 0.2)
+    assert took < 0.35
+
+
+def test_recurring_task_runs_once_per_interval(sched):
+    runs = []
+    sched.every('rotate', lambda: runs.append(1), interval=60)
+    sched.wait(0.1)
+    sched.wait(0.1)
+    assert runs == [1]
+    assert sched.pending() == []
+
+
+def test_failing_task_does_not_break_the_wait(sched):
+    sched.add('boom', lambda: 1 / 0)
+    sched.add('next', lambda: None)
+    _, took = _timed(sched.wait, 0.2)
+    assert took >= 0.2
+    assert sched.pending() == []
+
+
+def test_wait_ends_early_when_stopped(sched):
+    _, took = _timed(sched.wait, 5, running=lambda: False)
+    assert took < 0.1
+
+
+def _sleep_paced(seconds):
+    """random_sleep without the helpers import: sleep and note it."""
+    time.sleep(seconds)
+    cooldown.note_pacing(seconds)
+
+
+def _parts(report):
+    return sum(report[k] for k in ('action_seconds', 'pacing_seconds', 'prep_seconds',
+                                   'overrun_seconds', 'mechanical_seconds'))
+
+
+def test_session_report_splits_pacing_and_mechanical(sched):
+    sched.begin_session()
+    _sleep_paced(0.3)                       # random_sleep during login
+    sched.wait(0.2)
+    time.sleep(0.1)                         # outside waits: mechanical
+    report = sched.session_report(action_seconds=0.0)
+    assert report['pacing_seconds'] == pytest.approx(0.5, abs=0.05)
+    assert report['mechanical_seconds'] == pytest.approx(0.1, abs=0.05)
+    assert _parts(report) == pytest.approx(report['session_seconds'], abs=0.25)
+    assert cooldown.CooldownScheduler('x', NullRegistry()).session_report()['pacing_seconds'] == 0
+
+
+def test_in_action_pacing_is_not_counted_as_action_time(sched):
+    sched.begin_session()
+    start = time.monotonic()
+    time.sleep(0.2)                         # the action's UI work
+    _sleep_paced(0.4)                       # its random_sleep
+    action_seconds = time.monotonic() - start
+    sched.add('slow', lambda: time.sleep(0.3), estimate=0.0)
+    sched.wait(0.2)                         # 0.1 overrun
+    time.sleep(0.1)
+    report = sched.session_report(action_seconds=action_seconds)
+    assert report['action_seconds'] == pytest.approx(0.2, abs=0.05)
+    assert report['pacing_seconds'] == pytest.approx(0.4, abs=0.05)
+    assert report['prep_seconds'] == pytest.approx(0.2, abs=0.05)
+    assert report['overrun_seconds'] == pytest.approx(0.1, abs=0.05)
+    assert report['mechanical_seconds'] == pytest.approx(0.1, abs=0.05)
+    assert _parts(report) == pytest.approx(report['session_seconds'], abs=0.25)
@@ -0,0 +1,85 @@
+"""db/connection.py: pooling, per-checkout settings and pool_stats()."""
+
+import os
+import sqlite3
+import threading
+
+import pytest
+
+from db import connection
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    connection.reset_pool()
+    yield str(tmp_path / 'pool.db')
+    connection.reset_pool()
+
+
+def test_close_returns_connection_to_pool(db_path):
+    conn = connection.connect(db_path)
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.commit()
+    conn.close()
+    again = connection.connect(db_path)
+    assert again is conn
+    again.close()
+
+
+def test_close_rolls_back_uncommitted_work(db_path):
+    conn = connection.connect(db_path)
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.commit()
+    conn.execute("INSERT INTO t VALUES (1)")
+    conn.close()
+    conn = connection.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    conn.close()
+
+
+def test_settings_reapplied_on_checkout(db_path):
+    conn = connection.connect(db_path, row_factory=None, foreign_keys=True)
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+    conn.close()
+    conn = connection.connect(db_path)
+    assert conn.row_factory is sqlite3.Row
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 0
+    conn.close()
+
+
+def test_reset_pool_drops_idle_connections(db_path):
+    conn = connection.connect(db_path)
+    conn.close()
+    connection.reset_pool()
+    fresh = connection.connect(db_path)
+    assert fresh is not conn
+    fresh.close()
+
+
+def test_pool_stats_count_every_statement_across_threads(db_path):
+    threads, per_thread = connection.MAX_IDLE, 500
+    # Warm the pool so every worker checks out an already-tuned connection
+    # and the only statements counted are the workers' own.
+    warm = [connection.connect(db_path) for _ in range(threads)]
+    for c in warm:
+        c.close()
+    before = connection.pool_stats()['statements']
+    start = threading.Barrier(threads)
+
+    def work():
+        c = connection.connect(db_path)
+        try:
+            start.wait()
+            for _ in range(per_thread):
+                c.execute("SELECT 1").fetchone()
+        finally:
+            c.close()
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    stats = connection.pool_stats()
+    assert stats['statements'] - before == threads * per_thread
+    assert stats['idle'][os.path.abspath(db_path)] == threads
@@ -0,0 +1,129 @@
+"""automation/farm_start.py: warm-up deadline/cancel, handoff records and
+the staggered launch."""
+
+import os
+import threading
+import time
+
+import pytest
+
+from automation import device_connection, farm_start
+
+
+class FakeConnection:
+    CONNECTED = 'connected'
+
+    def __init__(self, delay=0.0, ok=True):
+        self.delay = delay
+        self.ok = ok
+        self.status = 'disconnected'
+        self.device = None
+        self.error_message = None
+        self.cancel = None
+        self.finished = threading.Event()
+
+    def connect(self, timeout=45, max_attempts=2, cancel=None):
+        self.cancel = cancel
+        try:
+            if cancel.wait(self.delay):
+                self.error_message = 'connect cancelled'
+                return None
+            if not self.ok:
+                self.error_message = 'UIAutomator not responsive'
+                return None
+            self.status, self.device = self.CONNECTED, object()
+            return self.device
+        finally:
+            self.finished.set()
+
+
+@pytest.fixture
+def farm(tmp_path, monkeypatch):
+    """Sim serials (no adb) whose connections are FakeConnections."""
+    monkeypatch.setattr(farm_start, 'READY_DIR', str(tmp_path / 'ready'))
+    monkeypatch.setattr(farm_start, 'REPORT_PATH', str(tmp_path / 'farm_start.json'))
+    conns = {}
+    monkeypatch.setattr(device_connection, 'get_connection', lambda s: conns[s])
+    return conns
+
+
+def test_ready_devices_first_and_handed_off(farm):
+    farm['sim-a_5555'] = FakeConnection(delay=0.2)
+    farm['sim-b_5555'] = FakeConnection(ok=False)
+    farm['sim-c_5555'] = FakeConnection()
+    report = farm_start.warm_up(['sim-a_5555', 'sim-b_5555', 'sim-c_5555'], concurrency=3)
+    assert [e['serial'] for e in report['devices']] == ['sim-c_5555', 'sim-a_5555', 'sim-b_5555']
+    assert [e['state'] for e in report['devices']] == ['ready', 'ready', 'failed']
+    assert report['ready'] == 2 and report['not_ready'] == 1
+    assert farm_start.take_ready('sim-a_5555')
+    assert not farm_start.take_ready('sim-a_5555')      # consumed
+    assert not farm_start.take_ready('sim-b_5555')
+    assert farm_start.last_report()['total'] == 3
+
+
+def test_deadline_reports_timeout_and_cancels_in_flight(farm):
+    farm['sim-fast_5555'] = FakeConnection()
+    slow = farm['sim-slow_5555'] = FakeConnection(delay=5)
+    started = time.time()
+    report = farm_start.warm_up(['sim-fast_5555', 'sim-slow_5555'], deadline=0.3)
+    assert time.time() - started < 2
+    states = {e['serial']: e for e in report['devices']}
+    assert states['sim-fast_5555']['state'] == 'ready'
+    assert states['sim-slow_5555']['state'] == 'timeout'
+    assert 'within 0.3s' in states['sim-slow_5555']['error']
+    # the in-flight connect saw the cancel and wrote no handoff record
+    assert slow.finished.wait(2)
+    assert slow.cancel.is_set()
+    time.sleep(0.05)
+    assert not os.path.exists(farm_start._ready_path('sim-slow_5555'))
+
+
+def test_queued_devices_are_not_started_after_deadline(farm):
+    for name in ('sim-1_5555', 'sim-2_5555', 'sim-3_5555'):
+        farm[name] = FakeConnection(delay=5)
+    report = farm_start.warm_up(list(farm), concurrency=1, deadline=0.2)
+    assert report['ready'] == 0
+    time.sleep(0.1)
+    assert sum(1 for c in farm.values() if c.cancel is not None) == 1
+
+
+def test_start_farm_launch_results(farm, monkeypatch):
+    monkeypatch.setattr(farm_start, 'stagger_delay', lambda *a: 0)
+    results = {'sim-ok_5555': (True, {'pid': 1}),
+               'sim-msg_5555': (False, 'already running'),
+               'sim-dict_5555': (False, {'error': 'spawn failed'})}
+
+    def launch(serial):
+        if serial == 'sim-boom_5555':
+            raise OSError('no python')
+        return results[serial]
+
+    report = farm_start.start_farm(list(results) + ['sim-boom_5555'], launch, warmup=False)
+    by_serial = {e['serial']: e for e in report['devices']}
+    assert report['launched'] == 1
+    assert by_serial['sim-msg_5555']['launch_error'] == 'already running'
+    assert by_serial['sim-dict_5555']['launch_error'] == 'spawn failed'
+    assert by_serial['sim-boom_5555']['launch_error'] == 'no python'
+
+
+def test_start_farm_saves_progress_for_pollers(farm, monkeypatch):
+    monkeypatch.setattr(farm_start, 'stagger_delay', lambda *a: 0)
+    farm['sim-a_5555'] = FakeConnection(delay=0.3)
+    farm['sim-b_5555'] = FakeConnection()
+    seen = []
+
+    def launch(serial):
+        seen.append((farm_start.last_report()['phase'], serial))
+        return True
+
+    worker = threading.Thread(target=farm_start.start_farm,
+                              args=(['sim-a_5555', 'sim-b_5555'], launch))
+    worker.start()
+    time.sleep(0.1)
+    during = farm_start.last_report()
+    assert during['phase'] == 'warmup'
+    assert [e['state'] for e in during['devices']] == ['pending', 'pending']
+    worker.join(5)
+    assert seen == [('launching', 'sim-b_5555'), ('launching', 'sim-a_5555')]
+    final = farm_start.last_report()
+    assert final['phase'] == 'done' and final['launched'] == 2
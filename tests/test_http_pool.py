@@ -0,0 +1,138 @@
+"""automation/http_pool.py: keep-alive reuse and the retry policy."""
+
+import socket
+import threading
+import time
+
+import pytest
+
+from automation.http_pool import HTTPPool, serve_stub
+
+BODY = {'model': 'stub', 'messages': [{'role': 'user', 'content': 'ping'}]}
+HEADERS = {'Content-Type': 'application/json'}
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(latency=0.0):
+        srv = serve_stub(0, latency=latency)
+        servers.append(srv)
+        return srv, f"http://127.0.0.1:{srv.server_address[1]}/v1/chat/completions"
+
+    yield start
+    for srv in servers:
+        srv.shutdown()
+        srv.server_close()
+
+
+def _stats(pool):
+    (entry,) = pool.stats().values()
+    return entry
+
+
+def test_connection_is_reused(stub):
+    srv, url = stub()
+    pool = HTTPPool(backoff=0)
+    for _ in range(3):
+        assert pool.post_json(url, HEADERS, BODY)['choices'][0]['message']['content'] == 'echo: ping'
+    st = _stats(pool)
+    assert st['connections_opened'] == 1
+    assert st['connections_reused'] == 2
+    assert srv.requests_received == 3
+
+
+def test_stream_returns_connection_to_pool(stub):
+    srv, url = stub()
+    pool = HTTPPool(backoff=0)
+    lines = list(pool.post_stream(url, HEADERS, dict(BODY, stream=True)))
+    assert lines[-1] == 'data: [DONE]'
+    pool.post_json(url, HEADERS, BODY)
+    assert _stats(pool)['connections_opened'] == 1
+
+
+class _OneShotServer:
+    """Answers one request per connection, then closes it without saying
+    so — the client keeps the socket, which is stale on its next use."""
+
+    RESPONSE = (b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                b'Content-Length: 11\r\n\r\n{"ok":true}')
+
+    def __init__(self):
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(8)
+        self.port = self.sock.getsockname()[1]
+        self.requests_received = 0
+        self._stop = False
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while not self._stop:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            data = b''
+            while b'\r\n\r\n' not in data:
+                chunk = client.recv(4096)
+                if not chunk:
+                    break
+                data += chunk
+            head, _, rest = data.partition(b'\r\n\r\n')
+            length = 0
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            while len(rest) < length:
+                rest += client.recv(4096)
+            self.requests_received += 1
+            client.sendall(self.RESPONSE)
+            client.close()
+
+    def close(self):
+        self._stop = True
+        self.sock.close()
+
+
+def test_stale_keepalive_socket_is_retried_on_fresh_connection():
+    srv = _OneShotServer()
+    try:
+        url = f"http://127.0.0.1:{srv.port}/v1/chat/completions"
+        pool = HTTPPool(backoff=0)
+        assert pool.post_json(url, HEADERS, BODY) == {'ok': True}
+        time.sleep(0.1)          # let the server's close reach the client
+        assert pool.post_json(url, HEADERS, BODY) == {'ok': True}
+        st = _stats(pool)
+        assert st['connections_reused'] == 1
+        assert st['connections_opened'] == 2
+        assert st['retries'] == 1
+        assert srv.requests_received == 2
+    finally:
+        srv.close()
+
+
+def test_read_timeout_is_not_retried(stub):
+    srv, url = stub(latency=1.0)
+    pool = HTTPPool(backoff=0, retries=2)
+    started = time.time()
+    with pytest.raises((socket.timeout, TimeoutError)):
+        pool.post_json(url, HEADERS, BODY, timeout=0.3)
+    assert time.time() - started < 0.9
+    time.sleep(0.2)
+    assert srv.requests_received == 1
+    st = _stats(pool)
+    assert st['retries'] == 0
+    assert st['errors'] == 1
+
+
+def test_connection_refused_is_not_retried():
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    pool = HTTPPool(backoff=0, retries=2)
+    with pytest.raises(ConnectionRefusedError):
+        pool.post_json(f"http://127.0.0.1:{port}/v1/x", HEADERS, BODY, timeout=2)
+    assert _stats(pool)['retries'] == 0
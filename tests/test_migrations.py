@@ -0,0 +1,143 @@
+"""db/migrations.py: versioned migration runner and row_versions triggers."""
+
+import sqlite3
+
+import pytest
+
+from db import migrations
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / 'farm.db')
+
+
+def _query(path, sql, params=()):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def test_fresh_db_gets_every_step(db):
+    assert migrations.migrate(db) is True
+    assert _query(db, "PRAGMA user_version")[0][0] == migrations.LATEST_VERSION
+    applied = [r[0] for r in _query(db, "SELECT version FROM schema_version ORDER BY version")]
+    assert applied == [v for v, _, _ in migrations.STEPS]
+    assert migrations.migrate(db) is False          # fast path
+
+
+def test_only_missing_steps_run(db, monkeypatch):
+    migrations.migrate(db)
+    ran = []
+    steps = [(v, n, (lambda conn, v=v: ran.append(v))) for v, n, _ in migrations.STEPS]
+    monkeypatch.setattr(migrations, 'STEPS', steps)
+    conn = sqlite3.connect(db)
+    conn.execute("DELETE FROM schema_version WHERE version = 12")
+    conn.execute("PRAGMA user_version = 11")
+    conn.commit()
+    conn.close()
+    assert migrations.migrate(db) is True
+    assert ran == [12]
+    assert _query(db, "PRAGMA user_version")[0][0] == migrations.LATEST_VERSION
+
+
+def test_failing_step_rolls_back_everything(db, monkeypatch):
+    migrations.migrate(db)
+
+    def broken(conn):
+        conn.execute("CREATE TABLE half_done (x INTEGER)")
+        raise RuntimeError('step failed')
+
+    latest = migrations.LATEST_VERSION + 1
+    monkeypatch.setattr(migrations, 'STEPS', migrations.STEPS + [(latest, 'broken', broken)])
+    monkeypatch.setattr(migrations, 'LATEST_VERSION', latest)
+    with pytest.raises(RuntimeError):
+        migrations.migrate(db)
+    assert _query(db, "PRAGMA user_version")[0][0] == latest - 1
+    assert _query(db, "SELECT COUNT(*) FROM schema_version WHERE version = ?", (latest,))[0][0] == 0
+    assert _query(db, "SELECT name FROM sqlite_master WHERE name = 'half_done'") == []
+
+
+def _insert_minimal_row(conn, table):
+    """INSERT with just the NOT NULL columns that have no default."""
+    cols = [(name, ctype) for _, name, ctype, notnull, default, pk
+            in conn.execute(f"PRAGMA table_info({table})")
+            if notnull and default is None and not pk]
+    values = [1 if 'INT' in (ctype or '').upper() else 'x' for _, ctype in cols]
+    if cols:
+        conn.execute(f"INSERT INTO {table} ({', '.join(n for n, _ in cols)}) "
+                     f"VALUES ({', '.join('?' * len(cols))})", values)
+    else:
+        conn.execute(f"INSERT INTO {table} DEFAULT VALUES")
+
+
+@pytest.mark.parametrize('table', migrations.ROW_VERSION_TABLES + migrations.PLAN_VERSION_TABLES)
+def test_writes_bump_row_versions(db, table):
+    migrations.migrate(db)
+
+    def version():
+        return _query(db, "SELECT version FROM row_versions WHERE name = ?", (table,))[0][0]
+
+    before = version()
+    conn = sqlite3.connect(db)
+    _insert_minimal_row(conn, table)
+    conn.commit()
+    conn.close()
+    after_insert = version()
+    assert after_insert > before
+
+    conn = sqlite3.connect(db)
+    conn.execute(f"DELETE FROM {table}")
+    conn.commit()
+    conn.close()
+    assert version() > after_insert
+
+
+def _traced_migrate(db, monkeypatch, **kwargs):
+    """migrate() with every statement it runs recorded."""
+    statements = []
+    real_connect = sqlite3.connect
+
+    def connect(*args, **kw):
+        conn = real_connect(*args, **kw)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(migrations.sqlite3, 'connect', connect)
+    migrations.migrate(db, **kwargs)
+    monkeypatch.setattr(migrations.sqlite3, 'connect', real_connect)
+    return statements
+
+
+def _log_message(db, message):
+    conn = sqlite3.connect(db)
+    conn.execute("INSERT INTO bot_logs (message) VALUES (?)", (message,))
+    conn.commit()
+    conn.close()
+
+
+def _fts_search(db, term):
+    return _query(db, "SELECT rowid FROM bot_logs_fts WHERE bot_logs_fts MATCH ?", (term,))
+
+
+def test_forced_rerun_skips_fts_rebuild_when_index_current(db, monkeypatch):
+    assert any("'rebuild'" in s for s in _traced_migrate(db, monkeypatch))
+    _log_message(db, 'tapped follow button')         # indexed by the trigger
+    statements = _traced_migrate(db, monkeypatch, force=True)
+    assert not any("'rebuild'" in s for s in statements)
+    assert len(_fts_search(db, 'follow')) == 1
+
+
+def test_forced_rerun_rebuilds_drifted_fts(db, monkeypatch):
+    migrations.migrate(db)
+    conn = sqlite3.connect(db)
+    conn.execute("DROP TRIGGER bot_logs_fts_ai")
+    conn.commit()
+    conn.close()
+    _log_message(db, 'tapped follow button')         # not indexed
+    assert _fts_search(db, 'follow') == []
+    statements = _traced_migrate(db, monkeypatch, force=True)
+    assert any("'rebuild'" in s for s in statements)
+    assert len(_fts_search(db, 'follow')) == 1
@@ -0,0 +1,93 @@
+"""automation/proxy_health.py: probe parsing and the shared cache."""
+
+import subprocess
+
+import pytest
+
+from automation import proxy_health
+
+# Probe output of a stock Android device without a VPN: the kernel's own
+# tunnels (tunl0, ip6tnl0, sit0, vti) are listed, down
+STOCK_NO_VPN = """\
+dummy0 unknown 0x83
+ip6_vti0 down 0x80
+ip6tnl0 down 0x80
+ip_vti0 down 0x80
+lo unknown 0x9
+p2p0 down 0x1002
+rmnet_data0 down 0x1002
+sit0 down 0x80
+tunl0 down 0x80
+wlan0 up 0x1003
+---
+"""
+
+WITH_VPN = STOCK_NO_VPN.replace(
+    'wlan0 up 0x1003\n', 'tun0 unknown 0x10d1\nwlan0 up 0x1003\n')
+
+
+def test_stock_device_is_not_active():
+    assert proxy_health.parse_probe(STOCK_NO_VPN) == (False, [])
+
+
+def test_kernel_tunnels_never_count():
+    out = 'tunl0 unknown 0xc1\nip6tnl0 up 0x1\nip_vti0 up 0x1\n---\n'
+    assert proxy_health.parse_probe(out) == (False, [])
+
+
+def test_up_tun_interface_is_active():
+    active, indicators = proxy_health.parse_probe(WITH_VPN)
+    assert active
+    assert indicators == ['VPN interface tun0 (unknown)']
+
+
+def test_down_tun_interface_is_not_active():
+    out = STOCK_NO_VPN.replace('wlan0', 'tun0 down 0x1090\nwlan0', 1)
+    assert proxy_health.parse_probe(out)[0] is False
+
+
+def test_connectivity_lines():
+    connected = STOCK_NO_VPN + '  NetworkAgentInfo{ ni{VPN CONNECTED extra: } }\n'
+    assert proxy_health.parse_probe(connected) == (True, ['VPN connectivity: CONNECTED'])
+    gone = STOCK_NO_VPN + '  NetworkAgentInfo{ ni{VPN DISCONNECTED extra: } }\n'
+    assert proxy_health.parse_probe(gone)[0] is False
+
+
+@pytest.fixture
+def adb(tmp_path, monkeypatch):
+    """Fake `adb shell` returning whatever .output is set to."""
+    monkeypatch.setattr(proxy_health, 'HEALTH_DIR', str(tmp_path))
+
+    class Fake:
+        output = STOCK_NO_VPN
+        calls = 0
+
+        def __call__(self, args, **kwargs):
+            self.calls += 1
+            return subprocess.CompletedProcess(args, 0, self.output, '')
+
+    fake = Fake()
+    monkeypatch.setattr(proxy_health.subprocess, 'run', fake)
+    return fake
+
+
+def test_stock_device_falls_back_to_ui_check(adb):
+    ui_calls = []
+    health = proxy_health.check('10.0.0.1_5555', ui_fallback=lambda: ui_calls.append(1) or False)
+    assert ui_calls == [1]
+    assert health['active'] is False
+    assert health['method'] == 'ui'
+
+
+def test_active_result_is_cached_inactive_is_not(adb):
+    adb.output = WITH_VPN
+    first = proxy_health.check('10.0.0.1_5555')
+    assert first['active'] and not first['cached']
+    second = proxy_health.check('10.0.0.1_5555')
+    assert second['cached'] and adb.calls == 1
+
+    proxy_health.invalidate('10.0.0.1_5555')
+    adb.output = STOCK_NO_VPN
+    assert proxy_health.check('10.0.0.1_5555')['active'] is False
+    assert proxy_health.check('10.0.0.1_5555')['active'] is False
+    assert adb.calls == 3
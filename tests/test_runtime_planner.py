@@ -0,0 +1,118 @@
+"""automation/runtime_planner.py: per-device hour allocation, pinned
+accounts, zero demand and incremental re-planning."""
+
+import json
+
+import pytest
+
+import run_device
+from automation import runtime_planner as rp
+from db.connection import connect
+
+SERIAL = '10.0.0.1_5555'
+
+
+def _account(aid, start='0', end='0', **settings):
+    row = {'id': aid, 'username': f'user{aid}', 'start_time': start, 'end_time': end}
+    return rp._account_input(row, settings)
+
+
+def _assert_disjoint(assignment):
+    taken = []
+    for hours in assignment.values():
+        taken.extend(hours)
+    assert len(taken) == len(set(taken))
+
+
+def test_demands_are_met_without_overlap():
+    accounts = [_account(1, daily_runtime_hours=8),
+                _account(2, daily_runtime_hours=10),
+                _account(3, '6', '12')]             # demand = its 6h window
+    assignment = rp.plan_device(accounts)
+    assert {aid: len(h) for aid, h in assignment.items()} == {1: 8, 2: 10, 3: 6}
+    _assert_disjoint(assignment)
+    assert assignment[3] == frozenset(range(6, 12))    # kept where it was
+
+
+def test_windows_are_compacted():
+    accounts = [_account(1, daily_runtime_hours=6), _account(2, daily_runtime_hours=6)]
+    assignment = rp.plan_device(accounts)
+    assert all(len(rp.runs(h)) == 1 for h in assignment.values())
+
+
+def test_constrained_account_gets_its_hours_by_shifting_others():
+    accounts = [_account(1, '0', '20', daily_runtime_hours=20),
+                _account(2, daily_runtime_hours=4, allowed_hours='8-12')]
+    assignment = rp.plan_device(accounts)
+    assert assignment[2] == frozenset(range(8, 12))
+    assert len(assignment[1]) == 20
+    _assert_disjoint(assignment)
+
+
+def test_flexible_account_takes_the_idle_hours():
+    accounts = [_account(1, '8', '16'), _account(2)]   # 2 is always-active
+    assignment = rp.plan_device(accounts)
+    assert assignment[1] == frozenset(range(8, 16))
+    assert assignment[2] == rp.ALL_HOURS - assignment[1]
+
+
+def test_pinned_account_keeps_its_window():
+    accounts = [_account(1, '9', '17', pin_time_window=True),
+                _account(2, daily_runtime_hours=24)]
+    assignment = rp.plan_device(accounts)
+    assert assignment[1] == frozenset(range(9, 17))
+    assert assignment[2] == rp.ALL_HOURS - assignment[1]
+    report = rp._device_report(SERIAL, accounts, assignment)
+    pinned = report['accounts'][0]
+    assert (pinned['start_time'], pinned['end_time'], pinned['changed']) == ('9', '17', False)
+
+
+def test_zero_demand_clears_the_window():
+    accounts = [_account(1, '8', '16', daily_runtime_hours=0),
+                _account(2, '16', '20')]
+    report = rp._device_report(SERIAL, accounts, rp.plan_device(accounts))
+    off, other = report['accounts']
+    assert (off['start_time'], off['end_time']) == (rp.OFF, rp.OFF)
+    assert off['changed'] and off['hours'] == 0
+    assert report['unplaced'] == []
+    assert not other['changed']
+    assert report['idle_hours'] == [h for h in range(24) if not 16 <= h < 20]
+    # an account already off stays off
+    again = rp._device_report(SERIAL, [_account(1, 'off', 'off')], {1: frozenset()})
+    assert not again['accounts'][0]['changed']
+
+
+def test_off_window_is_never_picked_by_run_device():
+    accounts = [{'username': 'off', 'start_time': 'off', 'end_time': 'off'},
+                {'username': 'day', 'start_time': '8', 'end_time': '20'}]
+    table = run_device.build_hour_table(accounts)
+    assert [a['username'] if a else None for a in table] == (
+        [None] * 8 + ['day'] * 12 + [None] * 4)
+
+
+@pytest.fixture
+def device(farm_db):
+    conn = connect(farm_db)
+    conn.execute("INSERT INTO devices (device_serial) VALUES (?)", (SERIAL,))
+    for username, start, end, settings in (
+            ('morning', '8', '16', {'daily_runtime_hours': 0}),
+            ('evening', '16', '20', {})):
+        cur = conn.execute("INSERT INTO accounts (device_serial, username, status, start_time, "
+                           "end_time) VALUES (?, ?, 'active', ?, ?)",
+                           (SERIAL, username, start, end))
+        conn.execute("INSERT INTO account_settings (account_id, settings_json) VALUES (?, ?)",
+                     (cur.lastrowid, json.dumps(settings)))
+    conn.commit()
+    conn.close()
+    return farm_db
+
+
+def test_apply_writes_windows_and_next_run_is_incremental(device):
+    report = rp.plan([SERIAL], apply=True, db_path=device)
+    assert report['changed_accounts'] == 1
+    conn = connect(device)
+    rows = dict(conn.execute("SELECT username, start_time || '-' || end_time FROM accounts"))
+    conn.close()
+    assert rows == {'morning': 'off-off', 'evening': '16-20'}
+    again = rp.plan([SERIAL], apply=True, db_path=device)
+    assert again['devices'] == [{'device_serial': SERIAL, 'skipped': 'unchanged'}]
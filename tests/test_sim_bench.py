@@ -0,0 +1,102 @@
+"""automation/sim_bench.py: the bench stays off the production DB, clock and
+subprocess.run."""
+
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+
+import pytest
+
+from automation import device_sim, sim_bench
+from db import connection
+
+
+@pytest.fixture
+def production_db(tmp_path, monkeypatch):
+    """Stand-in for db/phone_farm.db holding one real account."""
+    path = str(tmp_path / 'prod' / 'phone_farm.db')
+    (tmp_path / 'prod').mkdir()
+    sim_bench.migrate(path)
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO accounts (device_serial, username) VALUES ('10.0.0.1_5555', 'real')")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(connection, 'DB_PATH', path)
+    connection.reset_pool()
+    yield path
+    connection.reset_pool()
+
+
+def _accounts(path):
+    conn = sqlite3.connect(path)
+    try:
+        return [r[0] for r in conn.execute("SELECT username FROM accounts ORDER BY id")]
+    finally:
+        conn.close()
+
+
+def test_scratch_db_is_a_redirected_copy(production_db):
+    with sim_bench.scratch_db() as copy:
+        conn = connection.connect()
+        try:
+            conn.execute("INSERT INTO accounts (device_serial, username) VALUES ('sim-00_5555', 'x')")
+            conn.commit()
+        finally:
+            conn.close()
+        assert _accounts(copy) == ['real', 'x']
+    assert _accounts(production_db) == ['real']
+    assert not os.path.exists(copy)
+
+
+def test_run_writes_only_the_scratch_copy(production_db):
+    report = sim_bench.run(devices=2, hours=0.02, speed=400)
+    assert report['sessions'] >= 2
+    assert report['crashes'] == 0
+    assert _accounts(production_db) == ['real']
+    conn = sqlite3.connect(production_db)
+    try:
+        for table in ('action_history', 'account_sessions', 'bot_logs'):
+            assert conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 0
+    finally:
+        conn.close()
+
+
+def test_accelerated_clock_only_in_bench_threads():
+    real_sleep = time.sleep
+    seen = {}
+
+    def bench():
+        sim_bench.bench_thread()
+        t = time.perf_counter()
+        time.sleep(1.0)
+        seen['bench'] = time.perf_counter() - t
+
+    def other():
+        t = time.perf_counter()
+        time.sleep(0.2)
+        seen['other'] = time.perf_counter() - t
+
+    with sim_bench.accelerated_clock(20):
+        threads = [threading.Thread(target=bench), threading.Thread(target=other)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        with pytest.raises(RuntimeError):
+            with sim_bench.accelerated_clock(2):
+                pass
+    assert seen['bench'] < 0.15
+    assert seen['other'] >= 0.2
+    assert time.sleep is real_sleep
+
+
+def test_adb_router_is_scoped():
+    real_run = subprocess.run
+    with device_sim.adb_router():
+        assert subprocess.run is not real_run
+        r = subprocess.run(['adb', '-s', 'sim-90:5555', 'shell', 'input', 'keyevent', '4'],
+                           capture_output=True, text=True)
+        assert r.returncode == 0
+    assert subprocess.run is real_run